@@ -26,6 +26,7 @@ from dwca_utils import tsv_dialect
 from dwca_utils import csv_dialect
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 import logging
 import argparse
 
@@ -34,6 +35,8 @@ def composite_header_constructor(options):
         two input files.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the output file (optional; default './')
         inputfile1 - full path to one of the input files (optional)
         inputfile2 - full path to the second input file (optional)
@@ -49,6 +52,7 @@ def composite_header_constructor(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
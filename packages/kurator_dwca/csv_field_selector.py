@@ -22,6 +22,7 @@ __adapted_from__ = "actor_template.py"
 from dwca_utils import csv_select_fields
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 import os
 import logging
 import argparse
@@ -31,6 +32,8 @@ def csv_field_selector(options):
         that list.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory to work in (optional)
         inputfile - full path to the input file (required)
         outputfile - name of the output file, without path (required)
@@ -47,6 +50,7 @@ def csv_field_selector(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
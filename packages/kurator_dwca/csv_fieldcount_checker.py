@@ -22,6 +22,7 @@ __adapted_from__ = "actor_template.py"
 from dwca_utils import csv_field_checker
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 import os
 import logging
 import argparse
@@ -31,6 +32,8 @@ def csv_fieldcount_checker(options):
         of fields in the header.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the output artifacts (optional)
         inputfile - full path to the input file (required)
     returns a dictionary with information about the results
@@ -45,6 +48,7 @@ def csv_fieldcount_checker(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
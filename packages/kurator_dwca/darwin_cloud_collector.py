@@ -26,6 +26,7 @@ from dwca_utils import read_header
 from dwca_utils import clean_header
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 import os
 import logging
 import argparse
@@ -35,6 +36,8 @@ def darwin_cloud_collector(options):
        outputfile.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the outputfile (optional)
         inputfile - full path to the input file (required)
         outputfile - name of the output file, without path (required)
@@ -49,6 +52,7 @@ def darwin_cloud_collector(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
@@ -15,11 +15,12 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2018 President and Fellows of Harvard College"
-__version__ = "darwinize_header.py 2018-02-06T12:23-03:00"
+__version__ = "darwinize_header.py 2026-10-19T04:00-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_vocab_utils import darwinize_list
+from dwca_vocab_utils import darwin_cloud_mapper
 from dwca_utils import read_header
 from dwca_utils import write_header
 from dwca_utils import read_csv_row
@@ -27,9 +28,13 @@ from dwca_utils import csv_file_dialect
 from dwca_utils import csv_file_encoding
 from dwca_utils import csv_dialect
 from dwca_utils import tsv_dialect
+from dwca_utils import dialects_equal
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 import os
+import re
+import shutil
 import logging
 import argparse
 
@@ -49,10 +54,12 @@ def darwinize_header(options):
         using a Darwin Cloud vocabulary lookup.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the outputfile (optional)
         inputfile - full path to the input file (required)
         dwccloudfile - full path to the vocabulary file containing the Darwin Cloud 
-           terms (required)
+           terms, or a DarwinCloudMapper made from it (required)
         outputfile - name of the output file, without path (required)
         encoding - string signifying the encoding of the input file. If known, it speeds
             up processing a great deal. (optional; default None) (e.g., 'utf-8')
@@ -67,6 +74,7 @@ def darwinize_header(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
@@ -124,7 +132,8 @@ def darwinize_header(options):
         logging.debug('message:\n%s' % message)
         return response(returnvars, returnvals)
 
-    if os.path.isfile(dwccloudfile) == False:
+    dwccloudfile = darwin_cloud_mapper(dwccloudfile)
+    if dwccloudfile is None:
         message = 'Darwin Cloud vocabulary file not found. %s' % __version__
         returnvals = [workspace, outputfile, success, message, artifacts]
         logging.debug('message:\n%s' % message)
@@ -148,20 +157,61 @@ def darwinize_header(options):
     except:
         pass
 
-    if encoding is None or len(encoding.strip())==0:
-        encoding = csv_file_encoding(inputfile)
     try:
         namespace = options['namespace']
     except:
         pass
 
-    inputdialect = csv_file_dialect(inputfile)
-
     try:
         format = options['format']
     except:
         pass
 
+    dwcheader = darwinize_file(inputfile, outputfile, dwccloudfile, namespace=namespace,
+        format=format, encoding=encoding)
+
+    if dwcheader is None:
+        message = 'Unable to write darwinized header to output file. %s' % __version__
+        returnvals = [workspace, outputfile, success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    success = True
+    artifacts['darwinized_header_file'] = outputfile
+    returnvals = [workspace, outputfile, success, message, artifacts]
+    logging.debug('Finishing %s' % __version__)
+    return response(returnvars, returnvals)
+	
+def darwinize_file(inputfile, outputfile, dwccloudfile, namespace=None, format=None, 
+    encoding=None, blockcopy=True):
+    ''' Write a copy of a file with its field names translated to Darwin Core field 
+        names using a Darwin Cloud vocabulary lookup. If the output file has the same 
+        dialect as the input file, the input file is in utf-8 and its header line ends 
+        in the line terminator of the dialect, only the header is written anew and the 
+        rest of the file is copied as it is, without parsing the rows. 
+    parameters:
+        inputfile - full path to the input file (required)
+        outputfile - full path to the output file (required)
+        dwccloudfile - full path to the vocabulary file containing the Darwin Cloud 
+            terms, or a DarwinCloudMapper made from it (required)
+        namespace - prepend namespace to fields that were darwinized 
+            (optional; default None) (e.g., 'y', 'n')
+        format - output file format (e.g., 'csv' or 'txt') (optional; default None for 
+            the format of the input file)
+        encoding - string signifying the encoding of the input file (optional; 
+            default None)
+        blockcopy - False to write every row anew even if the rest of the file could be
+            copied as it is (optional; default True)
+    returns:
+        dwcheader - the darwinized header, or None if the file was not written
+    '''
+    functionname = 'darwinize_file()'
+
+    if encoding is None or len(encoding.strip())==0:
+        encoding = csv_file_encoding(inputfile)
+
+    inputdialect = csv_file_dialect(inputfile)
+
     if format is None or len(format)==0:
         outputdialect = inputdialect
     elif format.lower()=='csv':
@@ -173,17 +223,29 @@ def darwinize_header(options):
     dwcheader = darwinize_list(header, dwccloudfile, namespace)
 
     if dwcheader is None:
-        message = 'Unable to create darwinized header. %s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
-        logging.debug('message:\n%s' % message)
-        return response(returnvars, returnvals)
-        
+        s = 'Unable to create darwinized header of %s in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
     # Write the new header to the outputfile
     if write_header(outputfile, dwcheader, dialect=outputdialect) == False:
-        message = 'Unable to write header to output file. %s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
-        logging.debug('message:\n%s' % message)
-        return response(returnvars, returnvals)
+        s = 'Unable to write header to %s in %s.' % (outputfile, functionname)
+        logging.debug(s)
+        return None
+
+    # The columns stay in the same order, so if the rows would be written as they are,
+    # append the input file after its header line to the output file.
+    headerlength = None
+    if blockcopy == True and dialects_equal(inputdialect, outputdialect) == True and \
+        encoding is not None and \
+        re.sub('[-_]', '', encoding.lower()) in ['utf8', 'utf8sig', 'ascii']:
+        headerlength = _header_length(inputfile, inputdialect)
+    if headerlength is not None:
+        with open(inputfile, 'rb') as infile:
+            infile.seek(headerlength)
+            with open(outputfile, 'ab') as outfile:
+                shutil.copyfileobj(infile, outfile, 1048576)
+        return dwcheader
 
     # Read the rows of the input file, append them to the output file after the 
     # header with columns in the same order.
@@ -194,12 +256,32 @@ def darwinize_header(options):
             writer.writerow(row)
             #print 'row: %s' % row
 
-    success = True
-    artifacts['darwinized_header_file'] = outputfile
-    returnvals = [workspace, outputfile, success, message, artifacts]
-    logging.debug('Finishing %s' % __version__)
-    return response(returnvars, returnvals)
-	
+    return dwcheader
+
+def _header_length(inputfile, dialect, readto=1048576):
+    ''' Get the number of bytes in the header line of a file, line terminator included.
+    parameters:
+        inputfile - full path to the input file (required)
+        dialect - csv.dialect object with the attributes of the input file (required)
+        readto - the most bytes in which to look for the end of the header line 
+            (optional; default 1048576)
+    returns:
+        the number of bytes, or None if the header line does not end within readto bytes
+            in the line terminator of the dialect, outside of quotes
+    '''
+    with open(inputfile, 'rb') as infile:
+        buf = infile.read(readto)
+
+    end = re.search('\r\n|\r|\n', buf)
+    if end is None or end.group(0) != dialect.lineterminator:
+        return None
+
+    # A line terminator within quotes is part of a field name
+    if dialect.quotechar and buf[:end.start()].count(dialect.quotechar) % 2 != 0:
+        return None
+
+    return end.end()
+
 def _getoptions():
     ''' Parse command line options and return them.'''
     parser = argparse.ArgumentParser()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "John Wieczorek"
+__copyright__ = "Copyright 2018 President and Fellows of Harvard College"
+__version__ = "darwinize_headers.py 2026-10-19T03:20-04:00"
+__kurator_content_type__ = "actor"
+__adapted_from__ = "darwinize_header.py"
+
+from darwinize_header import darwinize_file
+from dwca_vocab_utils import darwin_cloud_mapper
+from dwca_utils import response
+from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
+import os
+import glob
+import logging
+import argparse
+
+def darwinize_headers(options):
+    ''' Translate field names from each of a set of input files to Darwin Core field
+        names in output files using a Darwin Cloud vocabulary lookup, read once for all
+        of the files.
+    options - a dictionary of parameters
+        loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
+        workspace - path to a directory for the outputfiles (optional)
+        inputpath - full path to the input file set (e.g., ./workspace/*.csv) (required)
+        dwccloudfile - full path to the vocabulary file containing the Darwin Cloud
+           terms (required)
+        outputprefix - string to prepend to the name of each input file to make the name
+            of its output file (optional; default 'darwinized_')
+        encoding - string signifying the encoding of the input files. If known, it
+            speeds up processing a great deal. (optional; default None) (e.g., 'utf-8')
+        format - output file format (e.g., 'csv' or 'txt'), which is also the extension
+            of the output files (optional; default None for the format and extension of
+            each input file)
+        namespace - prepend namespace to fields that were darwinized
+        (optional; default 'no') (e.g., 'y', 'n')
+    returns a dictionary with information about the results
+        workspace - actual path to the directory where the outputfiles were written
+        outputfiles - list of actual full paths to the output files written
+        success - True if every input file was darwinized, otherwise False
+        message - an explanation of the reason if success=False
+        artifacts - a dictionary of persistent objects created
+    '''
+    #print '%s options: %s' % (__version__, options)
+
+    setup_actor_logging(options)
+    setup_actor_profile_index(options)
+
+    logging.debug( 'Started %s' % __version__ )
+    logging.debug( 'options: %s' % options )
+
+    # Make a list for the response
+    returnvars = ['workspace', 'outputfiles', 'success', 'message', 'artifacts']
+
+    ### Standard outputs ###
+    success = False
+    message = None
+
+    ### Custom outputs ###
+    outputfiles = []
+
+    # Make a dictionary for artifacts left behind
+    artifacts = {}
+
+    ### Establish variables ###
+    workspace = './'
+    inputpath = None
+    dwccloudfile = None
+    outputprefix = 'darwinized_'
+    encoding = None
+    namespace = 'n'
+    format = None
+
+    ### Required inputs ###
+    try:
+        workspace = options['workspace']
+    except:
+        pass
+
+    try:
+        inputpath = options['inputpath']
+    except:
+        pass
+
+    if inputpath is None or len(inputpath)==0:
+        message = 'No input path given. %s' % __version__
+        returnvals = [workspace, outputfiles, success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    inputfiles = sorted([f for f in glob.glob(inputpath) if os.path.isfile(f)])
+    if len(inputfiles) == 0:
+        message = 'No input files found in %s. %s' % (inputpath, __version__)
+        returnvals = [workspace, outputfiles, success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    try:
+        dwccloudfile = options['dwccloudfile']
+    except:
+        pass
+
+    if dwccloudfile is None or len(dwccloudfile)==0:
+        message = 'No Darwin Cloud vocabulary file given. %s' % __version__
+        returnvals = [workspace, outputfiles, success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    # Make the lookup tables from the Darwin Cloud once for all of the files
+    mapper = darwin_cloud_mapper(dwccloudfile)
+    if mapper is None:
+        message = 'Darwin Cloud vocabulary file not found. %s' % __version__
+        returnvals = [workspace, outputfiles, success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    try:
+        if options['outputprefix'] is not None:
+            outputprefix = options['outputprefix']
+    except:
+        pass
+
+    try:
+        encoding = options['encoding']
+    except:
+        pass
+
+    try:
+        namespace = options['namespace']
+    except:
+        pass
+
+    try:
+        format = options['format']
+    except:
+        pass
+
+    failedfiles = []
+    for inputfile in inputfiles:
+        filename = outputprefix + os.path.basename(inputfile)
+        if format is not None and len(format) > 0:
+            filename = '%s.%s' % (os.path.splitext(filename)[0], format.lower())
+        outputfile = '%s/%s' % (workspace.rstrip('/'), filename)
+
+        # Never write over an input file
+        if os.path.abspath(outputfile) in [os.path.abspath(f) for f in inputfiles]:
+            s = 'Output file %s would replace an input file.' % outputfile
+            logging.debug(s)
+            failedfiles.append(inputfile)
+            continue
+
+        dwcheader = darwinize_file(inputfile, outputfile, mapper, namespace=namespace,
+            format=format, encoding=encoding)
+        if dwcheader is None:
+            failedfiles.append(inputfile)
+            continue
+
+        outputfiles.append(outputfile)
+        s = 'darwinized_header_file_%s' % os.path.splitext(filename)[0]
+        artifacts[s] = outputfile
+
+    if len(failedfiles) > 0:
+        message = 'Unable to darwinize %s. %s' % (', '.join(failedfiles), __version__)
+        returnvals = [workspace, outputfiles, success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    success = True
+    returnvals = [workspace, outputfiles, success, message, artifacts]
+    logging.debug('Finishing %s' % __version__)
+    return response(returnvars, returnvals)
+
+def _getoptions():
+    ''' Parse command line options and return them.'''
+    parser = argparse.ArgumentParser()
+
+    help = 'directory for the output files (optional)'
+    parser.add_argument("-w", "--workspace", help=help)
+
+    help = 'full path to the input file set (required)'
+    parser.add_argument("-i", "--inputpath", help=help)
+
+    help = 'full path to the Darwin Cloud vocabulary file (required)'
+    parser.add_argument("-v", "--dwccloudfile", help=help)
+
+    help = 'prefix for the output file names (optional; default darwinized_)'
+    parser.add_argument("-p", "--outputprefix", help=help)
+
+    help = 'include namespace (optional; default No)'
+    parser.add_argument("-n", "--namespace", help=help)
+
+    help = 'output file format (e.g., csv or txt) (optional; default unchanged)'
+    parser.add_argument("-f", "--format", help=help)
+
+    help = "encoding (optional)"
+    parser.add_argument("-e", "--encoding", help=help)
+
+    help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
+    parser.add_argument("-l", "--loglevel", help=help)
+
+    return parser.parse_args()
+
+def main():
+    options = _getoptions()
+    optdict = {}
+
+    if options.inputpath is None or len(options.inputpath)==0 or \
+        options.dwccloudfile is None or len(options.dwccloudfile)==0:
+        s =  'syntax:\n'
+        s += 'python darwinize_headers.py'
+        s += ' -w ./workspace'
+        s += ' -v ./data/vocabularies/darwin_cloud.txt'
+        s += ' -i "./data/tests/test_*.csv"'
+        s += ' -p darwinized_'
+        s += ' -n yes'
+        s += ' -f csv'
+        s += ' -l DEBUG'
+        print '%s' % s
+        return
+
+    optdict['workspace'] = options.workspace
+    optdict['inputpath'] = options.inputpath
+    optdict['dwccloudfile'] = options.dwccloudfile
+    optdict['outputprefix'] = options.outputprefix
+    optdict['namespace'] = options.namespace
+    optdict['format'] = options.format
+    optdict['encoding'] = options.encoding
+    optdict['loglevel'] = options.loglevel
+    print 'optdict: %s' % optdict
+
+    # Darwinize the headers of all of the files in the input path
+    response=darwinize_headers(optdict)
+    print '\nresponse: %s' % response
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,7 @@ __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 from report_utils import term_setter_report
 from slugify import slugify
 import os.path
@@ -33,6 +34,8 @@ def dataset_constants_setter(options):
         constants.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the output file (optional; default './')
         inputfile - path to the input file. Either full path or path within the workspace
             (required)
@@ -55,6 +58,7 @@ def dataset_constants_setter(options):
     print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
@@ -21,6 +21,7 @@ __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 from report_utils import uuid_term_appender
 from slugify import slugify
 import os.path
@@ -31,6 +32,8 @@ def dataset_guid_setter(options):
     ''' Create an output file adding a field populated by global unique identifiers.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the output file (optional; default './')
         inputfile - path to the input file. Either full path or path within the workspace
             (required)
@@ -50,6 +53,7 @@ def dataset_guid_setter(options):
     print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
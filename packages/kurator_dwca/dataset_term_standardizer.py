@@ -15,12 +15,13 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "dataset_term_standardizer.py 2017-04-27T16:37-04:00"
+__version__ = "dataset_term_standardizer.py 2026-10-19T02:00-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 from report_utils import term_standardizer_report
 from slugify import slugify
 import uuid
@@ -33,21 +34,32 @@ def dataset_term_standardizer(options):
         with standard values and adding new fields to hold the original values.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the output file (optional; default './')
         inputfile - path to the input file. Either full path or path within the workspace
             (required)
         outputfile - name of the output file, without path (optional)
         vocabfile - path to the vocabulary file. Either full path or path within the
-           workspace (required if constantvalues is None)
+           workspace (required if standardizations is None)
         encoding - string signifying the encoding of the input file. If known, it speeds
             up processing a great deal. (optional; default None) (e.g., 'utf-8')
         format - output file format (e.g., 'csv' or 'txt') (optional; default 'txt')
         key - field or separator-separated fields whose values are to be set to the 
-            constantvalues (required)
+            constantvalues (required if standardizations is None)
+        standardizations - list of [key, vocabfile] pairs of further standardizations 
+            to make in the same pass over the input file, in order, after the one for
+            key and vocabfile, if given. Each vocabfile is either a full path or a path 
+            within the workspace (optional)
         separator - string to use as the key and value separator (optional; default '|')
+        cachesize - the largest number of combinations of values of the fields in the 
+            key for which to keep the standard values while standardizing (optional; 
+            default 10000)
     returns a dictionary with information about the results
         workspace - actual path to the directory where the outputfile was written
         outputfile - actual full path to the output report file
+        cachestats - dictionary of the number of 'hits' and 'misses' of combinations of
+            values of the fields in the key looked up in the cache, and its 'size'
         success - True if process completed successfully, otherwise False
         message - an explanation of the reason if success=False
         artifacts - a dictionary of persistent objects created
@@ -55,17 +67,22 @@ def dataset_term_standardizer(options):
     print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
 
     # Make a list for the response
-    returnvars = ['workspace', 'outputfile', 'success', 'message', 'artifacts']
+    returnvars = ['workspace', 'outputfile', 'cachestats', 'success', 'message', 
+        'artifacts']
 
     ### Standard outputs ###
     success = False
     message = None
 
+    ### Custom outputs ###
+    cachestats = None
+
     # Make a dictionary for artifacts left behind
     artifacts = {}
 
@@ -78,6 +95,8 @@ def dataset_term_standardizer(options):
     key = None
     separator = '|'
     encoding = None
+    cachesize = None
+    standardizations = None
 
     ### Required inputs ###
     try:
@@ -92,7 +111,7 @@ def dataset_term_standardizer(options):
 
     if inputfile is None or len(inputfile)==0:
         message = 'No input file given. %s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
+        returnvals = [workspace, outputfile, cachestats, success, message, artifacts]
         logging.debug('message:\n%s' % message)
         return response(returnvars, returnvals)
 
@@ -102,38 +121,45 @@ def dataset_term_standardizer(options):
             inputfile = workspace+'/'+inputfile
         else:
             message = 'Input file %s not found. %s' % (inputfile, __version__)
-            returnvals = [workspace, outputfile, True, message, artifacts]
+            returnvals = [workspace, outputfile, cachestats, True, message, artifacts]
             logging.debug('message:\n%s' % message)
             return response(returnvars, returnvals)
 
+    try:
+        standardizations = options['standardizations']
+    except:
+        pass
+
+    if standardizations is None:
+        standardizations = []
+
+    # Look to see if the vocab files are at the absolute path or in the workspace.
+    standardizations = [[k, _vocabfile_at(v, workspace)] for k, v in standardizations]
+
     try:
         vocabfile = options['vocabfile']
     except:
         pass
 
-    if vocabfile is None or len(vocabfile)==0:
+    if (vocabfile is None or len(vocabfile)==0) and len(standardizations)==0:
         message = 'No vocab file given. %s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
+        returnvals = [workspace, outputfile, cachestats, success, message, artifacts]
         logging.debug('message:\n%s' % message)
         return response(returnvars, returnvals)
 
-    # Look to see if vocab file is at the absolute path or in the workspace.
-    vocabfileat = None
-    if os.path.isfile(vocabfile) == True:
-        vocabfileat = vocabfile
-    else:
-        vocabfileat = workspace+'/'+vocabfile
-
-    vocabfile = vocabfileat
-
     try:
         key = options['key']
     except:
         pass
 
+    if vocabfile is not None and len(vocabfile) > 0:
+        standardizations.insert(0, [key, _vocabfile_at(vocabfile, workspace)])
+
+    # The first key names the output file
+    key = standardizations[0][0]
     if key is None or len(key)==0:
         message = 'No key given. %s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
+        returnvals = [workspace, outputfile, cachestats, success, message, artifacts]
         logging.debug('message:\n%s' % message)
         return response(returnvars, returnvals)
 
@@ -153,6 +179,11 @@ def dataset_term_standardizer(options):
     except:
         pass
 
+    try:
+        cachesize = int(options['cachesize'])
+    except:
+        pass
+
     try:
         outputfile = options['outputfile']
     except:
@@ -164,25 +195,39 @@ def dataset_term_standardizer(options):
     else:
         outputfile = '%s/%s' % (workspace.rstrip('/'), outputfile)
 
-    # Get a list of distinct values of the term in the input file
-    fields = key.split(separator)
-
-    success = term_standardizer_report(inputfile, outputfile, vocabfile, key, \
-        separator=separator, encoding=encoding, format=format)
+    # Make all of the standardizations in one pass over the input file
+    cachestats = {}
+    success = term_standardizer_report(inputfile, outputfile, None, None, \
+        separator=separator, encoding=encoding, format=format, cachesize=cachesize,
+        cachestats=cachestats, standardizations=standardizations)
 
     if outputfile is not None and not os.path.isfile(outputfile):
         message = 'Failed to write results to output file %s. ' % outputfile
         message += '%s' %__version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
+        returnvals = [workspace, outputfile, cachestats, success, message, artifacts]
         logging.debug('message:\n%s' % message)
         return response(returnvars, returnvals)
 
     s = '%s_change_report_file' % slugify(key)
     artifacts[s] = outputfile
-    returnvals = [workspace, outputfile, success, message, artifacts]
+    returnvals = [workspace, outputfile, cachestats, success, message, artifacts]
     logging.debug('Finishing %s' % __version__)
     return response(returnvars, returnvals)
 
+def _vocabfile_at(vocabfile, workspace):
+    ''' Get the path to a vocabulary file given either as a full path or as a path 
+        within the workspace.
+    parameters:
+        vocabfile - path to the vocabulary file (required)
+        workspace - path to the workspace (required)
+    returns:
+        vocabfile - the path to the vocabulary file
+    '''
+    # Look to see if vocab file is at the absolute path or in the workspace.
+    if vocabfile is None or os.path.isfile(vocabfile) == True:
+        return vocabfile
+    return workspace+'/'+vocabfile
+
 def _getoptions():
     ''' Parse command line options and return them.'''
     parser = argparse.ArgumentParser()
@@ -211,6 +256,13 @@ def _getoptions():
     help = 'report file format (e.g., csv or txt) (optional; default csv)'
     parser.add_argument("-f", "--format", help=help)
 
+    help = 'further standardization as key:vocabfile, in the order given (optional)'
+    parser.add_argument("-d", "--standardization", action='append', help=help)
+
+    help = 'number of combinations of key values to keep standard values for '
+    help += '(optional; default 10000)'
+    parser.add_argument("-c", "--cachesize", help=help)
+
     help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
     parser.add_argument("-l", "--loglevel", help=help)
 
@@ -221,9 +273,9 @@ def main():
     optdict = {}
 
     if options.inputfile is None or len(options.inputfile)==0 or \
-       options.key is None or len(options.key)==0 or \
-       ((options.vocabfile is None or len(options.vocabfile)==0) and \
-       options.constantvalues is None):
+       ((options.key is None or len(options.key)==0 or \
+       options.vocabfile is None or len(options.vocabfile)==0) and \
+       options.standardization is None):
         s =  'Example syntax:\n'
         s += 'python dataset_term_standardizer.py'
         s += ' -w ./workspace'
@@ -248,6 +300,18 @@ def main():
         s += ' -e utf-8'
         s += ' -l DEBUG'
         print '%s' % s
+
+        s =  'Multiple vocabulary syntax:\n'
+        s += 'python dataset_term_standardizer.py'
+        s += ' -w ./workspace'
+        s += ' -i ./data/tests/test_geog_lowercase.csv'
+        s += ' -o testgeographystandardization.txt'
+        s += ' -d "continent|country|countryCode|stateProvince|county|municipality|waterBody|islandGroup|island:./data/vocabularies/dwc_geography.txt"'
+        s += ' -d "country:./data/vocabularies/country.txt"'
+        s += ' -s "|"'
+        s += ' -f txt'
+        s += ' -l DEBUG'
+        print '%s' % s
         return
 
     optdict['workspace'] = options.workspace
@@ -258,6 +322,10 @@ def main():
     optdict['separator'] = options.separator
     optdict['format'] = options.format
     optdict['encoding'] = options.encoding
+    optdict['cachesize'] = options.cachesize
+    if options.standardization is not None:
+        optdict['standardizations'] = [s.split(':', 1) 
+            for s in options.standardization]
     optdict['loglevel'] = options.loglevel
     print 'optdict: %s' % optdict
 
@@ -15,30 +15,68 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "downloader.py 2017-04-27T16:37-04:00"
+__version__ = "downloader.py 2026-10-19T08:00-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from slugify import slugify
+import os
+import time
+import json
+import shutil
+import hashlib
 import logging
+import threading
 import uuid
 import argparse
 try:
-    from urllib.request import urlretrieve  # Python 3
+    from urllib.request import Request, urlopen  # Python 3
+    from urllib.parse import urlparse
 except ImportError:
-    from urllib import urlretrieve  # Python 2
+    from urllib2 import Request, urlopen  # Python 2
+    from urlparse import urlparse
+
+# The number of bytes read from a response at a time
+_blocksize = 1048576
+
+# The smallest part of a file worth fetching in a segment of its own
+_minsegmentsize = 1048576
 
 def downloader(options):
     ''' Download a files from a list of URLs.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
         workspace - path to a directory for the outputfile (optional)
-        url - URL to the file to download (required)
+        url - URL to the file to download (required unless urls or urlfile given)
         outputfile - name of the output file, without path (optional)
+        urls - list of URLs of files to download concurrently, or a string of them
+            separated by white space, each to a file named after its URL (see 
+            download_filename()) (optional)
+        urlfile - full path to a file of URLs to download concurrently, one per line,
+            with blank lines and lines starting with '#' ignored (optional)
+        workers - the number of files to download at a time from a list of URLs
+            (optional; default 4)
+        perhost - the number of files to download at a time from any one host
+            (optional; default 2)
+        manifest - name of the file, without path, in which to write the results for
+            every URL in a list of URLs (optional; default a name made from a uuid)
+        retries - the number of times to try again after a failed attempt, resuming
+            where the last attempt stopped if the server accepts ranges
+            (optional; default 3)
+        segments - the number of ranges of the file to fetch in parallel if the server
+            accepts ranges (optional; default 1)
+        checksum - the expected SHA-256 digest of the file (optional)
+        cachedir - full path to a directory in which to keep downloads, so that files
+            unchanged on the server (by ETag or Last-Modified) are not downloaded
+            again (optional)
     returns a dictionary with information about the results
         workspace - actual path to the directory where the outputfile was written
         outputfile - actual full path to the output file
+        checksum - the SHA-256 digest of the downloaded file
+        manifest - actual full path to the manifest of the results for a list of URLs
+        results - a list of the results for every URL (see fetch_url())
         success - True if process completed successfully, otherwise False
         message - an explanation of the results
         artifacts - a dictionary of persistent objects created
@@ -51,12 +89,18 @@ def downloader(options):
     logging.debug( 'options: %s' % options )
 
     # Make a list for the response
-    returnvars = ['workspace', 'outputfile', 'success', 'message', 'artifacts']
+    returnvars = ['workspace', 'outputfile', 'checksum', 'manifest', 'results', 
+        'success', 'message', 'artifacts']
 
     ### Standard outputs ###
     success = False
     message = None
 
+    ### Custom outputs ###
+    checksum = None
+    manifest = None
+    results = None
+
     # Make a dictionary for artifacts left behind
     artifacts = {}
 
@@ -64,6 +108,14 @@ def downloader(options):
     workspace = './'
     url = None
     outputfile = None
+    retries = 3
+    segments = 1
+    expectedchecksum = None
+    cachedir = None
+    urls = None
+    urlfile = None
+    workers = 4
+    perhost = 2
 
     ### Required inputs ###
     try:
@@ -86,12 +138,113 @@ def downloader(options):
 
     outputfile = '%s/%s' % (workspace.rstrip('/'), outputfile)
 
-    success = download_file(url, outputfile)
+    try:
+        retries = int(options['retries'])
+    except:
+        pass
+
+    try:
+        segments = int(options['segments'])
+    except:
+        pass
+
+    try:
+        expectedchecksum = options['checksum']
+    except:
+        pass
+
+    try:
+        cachedir = options['cachedir']
+    except:
+        pass
+
+    try:
+        urls = options['urls']
+    except:
+        pass
+
+    try:
+        urlfile = options['urlfile']
+    except:
+        pass
+
+    try:
+        workers = int(options['workers'])
+    except:
+        pass
+
+    try:
+        perhost = int(options['perhost'])
+    except:
+        pass
+
+    try:
+        manifest = options['manifest']
+    except:
+        pass
+
+    # Gather the URLs of a batch, if any
+    if isinstance(urls, basestring):
+        urls = urls.split()
+    if urlfile is not None and len(urlfile) > 0:
+        if os.path.isfile(urlfile) == False:
+            message = 'URL file %s not found. %s' % (urlfile, __version__)
+            returnvals = [workspace, outputfile, checksum, manifest, results, success,
+                message, artifacts]
+            logging.debug('message:\n%s' % message)
+            return response(returnvars, returnvals)
+        urls = list(urls or []) + read_url_file(urlfile)
+
+    if urls is not None and len(urls) > 0:
+        if manifest is None or len(manifest)==0:
+            manifest = 'downloads_%s.json' % str(uuid.uuid1())
+        manifest = '%s/%s' % (workspace.rstrip('/'), manifest)
+        results = fetch_urls(urls, workspace.rstrip('/'), workers=workers, 
+            perhost=perhost, retries=retries, segments=segments, cachedir=cachedir)
+        outputfile = None
+        try:
+            with open(manifest, 'w') as manifestfile:
+                json.dump(results, manifestfile, indent=2, sort_keys=True)
+        except Exception, e:
+            message = 'Error %s writing manifest %s. %s' % (e, manifest, __version__)
+            returnvals = [workspace, outputfile, checksum, manifest, results, success,
+                message, artifacts]
+            logging.debug('message:\n%s' % message)
+            return response(returnvars, returnvals)
+        artifacts['downloader_manifest'] = manifest
+        failed = [r['url'] for r in results if r['success'] == False]
+        for result in results:
+            if result['success'] == True:
+                name = os.path.splitext(os.path.basename(result['outputfile']))[0]
+                artifacts['downloaded_file_%s' % name] = result['outputfile']
+        success = len(failed) == 0
+        if success == False:
+            message = 'Unable to download %s of %s files: %s' % \
+                (len(failed), len(results), ' '.join(failed))
+        returnvals = [workspace, outputfile, checksum, manifest, results, success, 
+            message, artifacts]
+        logging.debug('Finishing %s' % __version__)
+        return response(returnvars, returnvals)
+
+    if url is None or len(url)==0:
+        message = 'No URL given. %s' % __version__
+        returnvals = [workspace, outputfile, checksum, manifest, results, success, 
+            message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    result = fetch_url(url, outputfile, retries=retries, segments=segments,
+        checksum=expectedchecksum, cachedir=cachedir)
+    success = result['success']
+    message = result['message']
+    checksum = result['checksum']
+    results = [result]
 
     if success==True:
         artifacts['downloaded_file'] = outputfile
 
-    returnvals = [workspace, outputfile, success, message, artifacts]
+    returnvals = [workspace, outputfile, checksum, manifest, results, success, message, 
+        artifacts]
     logging.debug('Finishing %s' % __version__)
     return response(returnvars, returnvals)
 
@@ -116,14 +269,490 @@ def download_file(url, outputfile):
         logging.info(s)
         return False
 
+    return fetch_url(url, outputfile)['success']
+
+def read_url_file(urlfile):
+    ''' Get the URLs listed in a file.
+    parameters:
+        urlfile - full path to a file of URLs, one per line, with blank lines and lines 
+            starting with '#' ignored (required)
+    returns:
+        urls - a list of the URLs in the file
+    '''
+    urls = []
+    with open(urlfile, 'rU') as data:
+        for line in data:
+            line = line.strip()
+            if len(line) > 0 and line.startswith('#') == False:
+                urls.append(line)
+    return urls
+
+def download_filename(url):
+    ''' Make a file name for a download from its URL.
+    parameters:
+        url - the url to download from 
+            (e.g., 'http://ipt.vertnet.org:8080/ipt/archive.do?r=ccber_mammals')
+    returns:
+        filename - the name, without path, of a zip file named after the URL and ending
+            in the start of the SHA-1 digest of the URL, so that URLs with the same slug
+            get different names
+            (e.g., 'ipt-vertnet-org-8080-ipt-archive-do-r-ccber-mammals-30b83ff022.zip')
+    '''
+    digest = hashlib.sha1(url.encode('utf-8') if isinstance(url, unicode) else url)
+    return '%s-%s.zip' % (slugify(url.partition('://')[2] or url, max_length=180),
+        digest.hexdigest()[:10])
+
+def fetch_urls(urls, workspace, workers=4, perhost=2, retries=3, backoff=1.0, 
+    segments=1, cachedir=None, timeout=60):
+    ''' Get files from a list of URLs concurrently, each to a file in the workspace named
+        after its URL (see download_filename()), with a limit on the number of files
+        downloaded at a time in all and from any one host.
+    parameters:
+        urls - list of the urls to download from, downloaded once each (required)
+        workspace - path to the directory for the output files (required)
+        workers - the number of files to download at a time (optional; default 4)
+        perhost - the number of files to download at a time from any one host
+            (optional; default 2)
+        retries, backoff, segments, cachedir, timeout - as in fetch_url() (optional)
+    returns:
+        results - a list of the results of fetch_url() for the distinct urls, in the 
+            order given
+    '''
+    tasks = []
+    seen = set()
+    for url in urls:
+        if url not in seen:
+            seen.add(url)
+            tasks.append((url, urlparse(url).netloc.lower()))
+
+    results = [None] * len(tasks)
+    pending = range(len(tasks))
+    active = {}
+    condition = threading.Condition()
+
+    def work():
+        while True:
+            # Take the first pending URL from a host with a free connection
+            with condition:
+                while True:
+                    if len(pending) == 0:
+                        return
+                    ready = [i for i in pending \
+                        if active.get(tasks[i][1], 0) < perhost]
+                    if len(ready) > 0:
+                        break
+                    condition.wait()
+                i = ready[0]
+                pending.remove(i)
+                url, host = tasks[i]
+                active[host] = active.get(host, 0) + 1
+            try:
+                outputfile = '%s/%s' % (workspace, download_filename(url))
+                results[i] = fetch_url(url, outputfile, retries=retries, 
+                    backoff=backoff, segments=segments, cachedir=cachedir, 
+                    timeout=timeout)
+            except Exception, e:
+                results[i] = {'url':url, 'outputfile':None, 'bytes':None, 
+                    'checksum':None, 'status':None, 'cached':False, 'duration':None,
+                    'success':False, 'message':'Error %s getting %s' % (e, url)}
+            finally:
+                with condition:
+                    active[host] -= 1
+                    condition.notify_all()
+
+    threads = [threading.Thread(target=work) for i in range(max(min(workers, 
+        len(tasks)), 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def fetch_url(url, outputfile, retries=3, backoff=1.0, segments=1, checksum=None,
+    cachedir=None, timeout=60):
+    ''' Get a file from a URL, computing its SHA-256 digest as it arrives. Failed
+        attempts are tried again, resuming where they stopped if the server accepts
+        ranges, in which case the file can also be fetched in segments in parallel.
+        Parts are resumed, even from an earlier run, only if a record kept next to 
+        them shows they came from the same file on the server.
+    parameters:
+        url - the url to download from (required)
+        outputfile - the full path to the location for the output file (required)
+        retries - the number of times to try again after a failed attempt
+            (optional; default 3)
+        backoff - the number of seconds to wait before the first retry, doubled for
+            every retry after that (optional; default 1.0)
+        segments - the number of ranges to fetch in parallel, if the server accepts
+            ranges and the file is big enough (optional; default 1)
+        checksum - the expected SHA-256 digest of the file (optional; default None)
+        cachedir - full path to a directory in which to keep downloads, so that files
+            unchanged on the server (by ETag or Last-Modified) are copied from there
+            rather than downloaded again (optional; default None)
+        timeout - the number of seconds to wait for the server (optional; default 60)
+    returns:
+        result - a dictionary of the url, outputfile, bytes (the size of the file),
+            checksum (its SHA-256 digest), status (the HTTP status of the last
+            response), cached (True if copied from the cache), duration (in seconds),
+            success (True if the file was downloaded) and message (why not)
+    '''
+    functionname = 'fetch_url()'
+
+    started = time.time()
+    result = {'url':url, 'outputfile':outputfile, 'bytes':None, 'checksum':None,
+        'status':None, 'cached':False, 'duration':None, 'success':False,
+        'message':None}
+
+    probe = _probe_url(url, timeout)
+    if probe is not None:
+        result['status'] = probe['status']
+
+    entry = None
+    if cachedir is not None:
+        entry = _cached_download(cachedir, url, probe)
+
+    partfile = outputfile + '.part'
+    if entry is not None:
+        shutil.copyfile(entry['datafile'], partfile)
+        result['bytes'] = entry['bytes']
+        result['checksum'] = entry['checksum']
+        result['cached'] = True
+    else:
+        attempt = 0
+        while True:
+            # Resume only the parts fetched from the file the server has now
+            _prepare_parts(partfile, url, probe)
+            try:
+                if probe is not None and probe['ranges'] == True and \
+                    probe['size'] is not None and segments > 1 and \
+                    probe['size'] >= 2 * _minsegmentsize:
+                    count = min(segments, probe['size'] // _minsegmentsize)
+                    status, digest = _fetch_segments(url, partfile, probe, count,
+                        timeout)
+                else:
+                    status, digest = _fetch_stream(url, partfile, probe, timeout)
+                result['status'] = status
+                break
+            except Exception, e:
+                attempt += 1
+                s = 'Attempt %s to get %s failed in %s: %s' % \
+                    (attempt, url, functionname, e)
+                logging.debug(s)
+                if attempt > retries:
+                    result['message'] = 'Unable to get %s after %s attempts: %s' % \
+                        (url, attempt, e)
+                    result['duration'] = time.time() - started
+                    logging.warning(result['message'])
+                    return result
+                time.sleep(backoff * 2 ** (attempt - 1))
+                probe = _probe_url(url, timeout)
+        result['bytes'] = os.path.getsize(partfile)
+        result['checksum'] = digest
+        _remove_parts(partfile, True)
+
+    if checksum is not None and checksum.lower() != result['checksum']:
+        os.remove(partfile)
+        result['message'] = 'Checksum %s of %s not the expected %s.' % \
+            (result['checksum'], url, checksum)
+        result['duration'] = time.time() - started
+        logging.warning(result['message'])
+        return result
+
+    if os.path.isfile(outputfile):
+        os.remove(outputfile)
+    os.rename(partfile, outputfile)
+
+    if cachedir is not None and entry is None:
+        _cache_download(cachedir, url, probe, outputfile, result['bytes'],
+            result['checksum'])
+
+    result['success'] = True
+    result['duration'] = time.time() - started
+    return result
+
+def prepare_part_file(url, partfile, timeout=60):
+    ''' Keep a record of the file at a URL next to a part file about to be written from
+        it by other means than fetch_url(), so that fetch_url() can resume the part file
+        if it is left unfinished (see fetch_url()).
+    parameters:
+        url - the url of the file (required)
+        partfile - full path to the part file, the output file of fetch_url() plus the
+            extension .part (required)
+        timeout - the number of seconds to wait for the server (optional; default 60)
+    returns:
+        probe - dictionary of the status, size, validators and acceptance of ranges of
+            the file at the URL, or None if the server did not give them
+    '''
+    probe = _probe_url(url, timeout)
+    _prepare_parts(partfile, url, probe)
+    return probe
+
+def finish_part_file(partfile):
+    ''' Remove the record kept for a part file by prepare_part_file() once the part file
+        is complete.
+    parameters:
+        partfile - full path to the part file (required)
+    returns:
+        None
+    '''
+    _remove_parts(partfile, True)
+
+def _probe_url(url, timeout):
+    ''' Get the size and validators of a file at a URL, and whether the server accepts
+        ranges, from the headers of a HEAD request, or None if the request fails.'''
+    functionname = '_probe_url()'
+
+    request = Request(url)
+    request.get_method = lambda: 'HEAD'
     try:
-        urlretrieve(url, outputfile)
+        connection = urlopen(request, timeout=timeout)
+        try:
+            headers = connection.info()
+            probe = {'status':connection.getcode()}
+        finally:
+            connection.close()
     except Exception, e:
-        s = 'Exception while attempting urlretrieve(%s, %s):\n%s\n' % (url, outputfile, e)
-        s += '%s' % functionname
-        logging.warning(s)
+        s = 'Unable to get headers for %s in %s: %s' % (url, functionname, e)
+        logging.debug(s)
+        return None
+
+    try:
+        probe['size'] = int(headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        probe['size'] = None
+    probe['ranges'] = headers.get('Accept-Ranges', '').lower() == 'bytes'
+    probe['etag'] = headers.get('ETag')
+    probe['lastmodified'] = headers.get('Last-Modified')
+    return probe
+
+def _fetch_stream(url, partfile, probe, timeout):
+    ''' Get a file from a URL into a part file in one stream, resuming after what is
+        already in the part file if the server accepts ranges.
+    returns:
+        a tuple of the HTTP status and the SHA-256 digest of the file
+    '''
+    hasher = hashlib.sha256()
+    size = None
+    done = 0
+    if probe is not None:
+        size = probe['size']
+        if probe['ranges'] == True and os.path.isfile(partfile):
+            done = os.path.getsize(partfile)
+            if size is not None and done > size:
+                done = 0
+
+    if size is not None and done == size:
+        _hash_file(partfile, hasher)
+        return 206, hasher.hexdigest()
+
+    request = Request(url)
+    if done > 0:
+        request.add_header('Range', 'bytes=%s-' % done)
+        validator = probe['etag'] or probe['lastmodified']
+        if validator is not None:
+            request.add_header('If-Range', validator)
+
+    connection = urlopen(request, timeout=timeout)
+    try:
+        status = connection.getcode()
+        mode = 'wb'
+        # The server sends the whole file if it changed since the part was fetched
+        if status == 206 and done > 0:
+            _hash_file(partfile, hasher)
+            mode = 'ab'
+        with open(partfile, mode) as data:
+            _copy_response(connection, data, hasher)
+    finally:
+        connection.close()
+
+    if size is not None and os.path.getsize(partfile) != size:
+        raise IOError('Got %s of %s bytes' % (os.path.getsize(partfile), size))
+    return status, hasher.hexdigest()
+
+def _fetch_segments(url, partfile, probe, count, timeout):
+    ''' Get a file from a URL into a part file by fetching ranges of it in parallel
+        into files of their own, resuming any that are already partly fetched, then
+        joining them.
+    returns:
+        a tuple of the HTTP status and the SHA-256 digest of the file
+    '''
+    size = probe['size']
+    bounds = [size * i // count for i in range(count + 1)]
+    errors = []
+
+    def fetch(i):
+        try:
+            _fetch_segment(url, '%s%s' % (partfile, i), bounds[i], bounds[i + 1],
+                probe, timeout)
+        except Exception, e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if len(errors) > 0:
+        raise errors[0]
+
+    hasher = hashlib.sha256()
+    with open(partfile, 'wb') as data:
+        for i in range(count):
+            segmentfile = '%s%s' % (partfile, i)
+            with open(segmentfile, 'rb') as segment:
+                block = segment.read(_blocksize)
+                while block:
+                    data.write(block)
+                    hasher.update(block)
+                    block = segment.read(_blocksize)
+            os.remove(segmentfile)
+    return 206, hasher.hexdigest()
+
+def _fetch_segment(url, segmentfile, start, end, probe, timeout):
+    ''' Get the bytes from start up to end of a file from a URL into a segment file,
+        after what is already in the segment file.'''
+    done = 0
+    if os.path.isfile(segmentfile):
+        done = os.path.getsize(segmentfile)
+        if done > end - start:
+            done = 0
+    if done == end - start:
+        return
+
+    request = Request(url)
+    request.add_header('Range', 'bytes=%s-%s' % (start + done, end - 1))
+    validator = probe['etag'] or probe['lastmodified']
+    if validator is not None:
+        request.add_header('If-Range', validator)
+
+    connection = urlopen(request, timeout=timeout)
+    try:
+        if connection.getcode() != 206:
+            raise IOError('Range of %s not returned, status %s' % \
+                (url, connection.getcode()))
+        with open(segmentfile, 'ab' if done > 0 else 'wb') as data:
+            _copy_response(connection, data)
+    finally:
+        connection.close()
+
+    if os.path.getsize(segmentfile) != end - start:
+        raise IOError('Got %s of %s bytes of segment' % \
+            (os.path.getsize(segmentfile), end - start))
+
+def _copy_response(connection, data, hasher=None):
+    ''' Write the body of a response to an open file, updating a hasher, if given, as
+        the body arrives.'''
+    copied = 0
+    block = connection.read(_blocksize)
+    while block:
+        data.write(block)
+        if hasher is not None:
+            hasher.update(block)
+        copied += len(block)
+        if copied % (16 * _blocksize) < len(block):
+            logging.debug('Got %s bytes of %s' % (copied, connection.geturl()))
+        block = connection.read(_blocksize)
+
+def _hash_file(inputfile, hasher):
+    ''' Update a hasher with the content of a file.'''
+    with open(inputfile, 'rb') as data:
+        block = data.read(_blocksize)
+        while block:
+            hasher.update(block)
+            block = data.read(_blocksize)
+
+def _remove_parts(partfile, keeppart=False):
+    ''' Remove a part file, the segment files made for it and the record of the file 
+        they came from, or only the latter two if keeppart is True.'''
+    directory = os.path.dirname(partfile) or '.'
+    name = os.path.basename(partfile)
+    if os.path.isdir(directory) == False:
+        return
+    for f in os.listdir(directory):
+        if (f == name and keeppart == False) or f == name + '.json' or \
+            (f.startswith(name) and f[len(name):].isdigit()):
+            os.remove(os.path.join(directory, f))
+
+def _prepare_parts(partfile, url, probe):
+    ''' Remove the parts of a file fetched before unless the record next to them shows 
+        that they came from the file the server has now, by its size and its ETag or 
+        Last-Modified, then record the file on the server for the parts to come.'''
+    functionname = '_prepare_parts()'
+
+    current = None
+    if probe is not None and (probe['etag'] is not None or \
+        probe['lastmodified'] is not None):
+        current = {'url':url, 'size':probe['size'], 'etag':probe['etag'], 
+            'lastmodified':probe['lastmodified']}
+
+    recordfile = partfile + '.json'
+    try:
+        with open(recordfile) as data:
+            record = json.load(data)
+    except Exception:
+        record = None
+
+    if current is None or record != current:
+        _remove_parts(partfile)
+    if current is not None and record != current:
+        try:
+            with open(recordfile, 'w') as data:
+                json.dump(current, data)
+        except Exception, e:
+            s = 'Unable to record parts of %s in %s: %s' % (url, functionname, e)
+            logging.debug(s)
+
+def _cached_download(cachedir, url, probe):
+    ''' Get the cache entry of a download from a URL if the file on the server has the
+        ETag or, lacking that, the Last-Modified of the file in the cache, otherwise
+        None.'''
+    if probe is None or (probe['etag'] is None and probe['lastmodified'] is None):
+        return None
+
+    cachefile = '%s/%s' % (cachedir, hashlib.sha1(url).hexdigest())
+    try:
+        with open(cachefile + '.json') as data:
+            entry = json.load(data)
+    except Exception:
+        return None
+
+    if entry['url'] != url:
+        return None
+    if probe['etag'] is not None:
+        if entry['etag'] != probe['etag']:
+            return None
+    elif entry['lastmodified'] != probe['lastmodified']:
+        return None
+
+    entry['datafile'] = cachefile + '.download'
+    if os.path.isfile(entry['datafile']) == False or \
+        os.path.getsize(entry['datafile']) != entry['bytes']:
+        return None
+    return entry
+
+def _cache_download(cachedir, url, probe, outputfile, filesize, checksum):
+    ''' Keep a copy of a downloaded file in the cache, with the ETag and Last-Modified
+        the server gave it, if any.'''
+    functionname = '_cache_download()'
+
+    if probe is None or (probe['etag'] is None and probe['lastmodified'] is None):
         return False
 
+    cachefile = '%s/%s' % (cachedir, hashlib.sha1(url).hexdigest())
+    entry = {'url':url, 'etag':probe['etag'], 'lastmodified':probe['lastmodified'],
+        'bytes':filesize, 'checksum':checksum}
+    tempfile = '%s.%s.tmp' % (cachefile, os.getpid())
+    try:
+        if os.path.isdir(cachedir) == False:
+            os.makedirs(cachedir)
+        shutil.copyfile(outputfile, tempfile)
+        os.rename(tempfile, cachefile + '.download')
+        with open(tempfile, 'w') as data:
+            json.dump(entry, data)
+        os.rename(tempfile, cachefile + '.json')
+    except Exception, e:
+        s = 'Unable to cache download of %s in %s: %s' % (url, functionname, e)
+        logging.debug(s)
+        return False
     return True
 
 def _getoptions():
@@ -139,6 +768,30 @@ def _getoptions():
     help = 'output file name, no path (optional)'
     parser.add_argument("-o", "--outputfile", help=help)
 
+    help = 'number of times to retry a failed download (optional)'
+    parser.add_argument("-r", "--retries", help=help)
+
+    help = 'number of ranges of the file to fetch in parallel (optional)'
+    parser.add_argument("-s", "--segments", help=help)
+
+    help = 'expected SHA-256 digest of the file (optional)'
+    parser.add_argument("-c", "--checksum", help=help)
+
+    help = 'directory in which to keep downloads (optional)'
+    parser.add_argument("-d", "--cachedir", help=help)
+
+    help = 'full path to a file of URLs to download, one per line (optional)'
+    parser.add_argument("-f", "--urlfile", help=help)
+
+    help = 'number of files from a file of URLs to download at a time (optional)'
+    parser.add_argument("-n", "--workers", help=help)
+
+    help = 'number of files to download at a time from one host (optional)'
+    parser.add_argument("-p", "--perhost", help=help)
+
+    help = 'manifest file name for a file of URLs, no path (optional)'
+    parser.add_argument("-m", "--manifest", help=help)
+
     help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
     parser.add_argument("-l", "--loglevel", help=help)
 
@@ -148,12 +801,24 @@ def main():
     options = _getoptions()
     optdict = {}
 
-    if options.url is None or len(options.url)==0:
+    if (options.url is None or len(options.url)==0) and \
+        (options.urlfile is None or len(options.urlfile)==0):
         s =  'syntax:\n'
         s += 'python downloader.py'
         s += ' -w ./workspace'
         s += ' -u http://ipt.vertnet.org:8080/ipt/archive.do?r=ccber_mammals'
         s += ' -o test_ccber_mammals_dwc_archive.zip'
+        s += ' -r 3'
+        s += ' -s 4'
+        s += ' -d ./downloads'
+        s += ' -l DEBUG'
+        s += '\nor:\n'
+        s += 'python downloader.py'
+        s += ' -w ./workspace'
+        s += ' -f ./ipt_resources.txt'
+        s += ' -n 8'
+        s += ' -p 2'
+        s += ' -m downloads.json'
         s += ' -l DEBUG'
         print '%s' % s
         return
@@ -161,6 +826,14 @@ def main():
     optdict['workspace'] = options.workspace
     optdict['url'] = options.url
     optdict['outputfile'] = options.outputfile
+    optdict['retries'] = options.retries
+    optdict['segments'] = options.segments
+    optdict['checksum'] = options.checksum
+    optdict['cachedir'] = options.cachedir
+    optdict['urlfile'] = options.urlfile
+    optdict['workers'] = options.workers
+    optdict['perhost'] = options.perhost
+    optdict['manifest'] = options.manifest
     optdict['loglevel'] = options.loglevel
     print 'optdict: %s' % optdict
 
@@ -15,16 +15,19 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2018 President and Fellows of Harvard College"
-__version__ = "dwca_core_to_tsv.py 2018-02-06T11:57-03:00"
+__version__ = "dwca_core_to_tsv.py 2026-10-19T09:20-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
-from dwcareader_utils import short_term_names
-from dwcareader_utils import shortname
+from dwcareader_utils import short_term_name_map
+from dwcareader_utils import dwca_file_descriptors
+from dwcareader_utils import write_dwca_file_tsv
 from dwca_vocab_utils import dwc_ordered_header
 from dwca_utils import tsv_dialect
 from dwca_utils import response
 from dwca_utils import write_header
+from dwca_utils import column_store
+from dwca_utils import ColumnStoreWriter
 from dwca_utils import setup_actor_logging
 import uuid
 import os
@@ -62,6 +65,14 @@ def dwca_core_to_tsv(options):
         inputfile - full path to the input Darwin Core archive file (required)
         outputfile - file name of the tsv output file, no path (optional)
         archivetype - archive type ('standard' or 'gbif') (optional; default 'standard')
+        extractmode - how to read the core ('reader' to extract the archive to a 
+            temporary directory and read it with the python-dwca-reader, or 'stream' to
+            stream the core from the archive as described in its meta.xml) 
+            (optional; default None to stream the core if meta.xml describes it and 
+            use the reader otherwise)
+        columnstore - 'true' to also write the core to a column store next to the 
+            outputfile, from which functions that need only some of its columns read 
+            just those (see write_column_store()) (optional; default None)
     returns a dictionary with information about the results
         workspace - actual path to the directory where the outputfile was written
         outputfile - actual full path to the output tsv file
@@ -96,6 +107,8 @@ def dwca_core_to_tsv(options):
     inputfile = None
     outputfile = None
     archivetype = 'standard'
+    extractmode = None
+    columnstore = False
 
     ### Required inputs ###
     try:
@@ -138,13 +151,45 @@ def dwca_core_to_tsv(options):
     except:
         pass
 
+    try:
+        extractmode = options['extractmode']
+    except:
+        pass
+
+    try:
+        columnstore = str(options['columnstore']).lower() == 'true'
+    except:
+        pass
+
+    # Stream the core straight out of the archive if the archive describes its core in
+    # meta.xml, unless asked to use the reader. Otherwise, use a reader.
+    if extractmode is not None and extractmode.lower()=='stream':
+        try:
+            rowcount = stream_core_csv_file(inputfile, outputfile, columnstore)
+        except Exception, e:
+            message = 'Error %s streaming archive %s. %s' % (e, inputfile, __version__)
+            returnvals = [workspace, outputfile, rowcount, success, message, artifacts]
+            logging.debug('message:\n%s' % message)
+            return response(returnvars, returnvals)
+    elif extractmode is None or extractmode.lower()!='reader':
+        try:
+            rowcount = stream_core_csv_file(inputfile, outputfile, columnstore)
+        except Exception, e:
+            # The reader writes the outputfile over again from the start
+            s = 'Error %s streaming archive %s, reading it instead. %s' % \
+                (e, inputfile, __version__)
+            logging.debug(s)
+            rowcount = None
+
     # Note: The DwCAReader creates a temporary directory of its own and cleans it up
     # Make a reader based on whether the archive is standard or a GBIF download.
     dwcareader = None
-    if archivetype is not None and archivetype.lower()=='gbif':
+    if rowcount is not None:
+        pass
+    elif archivetype is not None and archivetype.lower()=='gbif':
         try:
             with GBIFResultsReader(inputfile) as dwcareader:
-                rowcount = write_core_csv_file(dwcareader, outputfile)
+                rowcount = write_core_csv_file(dwcareader, outputfile, columnstore)
                 
         except Exception, e:
             message = 'Error %s ' % e
@@ -155,7 +200,7 @@ def dwca_core_to_tsv(options):
     else:
         try:
             with DwCAReader(inputfile) as dwcareader:
-                rowcount = write_core_csv_file(dwcareader, outputfile)
+                rowcount = write_core_csv_file(dwcareader, outputfile, columnstore)
         except Exception, e:
             message = 'Error %s reading archive %s. %s' % (e, inputfile, __version__)
             returnvals = [workspace, outputfile, rowcount, success, message, artifacts]
@@ -171,25 +216,33 @@ def dwca_core_to_tsv(options):
     success = True
     if success==True:
         artifacts['dwca_core_to_tsv_outputfile'] = outputfile
+        if columnstore == True and \
+            column_store(outputfile, tsv_dialect(), 'utf-8') is not None:
+            artifacts['dwca_core_to_tsv_columnstore'] = outputfile + '.columns'
 
     returnvals = [workspace, outputfile, rowcount, success, message, artifacts]
     logging.debug('Finishing %s' % __version__)
     return response(returnvars, returnvals)
 
-def write_core_csv_file(dwcareader, outputfile):
+def write_core_csv_file(dwcareader, outputfile, columnstore=False):
     ''' Create a csv file from the Darwin Core Reader.
     parameters:
         dwcareader - Darwin Core Reader class instance
         outputfile - the path to the csv file
+        columnstore - True to also write a column store of the csv file from the rows
+            as they are written (see write_column_store()) (optional; default False)
     returns:
         rowcount - the number of rows in the core file
     '''
     # Get the fully qualified field names from the Darwin Core Reader
     termnames=list(dwcareader.descriptor.core.terms)
+
+    # Resolve the field names without full qualification once for the archive
+    shortnamemap = short_term_name_map(termnames)
     
     # Make a list of field names without full qualification, ordered as they are in
     # Darwin Core
-    shorttermnames=dwc_ordered_header(short_term_names(termnames))
+    shorttermnames=dwc_ordered_header([shortnamemap[t] for t in termnames])
     #shorttermnames=short_term_names(termnames);
 
     dialect = tsv_dialect()
@@ -197,20 +250,66 @@ def write_core_csv_file(dwcareader, outputfile):
     if success == False:
         return None
 
+    store = None
+    if columnstore == True:
+        store = ColumnStoreWriter(outputfile, shorttermnames, dialect, 'utf-8')
+        # The fully qualified field name of each column, to give the store the values 
+        # of a row in the order of the columns
+        fullnames = dict([(shortnamemap[t], t) for t in termnames])
+        termorder = [fullnames.get(n) for n in shorttermnames]
+
     rowcount = 0
-    with open(outputfile, 'a') as outfile:
-        writer = csv.DictWriter(outfile, dialect=dialect, fieldnames=shorttermnames,
-            encoding='utf-8')
+    try:
+        with open(outputfile, 'a') as outfile:
+            writer = csv.DictWriter(outfile, dialect=dialect, 
+                fieldnames=shorttermnames, encoding='utf-8')
+
+            for row in dwcareader:
+                rowout = {}
+                for f, value in row.data.iteritems():
+                    rowout[shortnamemap[f]]=value.encode('utf-8')
+                writer.writerow(rowout)
+                if store is not None:
+                    store.writerow([row.data.get(f, u'') for f in termorder], 
+                        written=True)
+                rowcount += 1
+    except Exception:
+        if store is not None:
+            store.fail('%s not written' % outputfile)
+        raise
+
+    # The csv file is still complete without a column store, only slower to profile
+    if store is not None:
+        store.close()
 
-        rowout = {}
+    return rowcount
 
-        for row in dwcareader:
-            for f in row.data:
-                rowout[shortname(f)]=row.data[f].encode('utf-8')
-            writer.writerow(rowout)
-            rowcount += 1
+def stream_core_csv_file(inputfile, outputfile, columnstore=False):
+    ''' Create a csv file from the core of a Darwin Core archive, streamed from the zip 
+        file as described in its meta.xml, without extracting the archive. A core that 
+        is already tab-separated utf-8 without enclosing quotes is copied without 
+        decoding its values, as a block if its columns are already in output order.
+    parameters:
+        inputfile - full path to the Darwin Core archive file
+        outputfile - the path to the csv file
+        columnstore - True to also write a column store of the csv file from the rows
+            as they are written (see write_column_store()) (optional; default False)
+    returns:
+        rowcount - the number of rows in the core file, or None if the archive does not
+            describe its core in a meta.xml
+    '''
+    functionname = 'stream_core_csv_file()'
 
-    return rowcount
+    descriptors = dwca_file_descriptors(inputfile)
+    if descriptors is None or len(descriptors) == 0 or \
+        descriptors[0]['core'] == False or descriptors[0]['location'] is None:
+        s = 'No core described in meta.xml of %s in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+    descriptor = descriptors[0]
+
+    return write_dwca_file_tsv(inputfile, descriptor, outputfile, 
+        columnstore=columnstore)
 
 def _getoptions():
     ''' Parse command line options and return them.'''
@@ -228,6 +327,13 @@ def _getoptions():
     help = "type of Darwin Core archive ('gbif', 'standard') (optional)"
     parser.add_argument("-t", "--archivetype", help=help)
 
+    help = "how to read the core ('reader', 'stream') (optional; default stream if "
+    help += "meta.xml describes the core, otherwise reader)"
+    parser.add_argument("-x", "--extractmode", help=help)
+
+    help = "also write a column store of the output file ('true') (optional)"
+    parser.add_argument("-c", "--columnstore", help=help)
+
     help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
     parser.add_argument("-l", "--loglevel", help=help)
 
@@ -247,6 +353,8 @@ def main():
         s += ' -i ./data/dwca-uwymv_herp.zip'
         s += ' -o testout.txt'
         s += ' -t standard'
+        s += ' -x stream'
+        s += ' -c true'
         s += ' -l DEBUG'
         print '%s' % s
         return
@@ -255,6 +363,8 @@ def main():
     optdict['inputfile'] = inputfile
     optdict['outputfile'] = outputfile
     optdict['archivetype'] = options.archivetype
+    optdict['extractmode'] = options.extractmode
+    optdict['columnstore'] = options.columnstore
     optdict['loglevel'] = options.loglevel
     print 'optdict: %s' % optdict
 
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "John Wieczorek"
+__copyright__ = "Copyright 2018 President and Fellows of Harvard College"
+__version__ = "dwca_download_core_to_tsv.py 2026-10-19T08:00-04:00"
+__kurator_content_type__ = "actor"
+__adapted_from__ = "dwca_core_to_tsv.py"
+
+from dwcareader_utils import ZipStream
+from dwcareader_utils import dwca_file_descriptors
+from dwcareader_utils import meta_descriptors
+from dwcareader_utils import write_dwca_file_tsv
+from downloader import fetch_url
+from downloader import prepare_part_file
+from downloader import finish_part_file
+from dwca_utils import response
+from dwca_utils import setup_actor_logging
+import os
+import uuid
+import logging
+import argparse
+try:
+    from urllib.request import urlopen  # Python 3
+except ImportError:
+    from urllib2 import urlopen  # Python 2
+
+def dwca_download_core_to_tsv(options):
+    ''' Download a Darwin Core archive from a URL and save its core to a tsv file with
+        DwC term names as headers, reading the archive as it arrives. The core is
+        written while the archive downloads if meta.xml comes before it in the archive,
+        otherwise from the downloaded archive.
+    options - a dictionary of parameters
+        loglevel - the level at which to log (e.g., DEBUG)
+        workspace - path to a directory for the output files (optional)
+        url - URL of the Darwin Core archive to download (required)
+        archivefile - file name of the downloaded archive, no path (optional)
+        outputfile - file name of the tsv output file, no path (optional)
+    returns a dictionary with information about the results
+        workspace - actual path to the directory where the outputfile was written
+        archivefile - actual full path to the downloaded archive
+        outputfile - actual full path to the output tsv file
+        rowcount - the number of rows in the core of the archive
+        checksum - the SHA-256 digest of the downloaded archive
+        streamed - True if the core was written while the archive downloaded
+        success - True if process completed successfully, otherwise False
+        message - an explanation of the reason if success=False
+        artifacts - a dictionary of persistent objects created
+    '''
+    #print '%s options: %s' % (__version__, options)
+
+    setup_actor_logging(options)
+
+    logging.debug( 'Started %s' % __version__ )
+    logging.debug( 'options: %s' % options )
+
+    # Make a list for the response
+    returnvars = ['workspace', 'archivefile', 'outputfile', 'rowcount', 'checksum',
+        'streamed', 'success', 'message', 'artifacts']
+
+    ### Standard outputs ###
+    success = False
+    message = None
+
+    ### Custom outputs ###
+    rowcount = None
+    checksum = None
+    streamed = False
+
+    # Make a dictionary for artifacts left behind
+    artifacts = {}
+
+    ### Establish variables ###
+    workspace = './'
+    url = None
+    archivefile = None
+    outputfile = None
+
+    ### Required inputs ###
+    try:
+        workspace = options['workspace']
+    except:
+        pass
+
+    try:
+        url = options['url']
+    except:
+        pass
+
+    if url is None or len(url)==0:
+        message = 'No URL given. %s' % __version__
+        returnvals = [workspace, archivefile, outputfile, rowcount, checksum, streamed,
+            success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    try:
+        archivefile = options['archivefile']
+    except:
+        pass
+
+    if archivefile is None or len(archivefile)==0:
+        archivefile = 'dwca_%s.zip' % str(uuid.uuid1())
+    archivefile = '%s/%s' % (workspace.rstrip('/'), archivefile)
+
+    try:
+        outputfile = options['outputfile']
+    except:
+        pass
+
+    if outputfile is None or len(outputfile)==0:
+        outputfile = 'dwca_%s.txt' % str(uuid.uuid1())
+    outputfile = '%s/%s' % (workspace.rstrip('/'), outputfile)
+
+    # Write the core as the archive arrives, spooling the archive to disk
+    partfile = archivefile + '.part'
+    try:
+        rowcount, checksum = stream_core_tsv_file(url, partfile, outputfile)
+        os.rename(partfile, archivefile)
+        streamed = rowcount is not None
+    except Exception, e:
+        s = 'Unable to stream archive from %s: %s. %s' % (url, e, __version__)
+        logging.debug(s)
+        # Get the rest of the archive, resuming the download of the spooled part if the
+        # server allows it and the archive has not changed since
+        result = fetch_url(url, archivefile)
+        if result['success'] == False:
+            message = 'Unable to download archive from %s: %s. %s' % \
+                (url, result['message'], __version__)
+            returnvals = [workspace, archivefile, outputfile, rowcount, checksum,
+                streamed, success, message, artifacts]
+            logging.debug('message:\n%s' % message)
+            return response(returnvars, returnvals)
+        checksum = result['checksum']
+        rowcount = None
+
+    # The core came before meta.xml or could not be written as it arrived
+    if streamed == False:
+        descriptors = dwca_file_descriptors(archivefile)
+        if descriptors is None or len(descriptors) == 0 or \
+            descriptors[0]['core'] == False or descriptors[0]['location'] is None:
+            message = 'No core described in meta.xml of archive from %s. %s' % \
+                (url, __version__)
+            returnvals = [workspace, archivefile, outputfile, rowcount, checksum,
+                streamed, success, message, artifacts]
+            logging.debug('message:\n%s' % message)
+            return response(returnvars, returnvals)
+        try:
+            rowcount = write_dwca_file_tsv(archivefile, descriptors[0], outputfile)
+        except Exception, e:
+            message = 'Error %s reading archive %s. %s' % (e, archivefile, __version__)
+            returnvals = [workspace, archivefile, outputfile, rowcount, checksum,
+                streamed, success, message, artifacts]
+            logging.debug('message:\n%s' % message)
+            return response(returnvars, returnvals)
+
+    if rowcount is None:
+        message = 'Unable to create outputfile %s. %s' % (outputfile, __version__)
+        returnvals = [workspace, archivefile, outputfile, rowcount, checksum, streamed,
+            success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    success = True
+    artifacts['downloaded_file'] = archivefile
+    artifacts['dwca_core_to_tsv_outputfile'] = outputfile
+
+    returnvals = [workspace, archivefile, outputfile, rowcount, checksum, streamed,
+        success, message, artifacts]
+    logging.debug('Finishing %s' % __version__)
+    return response(returnvars, returnvals)
+
+def stream_core_tsv_file(url, spoolfile, outputfile, timeout=60):
+    ''' Download a Darwin Core archive to a file and, if its meta.xml comes before its
+        core, write the core to a tsv file as it arrives. The file at the URL is 
+        recorded next to the spool file so that fetch_url() can resume the spool file 
+        if the download does not finish.
+    parameters:
+        url - the url to download the archive from (required)
+        spoolfile - full path to the file to which to write the archive, the archive
+            file plus the extension .part (required)
+        outputfile - full path to the tsv file to write (required)
+        timeout - the number of seconds to wait for the server (optional; default 60)
+    returns:
+        a tuple of the number of rows written, None if the core was not written, and the
+            SHA-256 digest of the archive. IOError is raised if the archive did not 
+            arrive whole.
+    '''
+    functionname = 'stream_core_tsv_file()'
+
+    prepare_part_file(url, spoolfile, timeout)
+
+    rowcount = None
+    connection = urlopen(url, timeout=timeout)
+    try:
+        try:
+            size = int(connection.info().get('Content-Length'))
+        except (TypeError, ValueError):
+            size = None
+        with open(spoolfile, 'wb') as spool:
+            stream = ZipStream(connection, spool)
+            descriptor = None
+            looking = True
+            try:
+                # Every member is read, to check them against the central directory
+                for member in stream.members():
+                    if looking == False:
+                        continue
+                    if descriptor is None and \
+                        os.path.basename(member.name) == 'meta.xml' and \
+                        member.name.count('/') <= 1:
+                        descriptors = meta_descriptors(member.read(), member.name)
+                        if len(descriptors) == 0 or descriptors[0]['core'] == False:
+                            looking = False
+                        else:
+                            descriptor = descriptors[0]
+                    elif descriptor is not None and \
+                        member.name == descriptor['location']:
+                        rowcount = write_dwca_file_tsv(url, descriptor, outputfile,
+                            data=member)
+                        looking = False
+            except IOError, e:
+                # The rest of the archive is still needed, to read the core from it
+                s = 'Unable to read archive from %s as it arrived in %s: %s' % \
+                    (url, functionname, e)
+                logging.debug(s)
+                rowcount = None
+            checksum = stream.drain()
+    finally:
+        connection.close()
+
+    # A connection that drops ends the stream as if it were complete
+    stream.verify(spoolfile, size)
+    finish_part_file(spoolfile)
+    return rowcount, checksum
+
+def _getoptions():
+    ''' Parse command line options and return them.'''
+    parser = argparse.ArgumentParser()
+
+    help = 'directory for the output files (optional)'
+    parser.add_argument("-w", "--workspace", help=help)
+
+    help = 'URL of the archive to download (required)'
+    parser.add_argument("-u", "--url", help=help)
+
+    help = 'archive file name, no path (optional)'
+    parser.add_argument("-a", "--archivefile", help=help)
+
+    help = 'output file name, no path (optional)'
+    parser.add_argument("-o", "--outputfile", help=help)
+
+    help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
+    parser.add_argument("-l", "--loglevel", help=help)
+
+    return parser.parse_args()
+
+def main():
+    options = _getoptions()
+    optdict = {}
+
+    if options.url is None or len(options.url)==0:
+        s =  'syntax:\n'
+        s += 'python dwca_download_core_to_tsv.py'
+        s += ' -w ./workspace'
+        s += ' -u http://ipt.vertnet.org:8080/ipt/archive.do?r=ccber_mammals'
+        s += ' -a ccber_mammals.zip'
+        s += ' -o ccber_mammals.txt'
+        s += ' -l DEBUG'
+        print '%s' % s
+        return
+
+    optdict['workspace'] = options.workspace
+    optdict['url'] = options.url
+    optdict['archivefile'] = options.archivefile
+    optdict['outputfile'] = options.outputfile
+    optdict['loglevel'] = options.loglevel
+    print 'optdict: %s' % optdict
+
+    # Write the core of the archive at the URL to a tsv file as the archive arrives
+    response = dwca_download_core_to_tsv(optdict)
+    print '\nresponse: %s' % response
+
+if __name__ == '__main__':
+    """ Demo of dwca_download_core_to_tsv"""
+    main()
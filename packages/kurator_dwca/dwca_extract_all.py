@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "John Wieczorek"
+__copyright__ = "Copyright 2018 President and Fellows of Harvard College"
+__version__ = "dwca_extract_all.py 2026-10-18T16:30-04:00"
+__kurator_content_type__ = "actor"
+__adapted_from__ = "dwca_core_to_tsv.py"
+
+from dwcareader_utils import dwca_file_descriptors
+from dwcareader_utils import dwca_file_columns
+from dwcareader_utils import write_dwca_file_tsv
+from dwca_utils import response
+from dwca_utils import setup_actor_logging
+import os
+import json
+import logging
+import argparse
+
+# Not available under Jython, where the files are extracted one after another
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+def dwca_extract_all(options):
+    ''' Save the core and every extension of a Darwin Core archive to tsv files with DwC
+        term names as headers, streamed from the archive as described in its meta.xml,
+        with one worker process per file. Write a manifest describing the files.
+    options - a dictionary of parameters
+        loglevel - the level at which to log (e.g., DEBUG)
+        workspace - path to a directory for the output files (optional)
+        inputfile - full path to the input Darwin Core archive file (required)
+        idindex - 'true' to write, for every file, an index of the byte offsets of its
+            rows by id (core) or coreid (extensions), so that extension rows can be
+            joined to core rows without reading either file into memory (see
+            dwca_index_offsets()) (optional; default None)
+        workers - the number of processes among which to spread the files
+            (optional; default the number of files, one process if None or 1)
+    returns a dictionary with information about the results
+        workspace - actual path to the directory where the outputfile was written
+        manifest - actual full path to the manifest file
+        files - a list of dictionaries describing the files written, core first
+        rowcount - the number of rows written to all of the files
+        success - True if process completed successfully, otherwise False
+        message - an explanation of the reason if success=False
+        artifacts - a dictionary of persistent objects created
+    '''
+    #print '%s options: %s' % (__version__, options)
+
+    setup_actor_logging(options)
+
+    logging.debug( 'Started %s' % __version__ )
+    logging.debug( 'options: %s' % options )
+
+    # Make a list for the response
+    returnvars = ['workspace', 'manifest', 'files', 'rowcount', 'success', 'message',
+        'artifacts']
+
+    ### Standard outputs ###
+    success = False
+    message = None
+
+    ### Custom outputs ###
+    manifest = None
+    files = None
+    rowcount = None
+
+    # Make a dictionary for artifacts left behind
+    artifacts = {}
+
+    ### Establish variables ###
+    workspace = './'
+    inputfile = None
+    idindex = None
+    workers = None
+
+    ### Required inputs ###
+    try:
+        workspace = options['workspace']
+    except:
+        pass
+
+    try:
+        inputfile = options['inputfile']
+    except:
+        pass
+
+    if inputfile is None or len(inputfile)==0:
+        message = 'No input file given. %s' % __version__
+        returnvals = [workspace, manifest, files, rowcount, success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    # Look to see if the input file is at the absolute path or in the workspace.
+    if os.path.isfile(inputfile) == False:
+        if os.path.isfile(workspace+'/'+inputfile) == True:
+            inputfile = workspace+'/'+inputfile
+        else:
+            message = 'Input file %s not found. %s' % (inputfile, __version__)
+            returnvals = [workspace, manifest, files, rowcount, success, message,
+                artifacts]
+            logging.debug('message:\n%s' % message)
+            return response(returnvars, returnvals)
+
+    try:
+        idindex = options['idindex']
+    except:
+        pass
+
+    try:
+        workers = int(options['workers'])
+    except:
+        pass
+
+    descriptors = dwca_file_descriptors(inputfile)
+    if descriptors is None or len(descriptors) == 0:
+        message = 'No data files described in meta.xml of %s. ' % inputfile
+        message += '%s' % __version__
+        returnvals = [workspace, manifest, files, rowcount, success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    # Name the output files after the archive and the data files in it
+    archivename = os.path.splitext(os.path.basename(inputfile))[0]
+    workspace = workspace.rstrip('/')
+    files = []
+    tasks = []
+    for descriptor in descriptors:
+        idcolumn = None
+        if descriptor['core'] == False:
+            idcolumn = 'coreid'
+        location = descriptor['location']
+        if location is None:
+            location = descriptor['rowtype'].split('/')[-1]
+        filename = '%s_%s' % (archivename,
+            os.path.splitext(os.path.basename(location))[0])
+        outputfile = '%s/%s.txt' % (workspace, filename)
+        indexfile = None
+        if idindex is not None and str(idindex).lower() == 'true' and \
+            descriptor['idindex'] is not None:
+            indexfile = '%s/%s_ids.txt' % (workspace, filename)
+        files.append({
+            'rowtype':descriptor['rowtype'],
+            'location':descriptor['location'],
+            'core':descriptor['core'],
+            'outputfile':outputfile,
+            'indexfile':indexfile,
+            'columns':[c['name'] for c in dwca_file_columns(descriptor, idcolumn)],
+            'rowcount':None })
+        tasks.append([inputfile, descriptor, outputfile, idcolumn, indexfile])
+
+    rowcounts = _extract_files(tasks, workers)
+
+    rowcount = 0
+    for f, filerowcount in zip(files, rowcounts):
+        f['rowcount'] = filerowcount
+        if filerowcount is None:
+            message = 'Unable to extract %s from %s. ' % (f['location'], inputfile)
+            message += '%s' % __version__
+            returnvals = [workspace, manifest, files, rowcount, success, message,
+                artifacts]
+            logging.debug('message:\n%s' % message)
+            return response(returnvars, returnvals)
+        rowcount += filerowcount
+
+    manifest = '%s/%s_manifest.json' % (workspace, archivename)
+    try:
+        with open(manifest, 'w') as manifestfile:
+            json.dump({'archive':inputfile, 'files':files}, manifestfile, indent=2,
+                sort_keys=True)
+    except Exception, e:
+        message = 'Error %s writing manifest %s. %s' % (e, manifest, __version__)
+        returnvals = [workspace, manifest, files, rowcount, success, message, artifacts]
+        logging.debug('message:\n%s' % message)
+        return response(returnvars, returnvals)
+
+    success = True
+    artifacts['dwca_extract_all_manifest'] = manifest
+    for f in files:
+        name = os.path.splitext(os.path.basename(f['outputfile']))[0]
+        artifacts['dwca_extract_all_%s' % name] = f['outputfile']
+        if f['indexfile'] is not None:
+            artifacts['dwca_extract_all_%s_ids' % name] = f['indexfile']
+
+    returnvals = [workspace, manifest, files, rowcount, success, message, artifacts]
+    logging.debug('Finishing %s' % __version__)
+    return response(returnvars, returnvals)
+
+def _extract_files(tasks, workers=None):
+    ''' Extract data files from a Darwin Core archive, spread over a pool of processes.
+    parameters:
+        tasks - list of tasks for _extract_file() (required)
+        workers - the number of processes to use (optional; default one per task)
+    returns:
+        a list of the number of rows written for each task, None for any that failed
+    '''
+    functionname = '_extract_files()'
+
+    if workers is None:
+        workers = len(tasks)
+    if multiprocessing is not None and workers > 1 and len(tasks) > 1:
+        try:
+            pool = multiprocessing.Pool(min(workers, len(tasks)))
+            try:
+                return pool.map(_extract_file, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        except Exception, e:
+            s = 'Unable to extract files in parallel in %s: %s' % (functionname, e)
+            logging.debug(s)
+
+    return [_extract_file(task) for task in tasks]
+
+def _extract_file(task):
+    ''' Extract one data file from a Darwin Core archive in a worker process.
+    parameters:
+        task - list of inputfile, descriptor, outputfile, idcolumn and indexfile (see
+            write_dwca_file_tsv()) (required)
+    returns:
+        the number of rows written, or None if the file could not be written
+    '''
+    inputfile, descriptor, outputfile, idcolumn, indexfile = task
+    # Exceptions are not passed back from the worker, only the failure
+    try:
+        return write_dwca_file_tsv(inputfile, descriptor, outputfile, idcolumn, indexfile)
+    except Exception, e:
+        s = 'Error %s extracting %s from %s.' % (e, descriptor['location'], inputfile)
+        logging.debug(s)
+    return None
+
+def _getoptions():
+    ''' Parse command line options and return them.'''
+    parser = argparse.ArgumentParser()
+
+    help = 'directory for the output files (optional)'
+    parser.add_argument("-w", "--workspace", help=help)
+
+    help = 'full path to the input file (required)'
+    parser.add_argument("-i", "--inputfile", help=help)
+
+    help = "write an index of row offsets by id for every file ('true') (optional)"
+    parser.add_argument("-x", "--idindex", help=help)
+
+    help = 'number of processes among which to spread the files (optional)'
+    parser.add_argument("-p", "--workers", help=help)
+
+    help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
+    parser.add_argument("-l", "--loglevel", help=help)
+
+    return parser.parse_args()
+
+def main():
+    options = _getoptions()
+    optdict = {}
+
+    inputfile = options.inputfile
+
+    if inputfile is None or len(inputfile)==0:
+        s =  'syntax:\n'
+        s += 'python dwca_extract_all.py'
+        s += ' -w ./workspace'
+        s += ' -i ./data/dwca-uwymv_herp.zip'
+        s += ' -x true'
+        s += ' -p 4'
+        s += ' -l DEBUG'
+        print '%s' % s
+        return
+
+    optdict['workspace'] = options.workspace
+    optdict['inputfile'] = inputfile
+    optdict['idindex'] = options.idindex
+    optdict['workers'] = options.workers
+    optdict['loglevel'] = options.loglevel
+    print 'optdict: %s' % optdict
+
+    # Write the core and extensions to tsv files at the specified location
+    response = dwca_extract_all(optdict)
+    print '\nresponse: %s' % response
+
+if __name__ == '__main__':
+    """ Demo of dwca_extract_all"""
+    main()
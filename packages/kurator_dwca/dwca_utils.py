@@ -15,20 +15,30 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2018 President and Fellows of Harvard College"
-__version__ = "dwca_utils.py 2018-02-06T12:16-03:00"
+__version__ = "dwca_utils.py 2026-10-19T09:20-04:00"
 __kurator_content_type__ = "utility"
 __adapted_from__ = ""
 
 # This file contains common utility functions for dealing with the content of CSV and
 # TXT files.
 
+from dwca_terms import controlledtermlist
+from dwca_terms import geogkeytermlist
 from operator import itemgetter
 from uuid import uuid1
+from array import array
+from bisect import bisect_right
 #from ftfy import fix_text
 import os.path
 import glob
 import codecs
+import json
 import logging
+import re
+import shutil
+import hashlib
+import struct
+import zlib
 
 # Replace the system csv with unicodecsv. All invocations of csv will use unicodecsv,
 # which supports reading and writing unicode streams.
@@ -41,6 +51,27 @@ except ImportError:
     s += "$JYTHON_HOME/bin/pip install unicodecsv"
     warnings.warn(s)
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# The standard csv module parses rows into byte strings, leaving it to the caller to 
+# decode only the values it needs (see read_csv_tuple_row()).
+import csv as bytecsv
+
+# Not available under Jython, where files are scanned in a single process
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+# Not available under Jython, where line indexes are built from the file as read
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
 try:
     from chardet.universaldetector import UniversalDetector
 except ImportError:
@@ -77,6 +108,22 @@ except ImportError:
 #         # obj is unicode
 #         return unicode(obj).encode('unicode_escape')
 
+# Characters that separate tokens in term values (see profile_file())
+_nonword = re.compile('[^\w]')
+
+# Encodings already checked by ascii_transparent_encoding()
+_ascii_transparent_encodings = {}
+
+# The most recently used line indexes, by full path of the indexed file, made on first 
+# use (see line_index())
+_line_indexes = None
+_line_index_cachesize = 8
+
+# Name of the codec error handler that replaces undecodable bytes and counts them in 
+# _replacements, so that csv readers can tell which rows had them (see read_csv_row())
+_countreplace = 'dwca_utils.countreplace'
+_replacements = [0]
+
 def represents_int(s):
     try: 
         int(s)
@@ -116,6 +163,215 @@ def setup_actor_logging(options):
             logging.basicConfig(level=logging.INFO)
             logging.info('Log level set to INFO')
 
+# Profiles of the files that have been inspected, keyed by absolute path. A profile
+# holds what was detected about a file (dialect, encoding, header, rowcount) along with
+# the size and modification time of the file at the time of detection, so that a
+# profile is discarded as soon as the file changes.
+_file_profiles = {}
+
+# Full path to the file in which file profiles are persisted, if any.
+_profile_index = None
+
+def setup_actor_profile_index(options):
+    ''' Set up a persistent file profile index based on 'profileindex' in a dictionary.
+        Actors sharing a profile index detect the dialect, encoding, header and row
+        count of a given file only once.
+    parameters:
+        options - dictionary in which to look for profileindex and workspace. A
+            profileindex without a path is placed in the workspace (required)
+    returns:
+        None
+    '''
+    try:
+        profileindex = options['profileindex']
+    except:
+        profileindex = None
+    if profileindex is None or len(profileindex.strip()) == 0:
+        return
+
+    try:
+        workspace = options['workspace']
+    except:
+        workspace = None
+    if workspace is not None and os.path.dirname(profileindex) == '':
+        profileindex = '%s/%s' % (workspace.rstrip('/'), profileindex)
+
+    load_profile_index(profileindex)
+
+def setup_actor_fingerprint_store(options):
+    ''' Get the fingerprint store (see profile_file_incremental()) given as 
+        'fingerprintstore' in a dictionary.
+    parameters:
+        options - dictionary in which to look for fingerprintstore and workspace. A
+            fingerprintstore without a path is placed in the workspace (required)
+    returns:
+        storedir - full path to the directory of the fingerprint store, or None if 
+            there is none
+    '''
+    try:
+        fingerprintstore = options['fingerprintstore']
+    except:
+        fingerprintstore = None
+    if fingerprintstore is None or len(fingerprintstore.strip()) == 0:
+        return None
+
+    try:
+        workspace = options['workspace']
+    except:
+        workspace = None
+    if workspace is not None and os.path.dirname(fingerprintstore) == '':
+        fingerprintstore = '%s/%s' % (workspace.rstrip('/'), fingerprintstore)
+    return fingerprintstore
+
+def load_profile_index(indexfile):
+    ''' Load file profiles from a profile index file and persist any new profiles to it.
+    parameters:
+        indexfile - full path to the profile index file. The file will be created if
+            it does not exist. If None, stop persisting profiles (required)
+    returns:
+        True if the profile index is in use, otherwise False
+    '''
+    global _profile_index
+    functionname = 'load_profile_index()'
+
+    if indexfile is None or len(indexfile) == 0:
+        _profile_index = None
+        s = 'No profile index file given in %s. ' % functionname
+        s += 'File profiles will not be persisted.'
+        logging.debug(s)
+        return False
+
+    _profile_index = indexfile
+
+    if os.path.isfile(indexfile) == False:
+        return True
+
+    try:
+        with open(indexfile, 'r') as indexdata:
+            profiles = json.load(indexdata)
+    except Exception, e:
+        s = 'Unable to read profile index %s in %s. %s' % (indexfile, functionname, e)
+        logging.debug(s)
+        return True
+
+    for path, profile in profiles.iteritems():
+        if path not in _file_profiles:
+            _file_profiles[path] = profile
+    return True
+
+def save_profile_index(indexfile=None):
+    ''' Write the current file profiles to a profile index file.
+    parameters:
+        indexfile - full path to the profile index file (optional; default is the index
+            given to load_profile_index())
+    returns:
+        True if the profile index was written, otherwise False
+    '''
+    functionname = 'save_profile_index()'
+
+    if indexfile is None:
+        indexfile = _profile_index
+    if indexfile is None or len(indexfile) == 0:
+        return False
+
+    # Write to a temporary file first so that concurrent readers never see a partial
+    # index.
+    tempfile = '%s.%s.tmp' % (indexfile, os.getpid())
+    try:
+        with open(tempfile, 'w') as indexdata:
+            json.dump(_file_profiles, indexdata)
+        os.rename(tempfile, indexfile)
+    except Exception, e:
+        s = 'Unable to write profile index %s in %s. %s' % (indexfile, functionname, e)
+        logging.debug(s)
+        return False
+    return True
+
+def clear_file_profiles():
+    ''' Forget all file profiles held in memory. A profile index file is not affected.'''
+    _file_profiles.clear()
+
+def file_profile(inputfile):
+    ''' Get the profile of a file, discarding any profile that no longer matches the
+        size and modification time of the file.
+    parameters:
+        inputfile - full path to the input file (required)
+    returns:
+        profile - dictionary of the detected attributes of the file, or None if there
+            is no such file
+    '''
+    if inputfile is None or len(inputfile) == 0:
+        return None
+
+    try:
+        filestat = os.stat(inputfile)
+    except OSError:
+        return None
+
+    path = os.path.abspath(inputfile)
+    profile = _file_profiles.get(path)
+    if profile is None or profile['size'] != filestat.st_size or \
+        profile['mtime'] != filestat.st_mtime:
+        profile = { 'size':filestat.st_size, 'mtime':filestat.st_mtime }
+        _file_profiles[path] = profile
+    return profile
+
+def set_file_profile_value(inputfile, attribute, value):
+    ''' Store a detected attribute in the profile of a file and persist it to the
+        profile index, if there is one.
+    parameters:
+        inputfile - full path to the input file (required)
+        attribute - name of the attribute in the profile (e.g., 'encoding') (required)
+        value - the value of the attribute (required)
+    returns:
+        None
+    '''
+    profile = file_profile(inputfile)
+    if profile is None:
+        return
+    profile[attribute] = value
+    if _profile_index is not None:
+        save_profile_index()
+
+def dialect_to_dict(dialect):
+    ''' Get the attributes of a csv dialect as a dictionary.
+    parameters:
+        dialect - a csv.dialect object (required)
+    returns:
+        a dictionary of the dialect attributes
+    '''
+    if dialect is None:
+        return None
+    return { 'lineterminator':dialect.lineterminator,
+        'delimiter':dialect.delimiter,
+        'escapechar':dialect.escapechar,
+        'doublequote':dialect.doublequote,
+        'quotechar':dialect.quotechar,
+        'quoting':dialect.quoting,
+        'skipinitialspace':dialect.skipinitialspace,
+        'strict':dialect.strict }
+
+def dialect_from_dict(attributes):
+    ''' Make a csv dialect object from a dictionary of dialect attributes.
+    parameters:
+        attributes - dictionary of dialect attributes as made by dialect_to_dict()
+            (required)
+    returns:
+        dialect - a csv.dialect object with the given attributes
+    '''
+    if attributes is None:
+        return None
+
+    class dialect(csv.Dialect):
+        pass
+
+    for key, value in attributes.iteritems():
+        # json gives back unicode strings, the csv module wants byte strings
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        setattr(dialect, str(key), value)
+    return dialect
+
 def tsv_dialect():
     ''' Get a dialect object with tab-separated value properties.
     parameters:
@@ -172,6 +428,24 @@ def csv_file_dialect(fullpath):
         logging.debug(s)
         return None
 
+    # Use the dialect detected previously if the file has not changed since
+    profile = file_profile(fullpath)
+    if 'dialect' in profile:
+        return dialect_from_dict(profile['dialect'])
+
+    dialect = _detect_csv_file_dialect(fullpath)
+    set_file_profile_value(fullpath, 'dialect', dialect_to_dict(dialect))
+    return dialect
+
+def _detect_csv_file_dialect(fullpath):
+    ''' Detect the dialect of an existing CSV or TXT data file.
+    parameters:
+        fullpath - full path to the file to process (required)
+    returns:
+        dialect - a csv.dialect object with the detected attributes
+    '''
+    functionname = 'csv_file_dialect()'
+
     # Let's look at up to readto bytes from the file
     readto = 20000
     filesize = os.path.getsize(fullpath)
@@ -371,16 +645,28 @@ def read_header(inputfile, dialect=None, encoding=None):
         encoding = csv_file_encoding(inputfile)
         # csv_file_encoding() always returns an encoding if there is an input file.    
 
+    # Use the header read previously if the file has not changed since and it was read
+    # with the same encoding and dialect
+    profile = file_profile(inputfile)
+    headerkey = [encoding, dialect_to_dict(dialect)]
+    if 'header' in profile and profile['header'][0] == headerkey:
+        return list(profile['header'][1])
+
     # Open up the file for processing
     with open(inputfile, 'rU') as data:
-        reader = csv.DictReader(utf8_data_encoder(data, encoding), dialect=dialect, 
-            encoding=encoding)
+        lines, lineencoding = csv_lines(data, encoding)
+        reader = csv.DictReader(lines, dialect=dialect, encoding=lineencoding, 
+            errors='replace')
         # header is the list as returned by the reader
         header=reader.fieldnames
 
+    if header is not None:
+        set_file_profile_value(inputfile, 'header', [headerkey, header])
+
     return header
 
-def read_rows(inputfile, rowcount, dialect, encoding, header=True, fieldnames=None):
+def read_rows(inputfile, rowcount, dialect, encoding, header=True, fieldnames=None,
+    errors=None, errorcounts=None, categoricals=None):
     ''' Read rows from a csv file. Determine the existence of the file, its dialect, and 
         its encoding before making a call to this function.
     parameters:
@@ -391,25 +677,24 @@ def read_rows(inputfile, rowcount, dialect, encoding, header=True, fieldnames=No
             (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
         fieldnames -  list containing the fields in the header (optional)
         header - True if the file has a header row (optional; default True)
+        errors - what to do with a row that cannot be decoded (see read_csv_row()) 
+            (optional; default 'skip')
+        errorcounts - dictionary in which to count the 'skipped' and 'replaced' rows 
+            (optional; default None)
+        categoricals - list of the fields whose values are to be shared by all of the 
+            rows with the same value (see read_csv_row()) (optional; default None)
     returns:
         rows - a list of row dictionaries
     '''
     rows = []
     i = 0
-    with open(inputfile, 'rU') as data:
-        if fieldnames is None or len(fieldnames)==0:
-            reader = csv.DictReader(utf8_data_encoder(data, encoding), 
-                dialect=dialect, encoding=encoding)
-        else:
-            reader = csv.DictReader(utf8_data_encoder(data, encoding), \
-                dialect=dialect, encoding=encoding, fieldnames=fieldnames)
-            if header==True:
-                reader.next()
-        for row in reader:
-            rows.append(row)
-            i += 1
-            if i == rowcount:
-                return rows
+    for row in read_csv_row(inputfile, dialect, encoding, header=header, 
+        fieldnames=fieldnames, errors=errors, errorcounts=errorcounts, 
+        categoricals=categoricals):
+        rows.append(row)
+        i += 1
+        if i == rowcount:
+            return rows
     return rows
 
 def count_rows(inputfile):
@@ -419,13 +704,261 @@ def count_rows(inputfile):
     returns:
         count - the number of rows in the file
     '''
-    with open(inputfile, "r") as f:
-        count = sum(bl.count("\r") for bl in blocks(f))
+    profile = file_profile(inputfile)
+    if profile is not None and 'rowcount' in profile:
+        return profile['rowcount']
+
+    # One more than the number of line endings, from the line index if there already is
+    # one, otherwise counted without keeping the offsets of the lines
+    index = None
+    if _line_indexes is not None:
+        index = _line_indexes.get(os.path.abspath(inputfile))
+    stat = os.stat(inputfile)
+    if index is not None and index['size'] == stat.st_size and \
+        index['mtime'] == stat.st_mtime:
+        count = len(index['offsets'])
+    else:
+        count = _count_line_ends(inputfile) + 1
+
+    set_file_profile_value(inputfile, 'rowcount', count)
+    return count
+
+def _count_line_ends(inputfile, blocksize=1048576):
+    ''' Count the line endings in a file the way _build_line_index() finds them, reading
+        a block at a time.
+    parameters:
+        inputfile - full path to the input file (required)
+        blocksize - the number of bytes to read at a time (optional; default 1048576)
+    returns:
+        count - the number of newlines in the file, or of carriage returns if the file
+            has no newlines
+    '''
+    newlines = 0
+    returns = 0
+    with open(inputfile, 'rb') as data:
+        block = data.read(blocksize)
+        while len(block) > 0:
+            newlines += block.count('\n')
+            if newlines == 0:
+                returns += block.count('\r')
+            block = data.read(blocksize)
+    if newlines == 0:
+        return returns
+    return newlines
+
+def line_index(inputfile, persist=False):
+    ''' Get an index of the offsets of the lines in a file. The index is built once for 
+        each state of the file and the most recently used indexes are kept for reuse in 
+        this process, and optionally in a file next to the input file for reuse by other 
+        processes.
+    parameters:
+        inputfile - full path to the input file (required)
+        persist - True to keep the index in a file with the name of the input file plus
+            the extension .lineindex (optional; default False)
+    returns:
+        index - dictionary with the 'size' and 'mtime' of the file when it was indexed, 
+            the 'newline' character ending its lines and the 'offsets' in an array of 
+            the start of every line, including the end of the file if it ends with a 
+            newline, or None if the file was not found
+    '''
+    global _line_indexes
+    functionname = 'line_index()'
+
+    if inputfile is None or os.path.isfile(inputfile) == False:
+        s = 'File %s not found in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    if _line_indexes is None:
+        _line_indexes = LRUCache(_line_index_cachesize)
+
+    key = os.path.abspath(inputfile)
+    stat = os.stat(key)
+    index = _line_indexes.get(key)
+    if index is not None and index['size'] == stat.st_size and \
+        index['mtime'] == stat.st_mtime:
+        return index
+
+    indexfile = inputfile + '.lineindex'
+    index = _load_line_index(indexfile, stat)
+    if index is None:
+        index = _build_line_index(key, stat)
+        if persist == True:
+            _save_line_index(indexfile, index)
+
+    _line_indexes.set(key, index)
+    return index
+
+def _build_line_index(inputfile, stat, blocksize=1048576):
+    ''' Find the offsets of the lines in a file (see line_index()).
+    parameters:
+        inputfile - full path to the input file (required)
+        stat - the result of os.stat() for the input file (required)
+        blocksize - the number of bytes to search at a time (optional; default 1048576)
+    returns:
+        index - dictionary of the index of the lines in the file
+    '''
+    offsets = array('L', [0])
+    newline = '\n'
+    with open(inputfile, 'rb') as data:
+        if mmap is not None and stat.st_size > 0:
+            content = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            content = data.read()
+        try:
+            # Files with only carriage returns end their lines with them
+            if content.find('\n') < 0 and content.find('\r') >= 0:
+                newline = '\r'
+            find = content.find
+            append = offsets.append
+            position = find(newline)
+            while position >= 0:
+                append(position + 1)
+                position = find(newline, position + 1)
+        finally:
+            if mmap is not None and stat.st_size > 0:
+                content.close()
+
+    return { 'size':stat.st_size, 'mtime':stat.st_mtime, 'newline':newline, 
+        'offsets':offsets }
+
+def _load_line_index(indexfile, stat):
+    ''' Read a line index kept in a file, if it was made for the current state of the 
+        indexed file.
+    parameters:
+        indexfile - full path to the index file (required)
+        stat - the result of os.stat() for the indexed file (required)
+    returns:
+        index - dictionary of the index of the lines in the file, or None if there is 
+            no index file for the current state of the file
+    '''
+    functionname = '_load_line_index()'
+
+    if os.path.isfile(indexfile) == False:
+        return None
+
+    try:
+        with open(indexfile, 'rb') as data:
+            attributes = json.loads(data.readline())
+            if attributes['size'] != stat.st_size or \
+                attributes['mtime'] != stat.st_mtime or \
+                attributes['itemsize'] != array('L').itemsize:
+                return None
+            offsets = array('L')
+            offsets.fromstring(data.read())
+    except Exception, e:
+        s = 'Unable to read line index %s in %s: %s' % (indexfile, functionname, e)
+        logging.debug(s)
+        return None
+
+    return { 'size':attributes['size'], 'mtime':attributes['mtime'], 
+        'newline':str(attributes['newline']), 'offsets':offsets }
+
+def _save_line_index(indexfile, index):
+    ''' Write a line index to a file.
+    parameters:
+        indexfile - full path to the index file (required)
+        index - dictionary of the index of the lines in a file (required)
+    returns:
+        True if the index file was written, otherwise False
+    '''
+    functionname = '_save_line_index()'
+
+    attributes = { 'size':index['size'], 'mtime':index['mtime'], 
+        'newline':index['newline'], 'itemsize':index['offsets'].itemsize }
+    tempfile = '%s.%s.tmp' % (indexfile, os.getpid())
+    try:
+        with open(tempfile, 'wb') as data:
+            data.write(json.dumps(attributes) + '\n')
+            index['offsets'].tofile(data)
+        os.rename(tempfile, indexfile)
+    except Exception, e:
+        s = 'Unable to write line index %s in %s: %s' % (indexfile, functionname, e)
+        logging.debug(s)
+        return False
+    return True
+
+def indexed_line_count(index):
+    ''' Get the number of lines in an indexed file, not counting an empty line after a 
+        final newline.
+    parameters:
+        index - dictionary of the index of the lines in a file (see line_index()) 
+            (required)
+    returns:
+        the number of lines in the file
+    '''
+    offsets = index['offsets']
+    if offsets[-1] == index['size']:
+        return len(offsets) - 1
+    return len(offsets)
 
-    if count == 0:
-        with open(inputfile, "r") as f:
-            count = sum(bl.count("\n") for bl in blocks(f))
-    return count+1
+def indexed_line_range(index, first, last=None):
+    ''' Get the byte offsets of a range of lines in an indexed file.
+    parameters:
+        index - dictionary of the index of the lines in a file (see line_index()) 
+            (required)
+        first - the number of the first line in the range, counting from 0 (required)
+        last - the number of the line after the range (optional; default None for the 
+            line after first)
+    returns:
+        a list of the [start, end] byte offsets of the range
+    '''
+    offsets = index['offsets']
+    if last is None:
+        last = first + 1
+    start = offsets[min(first, len(offsets) - 1)]
+    if last >= len(offsets):
+        return [start, index['size']]
+    return [start, offsets[last]]
+
+def read_indexed_lines(inputfile, first, last=None, index=None):
+    ''' Get a range of lines of a file, as they are in the file, using its line index.
+    parameters:
+        inputfile - full path to the input file (required)
+        first - the number of the first line to get, counting from 0 (required)
+        last - the number of the line after the last one to get (optional; default None
+            for just the first line)
+        index - dictionary of the index of the lines in the file (see line_index()) 
+            (optional; default None to get the index of the file)
+    returns:
+        the bytes of the lines, including their line endings
+    '''
+    if index is None:
+        index = line_index(inputfile)
+        if index is None:
+            return None
+    start, end = indexed_line_range(index, first, last)
+    with open(inputfile, 'rb') as data:
+        data.seek(start)
+        return data.read(end - start)
+
+def copy_indexed_lines(data, outfile, index, first, last=None):
+    ''' Write a range of lines of an open file to another, as they are in the file, 
+        without copying them in memory where the file can be memory-mapped.
+    parameters:
+        data - the indexed file, open in binary mode (required)
+        outfile - the open file to write to (required)
+        index - dictionary of the index of the lines in the file (see line_index()) 
+            (required)
+        first - the number of the first line to copy, counting from 0 (required)
+        last - the number of the line after the last one to copy (optional; default 
+            None for just the first line)
+    returns:
+        the number of bytes written
+    '''
+    start, end = indexed_line_range(index, first, last)
+    if end <= start:
+        return 0
+    if mmap is not None:
+        content = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            outfile.write(buffer(content, start, end - start))
+        finally:
+            content.close()
+    else:
+        data.seek(start)
+        outfile.write(data.read(end - start))
+    return end - start
 
 def blocks(file, size=65536):
     ''' Yield blocks of given size in bytes from file.
@@ -536,6 +1069,28 @@ def header_map(header):
 
     return headermap
 
+def header_index_map(header):
+    ''' Construct a map between the fields in a header and their column indexes.
+    parameters:
+        header - list of field names (required)
+    returns:
+        indexmap - a dictionary of field:index pairs, with the index of the last 
+            occurrence for a field that appears more than once, as in the rows of a 
+            csv.DictReader
+    '''
+    functionname = 'header_index_map()'
+
+    if header is None or len(header)==0:
+        s = 'No header given in %s.' % functionname
+        logging.debug(s)
+        return None
+
+    indexmap = {}
+    for i, field in enumerate(header):
+        indexmap[field] = i
+
+    return indexmap
+
 def strip_list(inputlist):
     ''' Create a list of strings stripped of whitespace from strings in an input list.
     parameters:
@@ -887,30 +1442,13 @@ def term_rowcount_from_file(inputfile, termname, dialect=None, encoding=None):
         encoding = csv_file_encoding(inputfile)
         # csv_file_encoding() always returns an encoding if there is an input file.    
 
-    # Search for fields based on a cleaned header
-    cleanheader = clean_header(read_header(inputfile, dialect, encoding))
-
-    # Search for term based on cleaned term to match cleaned header
-    cleanterm = clean_header([termname])[0]
-
-    if cleanterm not in cleanheader:
-        s = 'Term %s not found in %s in %s.' % (termname, inputfile, functionname)
-        logging.debug(s)
+    results = profile_file(inputfile, [{'type':'rowcount', 'term':termname}], 
+        dialect=dialect, encoding=encoding)
+    if results is None or results[0] is None:
         return 0
+    return results[0]
 
-    rowcount = 0
-
-    for row in read_csv_row(inputfile, dialect, encoding, fieldnames=cleanheader):
-        try:
-            value = row[cleanterm]
-            if value is not None and len(value.strip()) > 0:
-                rowcount += 1
-        except:
-            pass
-
-    return rowcount
-
-def term_completeness_from_file(inputfile, dialect=None, encoding=None):
+def term_completeness_from_file(inputfile, dialect=None, encoding=None, workers=None):
     ''' Make a dictionary of field names and the number of rows in which each is 
         populated.
     parameters:
@@ -918,6 +1456,8 @@ def term_completeness_from_file(inputfile, dialect=None, encoding=None):
         dialect - csv.dialect object with the attributes of the input files (default None)
         encoding - a string designating the input file encoding (optional; default None) 
             (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        workers - the number of processes among which to split the scan of the file 
+            (optional; default None)
     returns:
         fieldcountdict - dictionary of field names and the number of rows in which they 
             are populated in the inputfile
@@ -945,37 +1485,46 @@ def term_completeness_from_file(inputfile, dialect=None, encoding=None):
         encoding = csv_file_encoding(inputfile)
         # csv_file_encoding() always returns an encoding if there is an input file.    
 
-    # Search for fields based on a cleaned header
-    header = read_header(inputfile, dialect, encoding)
-
-    rowcount = 0
-
-    # Set up the dictionary of row counts for the fields in the input file
-    fieldcountdict = {}
-    for field in header:
-        fieldcountdict[field] = 0
-
-    for row in read_csv_row(inputfile, dialect, encoding, fieldnames=header):
-        for field in header:
-            v = row[field]
-            if v is not None and len(v.strip())>0:
-                fieldcountdict[field] += 1
-        rowcount += 1
-    fieldcountdict['rows'] = rowcount
-    return fieldcountdict
+    results = profile_file(inputfile, [{'type':'completeness'}], dialect=dialect, 
+        encoding=encoding, workers=workers)
+    if results is None:
+        return 0
+    return results[0]
 
-def csv_field_checker(inputfile, dialect=None, encoding=None):
-    ''' Determine if any row in a csv file has fewer fields than the header.
+def profile_file(inputfile, aggregates, dialect=None, encoding=None, workers=None,
+    categoricals=None):
+    ''' Compute a list of aggregates over the rows of a file in a single pass.
     parameters:
         inputfile - full path to the input file (required)
-        dialect - csv.dialect object with the attributes of the input files (default None)
+        aggregates - list of dictionaries, each specifying one aggregate by its 'type' 
+            (required):
+            {'type':'rowcount'} - the number of rows in the file
+            {'type':'rowcount', 'term':termname} - the number of rows in which termname
+                is populated
+            {'type':'completeness'} - dictionary of field names and the number of rows 
+                in which each is populated, plus the number of rows in 'rows'
+            {'type':'valuecounts', 'fields':fieldlist, 'separator':separator, 
+                'function':function, 'args':args, 'kwargs':kwargs} - list of distinct 
+                values of the fields in fieldlist, concatenated with separator, and their 
+                counts, in descending order of count (separator, function, args and 
+                kwargs optional)
+            {'type':'tokens', 'term':termname} - dictionary of the tokens in termname 
+                with their counts (see term_token_count_from_file())
+        dialect - csv.dialect object with the attributes of the input file (default None)
         encoding - a string designating the input file encoding (optional; default None) 
             (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        workers - the number of processes among which to split the scan of the file 
+            (optional; default None scans the file in this process)
+        categoricals - list of the terms whose values are few and repeated in many 
+            rows. Valuecounts aggregates without a function over only these terms count 
+            the values as integer codes, decoding each distinct value once (see 
+            CategoricalDictionary) (optional; default None for the 
+            categorical_terms(), [] to count the values as they are)
     returns:
-        index, row - a tuple composed of the index of the first row that has a different 
-            number of fields (1 is the first row after the header) and the row string
+        results - list of the results of the aggregates, in the order given in 
+            aggregates, with None for any aggregate that could not be computed
     '''
-    functionname = 'csv_field_checker()'
+    functionname = 'profile_file()'
 
     if inputfile is None or len(inputfile) == 0:
         s = 'No input file given in %s.' % functionname
@@ -987,6 +1536,11 @@ def csv_field_checker(inputfile, dialect=None, encoding=None):
         logging.debug(s)
         return None
 
+    if aggregates is None or len(aggregates) == 0:
+        s = 'No aggregates given in %s.' % functionname
+        logging.debug(s)
+        return None
+
     # Determine the dialect of the input file
     if dialect is None:
         dialect = csv_file_dialect(inputfile)
@@ -999,41 +1553,69 @@ def csv_field_checker(inputfile, dialect=None, encoding=None):
         # csv_file_encoding() always returns an encoding if there is an input file.    
 
     header = read_header(inputfile, dialect, encoding)
-
-    if header is None:
-        s = 'No header found for %s in %s.' % (inputfile, functionname)
+    if header is None or len(header) == 0:
+        s = 'No header found in %s in %s.' % (inputfile, functionname)
         logging.debug(s)
         return None
 
-    delimiter = dialect.delimiter
-    fieldcount = len(header)
-
-    with open(inputfile, 'rU') as f:
-        i=0
-        for line in f:
-            delimitercount = line.count(delimiter)
-            if delimitercount < fieldcount-1:
-                return i, line
-            i+=1
-
-    return None
-
-def purge_non_printing_from_file(inputfile, outputfile, dialect=None, encoding=None, 
-    sub='-'):
-    ''' Remove new lines and carriage returns in data. Assumes that the header is intact
-        with the correct number of columns.
+    accumulators, columns, position, dictionaries = _prepare_accumulators(inputfile, 
+        header, aggregates, categoricals)
+
+    # Read only the columns needed from the column store of the file if it has one, 
+    # otherwise scan the file, in parallel if asked to.
+    store = column_store(inputfile, dialect, encoding)
+    rowcount = None
+    if store is None and workers is not None and workers > 1:
+        scanned = _scan_chunks(inputfile, dialect, encoding, columns, accumulators, 
+            workers, dictionaries)
+        if scanned is not None:
+            rowcount, accumulators = scanned
+    if rowcount is None:
+        if store is not None:
+            rows = read_column_store_rows(store, columns, categoricals=dictionaries)
+        else:
+            rows = read_csv_tuple_row(inputfile, dialect, encoding, columns=columns, 
+                categoricals=dictionaries)
+        rowcount = _scan_rows(rows, accumulators)
+        _decode_accumulator_codes(accumulators)
+
+    return _profile_results(inputfile, header, accumulators, position, rowcount)
+
+def profile_file_incremental(inputfile, aggregates, storedir, dialect=None, 
+    encoding=None, keyterm=None, changes=None):
+    ''' Compute a list of aggregates over the rows of a file, as profile_file() does,
+        updating the results kept in a fingerprint store for an earlier version of the 
+        file with only the rows that changed since. The store keeps a fingerprint of 
+        every record by its key, and counts of the distinct combinations of the values 
+        of the columns the aggregates need. Columns needed only to tell whether they 
+        are blank, as for completeness, are kept as just that, so a completeness 
+        aggregate costs a count of each pattern of blank columns rather than a copy of 
+        the file. Every row of the file is read and fingerprinted, but only the rows 
+        inserted, deleted or changed are decoded and counted, added to or taken away 
+        from the results kept. The first time the aggregates are computed in a store, 
+        and whenever the header, dialect or encoding of the file change, all of the 
+        rows are counted.
     parameters:
         inputfile - full path to the input file (required)
-        outputfile - full path to the translated output file (required)
-        dialect - csv.dialect object with the attributes of the input files (default None)
+        aggregates - list of dictionaries, each specifying one aggregate (see 
+            profile_file()) (required)
+        storedir - full path to the directory of the fingerprint store of the dataset 
+            the file is a version of, created if it does not exist. Each list of 
+            aggregates is kept in a file of its own in the store (required)
+        dialect - csv.dialect object with the attributes of the input file (default None)
         encoding - a string designating the input file encoding (optional; default None) 
             (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
-        sub - character sequence to substitute for the non-printing character 
-            (default '-')
+        keyterm - the term that identifies a record from one version of the file to the 
+            next. Records are identified by their content if the file has no such term 
+            (optional; default 'occurrenceID')
+        changes - dictionary in which to count the records 'inserted', 'updated', 
+            'deleted' and 'unchanged' since the version of the file in the store, and 
+            the rows 'scanned' for the aggregates (optional; default None)
     returns:
-        False if the removal does not complete successfully, otherwise True
+        results - list of the results of the aggregates, in the order given in 
+            aggregates, with None for any aggregate that could not be computed
     '''
-    functionname = 'purge_non_printing_from_file()'
+    functionname = 'profile_file_incremental()'
 
     if inputfile is None or len(inputfile) == 0:
         s = 'No input file given in %s.' % functionname
@@ -1045,6 +1627,16 @@ def purge_non_printing_from_file(inputfile, outputfile, dialect=None, encoding=N
         logging.debug(s)
         return None
 
+    if aggregates is None or len(aggregates) == 0:
+        s = 'No aggregates given in %s.' % functionname
+        logging.debug(s)
+        return None
+
+    if storedir is None or len(storedir) == 0:
+        s = 'No fingerprint store given in %s.' % functionname
+        logging.debug(s)
+        return None
+
     # Determine the dialect of the input file
     if dialect is None:
         dialect = csv_file_dialect(inputfile)
@@ -1057,9 +1649,809 @@ def purge_non_printing_from_file(inputfile, outputfile, dialect=None, encoding=N
         # csv_file_encoding() always returns an encoding if there is an input file.    
 
     header = read_header(inputfile, dialect, encoding)
-
-    if header is None:
-        s = 'No header found for %s in %s.' % (inputfile, functionname)
+    if header is None or len(header) == 0:
+        s = 'No header found in %s in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    if keyterm is None or len(keyterm) == 0:
+        keyterm = 'occurrenceID'
+    keycolumn = header_index_map(clean_header(header)).get(clean_header([keyterm])[0])
+
+    # Codes are only good for one scan, so the values are counted as they are
+    accumulators, columns, position, dictionaries = _prepare_accumulators(inputfile, 
+        header, aggregates, [])
+
+    # Positions in the rows read of the columns only tested for being blank
+    blankcolumns = set()
+    valuecolumns = set()
+    for aggregatetype, accumulator in accumulators:
+        if accumulator is None:
+            continue
+        if aggregatetype == 'completeness':
+            blankcolumns.update(accumulator['columns'])
+        elif aggregatetype == 'rowcount':
+            blankcolumns.add(accumulator['column'])
+        elif aggregatetype == 'valuecounts':
+            valuecolumns.update(accumulator['columns'])
+        elif aggregatetype == 'tokens':
+            valuecolumns.add(accumulator['column'])
+    blankcolumns = sorted(blankcolumns - valuecolumns - set([None]))
+
+    storefile = '%s/%s.fingerprints' % (storedir.rstrip('/'), 
+        hashlib.sha1(_aggregates_key(aggregates)).hexdigest())
+    attributes = { 'header':header, 'dialect':dialect_to_dict(dialect), 
+        'encoding':encoding, 'keycolumn':keycolumn, 'blankcolumns':blankcolumns }
+    store = _load_fingerprint_store(storefile, attributes)
+
+    # Fingerprint every record, and count the distinct combinations of the raw values 
+    # of the columns the aggregates need, without decoding anything.
+    records = {}
+    rows = {}
+    with open(inputfile, 'rU') as data:
+        if ascii_transparent_encoding(encoding) == True:
+            reader = bytecsv.reader(data, dialect=dialect)
+            valueencoding = encoding
+        else:
+            reader = bytecsv.reader(utf8_data_encoder(data, encoding), dialect=dialect)
+            valueencoding = 'utf-8'
+
+        for row in reader:
+            if row != []:
+                break
+
+        for row in reader:
+            # Skip blank rows, as csv.DictReader does
+            if row == []:
+                continue
+            digest = hashlib.sha1('\x00'.join(row)).digest()
+            rowlength = len(row)
+            if keycolumn is not None and keycolumn < rowlength:
+                records[row[keycolumn]] = digest
+            else:
+                records[digest] = digest
+            values = [row[c] if c < rowlength else None for c in columns]
+            for i in blankcolumns:
+                if values[i] is not None:
+                    values[i] = _blank_marker(values[i], valueencoding)
+            values = tuple(values)
+            rows[values] = rows.get(values, 0) + 1
+
+    # The rows to add to the results kept, and the rows to take away from them
+    inserted = rows
+    deleted = {}
+    rowcount = 0
+    if store is not None:
+        inserted = {}
+        for values, count in rows.iteritems():
+            difference = count - store['rows'].get(values, 0)
+            if difference > 0:
+                inserted[values] = difference
+            elif difference < 0:
+                deleted[values] = -difference
+        for values, count in store['rows'].iteritems():
+            if values not in rows:
+                deleted[values] = count
+        # The functions of the aggregates are not kept, only what they counted
+        for [aggregatetype, accumulator], state in zip(accumulators, 
+            store['accumulators']):
+            if accumulator is not None:
+                accumulator.update(state)
+        rowcount = store['rowcount']
+
+    scanned = _scan_rows(_decode_counted_rows(inserted, valueencoding), accumulators)
+    rowcount += scanned
+    if len(deleted) > 0:
+        removed = _prepare_accumulators(inputfile, header, aggregates, [])[0]
+        removedcount = _scan_rows(_decode_counted_rows(deleted, valueencoding), removed)
+        for [aggregatetype, accumulator], [t, other] in zip(accumulators, removed):
+            _merge_accumulator(aggregatetype, accumulator, other, -1)
+        rowcount -= removedcount
+        scanned += removedcount
+
+    if changes is not None:
+        oldrecords = {}
+        if store is not None:
+            oldrecords = store['records']
+        counts = {'inserted':0, 'updated':0, 'deleted':0, 'unchanged':0}
+        for key, digest in records.iteritems():
+            olddigest = oldrecords.get(key)
+            if olddigest is None:
+                counts['inserted'] += 1
+            elif olddigest != digest:
+                counts['updated'] += 1
+            else:
+                counts['unchanged'] += 1
+        counts['deleted'] = len(oldrecords) - len(records) + counts['inserted']
+        counts['scanned'] = scanned
+        changes.update(counts)
+
+    state = []
+    for aggregatetype, accumulator in accumulators:
+        if accumulator is None:
+            state.append(None)
+        else:
+            state.append(dict([(k, v) for k, v in accumulator.iteritems() 
+                if k not in ['function', 'args', 'kwargs']]))
+    attributes.update({ 'records':records, 'rows':rows, 'accumulators':state, 
+        'rowcount':rowcount })
+    _save_fingerprint_store(storefile, attributes)
+
+    return _profile_results(inputfile, header, accumulators, position, rowcount)
+
+def _blank_marker(value, encoding):
+    ''' Reduce a raw value to whether it is blank, as _scan_rows() tests it, for 
+        profile_file_incremental(), decoding it only if that depends on characters 
+        outside of ASCII.
+    parameters:
+        value - the raw value (required)
+        encoding - the encoding of the value (required)
+    returns:
+        marker - '' if the value is blank, 'x' if not, or the value as it is if it 
+            cannot be decoded
+    '''
+    stripped = value.strip()
+    if len(stripped) == 0:
+        return ''
+    # Printable ASCII characters are not blank in any of the encodings read as bytes
+    if ' ' < stripped[0] < '\x80':
+        return 'x'
+    try:
+        if len(value.decode(encoding).strip()) == 0:
+            return ''
+    except UnicodeDecodeError:
+        return value
+    return 'x'
+
+def _aggregates_key(aggregates):
+    ''' Make a string that identifies a list of aggregates (see profile_file()), 
+        functions given by their module and name.
+    parameters:
+        aggregates - list of dictionaries, each specifying one aggregate (required)
+    returns:
+        key - the string that identifies the aggregates
+    '''
+    key = []
+    for aggregate in aggregates:
+        items = []
+        for name, value in sorted(aggregate.iteritems()):
+            if callable(value):
+                value = '%s.%s' % (value.__module__, value.__name__)
+            items.append((name, value))
+        key.append(items)
+    return repr(key)
+
+def _decode_counted_rows(rows, encoding):
+    ''' Yield the rows counted by profile_file_incremental() as many times as they 
+        were counted, decoded, skipping any that cannot be decoded.
+    parameters:
+        rows - dictionary of tuples of raw values and their counts (required)
+        encoding - the encoding of the values (required)
+    returns:
+        row - a tuple of the decoded values, with None for any column not in the row
+    '''
+    functionname = '_decode_counted_rows()'
+
+    for values, count in rows.iteritems():
+        try:
+            row = tuple([v.decode(encoding) if v is not None else None 
+                for v in values])
+        except UnicodeDecodeError, e:
+            s = 'Exception decoding row in %s: %s' % (functionname, e)
+            logging.debug(s)
+            continue
+        for i in xrange(count):
+            yield row
+
+def _load_fingerprint_store(storefile, attributes):
+    ''' Read the fingerprints and results kept by profile_file_incremental(), if they 
+        were made for a file with the same header, dialect, encoding and key.
+    parameters:
+        storefile - full path to the file of the fingerprint store (required)
+        attributes - dictionary of the header, dialect, encoding and keycolumn of the 
+            file (required)
+    returns:
+        store - dictionary of the fingerprints and results, or None if there are none 
+            for the file
+    '''
+    functionname = '_load_fingerprint_store()'
+
+    if os.path.isfile(storefile) == False:
+        return None
+
+    try:
+        with open(storefile, 'rb') as data:
+            store = pickle.load(data)
+    except Exception, e:
+        s = 'Unable to read fingerprint store %s in %s: %s' % \
+            (storefile, functionname, e)
+        logging.debug(s)
+        return None
+
+    for attribute, value in attributes.iteritems():
+        if store.get(attribute) != value:
+            s = 'Fingerprint store %s made for a different %s in %s.' % \
+                (storefile, attribute, functionname)
+            logging.debug(s)
+            return None
+    return store
+
+def _save_fingerprint_store(storefile, store):
+    ''' Write the fingerprints and results of profile_file_incremental() to a file.
+    parameters:
+        storefile - full path to the file of the fingerprint store (required)
+        store - dictionary of the fingerprints and results (required)
+    returns:
+        True if the store was written, otherwise False
+    '''
+    functionname = '_save_fingerprint_store()'
+
+    tempfile = '%s.%s.tmp' % (storefile, os.getpid())
+    try:
+        storedir = os.path.dirname(storefile)
+        if len(storedir) > 0 and os.path.isdir(storedir) == False:
+            os.makedirs(storedir)
+        with open(tempfile, 'wb') as data:
+            pickle.dump(store, data, pickle.HIGHEST_PROTOCOL)
+        os.rename(tempfile, storefile)
+    except Exception, e:
+        s = 'Unable to write fingerprint store %s in %s: %s' % \
+            (storefile, functionname, e)
+        logging.debug(s)
+        return False
+    return True
+
+def _prepare_accumulators(inputfile, header, aggregates, categoricals=None):
+    ''' Prepare the accumulators of the aggregates of profile_file() for a file.
+    parameters:
+        inputfile - full path to the input file (required)
+        header - list of the fields in the header of the file (required)
+        aggregates - list of dictionaries, each specifying one aggregate (see 
+            profile_file()) (required)
+        categoricals - list of the terms whose values to count as codes (see 
+            profile_file()) (optional; default None for the categorical_terms())
+    returns:
+        a tuple of the list of [aggregatetype, accumulator] pairs, the list of the 
+            indexes of the columns to read, the dictionary of the positions in the rows 
+            read of the columns in the header, and the dictionary of the positions and 
+            the CategoricalDictionary of the columns read as codes, or None
+    '''
+    functionname = '_prepare_accumulators()'
+
+    # Terms and fields given by name are matched to the header on their cleaned form,
+    # the last field in the header winning when two clean to the same name.
+    headerindex = header_index_map(header)
+    cleanheaderindex = header_index_map(clean_header(header))
+
+    if categoricals is None:
+        categoricals = categorical_terms()
+    cleancategoricals = set()
+    if len(categoricals) > 0:
+        cleancategoricals = set(clean_header(categoricals))
+
+    # Prepare an accumulator for each aggregate. Aggregates that cannot be computed 
+    # keep None as their accumulator and are skipped during the scan. Accumulators 
+    # refer to the columns they need by their index in the header.
+    accumulators = []
+    for aggregate in aggregates:
+        try:
+            aggregatetype = aggregate['type']
+        except:
+            aggregatetype = None
+        accumulator = None
+        if aggregatetype == 'rowcount':
+            term = aggregate.get('term')
+            if term is None:
+                accumulator = {'column':None, 'count':0}
+            else:
+                cleanterm = clean_header([term])[0]
+                if cleanterm in cleanheaderindex:
+                    accumulator = {'column':cleanheaderindex[cleanterm], 'count':0}
+                else:
+                    s = 'Term %s not found in %s in %s.' % (term, inputfile, functionname)
+                    logging.debug(s)
+        elif aggregatetype == 'completeness':
+            accumulator = {'columns':headerindex.values(), 'counts':{}}
+        elif aggregatetype == 'valuecounts':
+            fields = aggregate.get('fields')
+            if fields is not None and len(fields) > 0:
+                separator = aggregate.get('separator')
+                if separator is None:
+                    separator = ''
+                args = aggregate.get('args')
+                if args is None:
+                    args = ()
+                kwargs = aggregate.get('kwargs')
+                if kwargs is None:
+                    kwargs = {}
+                cleanfields = clean_header(fields)
+                accumulator = { 
+                    'columns':[cleanheaderindex.get(f) for f in cleanfields],
+                    'separator':separator, 'function':aggregate.get('function'), 
+                    'args':args, 'kwargs':kwargs, 'values':{} }
+                # Count the values of categorical terms by their codes
+                if accumulator['function'] is None and \
+                    set(cleanfields).issubset(cleancategoricals):
+                    accumulator['codes'] = {}
+            else:
+                s = 'No fields given for value counts in %s.' % functionname
+                logging.debug(s)
+        elif aggregatetype == 'tokens':
+            term = aggregate.get('term')
+            if term is not None and term in headerindex:
+                accumulator = { 'field':term, 'column':headerindex[term], 
+                    'tokenlist':{}, 'tokencount':0 }
+            else:
+                s = 'Term %s not found in file %s ' % (term, inputfile)
+                s += 'in %s.' % functionname
+                logging.debug(s)
+        else:
+            s = 'Aggregate type %s not recognized in %s.' % (aggregatetype, functionname)
+            logging.debug(s)
+        accumulators.append([aggregatetype, accumulator])
+
+    # Decode only the columns needed by the aggregates, and from here on refer to 
+    # them by their position in the rows as read.
+    columns = set()
+    codedcolumns = set()
+    for aggregatetype, accumulator in accumulators:
+        if accumulator is None:
+            continue
+        if 'codes' in accumulator:
+            codedcolumns.update([c for c in accumulator['columns'] if c is not None])
+            continue
+        if 'column' in accumulator and accumulator['column'] is not None:
+            columns.add(accumulator['column'])
+        if 'columns' in accumulator:
+            columns.update([c for c in accumulator['columns'] if c is not None])
+    columns = sorted(columns)
+    position = {}
+    for i, c in enumerate(columns):
+        position[c] = i
+
+    # Columns counted as codes are read after the others, even if also read as values
+    codedposition = {}
+    dictionaries = {}
+    for i, c in enumerate(sorted(codedcolumns)):
+        codedposition[c] = len(columns) + i
+        dictionaries[len(columns) + i] = CategoricalDictionary()
+    for aggregatetype, accumulator in accumulators:
+        if accumulator is None:
+            continue
+        if 'codes' in accumulator:
+            accumulator['columns'] = [codedposition.get(c) 
+                for c in accumulator['columns']]
+            accumulator['dictionaries'] = [dictionaries.get(p) 
+                for p in accumulator['columns']]
+            continue
+        if 'column' in accumulator:
+            accumulator['column'] = position.get(accumulator['column'])
+        if 'columns' in accumulator:
+            accumulator['columns'] = [position.get(c) for c in accumulator['columns']]
+        if aggregatetype == 'completeness':
+            for c in accumulator['columns']:
+                accumulator['counts'][c] = 0
+
+    columns = columns + sorted(codedcolumns)
+    if len(dictionaries) == 0:
+        dictionaries = None
+    return accumulators, columns, position, dictionaries
+
+def _profile_results(inputfile, header, accumulators, position, rowcount):
+    ''' Get the results of the aggregates of profile_file() from their accumulators.
+    parameters:
+        inputfile - full path to the input file (required)
+        header - list of the fields in the header of the file (required)
+        accumulators - list of [aggregatetype, accumulator] pairs (required)
+        position - dictionary of the positions in the rows read of the columns in the 
+            header (required)
+        rowcount - the number of rows scanned (required)
+    returns:
+        results - list of the results of the aggregates, with None for any aggregate 
+            that could not be computed
+    '''
+    headerindex = header_index_map(header)
+    results = []
+    for aggregatetype, accumulator in accumulators:
+        result = None
+        if accumulator is None:
+            pass
+        elif aggregatetype == 'rowcount':
+            result = accumulator['count']
+        elif aggregatetype == 'completeness':
+            result = {}
+            for field, column in headerindex.iteritems():
+                result[field] = accumulator['counts'][position[column]]
+            result['rows'] = rowcount
+        elif aggregatetype == 'valuecounts':
+            result = sorted(accumulator['values'].iteritems(), key=itemgetter(1), 
+                reverse=True)
+        elif aggregatetype == 'tokens':
+            result = { 'tokenlist':accumulator['tokenlist'] }
+            result['rowcount'] = rowcount
+            result['tokencount'] = accumulator['tokencount']
+            result['input'] = inputfile
+            result['term'] = accumulator['field']
+        results.append(result)
+    return results
+
+def _scan_rows(rows, accumulators):
+    ''' Add the values in rows to the accumulators of aggregates (see profile_file()).
+    parameters:
+        rows - iterable of tuples of the values in the columns read (required)
+        accumulators - list of [aggregatetype, accumulator] pairs (required)
+    returns:
+        rowcount - the number of rows scanned
+    '''
+    rowcount = 0
+    for row in rows:
+        rowcount += 1
+        for aggregatetype, accumulator in accumulators:
+            if accumulator is None:
+                continue
+            if aggregatetype == 'valuecounts':
+                if 'codes' in accumulator:
+                    _count_row_codes(row, accumulator)
+                else:
+                    _count_row_values(row, accumulator)
+            elif aggregatetype == 'completeness':
+                counts = accumulator['counts']
+                for c in accumulator['columns']:
+                    v = row[c]
+                    if v is not None and len(v.strip()) > 0:
+                        counts[c] += 1
+            elif aggregatetype == 'rowcount':
+                c = accumulator['column']
+                if c is None:
+                    accumulator['count'] += 1
+                else:
+                    v = row[c]
+                    if v is not None and len(v.strip()) > 0:
+                        accumulator['count'] += 1
+            elif aggregatetype == 'tokens':
+                _count_row_tokens(row[accumulator['column']], accumulator)
+    return rowcount
+
+def _scan_chunks(inputfile, dialect, encoding, columns, accumulators, workers, 
+    categoricals=None):
+    ''' Scan a file for the aggregates of profile_file() in byte ranges spread over a 
+        pool of processes.
+    parameters:
+        inputfile - full path to the input file (required)
+        dialect - csv.dialect object with the attributes of the input file (required)
+        encoding - a string designating the input file encoding (required)
+        columns - list of the indexes of the columns to read (required)
+        accumulators - list of [aggregatetype, accumulator] pairs (required)
+        workers - the number of processes to use (required)
+        categoricals - dictionary of positions in the rows and the 
+            CategoricalDictionary with which to encode them (optional; default None)
+    returns:
+        a tuple of the number of rows and the accumulators with the results merged from 
+            all ranges, or None if the file could not be scanned in parallel
+    '''
+    functionname = '_scan_chunks()'
+
+    if multiprocessing is None:
+        s = 'multiprocessing not available to %s.' % functionname
+        logging.debug(s)
+        return None
+
+    if ascii_transparent_encoding(encoding) == False:
+        s = 'Unable to split %s in encoding %s in %s.' % \
+            (inputfile, encoding, functionname)
+        logging.debug(s)
+        return None
+
+    chunks = file_chunks(inputfile, dialect, workers)
+    if len(chunks) < 2:
+        return None
+
+    tasks = []
+    for chunk in chunks:
+        tasks.append([inputfile, chunk, dialect_to_dict(dialect), encoding, columns, 
+            accumulators, categoricals])
+
+    # Functions given to valuecounts aggregates have to be picklable, as do any 
+    # exceptions in the workers. Fall back on a single pass otherwise.
+    try:
+        pool = multiprocessing.Pool(min(workers, len(chunks)))
+        try:
+            results = pool.map(_scan_chunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    except Exception, e:
+        s = 'Unable to scan %s in parallel in %s: %s' % (inputfile, functionname, e)
+        logging.debug(s)
+        return None
+
+    rowcount = 0
+    merged = None
+    for chunkrowcount, chunkaccumulators in results:
+        rowcount += chunkrowcount
+        if merged is None:
+            merged = chunkaccumulators
+        else:
+            for [aggregatetype, accumulator], [t, chunkaccumulator] in \
+                zip(merged, chunkaccumulators):
+                _merge_accumulator(aggregatetype, accumulator, chunkaccumulator)
+    return rowcount, merged
+
+def _scan_chunk(task):
+    ''' Scan the rows in a byte range of a file for the aggregates of profile_file() in
+        a worker process.
+    parameters:
+        task - list of inputfile, [start, end], dialect attributes (see 
+            dialect_to_dict()), encoding, columns, accumulators and categoricals 
+            (required)
+    returns:
+        a tuple of the number of rows in the range and the accumulators
+    '''
+    inputfile, byterange, dialectattributes, encoding, columns, accumulators, \
+        categoricals = task
+    dialect = dialect_from_dict(dialectattributes)
+    rows = read_csv_tuple_row(inputfile, dialect, encoding, columns=columns, 
+        byterange=byterange, categoricals=categoricals)
+    rowcount = _scan_rows(rows, accumulators)
+    # Codes are only good for the dictionaries of this process
+    _decode_accumulator_codes(accumulators)
+    return rowcount, accumulators
+
+def _merge_accumulator(aggregatetype, accumulator, other, sign=1):
+    ''' Add the results of an aggregate accumulated over one part of a file to those 
+        accumulated over another (see profile_file()), or take them away.
+    parameters:
+        aggregatetype - the type of the aggregate (required)
+        accumulator - the accumulator to add to (required)
+        other - the accumulator to add (required)
+        sign - 1 to add other, -1 to take it away, leaving out values and tokens 
+            no longer counted in any row (optional; default 1)
+    returns:
+        None
+    '''
+    if accumulator is None:
+        return
+    if aggregatetype == 'rowcount':
+        accumulator['count'] += sign * other['count']
+    elif aggregatetype == 'completeness':
+        counts = accumulator['counts']
+        for c, count in other['counts'].iteritems():
+            counts[c] += sign * count
+    elif aggregatetype == 'valuecounts':
+        values = accumulator['values']
+        for value, count in other['values'].iteritems():
+            if value in values:
+                values[value] += sign * count
+                if values[value] <= 0:
+                    del values[value]
+            elif sign > 0:
+                values[value] = count
+    elif aggregatetype == 'tokens':
+        tokenlist = accumulator['tokenlist']
+        for token, counts in other['tokenlist'].iteritems():
+            if token in tokenlist:
+                tokenlist[token]['rowcount'] += sign * counts['rowcount']
+                tokenlist[token]['totalcount'] += sign * counts['totalcount']
+                if tokenlist[token]['rowcount'] <= 0:
+                    del tokenlist[token]
+            elif sign > 0:
+                tokenlist[token] = counts
+        accumulator['tokencount'] += sign * other['tokencount']
+
+def _count_row_values(row, accumulator):
+    ''' Add the value of the fields of a valuecounts aggregate in a row to the counts of 
+        that aggregate (see profile_file()).
+    parameters:
+        row - a tuple of the values in the columns read (required)
+        accumulator - the state of the valuecounts aggregate (required)
+    returns:
+        None
+    '''
+    values = []
+    for c in accumulator['columns']:
+        # Fields not in the header contribute an empty value
+        v = None
+        if c is not None:
+            v = row[c]
+        if v is None:
+            v = ''
+        values.append(v)
+    value = accumulator['separator'].join(values)
+    if len(value) == 0:
+        return
+    function = accumulator['function']
+    if function is not None:
+        try:
+            value = function(value, *accumulator['args'], **accumulator['kwargs'])
+        except:
+            return
+    counts = accumulator['values']
+    if value in counts:
+        counts[value] += 1
+    else:
+        counts[value] = 1
+
+def _count_row_codes(row, accumulator):
+    ''' Add the codes of the fields of a valuecounts aggregate of categorical terms in 
+        a row to the counts of that aggregate (see profile_file()).
+    parameters:
+        row - a tuple of the values and codes in the columns read (required)
+        accumulator - the state of the valuecounts aggregate (required)
+    returns:
+        None
+    '''
+    columns = accumulator['columns']
+    if len(columns) == 1 and columns[0] is not None:
+        key = row[columns[0]]
+    else:
+        # Fields not in the header contribute an empty value
+        key = tuple([row[c] if c is not None else 0 for c in columns])
+    codes = accumulator['codes']
+    if key in codes:
+        codes[key] += 1
+    else:
+        codes[key] = 1
+
+def _decode_accumulator_codes(accumulators):
+    ''' Turn the counts of codes of the valuecounts aggregates of categorical terms into
+        counts of their values (see profile_file()).
+    parameters:
+        accumulators - list of [aggregatetype, accumulator] pairs (required)
+    returns:
+        None
+    '''
+    for aggregatetype, accumulator in accumulators:
+        if accumulator is None or 'codes' not in accumulator:
+            continue
+        separator = accumulator['separator']
+        dictionaries = accumulator['dictionaries']
+        values = accumulator['values']
+        for key, count in accumulator['codes'].iteritems():
+            if isinstance(key, tuple) == False:
+                key = (key,)
+            parts = []
+            for dictionary, code in zip(dictionaries, key):
+                v = None
+                if dictionary is not None:
+                    v = dictionary.values[code]
+                if v is None:
+                    v = ''
+                parts.append(v)
+            # Different codes can make the same value when joined
+            value = separator.join(parts)
+            if len(value) == 0:
+                continue
+            if value in values:
+                values[value] += count
+            else:
+                values[value] = count
+        accumulator['codes'] = {}
+
+def _count_row_tokens(value, accumulator):
+    ''' Add the tokens in a value to the counts of a tokens aggregate 
+        (see profile_file()).
+    parameters:
+        value - the value of the term in a row (required)
+        accumulator - the state of the tokens aggregate (required)
+    returns:
+        None
+    '''
+    if value is None or len(value.strip()) == 0:
+        return
+
+    wordlist = _nonword.sub(' ', value).split()
+    rowdict = {}
+    for token in wordlist:
+        if token in rowdict:
+            rowdict[token] += 1
+        else:
+            rowdict[token] = 1
+
+    tokenlist = accumulator['tokenlist']
+    for token, count in rowdict.iteritems():
+        if token in tokenlist:
+            tokenlist[token]['rowcount'] += 1
+            tokenlist[token]['totalcount'] += count
+        else:
+            tokenlist[token] = {'rowcount':1, 'totalcount':count}
+    accumulator['tokencount'] += len(wordlist)
+
+def csv_field_checker(inputfile, dialect=None, encoding=None):
+    ''' Determine if any row in a csv file has fewer fields than the header.
+    parameters:
+        inputfile - full path to the input file (required)
+        dialect - csv.dialect object with the attributes of the input files (default None)
+        encoding - a string designating the input file encoding (optional; default None) 
+            (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+    returns:
+        index, row - a tuple composed of the index of the first row that has a different 
+            number of fields (1 is the first row after the header) and the row string
+    '''
+    functionname = 'csv_field_checker()'
+
+    if inputfile is None or len(inputfile) == 0:
+        s = 'No input file given in %s.' % functionname
+        logging.debug(s)
+        return None
+
+    if os.path.isfile(inputfile) == False:
+        s = 'File %s not found in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    # Determine the dialect of the input file
+    if dialect is None:
+        dialect = csv_file_dialect(inputfile)
+        # csv_file_dialect() always returns a dialect if there is an input file.
+        # No need to check.
+
+    # Try to determine the encoding of the inputfile.
+    if encoding is None or len(encoding.strip()) == 0:
+        encoding = csv_file_encoding(inputfile)
+        # csv_file_encoding() always returns an encoding if there is an input file.    
+
+    header = read_header(inputfile, dialect, encoding)
+
+    if header is None:
+        s = 'No header found for %s in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    delimiter = dialect.delimiter
+    fieldcount = len(header)
+
+    with open(inputfile, 'rU') as f:
+        i=0
+        for line in f:
+            delimitercount = line.count(delimiter)
+            if delimitercount < fieldcount-1:
+                return i, line
+            i+=1
+
+    return None
+
+def purge_non_printing_from_file(inputfile, outputfile, dialect=None, encoding=None, 
+    sub='-'):
+    ''' Remove new lines and carriage returns in data. Assumes that the header is intact
+        with the correct number of columns.
+    parameters:
+        inputfile - full path to the input file (required)
+        outputfile - full path to the translated output file (required)
+        dialect - csv.dialect object with the attributes of the input files (default None)
+        encoding - a string designating the input file encoding (optional; default None) 
+            (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        sub - character sequence to substitute for the non-printing character 
+            (default '-')
+    returns:
+        False if the removal does not complete successfully, otherwise True
+    '''
+    functionname = 'purge_non_printing_from_file()'
+
+    if inputfile is None or len(inputfile) == 0:
+        s = 'No input file given in %s.' % functionname
+        logging.debug(s)
+        return None
+
+    if os.path.isfile(inputfile) == False:
+        s = 'File %s not found in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    # Determine the dialect of the input file
+    if dialect is None:
+        dialect = csv_file_dialect(inputfile)
+        # csv_file_dialect() always returns a dialect if there is an input file.
+        # No need to check.
+
+    # Try to determine the encoding of the inputfile.
+    if encoding is None or len(encoding.strip()) == 0:
+        encoding = csv_file_encoding(inputfile)
+        # csv_file_encoding() always returns an encoding if there is an input file.    
+
+    header = read_header(inputfile, dialect, encoding)
+
+    if header is None:
+        s = 'No header found for %s in %s.' % (inputfile, functionname)
         logging.debug(s)
         return None
 
@@ -1153,11 +2545,36 @@ def csv_file_encoding(inputfile, maxlines=None):
         command line to discern what the results of csv_file_encoding(inputfile) will be.
     parameters:
         inputfile - the full path to an input file (required)
-        maxlines  - the maximum number of lines to read from the csv file(optional)
+        maxlines  - the maximum number of lines to read from the csv file. If not given, 
+            the encoding is detected from a bounded sample of the file (optional)
     returns:
         the best guess at an encoding, defaulting to utf-8, or None on error
     '''
-    functionname = 'csv_file_encoding()'
+    detected = csv_file_encoding_detection(inputfile, maxlines)
+    if detected is None:
+        return None
+    return detected['encoding']
+
+def csv_file_encoding_detection(inputfile, maxlines=None, samplesize=65536, 
+    samplecount=16):
+    ''' Try to discern the encoding of a file and report the confidence in the result.
+        If maxlines is given, feed up to maxlines lines to the character set detector.
+        Otherwise read at most samplecount ranges of samplesize bytes from the head, the 
+        tail and evenly spaced positions in between, so that the time to detect does not 
+        grow with the size of the file. If every sample is valid UTF-8, the file is 
+        taken to be utf-8 without consulting the character set detector.
+    parameters:
+        inputfile - the full path to an input file (required)
+        maxlines  - the maximum number of lines to read from the csv file (optional)
+        samplesize - the number of bytes in each sample (optional; default 65536)
+        samplecount - the maximum number of samples to read (optional; default 16)
+    returns:
+        detected - a dictionary with the best guess at an encoding ('encoding'), 
+            defaulting to utf-8, the confidence in that guess between 0 and 1 
+            ('confidence'), and how it was found ('method', one of 'lines', 'utf-8', 
+            'sampled'), or None on error
+    '''
+    functionname = 'csv_file_encoding_detection()'
     line_count = 0
     limitlines = False
     
@@ -1173,16 +2590,48 @@ def csv_file_encoding(inputfile, maxlines=None):
 
     if represents_int(maxlines) and maxlines > 0:
         limitlines = True
-             
+    else:
+        # Use the encoding detected previously if the file has not changed since
+        profile = file_profile(inputfile)
+        if 'encoding' in profile:
+            return { 'encoding':profile['encoding'], 
+                'confidence':profile.get('encodingconfidence'), 'method':'profile' }
+
     detector = UniversalDetector()
-    with open(inputfile, 'rU') as indata:
-        for line in indata:
-            line_count += 1
-            detector.feed(line)
-            if detector.done or ( limitlines and line_count >= maxlines ): break
+    if limitlines == True:
+        method = 'lines'
+        with open(inputfile, 'rU') as indata:
+            for line in indata:
+                line_count += 1
+                detector.feed(line)
+                if detector.done or ( limitlines and line_count >= maxlines ): break
+    else:
+        samples, complete = file_samples(inputfile, samplesize, samplecount)
+
+        # Most files are UTF-8 (or its subset, ASCII). Strict validation of the samples
+        # confirms that much faster than the detector can.
+        if samples_are_utf8(samples) == True:
+            if len(samples) > 0 and samples[0].startswith(codecs.BOM_UTF8):
+                encoding = 'UTF-8-SIG'
+            else:
+                encoding = 'utf-8'
+            # Having seen only part of a file, the rest of it could still hold 
+            # something else.
+            confidence = 0.99
+            if complete == False:
+                confidence = 0.9
+            set_file_profile_value(inputfile, 'encodingconfidence', confidence)
+            set_file_profile_value(inputfile, 'encoding', encoding)
+            return { 'encoding':encoding, 'confidence':confidence, 'method':'utf-8' }
+
+        method = 'sampled'
+        for sample in samples:
+            detector.feed(sample)
+            if detector.done: break
 
     detector.close()
     encoding = detector.result['encoding']
+    confidence = detector.result['confidence']
     # print(encoding)
 
     if encoding is None or len(encoding.strip()) == 0:
@@ -1191,8 +2640,71 @@ def csv_file_encoding(inputfile, maxlines=None):
         s += 'in %s' % functionname
         logging.debug(s)
         encoding = 'utf-8'
+        confidence = 0.0
+
+    if limitlines == False:
+        set_file_profile_value(inputfile, 'encodingconfidence', confidence)
+        set_file_profile_value(inputfile, 'encoding', encoding)
 
-    return encoding
+    return { 'encoding':encoding, 'confidence':confidence, 'method':method }
+
+def file_samples(inputfile, samplesize=65536, samplecount=16):
+    ''' Read byte ranges from the head, the tail and evenly spaced positions in between
+        in a file. A file no bigger than samplesize*samplecount bytes is read whole.
+    parameters:
+        inputfile - the full path to an input file (required)
+        samplesize - the number of bytes in each sample (optional; default 65536)
+        samplecount - the maximum number of samples to read, at least 2 
+            (optional; default 16)
+    returns:
+        a tuple with the following elements:
+            samples - list of byte strings read from the file, in file order
+            complete - True if the samples cover the whole file, otherwise False
+    '''
+    filesize = os.path.getsize(inputfile)
+    samplecount = max(samplecount, 2)
+
+    with open(inputfile, 'rb') as indata:
+        if filesize <= samplesize * samplecount:
+            return [indata.read()], True
+
+        samples = []
+        # Spread the samples so that the first starts at the head of the file and the 
+        # last ends at the tail of the file.
+        for i in range(samplecount):
+            indata.seek((filesize - samplesize) * i / (samplecount - 1))
+            samples.append(indata.read(samplesize))
+
+    return samples, False
+
+def samples_are_utf8(samples):
+    ''' Determine whether byte samples taken from a file are valid UTF-8. Samples other 
+        than the first may begin in the middle of a multi-byte character, and samples 
+        other than the last may end in the middle of one, so partial characters at 
+        those edges are ignored. The last sample ends at the end of the file, where a 
+        partial character is not valid.
+    parameters:
+        samples - list of byte strings in file order as returned by file_samples() 
+            (required)
+    returns:
+        True if all of the samples are valid UTF-8, otherwise False
+    '''
+    i = 0
+    for sample in samples:
+        if i > 0:
+            # Skip up to three continuation bytes of a character begun before the sample
+            j = 0
+            while j < 3 and j < len(sample) and '\x80' <= sample[j] <= '\xbf':
+                j += 1
+            sample = sample[j:]
+        i += 1
+        decoder = codecs.getincrementaldecoder('utf-8')('strict')
+        try:
+            # Without final=True an incomplete character at the end is not an error
+            decoder.decode(sample, i == len(samples))
+        except UnicodeDecodeError:
+            return False
+    return True
 
 def extract_values_from_file(
     inputfile, fields, separator=None, dialect=None, encoding=None, 
@@ -1241,23 +2753,32 @@ def extract_values_from_file(
 
     # Create a cleaned version of the header
     cleanheader = clean_header(read_header(inputfile, dialect, encoding))
+    if cleanheader is None or fields is None or len(fields) == 0:
+        return []
 
-    # Create a cleaned version of fields
-    cleanfields = clean_header(fields)
-
-    #print 'cleanheader: %s' % cleanheader
-    #print 'cleanfields: %s' % cleanfields
+    # Find the columns of the cleaned fields. Fields not in the header contribute an 
+    # empty value.
+    indexmap = header_index_map(cleanheader)
+    columns = [indexmap.get(f) for f in clean_header(fields)]
+    if separator is None:
+        separator = ''
 
-    # Extract values from the rows in the input file
-    for row in read_csv_row(inputfile, dialect, encoding, fieldnames=cleanheader):
+    # Extract values from the rows in the input file, or from its column store
+    store = column_store(inputfile, dialect, encoding)
+    if store is not None:
+        rows = read_column_store_rows(store, columns)
+    else:
+        rows = read_csv_tuple_row(inputfile, dialect, encoding, columns=columns)
+    for row in rows:
+        value = separator.join([v if v is not None else '' for v in row])
+        if len(value) == 0:
+            continue
         try:
-            value = extract_values_from_row(row, cleanfields, separator)
-            if value is not None:
-                if function is not None:
-                    newvalue = function(value, *args, **kwargs)
-                    values.add(newvalue)
-                else:
-                    values.add(value)
+            if function is not None:
+                newvalue = function(value, *args, **kwargs)
+                values.add(newvalue)
+            else:
+                values.add(value)
         except:
             pass
     return sorted(list(values))
@@ -1276,12 +2797,16 @@ def extract_value_counts_from_file(
             (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
         function - function to call for each value extracted (default None)
         args - unnamed parameters to function as tuple (optional)
-        kwargs - named parameters to function as dictionary (optional)
+        kwargs - named parameters to function as dictionary (optional), except for
+            workers - the number of processes among which to split the scan of the 
+                file, in which case function must be picklable (optional; 
+                default None), which is not passed on to function
     returns:
         values - the extracted values of the fields in the list, concatenated with
             separator between values
     '''
     functionname = 'extract_value_counts_from_file()'
+    workers = kwargs.pop('workers', None)
 
     if inputfile is None or len(inputfile) == 0:
         s = 'No input file given in %s.' % functionname
@@ -1304,34 +2829,13 @@ def extract_value_counts_from_file(
         encoding = csv_file_encoding(inputfile)
         # csv_file_encoding() always returns an encoding if there is an input file.    
 
-    # Create a cleaned version of the header
-    cleanheader = clean_header(read_header(inputfile, dialect, encoding))
-
-    # Create a cleaned version of fields
-    cleanfields = clean_header(fields)
-
-    # Create a set into which to put the distinct values
-    values = {}
-
-    # Extract values from the rows in the input file
-    for row in read_csv_row(inputfile, dialect, encoding, fieldnames=cleanheader):
-        try:
-            value = extract_values_from_row(row, cleanfields, separator)
-            if value is not None:
-                if function is not None:
-                    newvalue = function(value, *args, **kwargs)
-                    if newvalue in values:
-                        values[newvalue] += 1
-                    else:
-                        values[newvalue] = 1
-                else:
-                    if value in values:
-                        values[value] += 1
-                    else:
-                        values[value] = 1
-        except:
-            pass
-    return sorted(values.iteritems(), key=itemgetter(1), reverse=True)
+    aggregate = {'type':'valuecounts', 'fields':fields, 'separator':separator, 
+        'function':function, 'args':args, 'kwargs':kwargs}
+    results = profile_file(inputfile, [aggregate], dialect=dialect, encoding=encoding,
+        workers=workers)
+    if results is None:
+        return None
+    return results[0]
 
 def extract_values_from_row(row, fields, separator=None):
     ''' Get the values of a list of fields from a row.
@@ -1396,7 +2900,148 @@ def extract_fields_from_row(row, fields, separator=None):
 
     return newrow
 
-def read_csv_row(inputfile, dialect, encoding, header=True, fieldnames=None):
+def categorical_terms():
+    ''' Get the terms whose values are few and repeated in many rows, and so are worth 
+        dictionary-encoding as they are read (see CategoricalDictionary).
+    parameters:
+        None
+    returns:
+        terms - list of the terms in controlledtermlist and geogkeytermlist
+    '''
+    terms = list(controlledtermlist)
+    for term in geogkeytermlist:
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+class CategoricalDictionary(object):
+    ''' A dictionary of the distinct values of a column, each with an integer code. A 
+        value is decoded only the first time it is seen, and every row with that value
+        shares the same unicode object. Code 0 stands for a column not in a row.
+    '''
+    def __init__(self):
+        ''' Make an empty dictionary.'''
+        self.values = [None]
+        self.codes = {None:0}
+        self.rawcodes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, raw, encoding='utf-8'):
+        ''' Get the code of a value as read from a file, always read in the same 
+            encoding.
+        parameters:
+            raw - the value as a byte string, None for a column not in the row 
+                (required)
+            encoding - the encoding of raw (optional; default 'utf-8')
+        returns:
+            code - the code of the value
+        '''
+        code = self.rawcodes.get(raw)
+        if code is None:
+            if raw is None:
+                return 0
+            # Raises UnicodeDecodeError for a value that cannot be decoded
+            code = self.encode_value(raw.decode(encoding))
+            self.rawcodes[raw] = code
+        return code
+
+    def encode_value(self, value):
+        ''' Get the code of a decoded value.
+        parameters:
+            value - the value as a unicode string, None for a column not in the row 
+                (required)
+        returns:
+            code - the code of the value
+        '''
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def intern(self, value):
+        ''' Get the unicode object shared by all of the rows with a value.
+        parameters:
+            value - the value as a unicode string (required)
+        returns:
+            value - the shared unicode object equal to value
+        '''
+        return self.values[self.encode_value(value)]
+
+class LRUCache(object):
+    ''' A cache of at most maxsize entries that forgets the least recently used ones, 
+        counting its hits and misses. The entries are kept in two generations of at 
+        most half of maxsize each, so that a hit on an entry used in the current 
+        generation costs a single dictionary lookup. An entry found in the previous 
+        generation is moved to the current one. When the current generation is full it 
+        becomes the previous one, and the entries not used since are forgotten.
+    '''
+    def __init__(self, maxsize=10000):
+        ''' Make an empty cache.
+        parameters:
+            maxsize - the largest number of entries to keep (optional; default 10000)
+        '''
+        self.generationsize = max(1, maxsize // 2)
+        self.current = {}
+        self.previous = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.current) + len(self.previous)
+
+    def __contains__(self, key):
+        return key in self.current or key in self.previous
+
+    def get(self, key, default=None):
+        ''' Get the value of an entry, counting a hit or a miss.
+        parameters:
+            key - the key of the entry (required)
+            default - the value to return if there is no entry for key (optional; 
+                default None)
+        returns:
+            value - the value of the entry, or default
+        '''
+        try:
+            value = self.current[key]
+        except KeyError:
+            try:
+                value = self.previous.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.set(key, value)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        ''' Add or replace an entry in the current generation.
+        parameters:
+            key - the key of the entry (required)
+            value - the value of the entry (required)
+        returns:
+            None
+        '''
+        current = self.current
+        if key not in current and len(current) >= self.generationsize:
+            self.previous = current
+            self.current = current = {}
+        current[key] = value
+
+    def stats(self):
+        ''' Get the counts of the hits, misses and entries of the cache.
+        parameters:
+            None
+        returns:
+            dictionary of the number of 'hits', 'misses' and entries ('size')
+        '''
+        return {'hits':self.hits, 'misses':self.misses, 'size':len(self)}
+
+def read_csv_row(inputfile, dialect, encoding, header=True, fieldnames=None,
+    errors=None, errorcounts=None, categoricals=None):
     ''' Yield a row from a csv file. Determine the existence of the file, its dialect, and 
         its encoding before making a call to this function.
     parameters:
@@ -1406,21 +3051,774 @@ def read_csv_row(inputfile, dialect, encoding, header=True, fieldnames=None):
             (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
         fieldnames -  list containing the fields in the header (optional)
         header - True if the file has a header row (optional; default True)
+        errors - what to do with a row that cannot be decoded: 'skip' it, 'replace' the 
+            bytes that cannot be decoded with U+FFFD, or raise a UnicodeDecodeError with
+            'strict' (optional; default 'skip')
+        errorcounts - dictionary in which to count the 'skipped' and 'replaced' rows 
+            (optional; default None)
+        categoricals - list of the fields whose values are to be shared by all of the 
+            rows with the same value, so that rows kept in memory hold one copy of each 
+            distinct value, or True for the categorical_terms() (optional; default None)
     returns:
         row - the row as a dictionary
     '''
+    functionname = 'read_csv_row()'
+
+    if errors is None:
+        errors = 'skip'
+    if errors == 'strict':
+        valueerrors = 'strict'
+    else:
+        valueerrors = _countreplace
+
+    if categoricals == True:
+        categoricals = categorical_terms()
+    dictionaries = {}
+    if categoricals is not None:
+        for field in categoricals:
+            dictionaries[field] = CategoricalDictionary()
+
     with open(inputfile, 'rU') as data:
+        lines, lineencoding = csv_lines(data, encoding, errors=errors, 
+            errorcounts=errorcounts)
         if fieldnames is None or len(fieldnames)==0:
-            reader = csv.DictReader(utf8_data_encoder(data, encoding), 
-                dialect=dialect, encoding=encoding)
+            reader = csv.DictReader(lines, dialect=dialect, encoding=lineencoding, 
+                errors=valueerrors)
+            # Read the header before counting replacements in the rows
+            reader.fieldnames
         else:
-            reader = csv.DictReader(utf8_data_encoder(data, encoding), \
-                dialect=dialect, encoding=encoding, fieldnames=fieldnames)
+            reader = csv.DictReader(lines, dialect=dialect, encoding=lineencoding, 
+                errors=valueerrors, fieldnames=fieldnames)
             if header==True:
                 reader.next()
-        for row in reader:
+
+        # Lines of files in UTF-8 and other encodings in which the bytes of delimiters,
+        # quotes and line endings only stand for themselves are only decoded as the 
+        # reader gets to their values.
+        # Rows in which the reader had to replace bytes are subject to the policy.
+        while True:
+            replacements = _replacements[0]
+            try:
+                row = reader.next()
+            except StopIteration:
+                break
+            if _replacements[0] != replacements:
+                if errors == 'skip':
+                    _count_decode_error(errorcounts, 'skipped')
+                    s = 'Skipped undecodable row ending on line %s of %s in %s.' % \
+                        (reader.line_num, inputfile, functionname)
+                    logging.debug(s)
+                    continue
+                _count_decode_error(errorcounts, 'replaced')
+            for field, dictionary in dictionaries.iteritems():
+                value = row.get(field)
+                if value is not None:
+                    row[field] = dictionary.intern(value)
             yield row
 
+def read_csv_tuple_row(inputfile, dialect, encoding, columns=None, header=True, 
+    errors=None, errorcounts=None, byterange=None, categoricals=None):
+    ''' Yield the values in a list of columns of a row from a csv file as a tuple, 
+        decoding only the values in those columns. Determine the existence of the file, 
+        its dialect, and its encoding before making a call to this function.
+    parameters:
+        inputfile - full path to the input file (required)
+        dialect - csv.dialect object with the attributes of the input file (required)
+        encoding - a string designating the input file encoding (required) 
+            (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        columns - list of the indexes in the header of the columns to return, in the 
+            order in which to return them, None for a column not in the file 
+            (see header_index_map()) (optional; default None returns all of the 
+            columns in the row)
+        header - True if the file has a header row (optional; default True)
+        errors - what to do with a row that cannot be decoded (see read_csv_row()) 
+            (optional; default 'skip')
+        errorcounts - dictionary in which to count the 'skipped' and 'replaced' rows 
+            (optional; default None)
+        byterange - [start, end] byte offsets of whole records to read instead of the 
+            whole file, ignoring header, in a file in an encoding for which 
+            ascii_transparent_encoding() is True (see file_chunks()) (optional; 
+            default None)
+        categoricals - dictionary of positions in the tuple and the 
+            CategoricalDictionary with which to encode the values in those positions, 
+            each decoded only once, as integer codes (optional; default None)
+    returns:
+        row - a tuple of the values in the columns, with None for any column not in the 
+            file or beyond the end of the row
+    '''
+    functionname = 'read_csv_tuple_row()'
+
+    if errors is None:
+        errors = 'skip'
+
+    mode = 'rU'
+    if byterange is not None:
+        if ascii_transparent_encoding(encoding) == False:
+            s = 'Unable to read byte range of %s in encoding %s in %s.' % \
+                (inputfile, encoding, functionname)
+            logging.debug(s)
+            return
+        # Offsets are in bytes as they are in the file, before any newline translation
+        mode = 'rb'
+        header = False
+
+    with open(inputfile, mode) as data:
+        # Encodings in which the bytes of the delimiters, quotes and line endings can 
+        # only stand for themselves can be parsed as they are, anything else is parsed 
+        # after conversion to UTF-8.
+        if byterange is not None:
+            reader = bytecsv.reader(byte_range_lines(data, byterange[0], byterange[1]), 
+                dialect=dialect)
+            valueencoding = encoding
+        elif ascii_transparent_encoding(encoding) == True:
+            reader = bytecsv.reader(data, dialect=dialect)
+            valueencoding = encoding
+        else:
+            reader = bytecsv.reader(utf8_data_encoder(data, encoding, errors=errors, 
+                errorcounts=errorcounts), dialect=dialect)
+            valueencoding = 'utf-8'
+
+        if header == True:
+            for row in reader:
+                if row != []:
+                    break
+
+        # The CategoricalDictionary of each position, if any, to look up the codes of 
+        # the values seen before without decoding them again
+        coders = None
+        if categoricals is not None and columns is not None:
+            coders = [categoricals.get(i) for i in range(len(columns))]
+
+        for row in reader:
+            # Skip blank rows, as csv.DictReader does
+            if row == []:
+                continue
+            if columns is not None:
+                rowlength = len(row)
+                row = [row[c] if c is not None and c < rowlength else None 
+                    for c in columns]
+            try:
+                if categoricals is None:
+                    yield tuple([v.decode(valueencoding) if v is not None else None 
+                        for v in row])
+                elif coders is not None:
+                    yield tuple([(coder.rawcodes.get(v) or 
+                        coder.encode(v, valueencoding)) if coder is not None else 
+                        v.decode(valueencoding) if v is not None else None 
+                        for v, coder in zip(row, coders)])
+                else:
+                    yield _decode_row(row, valueencoding, categoricals)
+            except UnicodeDecodeError, e:
+                if errors == 'strict':
+                    raise
+                s = 'Exception reading line %s of %s in %s: ' % \
+                    (reader.line_num, inputfile, functionname)
+                s += '%s' % e
+                logging.debug(s)
+                if errors == 'skip':
+                    _count_decode_error(errorcounts, 'skipped')
+                    continue
+                _count_decode_error(errorcounts, 'replaced')
+                yield _decode_row(row, valueencoding, categoricals, 'replace')
+
+def _decode_row(row, encoding, categoricals=None, errors='strict'):
+    ''' Decode the values in a row read by read_csv_tuple_row(), as codes in the 
+        positions that have a CategoricalDictionary.
+    parameters:
+        row - list of the values as byte strings, None for a column not in the row 
+            (required)
+        encoding - the encoding of the values (required)
+        categoricals - dictionary of positions in the row and the CategoricalDictionary 
+            with which to encode them (optional; default None)
+        errors - the error handling scheme with which to decode (optional; default 
+            'strict')
+    returns:
+        row - a tuple of the decoded values and codes
+    '''
+    if categoricals is None:
+        categoricals = {}
+    values = []
+    for i, v in enumerate(row):
+        dictionary = categoricals.get(i)
+        if dictionary is not None:
+            if errors == 'strict':
+                values.append(dictionary.encode(v, encoding))
+            elif v is None:
+                values.append(0)
+            else:
+                values.append(dictionary.encode_value(v.decode(encoding, errors)))
+        elif v is None:
+            values.append(None)
+        else:
+            values.append(v.decode(encoding, errors))
+    return tuple(values)
+
+class ColumnStoreWriter(object):
+    ''' A writer of the column store of a csv file (see write_column_store()), to which 
+        rows are given one at a time, either as they are read from the file or as they 
+        are being written to it, so that a file and its store can be written together. 
+        The store is only kept if it has every row as it would be read from the file.
+    '''
+    def __init__(self, inputfile, header, dialect, encoding, rowgroupsize=65536):
+        ''' Start a column store in a temporary directory next to a file.
+        parameters:
+            inputfile - full path to the file of which this is the store (required)
+            header - list of the fields in the header of the file (required)
+            dialect - csv.dialect object with the attributes of the file (required)
+            encoding - a string designating the file encoding (required)
+            rowgroupsize - the number of rows in a group (optional; default 65536)
+        '''
+        if rowgroupsize is None or rowgroupsize < 1:
+            rowgroupsize = 65536
+        self.inputfile = inputfile
+        self.dialect = dialect
+        self.rowgroupsize = rowgroupsize
+        self.storedir = inputfile + '.columns'
+        self.tempdir = '%s.%s.tmp' % (self.storedir, os.getpid())
+        self.fieldcount = len(header)
+        self.store = { 'dialect':dialect_to_dict(dialect), 'encoding':encoding, 
+            'header':list(header), 'itemsize':array('L').itemsize, 'rowcount':0, 
+            'rowgroups':[] }
+        self.columnfiles = []
+        self.group = [[] for c in range(self.fieldcount)]
+        # The reason the store cannot be kept, if any
+        self.failure = None
+        try:
+            if os.path.isdir(self.tempdir):
+                shutil.rmtree(self.tempdir)
+            os.mkdir(self.tempdir)
+            for c in range(self.fieldcount):
+                self.columnfiles.append(open('%s/%s.col' % (self.tempdir, c), 'wb'))
+        except Exception, e:
+            self.fail(e)
+
+    def writerow(self, row, written=False):
+        ''' Add a row to the store.
+        parameters:
+            row - list of the unicode values of the row, None for a column beyond the 
+                end of the row (required)
+            written - True if the row is given as it is written to the file rather 
+                than as it is read from it, so that it is stored as it will be read 
+                (optional; default False)
+        returns:
+            None
+        '''
+        if self.failure is not None:
+            return
+        if written == True:
+            row = self._row_as_read(row)
+            if row is None:
+                return
+        try:
+            for c in range(self.fieldcount):
+                self.group[c].append(row[c] if c < len(row) else None)
+            if len(self.group[0]) == self.rowgroupsize:
+                _write_column_group(self.store, self.columnfiles, self.group)
+                self.group = [[] for c in range(self.fieldcount)]
+        except Exception, e:
+            self.fail(e)
+
+    def _row_as_read(self, row):
+        ''' Get the values of a row as a csv reader will read them from the line written
+            for them, or None if the line is a blank row that the reader skips. The store
+            fails if the values cannot be read as they were written.'''
+        if self.dialect.quoting == csv.QUOTE_NONE:
+            for v in row:
+                if v is not None and ('\r' in v or '\n' in v):
+                    self.fail('line break in value %r' % v)
+                    return None
+        for v in row:
+            if v is not None and '\x00' in v:
+                self.fail('NUL in value %r' % v)
+                return None
+        # A value written without quotes loses the spaces the reader skips at its start
+        if self.dialect.skipinitialspace == True:
+            if self.dialect.quoting == csv.QUOTE_NONE:
+                row = [v.lstrip(u' ') if v is not None else v for v in row]
+            else:
+                for v in row:
+                    if v is not None and v.startswith(u' '):
+                        self.fail('space at start of value %r' % v)
+                        return None
+        if len(row) == 1 and row[0] == u'':
+            return None
+        return row
+
+    def fail(self, reason):
+        ''' Give up the store, removing its temporary directory.
+        parameters:
+            reason - what kept the store from being written (required)
+        returns:
+            None
+        '''
+        if self.failure is None:
+            s = 'Unable to write column store for %s: %s' % (self.inputfile, reason)
+            logging.debug(s)
+            self.failure = reason
+        for columnfile in self.columnfiles:
+            columnfile.close()
+        if os.path.isdir(self.tempdir):
+            shutil.rmtree(self.tempdir)
+
+    def close(self):
+        ''' Finish the store after the file is written and closed, replacing any store 
+            there was for the file.
+        parameters:
+            None
+        returns:
+            store - dictionary describing the store (see write_column_store()), or None
+                if the store could not be written
+        '''
+        if self.failure is not None:
+            return None
+        store = self.store
+        try:
+            if len(self.group[0]) > 0:
+                _write_column_group(store, self.columnfiles, self.group)
+            self.group = [[] for c in range(self.fieldcount)]
+            for columnfile in self.columnfiles:
+                columnfile.close()
+            stat = os.stat(self.inputfile)
+            store['size'] = stat.st_size
+            store['mtime'] = stat.st_mtime
+            with open('%s/store.json' % self.tempdir, 'wb') as storefile:
+                json.dump(store, storefile)
+            if os.path.isdir(self.storedir):
+                shutil.rmtree(self.storedir)
+            os.rename(self.tempdir, self.storedir)
+        except Exception, e:
+            self.fail(e)
+            return None
+
+        store['directory'] = self.storedir
+        return store
+
+def write_column_store(inputfile, dialect=None, encoding=None, rowgroupsize=65536):
+    ''' Write the rows of a csv file to a column store in a directory next to the file,
+        so that functions that need only some of the columns of the file can read just 
+        those (see column_store() and read_column_store_rows()). The store keeps each 
+        column in a file of its own, in compressed groups of rows. The values of a 
+        column in a group of rows are kept as a dictionary of the distinct values and 
+        a code for each row if there are few distinct values, otherwise as they are. 
+        The store describes every group of rows with the position, size and 
+        statistics (the number of populated and distinct values, and the smallest and 
+        largest values) of every column in it. A file being written can get its store
+        as it is written instead (see ColumnStoreWriter).
+    parameters:
+        inputfile - full path to the input file (required)
+        dialect - csv.dialect object with the attributes of the input file (default None)
+        encoding - a string designating the input file encoding (optional; default None) 
+            (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        rowgroupsize - the number of rows in a group (optional; default 65536)
+    returns:
+        store - dictionary describing the store, as in the file store.json in the 
+            directory with the name of the input file plus the extension .columns, or 
+            None if the store could not be written
+    '''
+    functionname = 'write_column_store()'
+
+    if inputfile is None or os.path.isfile(inputfile) == False:
+        s = 'File %s not found in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    # Determine the dialect of the input file
+    if dialect is None:
+        dialect = csv_file_dialect(inputfile)
+
+    # Try to determine the encoding of the inputfile.
+    if encoding is None or len(encoding.strip()) == 0:
+        encoding = csv_file_encoding(inputfile)
+
+    header = read_header(inputfile, dialect, encoding)
+    if header is None or len(header) == 0:
+        s = 'No header found in %s in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    writer = ColumnStoreWriter(inputfile, header, dialect, encoding, rowgroupsize)
+    # A store is only made of files in which every row can be decoded, so that the 
+    # rows read from it are those read from the file under any error policy.
+    try:
+        for row in read_csv_tuple_row(inputfile, dialect, encoding, 
+            columns=range(len(header)), errors='strict'):
+            writer.writerow(row)
+    except Exception, e:
+        writer.fail(e)
+    return writer.close()
+
+def _write_column_group(store, columnfiles, group):
+    ''' Append a group of rows to the column files of a column store and describe it in 
+        the store (see ColumnStoreWriter).
+    parameters:
+        store - dictionary describing the store (required)
+        columnfiles - list of the open files of the columns (required)
+        group - list of the lists of the values of each column in the rows (required)
+    returns:
+        None
+    '''
+    rows = len(group[0])
+    columns = []
+    for values, columnfile in zip(group, columnfiles):
+        distinct = set(values)
+        distinct.discard(None)
+        populated = [v for v in distinct if len(v.strip()) > 0]
+        nonempty = 0
+        for v in values:
+            if v is not None and len(v.strip()) > 0:
+                nonempty += 1
+
+        # Values are kept in UTF-8, separated by NUL bytes, which cannot be in a value 
+        # read from a csv file. Codes are the positions of values in the dictionary 
+        # plus one, zero for a row without the column. Values kept as they are leave out 
+        # the rows without the column, which are listed by position instead.
+        if len(distinct) * 2 <= rows:
+            kind = 'dictionary'
+            dictionary = sorted(distinct)
+            codemap = {None:0}
+            for i, v in enumerate(dictionary):
+                codemap[v] = i + 1
+            text = '\x00'.join([v.encode('utf-8') for v in dictionary])
+            codes = array('L', [codemap[v] for v in values])
+        else:
+            kind = 'plain'
+            text = '\x00'.join([v.encode('utf-8') for v in values if v is not None])
+            codes = array('L', [i for i, v in enumerate(values) if v is None])
+        chunk = zlib.compress(struct.pack('<L', len(text)) + text + codes.tostring())
+
+        offset = columnfile.tell()
+        columnfile.write(chunk)
+        columns.append({ 'offset':offset, 'length':len(chunk), 'kind':kind, 
+            'nonempty':nonempty, 'distinct':len(distinct), 
+            'min':min(populated) if len(populated) > 0 else None, 
+            'max':max(populated) if len(populated) > 0 else None })
+    store['rowgroups'].append({'rows':rows, 'columns':columns})
+    store['rowcount'] += rows
+
+def column_store(inputfile, dialect=None, encoding=None):
+    ''' Get the description of the column store of a file, if it was written for the 
+        current state of the file (see write_column_store()).
+    parameters:
+        inputfile - full path to the input file (required)
+        dialect - csv.dialect object with which the file is to be read, which must be 
+            that with which the store was written (optional; default None)
+        encoding - a string designating the encoding in which the file is to be read, 
+            which must be that with which the store was written (optional; default None)
+    returns:
+        store - dictionary describing the store, or None if there is no store for the 
+            current state of the file read in the given dialect and encoding
+    '''
+    functionname = 'column_store()'
+
+    if inputfile is None or os.path.isfile(inputfile) == False:
+        return None
+
+    storedir = inputfile + '.columns'
+    storefile = '%s/store.json' % storedir
+    if os.path.isfile(storefile) == False:
+        return None
+
+    try:
+        with open(storefile, 'rb') as data:
+            store = json.load(data)
+    except Exception, e:
+        s = 'Unable to read column store %s in %s: %s' % (storefile, functionname, e)
+        logging.debug(s)
+        return None
+
+    stat = os.stat(inputfile)
+    if store['size'] != stat.st_size or store['mtime'] != stat.st_mtime or \
+        store['itemsize'] != array('L').itemsize:
+        return None
+    if dialect is not None and \
+        dialects_equal(dialect, dialect_from_dict(store['dialect'])) == False:
+        return None
+    if encoding is not None and len(encoding.strip()) > 0 and \
+        encoding.lower() != store['encoding'].lower():
+        return None
+
+    store['directory'] = storedir
+    return store
+
+def read_column_store_rows(store, columns=None, where=None, categoricals=None):
+    ''' Yield the values in a list of columns of the rows in a column store as a tuple, 
+        as read_csv_tuple_row() does from the file, reading only the parts of the store 
+        for those columns. Groups of rows in which no row can match are not read.
+    parameters:
+        store - dictionary describing the store (see column_store()) (required)
+        columns - list of the indexes in the header of the columns to return, in the 
+            order in which to return them, None for a column not in the file 
+            (see header_index_map()) (optional; default None returns all of the 
+            columns in the header)
+        where - dictionary of the indexes of columns and the values they must have in 
+            the rows to return (optional; default None returns all of the rows)
+        categoricals - dictionary of positions in the tuple and the 
+            CategoricalDictionary with which to encode the values in those positions 
+            as integer codes (optional; default None)
+    returns:
+        row - a tuple of the values in the columns, with None for any column not in the 
+            file or beyond the end of the row
+    '''
+    fieldcount = len(store['header'])
+    if columns is None:
+        columns = range(fieldcount)
+    if where is None:
+        where = {}
+    if categoricals is None:
+        categoricals = {}
+
+    columnfiles = {}
+    try:
+        for group in store['rowgroups']:
+            rows = group['rows']
+            values = {}
+
+            # Find the rows that match, first from the statistics of the group
+            matches = None
+            for c, value in where.iteritems():
+                if c is None or c >= fieldcount:
+                    matches = []
+                    break
+                stats = group['columns'][c]
+                if value is not None and len(value.strip()) > 0 and \
+                    (stats['nonempty'] == 0 or value < stats['min'] or \
+                    value > stats['max']):
+                    matches = []
+                    break
+                values[c] = _read_column_group(store, columnfiles, c, group)
+                if matches is None:
+                    matches = range(rows)
+                matches = [i for i in matches if values[c][i] == value]
+                if len(matches) == 0:
+                    break
+            if matches is not None and len(matches) == 0:
+                continue
+
+            for c in columns:
+                if c is not None and c < fieldcount and c not in values:
+                    values[c] = _read_column_group(store, columnfiles, c, group)
+            empty = [None] * rows
+            rowvalues = [values[c] if c is not None and c < fieldcount else empty 
+                for c in columns]
+            for p, dictionary in categoricals.iteritems():
+                encode = dictionary.encode_value
+                rowvalues[p] = [encode(v) for v in rowvalues[p]]
+            if matches is None:
+                for row in zip(*rowvalues):
+                    yield row
+            else:
+                for i in matches:
+                    yield tuple([v[i] for v in rowvalues])
+    finally:
+        for columnfile in columnfiles.values():
+            columnfile.close()
+
+def _read_column_group(store, columnfiles, column, group):
+    ''' Read the values of a column in a group of rows of a column store (see 
+        write_column_store()).
+    parameters:
+        store - dictionary describing the store (required)
+        columnfiles - dictionary of the column files opened so far, by column (required)
+        column - the index of the column in the header (required)
+        group - dictionary describing the group of rows (required)
+    returns:
+        values - list of the values of the column in the rows of the group
+    '''
+    if column not in columnfiles:
+        columnfiles[column] = open('%s/%s.col' % (store['directory'], column), 'rb')
+    columnfile = columnfiles[column]
+    stats = group['columns'][column]
+    columnfile.seek(stats['offset'])
+    chunk = zlib.decompress(columnfile.read(stats['length']))
+
+    textlength = struct.unpack('<L', chunk[:4])[0]
+    text = chunk[4:4 + textlength]
+    codes = array('L')
+    codes.fromstring(chunk[4 + textlength:])
+    if stats['kind'] == 'dictionary':
+        dictionary = [None]
+        if stats['distinct'] > 0:
+            dictionary += [v.decode('utf-8') for v in text.split('\x00')]
+        return [dictionary[code] for code in codes]
+
+    values = []
+    if group['rows'] > len(codes):
+        values = [v.decode('utf-8') for v in text.split('\x00')]
+    for i in codes:
+        values.insert(i, None)
+    return values
+
+def file_chunks(inputfile, dialect, chunkcount, blocksize=65536):
+    ''' Split the records after the header of a csv file into byte ranges of about the 
+        same size. Ranges start and end at record boundaries, which in files with a 
+        quote character are the line endings outside of quoted values.
+    parameters:
+        inputfile - full path to the input file (required)
+        dialect - csv.dialect object with the attributes of the input file (required)
+        chunkcount - the number of ranges to make (required)
+        blocksize - the number of bytes to read at a time (optional; default 65536)
+    returns:
+        chunks - a list of [start, end] byte offsets, possibly fewer than chunkcount
+    '''
+    functionname = 'file_chunks()'
+
+    if inputfile is None or os.path.isfile(inputfile) == False:
+        s = 'File %s not found in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return []
+
+    if chunkcount is None or chunkcount < 1:
+        chunkcount = 1
+
+    quotechar = None
+    if dialect.quoting != csv.QUOTE_NONE and dialect.quotechar:
+        quotechar = dialect.quotechar
+    escapechar = None
+    if dialect.escapechar:
+        escapechar = dialect.escapechar
+
+    filesize = os.path.getsize(inputfile)
+
+    # The first boundary is the end of the header, the others the first ends of records
+    # after evenly spaced offsets.
+    targets = [0] + [filesize * i / chunkcount for i in range(1, chunkcount)]
+    boundaries = []
+    if quotechar is None:
+        # Every line ending ends a record, so the boundaries are in the line index
+        offsets = line_index(inputfile)['offsets']
+        for target in targets:
+            position = bisect_right(offsets, target)
+            if position < len(offsets):
+                boundaries.append(offsets[position])
+        targets = []
+    with open(inputfile, 'rb') as data:
+        newline = '\n'
+        previous = ''
+        offset = 0
+        quotes = 0
+        while len(targets) > 0:
+            block = data.read(blocksize)
+            if not block:
+                break
+            if offset == 0 and '\n' not in block and '\r' in block:
+                newline = '\r'
+            # Text starts with the last byte of the previous block so that a quote 
+            # escaped across blocks is recognized. Quotes in text have been counted up 
+            # to counted.
+            text = previous + block
+            textoffset = offset - len(previous)
+            counted = len(previous)
+            while len(targets) > 0:
+                position = text.find(newline, max(targets[0] - textoffset, counted))
+                while position >= 0 and quotechar is not None:
+                    quotes += _count_quotes(text, counted, position + 1, quotechar, 
+                        escapechar)
+                    counted = position + 1
+                    if quotes % 2 == 0:
+                        break
+                    position = text.find(newline, counted)
+                if position < 0:
+                    break
+                boundary = textoffset + position + 1
+                while len(targets) > 0 and targets[0] < boundary:
+                    targets.pop(0)
+                boundaries.append(boundary)
+            if quotechar is not None:
+                quotes += _count_quotes(text, counted, len(text), quotechar, escapechar)
+            previous = block[-1:]
+            offset += len(block)
+
+    # No records after the header
+    if len(boundaries) == 0:
+        return []
+
+    chunks = []
+    boundaries.append(filesize)
+    for i in range(len(boundaries) - 1):
+        if boundaries[i] < boundaries[i+1]:
+            chunks.append([boundaries[i], boundaries[i+1]])
+    return chunks
+
+def _count_quotes(text, start, end, quotechar, escapechar):
+    ''' Count the quote characters that are not escaped in a part of a text.
+    parameters:
+        text - the text in which to count (required)
+        start - offset in text at which to start counting (required)
+        end - offset in text at which to stop counting (required)
+        quotechar - the quote character (required)
+        escapechar - the escape character (optional)
+    returns:
+        the number of unescaped quote characters from start up to end
+    '''
+    count = text.count(quotechar, start, end)
+    if escapechar is not None:
+        count -= text.count(escapechar + quotechar, max(start - 1, 0), end)
+    return count
+
+def byte_range_lines(data, start, end, blocksize=65536):
+    ''' Yield the lines in a range of bytes of an open file, with line endings translated 
+        to newlines as when reading the file in universal newlines mode.
+    parameters:
+        data - the input file, open in binary mode (required)
+        start - offset of the first byte of the range (required)
+        end - offset of the byte after the end of the range (required)
+        blocksize - the number of bytes to read at a time (optional; default 65536)
+    returns:
+        the line, ending in a newline unless it is the last line and the range does not
+            end with a line ending
+    '''
+    data.seek(start)
+    remaining = end - start
+    pending = ''
+    while remaining > 0:
+        block = data.read(min(blocksize, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        text = pending + block
+        # A '\r' at the end of a block might be followed by a '\n' in the next
+        hold = ''
+        if remaining > 0 and text.endswith('\r'):
+            text = text[:-1]
+            hold = '\r'
+        lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        pending = lines.pop() + hold
+        for line in lines:
+            yield line + '\n'
+    if len(pending) > 0:
+        lines = pending.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        last = lines.pop()
+        for line in lines:
+            yield line + '\n'
+        if len(last) > 0:
+            yield last
+
+def ascii_transparent_encoding(encoding):
+    ''' Determine whether the bytes of the ASCII characters in an encoding always stand 
+        for those characters, so that the text can be split on delimiters, quotes and 
+        line endings before it is decoded.
+    parameters:
+        encoding - a string designating the encoding (required) 
+            (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+    returns:
+        True if every ASCII byte is that ASCII character in every position, otherwise 
+            False
+    '''
+    if encoding in _ascii_transparent_encodings:
+        return _ascii_transparent_encodings[encoding]
+
+    # Every byte of a single-byte encoding decodes to exactly one character. Of the
+    # multi-byte encodings, only in UTF-8 can bytes of multi-byte characters not be 
+    # confused with ASCII.
+    allbytes = ''.join([chr(i) for i in range(256)])
+    try:
+        decoded = allbytes.decode(encoding, 'replace')
+        transparent = len(decoded) == 256 and decoded[:128] == allbytes[:128]
+    except (LookupError, TypeError):
+        transparent = False
+    _ascii_transparent_encodings[encoding] = transparent
+    return transparent
+
 def utf8_file_encoder(inputfile, outputfile, encoding=None):
     ''' Translate input file to utf8.
     parameters:
@@ -1438,39 +3836,178 @@ def utf8_file_encoder(inputfile, outputfile, encoding=None):
         encoding = csv_file_encoding(inputfile)
         # csv_file_encoding() always returns an encoding if there is an input file.    
 
-    i = 0
     with open(outputfile, 'w') as outdata:
         with open(inputfile, 'rU') as indata:
-            for line in indata:
-                try:
-                    outdata.write( utf8_line_encoder(line, encoding) )
-                except UnicodeDecodeError, e:
-                    s = 'Failed to encode line #%s:\n%s\n' % (i, line)
-                    s += 'from %s in encoding %s. ' % (inputfile, encoding)
-                    s += 'Exception: %s %s' % (e, functionname)
-                    logging.debug(s)
-                    return False
-                i += 1
+            try:
+                for line in utf8_data_encoder(indata, encoding, errors='strict'):
+                    outdata.write(line)
+            except UnicodeDecodeError, e:
+                s = 'Failed to encode %s in encoding %s. ' % (inputfile, encoding)
+                s += 'Exception: %s %s' % (e, functionname)
+                logging.debug(s)
+                return False
     return True
 
-def utf8_data_encoder(data, encoding):
-    ''' Yield a row in utf8 from a file in given encoding.
+def csv_lines(data, encoding, errors=None, errorcounts=None):
+    ''' Get the lines of an open file for a csv reader, and the encoding in which the 
+        reader is to decode their values. A file in utf8, or in an encoding for which 
+        ascii_transparent_encoding() is True, is passed on as it is, leaving the reader 
+        to decode its values only once. Other files are converted to utf8 first.
     parameters:
         data - the open input file (required)
         encoding - a string designating the input file encoding (required) 
             (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        errors - what to do with a line that cannot be converted to utf8 (see 
+            utf8_data_encoder()) (optional; default 'skip')
+        errorcounts - dictionary in which to count the 'skipped' and 'replaced' lines 
+            (optional; default None)
+    returns:
+        a tuple of the open input file or a generator of its lines in utf8, and the 
+            encoding of the lines
+    '''
+    if ascii_transparent_encoding(encoding) == True:
+        return data, encoding
+    return utf8_data_encoder(data, encoding, errors=errors, errorcounts=errorcounts), \
+        'utf-8'
+
+def utf8_data_encoder(data, encoding, errors=None, errorcounts=None, blocksize=65536):
+    ''' Yield a row in utf8 from a file in given encoding. The file is read in blocks, 
+        each decoded in one call. A csv reader of the rows decodes them again, so csv 
+        readers only need this for files in encodings for which 
+        ascii_transparent_encoding() is False (see csv_lines()).
+    parameters:
+        data - the open input file (required)
+        encoding - a string designating the input file encoding (required) 
+            (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        errors - what to do with a line that cannot be decoded: 'skip' it, 'replace' the 
+            bytes that cannot be decoded with U+FFFD, or raise a UnicodeDecodeError with
+            'strict' (optional; default 'skip')
+        errorcounts - dictionary in which to count the 'skipped' and 'replaced' lines 
+            (optional; default None)
+        blocksize - the number of bytes to read at a time (optional; default 65536)
     returns:
         the row in utf8
     '''
     functionname = 'utf8_data_encoder()'
-    for line in data:
-        try:
-            yield utf8_line_encoder(line, encoding)
-        except UnicodeDecodeError, e:
-            s = 'Failed to encode line:\n%s\n' % line
-            s += 'in encoding %s. ' % encoding
-            s += 'Exception: %s %s' % (e, functionname)
-            logging.debug(s)
+
+    if errors is None:
+        errors = 'skip'
+
+    # Bytes that cannot be decoded are replaced with U+FFFD and counted by the error 
+    # handler, so a block in which the count changes has lines with undecodable bytes.
+    if errors == 'strict':
+        decoder = codecs.getincrementaldecoder(encoding)('strict')
+    else:
+        decoder = codecs.getincrementaldecoder(encoding)(_countreplace)
+
+    linenumber = 0
+    pending = u''
+    pendingfailed = False
+    while True:
+        block = data.read(blocksize)
+        final = len(block) == 0
+        failures = []
+        if errors == 'strict':
+            text = decoder.decode(block, final)
+        else:
+            state = decoder.getstate()
+            replacements = _replacements[0]
+            text = decoder.decode(block, final)
+            replaced = _replacements[0] - replacements
+            if replaced > 0:
+                # The replacements are the U+FFFD in the text, unless the data has 
+                # some of its own
+                position = text.find(u'\ufffd')
+                while position >= 0:
+                    failures.append(position)
+                    position = text.find(u'\ufffd', position + 1)
+                if len(failures) != replaced:
+                    decoder.setstate(state)
+                    text, failures = _decode_finding_replacements(decoder, block, 
+                        final)
+        lines = (pending + text).split(u'\n')
+        # Positions of the replacements in the lines of the block
+        failures = [len(pending) + position for position in failures]
+        # The last line is incomplete until the end of the file
+        pending = lines.pop()
+        if final and len(pending) > 0:
+            lines.append(pending)
+        start = 0
+        # The index of the first replacement not before the current line
+        f = 0
+        for i in range(len(lines)):
+            linenumber += 1
+            line = lines[i]
+            end = start + len(line)
+            failed = i == 0 and pendingfailed
+            while f < len(failures) and failures[f] < end:
+                failed = True
+                f += 1
+            start = end + 1
+            if failed:
+                s = 'Failed to decode line %s in encoding %s ' % (linenumber, encoding)
+                if errors == 'skip':
+                    _count_decode_error(errorcounts, 'skipped')
+                    logging.debug(s + 'and skipped it in %s.' % functionname)
+                    continue
+                _count_decode_error(errorcounts, 'replaced')
+                logging.debug(s + 'and replaced undecodable bytes in %s.' % functionname)
+            if final and i == len(lines) - 1:
+                yield line.encode('utf-8')
+            else:
+                yield line.encode('utf-8') + '\n'
+        if final:
+            break
+        pendingfailed = (len(lines) == 0 and pendingfailed) or f < len(failures)
+
+def _decode_finding_replacements(decoder, block, final):
+    ''' Decode a block of bytes a byte at a time to find where the error handler 
+        replaced bytes that could not be decoded, for a block with U+FFFD of its own as
+        well (see utf8_data_encoder()).
+    parameters:
+        decoder - incremental decoder with the _countreplace error handler, in the state
+            in which to decode the block (required)
+        block - the bytes to decode (required)
+        final - True if the block is the end of the input (required)
+    returns:
+        a tuple of the decoded text and the list of the positions of the replacements 
+            in it
+    '''
+    pieces = []
+    length = 0
+    failures = []
+    for i in range(len(block) + 1):
+        replacements = _replacements[0]
+        if i < len(block):
+            piece = decoder.decode(block[i])
+        elif final:
+            piece = decoder.decode('', True)
+        else:
+            break
+        # Replacements come before the character completed by the byte
+        for j in range(_replacements[0] - replacements):
+            failures.append(length + j)
+        pieces.append(piece)
+        length += len(piece)
+    return u''.join(pieces), failures
+
+def _count_decode_error(errorcounts, key):
+    ''' Count a line or row that could not be decoded.
+    parameters:
+        errorcounts - dictionary of counts to add to (optional)
+        key - 'skipped' or 'replaced' (required)
+    returns:
+        None
+    '''
+    if errorcounts is not None:
+        errorcounts[key] = errorcounts.get(key, 0) + 1
+
+def _count_replacement(e):
+    ''' Codec error handler to replace undecodable bytes with U+FFFD and count them.'''
+    _replacements[0] += 1
+    return (u'\ufffd', e.end)
+
+codecs.register_error(_countreplace, _count_replacement)
 
 def utf8_line_encoder(line, encoding):
     ''' Get a row with a given encoding as utf8.
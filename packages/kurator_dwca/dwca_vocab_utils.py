@@ -15,7 +15,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "dwca_vocab_utils.py 2017-04-27T16:37-04:00"
+__version__ = "dwca_vocab_utils.py 2026-10-19T03:20-04:00"
 __kurator_content_type__ = "utility"
 __adapted_from__ = ""
 
@@ -28,6 +28,7 @@ from dwca_terms import vocabrowdict
 from dwca_utils import csv_file_dialect
 from dwca_utils import csv_file_encoding
 from dwca_utils import extract_values_from_file
+from dwca_utils import LRUCache
 from dwca_utils import read_csv_row
 from dwca_utils import read_header
 from dwca_utils import tsv_dialect
@@ -35,8 +36,29 @@ from dwca_utils import ustripstr
 from dwca_utils import write_header
 import os.path
 import logging
+import hashlib
+import heapq
+import math
 import copy
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# Darwin Core terms as they are and as upper case, stripped keys (see terms_not_in_dwc())
+_dwctermset = None
+_dwctermkeyset = None
+
+# Vocabularies already read, by file, key and field names (see load_vocabulary())
+_vocabularies = {}
+
+# Darwin Cloud mappers already made, by file (see darwin_cloud_mapper())
+_darwin_cloud_mappers = {}
+
+# Full path to the directory in which vocabularies are persisted, if any.
+_vocabulary_cache = None
+
 # Replace the system csv with unicodecsv. All invocations of csv will use unicodecsv,
 # which supports reading and writing unicode streams.
 try:
@@ -180,6 +202,382 @@ def vocab_dialect():
     '''
     return tsv_dialect()
 
+class Vocabulary(object):
+    ''' A vocabulary read once from a file and kept in compact form, with one tuple of 
+        values per entry and shared copies of repeated values, for exact lookups and 
+        lookups on upper case, stripped keys. Get instances through load_vocabulary(), 
+        which keeps them for reuse.
+    attributes:
+        vocabfile - full path to the vocabulary file
+        key - the field or separator-separated fieldnames that hold the distinct values 
+            in the vocabulary file
+        separator - string used as the value separator in the key
+        fieldnames - tuple of the names of the fields in the entries, other than the key
+        size - the size of the vocabulary file when it was read
+        mtime - the modification time of the vocabulary file when it was read
+    '''
+    def __init__(self, vocabfile, key, separator=None, fieldnames=None, entries=None,
+        order=None, size=None, mtime=None):
+        self.vocabfile = vocabfile
+        self.key = key
+        self.separator = separator
+        self.fieldnames = tuple(fieldnames or ())
+        self.size = size
+        self.mtime = mtime
+        # Dictionary of key values and tuples of the values of the other fields
+        self._entries = entries or {}
+        # Tuple of the key values in the order of the rows in the file
+        self._order = tuple(order or ())
+        # Dictionary of upper case, stripped key values and key values, made when needed
+        self._normalized = None
+        # TrigramIndexes of all and of vetted key values, made when needed
+        self._trigrams = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, value):
+        return value in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def keys(self):
+        ''' Get the key values of the vocabulary.'''
+        return self._entries.keys()
+
+    def entry(self, value):
+        ''' Get the entry for a key value as a new dictionary of field names and values, 
+            or None if the value is not in the vocabulary.'''
+        values = self._entries.get(value)
+        if values is None:
+            return None
+        return dict(zip(self.fieldnames, values))
+
+    def lookup(self, value):
+        ''' Get the entry for a key value, or if there is none, for the key value that is
+            the same after both are made upper case and stripped. Returns None if neither
+            is in the vocabulary.'''
+        if value in self._entries:
+            return self.entry(value)
+        try:
+            original = self.normalized().get(ustripstr(value))
+        except Exception:
+            return None
+        if original is None:
+            return None
+        return self.entry(original)
+
+    def normalized(self):
+        ''' Get the dictionary of upper case, stripped key values and the key values they
+            were made from. Where several key values make the same one, the last in the
+            file is kept.'''
+        if self._normalized is None:
+            normalized = {}
+            for value in self._order:
+                normalized[ustripstr(value)] = value
+            self._normalized = normalized
+        return self._normalized
+
+    def similar(self, value, count=3, minscore=0.5, vetted=True):
+        ''' Get the key values most similar to a value that is not in the vocabulary, 
+            with their similarity scores, best first (see TrigramIndex.similar()). If 
+            vetted is True and the entries have a vetted field, only vetted key values 
+            are proposed.'''
+        vetted = vetted == True and 'vetted' in self.fieldnames
+        index = self._trigrams.get(vetted)
+        if index is None:
+            index = TrigramIndex(separator=self.separator)
+            if vetted == True:
+                i = self.fieldnames.index('vetted')
+                values = [v for v in self._order if self._entries[v][i] == '1']
+            else:
+                values = self._order
+            for v in values:
+                index.add(v)
+            self._trigrams[vetted] = index
+        return index.similar(value, count, minscore)
+
+    def vocab_dict(self, function=None, *args, **kwargs):
+        ''' Get the vocabulary as a dictionary of key values and dictionaries of their 
+            entries, optionally with a function applied to the key values (see 
+            vocab_dict_from_file()).'''
+        if function is None:
+            keys = [(value, value) for value in self._entries]
+        elif function is ustripstr and len(args) == 0 and len(kwargs) == 0:
+            keys = self.normalized().iteritems()
+        else:
+            keys = [(function(value, *args, **kwargs), value) \
+                for value in self._entries]
+        vocabdict = {}
+        for newvalue, value in keys:
+            vocabdict[newvalue] = self.entry(value)
+        return vocabdict
+
+    def state(self):
+        ''' Get the content of the vocabulary in builtin types, for persisting.'''
+        return (self.key, self.separator, self.fieldnames, self.size, self.mtime, 
+            self._entries, self._order)
+
+class TrigramIndex(object):
+    ''' An index of values by the trigrams of their upper case, stripped keys (see 
+        normalized_vocab_key()), to find the values most similar to a given one without 
+        comparing it to every value. The similarity of two values is the Dice coefficient 
+        of their sets of trigrams, from 0 (no trigrams in common) to 1 (the same 
+        trigrams).
+    attributes:
+        separator - string used as the value separator in the values
+    '''
+    def __init__(self, values=None, separator=None):
+        self.separator = separator
+        # List of the keys of the values, and of the values, by position
+        self._keys = []
+        self._values = []
+        # Dictionary of keys and their positions
+        self._positions = {}
+        # Dictionary of trigrams and lists of the positions of the keys that have them
+        self._postings = {}
+        if values is not None:
+            for value in values:
+                self.add(value)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, value):
+        ''' Add a value to the index, unless a value with the same key is in it.'''
+        key = normalized_vocab_key(_decoded(value), self.separator)
+        if key in self._positions:
+            return
+        position = len(self._keys)
+        self._positions[key] = position
+        self._keys.append(key)
+        self._values.append(value)
+        for gram in trigrams(key):
+            try:
+                self._postings[gram].append(position)
+            except KeyError:
+                self._postings[gram] = [position]
+
+    def similar(self, value, count=3, minscore=0.5):
+        ''' Get the values most similar to a value.
+        parameters:
+            value - the value to find similar values for (required)
+            count - the greatest number of values to get (optional; default 3)
+            minscore - the least similarity of the values to get, greater than 0 
+                (optional; default 0.5)
+        returns:
+            a list of tuples of values and their similarity scores, best first
+        '''
+        grams = trigrams(normalized_vocab_key(_decoded(value), self.separator))
+        if len(grams) == 0 or count < 1:
+            return []
+
+        # A key needs at least this many trigrams in common with the value to score 
+        # minscore. Every such key is in one of the shortest len(grams)-needed+1 lists.
+        needed = max(1, int(math.ceil(minscore*len(grams)/(2.0-minscore) - 1e-9)))
+        postings = sorted([self._postings.get(g, ()) for g in grams], key=len)
+        candidates = set()
+        for positions in postings[:len(grams)-needed+1]:
+            candidates.update(positions)
+
+        scored = []
+        for position in candidates:
+            keygrams = trigrams(self._keys[position])
+            score = 2.0*len(grams & keygrams) / (len(grams) + len(keygrams))
+            if score >= minscore:
+                scored.append((score, self._keys[position], position))
+        best = heapq.nsmallest(count, scored, key=lambda x: (-x[0], x[1]))
+        return [(self._values[position], score) for score, key, position in best]
+
+def trigrams(value):
+    ''' Get the set of trigrams of a value, padded with two spaces before and one after 
+        so that its beginning counts for more than its middle.'''
+    padded = u'  %s ' % _decoded(value)
+    return set([padded[i:i+3] for i in range(len(padded)-2)])
+
+def _decoded(value):
+    ''' Get a value as unicode, decoding it as utf-8, or failing that as latin_1, if it
+        is a byte string, so that it is made upper case the same way as a unicode one.'''
+    if isinstance(value, str):
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            return value.decode('latin_1')
+    return value
+
+def set_vocabulary_cache(cachedir):
+    ''' Set the directory in which vocabularies read by load_vocabulary() are persisted,
+        so that other processes do not have to read the vocabulary files again.
+    parameters:
+        cachedir - full path to the directory. It will be created if it does not 
+            exist. If None, stop persisting vocabularies (required)
+    returns:
+        True if the vocabulary cache is in use, otherwise False
+    '''
+    global _vocabulary_cache
+    functionname = 'set_vocabulary_cache()'
+
+    if cachedir is None or len(cachedir) == 0:
+        _vocabulary_cache = None
+        return False
+
+    if os.path.isdir(cachedir) == False:
+        try:
+            os.makedirs(cachedir)
+        except Exception, e:
+            s = 'Unable to create vocabulary cache %s in %s: %s' % \
+                (cachedir, functionname, e)
+            logging.debug(s)
+            _vocabulary_cache = None
+            return False
+
+    _vocabulary_cache = cachedir
+    return True
+
+def clear_vocabularies():
+    ''' Forget the vocabularies kept in this process by load_vocabulary().
+    parameters:
+        None
+    returns:
+        None
+    '''
+    _vocabularies.clear()
+    _darwin_cloud_mappers.clear()
+
+def load_vocabulary(vocabfile, key, separator=None, dialect=None, encoding=None, 
+    fieldnames=None):
+    ''' Get a vocabulary from a file, read only if it has not been read already in this 
+        process or persisted in the vocabulary cache (see set_vocabulary_cache()) since 
+        the file last changed.
+    parameters:
+        vocabfile - full path to the vocabulary file, or a Vocabulary, which is returned
+            as is (required)
+        key - the field or separator-separated fieldnames that hold the distinct values 
+            in the vocabulary file (required)
+        separator - string to use as the value separator in the string 
+            (optional; default None)
+        dialect - csv.dialect object with the attributes of the vocabulary file 
+            (default None)
+        encoding - a string designating the input file encoding (optional; default None) 
+            (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        fieldnames - list of the field names of the vocabulary file (optional; default 
+            None for the standard vocabulary header for the key)
+    returns:
+        vocabulary - the Vocabulary, or None if there is no vocabulary file
+    '''
+    functionname = 'load_vocabulary()'
+
+    if isinstance(vocabfile, Vocabulary):
+        return vocabfile
+
+    if vocabfile is None or len(vocabfile) == 0:
+        s = 'No vocabulary file given in %s.' % functionname
+        logging.debug(s)
+        return None
+
+    if os.path.isfile(vocabfile) == False:
+        s = 'Vocabulary file %s not found in %s.' % (vocabfile, functionname)
+        logging.debug(s)
+        return None
+
+    # Set up the field names to match the standard vocabulary header
+    if fieldnames is None:
+        fieldnames = vocabheader(key, separator)
+    fieldnames = tuple(fieldnames)
+
+    stat = os.stat(vocabfile)
+    cachekey = (os.path.abspath(vocabfile), key, separator, fieldnames)
+    vocabulary = _vocabularies.get(cachekey)
+    if vocabulary is not None and vocabulary.size == stat.st_size and \
+        vocabulary.mtime == stat.st_mtime:
+        return vocabulary
+
+    cachefile = None
+    if _vocabulary_cache is not None:
+        cachefile = '%s/%s.vocabulary' % (_vocabulary_cache, 
+            hashlib.sha1(repr(cachekey)).hexdigest())
+        vocabulary = _read_vocabulary_cache(cachefile, vocabfile, stat)
+
+    if vocabulary is None:
+        vocabulary = _read_vocabulary(vocabfile, key, separator, dialect, encoding, 
+            fieldnames, stat)
+        if cachefile is not None:
+            _write_vocabulary_cache(cachefile, vocabulary)
+
+    _vocabularies[cachekey] = vocabulary
+    return vocabulary
+
+def _read_vocabulary(vocabfile, key, separator, dialect, encoding, fieldnames, stat):
+    ''' Read a Vocabulary from a file (see load_vocabulary()).'''
+    if dialect is None:
+        dialect = vocab_dialect()
+    
+    # Try to determine the encoding of the inputfile.
+    if encoding is None or len(encoding.strip()) == 0:
+        encoding = csv_file_encoding(vocabfile)
+        # csv_file_encoding() always returns an encoding if there is an input file.    
+
+    entryfields = tuple([f for f in fieldnames if f != key])
+
+    # Repeated values, such as those of vetted, share one copy
+    shared = {}
+    entries = {}
+    order = []
+
+    # Iterate through all rows in the input file
+    for row in read_csv_row(vocabfile, dialect, encoding, header=True, 
+            fieldnames=list(fieldnames)):
+        values = []
+        for field in entryfields:
+            value = row.get(field)
+            values.append(shared.setdefault(value, value))
+        entries[row[key]] = tuple(values)
+        order.append(row[key])
+
+    return Vocabulary(vocabfile, key, separator, entryfields, entries, order, 
+        stat.st_size, stat.st_mtime)
+
+def _read_vocabulary_cache(cachefile, vocabfile, stat):
+    ''' Read a Vocabulary from the vocabulary cache, if it was persisted from the 
+        current state of the vocabulary file.'''
+    functionname = '_read_vocabulary_cache()'
+
+    if os.path.isfile(cachefile) == False:
+        return None
+
+    try:
+        with open(cachefile, 'rb') as data:
+            key, separator, fieldnames, size, mtime, entries, order = \
+                pickle.load(data)
+    except Exception, e:
+        s = 'Unable to read vocabulary cache %s in %s: %s' % \
+            (cachefile, functionname, e)
+        logging.debug(s)
+        return None
+
+    if size != stat.st_size or mtime != stat.st_mtime:
+        return None
+
+    return Vocabulary(vocabfile, key, separator, fieldnames, entries, order, size, 
+        mtime)
+
+def _write_vocabulary_cache(cachefile, vocabulary):
+    ''' Persist a Vocabulary in the vocabulary cache.'''
+    functionname = '_write_vocabulary_cache()'
+
+    tempfile = '%s.%s.tmp' % (cachefile, os.getpid())
+    try:
+        with open(tempfile, 'wb') as data:
+            pickle.dump(vocabulary.state(), data, pickle.HIGHEST_PROTOCOL)
+        os.rename(tempfile, cachefile)
+    except Exception, e:
+        s = 'Unable to write vocabulary cache %s in %s: %s' % \
+            (cachefile, functionname, e)
+        logging.debug(s)
+        return False
+    return True
+
 def matching_vocab_dict_from_file(
     checklist, vocabfile, key, separator=None, dialect=None, encoding=None):
     ''' Given a checklist of values, get matching values from a vocabulary file. Values
@@ -187,7 +585,8 @@ def matching_vocab_dict_from_file(
        whitespace.
     parameters:
         checklist - list of values to get from the vocabfile (required)
-        vocabfile - full path to the vocabulary lookup file (required)
+        vocabfile - full path to the vocabulary lookup file, or a Vocabulary loaded 
+            from it (required)
         key - the field or separator-separated fieldnames that hold the distinct values 
             in the vocabulary file (required)
         separator - string to use as the value separator in the string 
@@ -209,9 +608,9 @@ def matching_vocab_dict_from_file(
 
     #print 'checklist: %s' % checklist
 
-    vocabdict = vocab_dict_from_file(vocabfile, key, separator, dialect, encoding)
+    vocabdict = load_vocabulary(vocabfile, key, separator, dialect, encoding)
     if vocabdict is None or len(vocabdict)==0:
-        s = 'No vocabdict constructed in %s' % functionname
+        s = 'No vocabulary loaded in %s' % functionname
         logging.debug(s)
         return None
 
@@ -219,31 +618,16 @@ def matching_vocab_dict_from_file(
 
     matchingvocabdict = {}
 
-    # Look through every value in the checklist
-    for value in checklist:
-        if separator is None:
-            terms = [value]
-        else:
-            try:
-                terms = value.split(separator)
-            except Exception , e:
-                s = 'Exception splitting value: %s Exception: %s ' % (value, e)
-                s += 'in %s' % functionname
-                logging.debug(s)
-                terms = [value] # cop out
-        newvalue = ''
-        n=0
-        for term in terms:
-            if n==0:
-                newvalue = ustripstr(term)
-                n=1
-            else:
-                newvalue = newvalue + separator + ustripstr(term)
+    # Look through every distinct value in the checklist
+    for value in set(checklist):
+        newvalue = normalized_vocab_key(value, separator)
 
         # If the simplified version of the value is in the dictionary, get the 
         # vocabulary entry for it.
-        if value in vocabdict or newvalue in vocabdict:
-            matchingvocabdict[value]=vocabdict[newvalue]
+        if newvalue in vocabdict:
+            matchingvocabdict[value]=vocabdict.entry(newvalue)
+        elif value in vocabdict:
+            matchingvocabdict[value]=vocabdict.entry(value)
 
     return matchingvocabdict
 
@@ -254,7 +638,8 @@ def missing_vocab_list_from_file(checklist, vocabfile, key, separator=None, dial
        stripping whitespace.
     parameters:
         checklist - list of values to get from the vocabfile (required)
-        vocabfile - full path to the vocabulary lookup file (required)
+        vocabfile - full path to the vocabulary lookup file, or a Vocabulary loaded 
+            from it (required)
         key - the field or separator-separated fieldnames that hold the distinct values 
               in the vocabulary file (required)
         separator - string to use as the value separator in the string 
@@ -273,48 +658,82 @@ def missing_vocab_list_from_file(checklist, vocabfile, key, separator=None, dial
         logging.debug(s)
         return None
 
-    vocabdict = vocab_dict_from_file(vocabfile, key, separator, dialect, encoding)
+    vocabdict = load_vocabulary(vocabfile, key, separator, dialect, encoding)
     if vocabdict is None or len(vocabdict)==0:
-        s = 'No vocabdict constructed in %s.' % functionname
+        s = 'No vocabulary loaded in %s.' % functionname
         logging.debug(s)
         return None
 
+    # The upper case, stripped version of every distinct value in the checklist
+    checkkeys = normalized_key_index(checklist, normalized_vocab_key, separator)
+
+    # Values are missing unless they or their upper case, stripped versions are in the 
+    # vocabulary
     missingvocabset = set()
+    for newvalue, values in checkkeys.iteritems():
+        if newvalue in vocabdict:
+            continue
+        for value in values:
+            if value not in vocabdict:
+                missingvocabset.add(newvalue)
+                break
+
+    return sorted(missingvocabset)
+
+def similar_vocab_dict_from_file(checklist, vocabfile, key, separator=None, 
+    dialect=None, encoding=None, count=3, minscore=0.5):
+    ''' Given a checklist of values not in a vocabulary file, get the most similar 
+       vetted values in the vocabulary for each of them, as suggestions for curation.
+    parameters:
+        checklist - list of values to find similar vocabulary values for (required)
+        vocabfile - full path to the vocabulary lookup file, or a Vocabulary loaded 
+            from it (required)
+        key - the field or separator-separated fieldnames that hold the distinct values 
+              in the vocabulary file (required)
+        separator - string to use as the value separator in the string 
+            (optional; default None)
+        dialect - csv.dialect object with the attributes of the vocabulary lookup file 
+            (default None)
+        encoding - a string designating the input file encoding (optional; default None) 
+            (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        count - the greatest number of vocabulary values to get for each value
+            (optional; default 3)
+        minscore - the least similarity score of the vocabulary values, from 0 to 1 
+            (see TrigramIndex) (optional; default 0.5)
+    returns:
+        similardict - dictionary of values in the checklist and lists of tuples of the 
+            most similar vocabulary values and their scores, best first
+    '''
+    functionname = 'similar_vocab_dict_from_file()'
 
-    # Look through every value in the checklist
-    for value in checklist:
-        if separator is None:
-            terms = [value]
-        else:
-            try:
-                terms = value.split(separator)
-            except Exception , e:
-                s = 'Exception splitting value: %s Exception: %s ' % (value, e)
-                s += 'in %s' % functionname
-                logging.debug(s)
-                terms = [value] # cop out
-        newvalue = ''
-        n=0
-        for term in terms:
-            if n==0:
-                newvalue = ustripstr(term)
-                n=1
-            else:
-                newvalue = newvalue + separator + ustripstr(term)
-        # If value or newvalue is in the vocabulary, nevermind
-        if value in vocabdict or newvalue in vocabdict:
-            pass
-        # Otherwise, add the upper case, stripped value to the list
-        else:
-            missingvocabset.add(newvalue)
+    if checklist is None or len(checklist)==0:
+        s = 'No list of values given in %s.' % functionname
+        logging.debug(s)
+        return None
 
-    return sorted(list(missingvocabset))
+    vocabdict = load_vocabulary(vocabfile, key, separator, dialect, encoding)
+    if vocabdict is None or len(vocabdict)==0:
+        s = 'No vocabulary loaded in %s.' % functionname
+        logging.debug(s)
+        return None
+
+    similardict = {}
+    for value in set(checklist):
+        try:
+            similardict[value] = vocabdict.similar(value, count, minscore)
+        except Exception, e:
+            s = 'Exception finding values similar to %s: %s ' % (value, e)
+            s += 'in %s' % functionname
+            logging.debug(s)
+            similardict[value] = []
+    return similardict
 
 def vetted_vocab_dict_from_file(vocabfile, key, separator=None, dialect=None, 
     encoding=None):
     ''' Get the vetted vocabulary as a dictionary from a file.
     parameters:
-        vocabfile - path to the vocabulary file (required)
+        vocabfile - path to the vocabulary file, or a Vocabulary loaded from it 
+            (required)
         key - the field or separator-separated fieldnames that hold the distinct values 
             in the vocabulary file (required)
         separator - string to use as the value separator in the string 
@@ -339,7 +758,8 @@ def vocab_dict_from_file(
     function=None, *args, **kwargs):
     ''' Get a vocabulary as a dictionary from a file.
     parameters:
-        vocabfile - path to the vocabulary file (required)
+        vocabfile - path to the vocabulary file, or a Vocabulary loaded from it 
+            (required)
         key - the field or separator-separated fieldnames that hold the distinct values 
             in the vocabulary file (required)
         separator - string to use as the value separator in the string 
@@ -364,55 +784,48 @@ def vocab_dict_from_file(
         logging.debug(s)
         return None
 
-    if vocabfile is None or len(vocabfile) == 0:
-        s = 'No vocabulary file given in %s.' % functionname
-        logging.debug(s)
-        return None
-
-    if os.path.isfile(vocabfile) == False:
-        s = 'Vocabulary file %s not found in %s.' % (vocabfile, functionname)
+    # No need to check for vocabfile, load_vocabulary() does that.
+    vocabulary = load_vocabulary(vocabfile, key, separator, dialect, encoding)
+    if vocabulary is None:
+        s = 'No vocabulary loaded from %s in %s.' % (vocabfile, functionname)
         logging.debug(s)
         return None
 
-    if dialect is None:
-        dialect = vocab_dialect()
-    
-    # Try to determine the encoding of the inputfile.
-    if encoding is None or len(encoding.strip()) == 0:
-        encoding = csv_file_encoding(vocabfile)
-        # csv_file_encoding() always returns an encoding if there is an input file.    
-
-    # Set up the field names to match the standard vocabulary header
-    fieldnames = vocabheader(key, separator)
-
-    # Create a dictionary to hold the vocabulary
-    vocabdict = {}
-
-    # Iterate through all rows in the input file
-    for row in read_csv_row(vocabfile, dialect, encoding, header=True, 
-            fieldnames=fieldnames):
-        # Make a complete copy of the row
-        rowdict = copy.deepcopy(row)
-        value = row[key]
-        # Remove the key from the row copy
-        rowdict.pop(key)
-        newvalue = value
-        # If we are not supposed to apply a function to the key value
-        if function is not None:
-            newvalue = function(value, *args, **kwargs)
-        vocabdict[newvalue]=rowdict
-                
-    return vocabdict
+    return vocabulary.vocab_dict(function, *args, **kwargs)
 
 def darwin_cloud_vocab_dict_from_file(vocabfile):
     ''' Get a Darwin Cloud vocabulary as a dictionary from a file.
     parameters:
-        vocabfile - path to the vocabulary file (required)
+        vocabfile - path to the vocabulary file, or a Vocabulary loaded from it 
+            (see darwin_cloud_vocabulary()) (required)
     returns:
         vocabdict - dictionary of complete vocabulary records
     '''
     functionname = 'darwin_cloud_vocab_dict_from_file()'
 
+    vocabulary = darwin_cloud_vocabulary(vocabfile)
+    if vocabulary is None:
+        s = 'No Darwin Cloud vocabulary loaded from %s in %s.' % \
+            (vocabfile, functionname)
+        logging.debug(s)
+        return None
+
+    return vocabulary.vocab_dict()
+
+def darwin_cloud_vocabulary(vocabfile):
+    ''' Get a Darwin Cloud vocabulary from a file, with the header and dialect of the 
+        file, keyed on fieldname (see load_vocabulary()).
+    parameters:
+        vocabfile - path to the vocabulary file, or a Vocabulary, which is returned as 
+            is (required)
+    returns:
+        vocabulary - the Vocabulary, or None if there is no vocabulary file
+    '''
+    functionname = 'darwin_cloud_vocabulary()'
+
+    if isinstance(vocabfile, Vocabulary):
+        return vocabfile
+
     if vocabfile is None or len(vocabfile) == 0:
         s = 'No vocabulary file given in %s.' % functionname
         logging.debug(s)
@@ -424,22 +837,121 @@ def darwin_cloud_vocab_dict_from_file(vocabfile):
         return None
 
     dialect = csv_file_dialect(vocabfile)
+    header = read_header(vocabfile, dialect=dialect, encoding='utf8')
 
-    # Create a dictionary to hold the vocabulary
-    vocabdict = {}
+    return load_vocabulary(vocabfile, 'fieldname', dialect=dialect, encoding='utf-8', 
+        fieldnames=header)
+
+class DarwinCloudMapper(object):
+    ''' A Darwin Cloud vocabulary made into a table of the standard term and namespace 
+        for each field name that has a standard, for darwinizing many headers against 
+        the same vocabulary. The darwinized headers are kept, so that files with the same
+        header are darwinized once. Get instances through darwin_cloud_mapper(), which 
+        keeps them for reuse.
+    attributes:
+        vocabulary - the Darwin Cloud Vocabulary the mapper was made from
+    '''
+    def __init__(self, vocabulary, cachesize=1000):
+        self.vocabulary = vocabulary
+        # Dictionary of field names and tuples of their standard terms and namespaces
+        self._standards = {}
+        for fieldname in vocabulary:
+            entry = vocabulary.entry(fieldname)
+            standard = entry.get('standard')
+            if standard is not None and len(standard.strip()) > 0:
+                self._standards[fieldname] = (standard, entry.get('namespace'))
+        # Darwinized headers by the headers and whether namespaces were added
+        self._headers = LRUCache(cachesize)
+
+    def __len__(self):
+        return len(self._standards)
+
+    def darwinize(self, termlist, namespace=None):
+        ''' Translate the terms in a list to standard Darwin Core terms (see 
+            darwinize_list()).
+        parameters:
+            termlist - list of values to translate (required)
+            namespace - prepend the namespace to darwinized terms if it contains 'y' 
+                (optional; default None)
+        returns:
+            a list with all translatable terms translated
+        '''
+        addnamespace = namespace is not None and 'y' in namespace
+        cachekey = (tuple(termlist), addnamespace)
+        darwinized = self._headers.get(cachekey)
+        if darwinized is not None:
+            return list(darwinized)
+
+        darwinized = []
+        j = 1
+        for term in termlist:
+            mapped = self._standards.get(ustripstr(term))
+            if mapped is not None:
+                if addnamespace == True:
+                    newterm = mapped[1] + ':' + mapped[0]
+                else:
+                    newterm = mapped[0]
+            else:
+                newterm = term.strip()
+                if len(newterm) == 0 and ustripstr(term) not in self.vocabulary:
+                    newterm = 'UNNAMED_COLUMN_%s' % j
+                    j += 1
+            darwinized.append(newterm)
+
+        self._headers.set(cachekey, tuple(darwinized))
+        return darwinized
+
+def darwin_cloud_mapper(dwccloudfile):
+    ''' Get a DarwinCloudMapper for a Darwin Cloud vocabulary file, made only if it has 
+        not been made already in this process since the file last changed.
+    parameters:
+        dwccloudfile - the vocabulary file for the Darwin Cloud, a Vocabulary loaded from
+            it, or a DarwinCloudMapper, which is returned as is (required)
+    returns:
+        mapper - the DarwinCloudMapper, or None if there is no vocabulary file
+    '''
+    functionname = 'darwin_cloud_mapper()'
 
-    header = read_header(vocabfile, dialect=dialect, encoding='utf8')
+    if isinstance(dwccloudfile, DarwinCloudMapper):
+        return dwccloudfile
+
+    if isinstance(dwccloudfile, Vocabulary):
+        vocabulary = dwccloudfile
+        cachekey = os.path.abspath(vocabulary.vocabfile)
+        mapper = _darwin_cloud_mappers.get(cachekey)
+        if mapper is None or mapper.vocabulary is not vocabulary:
+            mapper = DarwinCloudMapper(vocabulary)
+            _darwin_cloud_mappers[cachekey] = mapper
+        return mapper
 
-    # Iterate through all rows in the input file. Let read_csv_row figure out the dialect
-    for row in read_csv_row(vocabfile, dialect=dialect, encoding='utf-8', header=True, 
-            fieldnames=header):
-        # Make a complete copy of the row
-        rowdict = copy.deepcopy(row)
-        key = row['fieldname']
-        # Remove the key from the row copy
-        rowdict.pop('fieldname')
-        vocabdict[key]=rowdict                
-    return vocabdict
+    if dwccloudfile is None or len(dwccloudfile) == 0:
+        s = 'No vocabulary file given in %s.' % functionname
+        logging.debug(s)
+        return None
+
+    if os.path.isfile(dwccloudfile) == False:
+        s = 'Vocabulary file %s not found in %s.' % (dwccloudfile, functionname)
+        logging.debug(s)
+        return None
+
+    # A mapper made from the file since it last changed needs no vocabulary at all
+    stat = os.stat(dwccloudfile)
+    cachekey = os.path.abspath(dwccloudfile)
+    mapper = _darwin_cloud_mappers.get(cachekey)
+    if mapper is not None and mapper.vocabulary.size == stat.st_size and \
+        mapper.vocabulary.mtime == stat.st_mtime:
+        return mapper
+
+    vocabulary = darwin_cloud_vocabulary(dwccloudfile)
+    if vocabulary is None:
+        s = 'No Darwin Cloud vocabulary loaded from %s in %s.' % \
+            (dwccloudfile, functionname)
+        logging.debug(s)
+        return None
+
+    mapper = DarwinCloudMapper(vocabulary)
+    _darwin_cloud_mappers[cachekey] = mapper
+    return mapper
 
 def term_values_recommended(lookupdict):
     ''' Get non-standard values and their standard equivalents from a lookupdict
@@ -542,15 +1054,18 @@ def terms_not_in_dwc(checklist, casesensitive=False):
     returns:
         a sorted list of non-Darwin Core terms from the checklist
     '''
+    global _dwctermset, _dwctermkeyset
+
+    # The Darwin Core term sets are made once and shared by all calls
+    if _dwctermset is None:
+        _dwctermset = frozenset(simpledwctermlist)
+        _dwctermkeyset = frozenset(normalized_key_index(simpledwctermlist, ustripstr))
+
     # No need to check if checklist is given, not_in_list() does that
     if casesensitive==True:
-        return not_in_list(simpledwctermlist, checklist)
-
-    lowerdwc = []
-    for term in simpledwctermlist:
-        lowerdwc.append(ustripstr(term))
+        return not_in_list(_dwctermset, checklist)
 
-    notfound = not_in_list(lowerdwc,checklist,function=ustripstr)
+    notfound = not_in_list(_dwctermkeyset, checklist, function=ustripstr)
     return notfound
 
 def terms_not_in_darwin_cloud(checklist, dwccloudfile, encoding=None, vetted=True, 
@@ -561,7 +1076,8 @@ def terms_not_in_darwin_cloud(checklist, dwccloudfile, encoding=None, vetted=Tru
         should have the case-sensitive standard value.
     parameters:
         checklist - list of values to check against the target list (required)
-        dwccloudfile - the vocabulary file for the Darwin Cloud (required)
+        dwccloudfile - the vocabulary file for the Darwin Cloud, or a Vocabulary 
+            loaded from it (required)
         vetted - set to False if unvetted values should also be returned (default True)
         encoding - a string designating the input file encoding (optional; default None) 
             (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
@@ -575,12 +1091,14 @@ def terms_not_in_darwin_cloud(checklist, dwccloudfile, encoding=None, vetted=Tru
         logging.debug(s)
         return None
 
-    dialect = csv_file_dialect(dwccloudfile)
+    dialect = None
+    if not isinstance(dwccloudfile, Vocabulary):
+        dialect = csv_file_dialect(dwccloudfile)
     
-    # Try to determine the encoding of the inputfile.
-    if encoding is None or len(encoding.strip()) == 0:
-        encoding = csv_file_encoding(dwccloudfile)
-        # csv_file_encoding() always returns an encoding if there is an input file.    
+        # Try to determine the encoding of the inputfile.
+        if encoding is None or len(encoding.strip()) == 0:
+            encoding = csv_file_encoding(dwccloudfile)
+            # csv_file_encoding() always returns an encoding if there is an input file.
 
     # No need to check if dwccloudfile is given and exists, vocab_dict_from_file() and
     # vetted_vocab_dict_from_file() do that.
@@ -591,18 +1109,12 @@ def terms_not_in_darwin_cloud(checklist, dwccloudfile, encoding=None, vetted=Tru
         darwinclouddict = vocab_dict_from_file(dwccloudfile, 'fieldname', 
             dialect=dialect, encoding=encoding)
 
-    dwcloudlist = []
-    for key, value in darwinclouddict.iteritems():
-        dwcloudlist.append(key)
-
     if casesensitive==True:
-        return not_in_list(dwcloudlist, checklist)
+        return not_in_list(darwinclouddict.viewkeys(), checklist)
 
-    lowerdwclist = []
-    for term in dwcloudlist:
-        lowerdwclist.append(ustripstr(term))
+    lowerdwcset = frozenset(normalized_key_index(darwinclouddict, ustripstr))
 
-    notfound = not_in_list(lowerdwclist, checklist, function=ustripstr)
+    notfound = not_in_list(lowerdwcset, checklist, function=ustripstr)
 
     return notfound
 
@@ -610,9 +1122,10 @@ def darwinize_list(termlist, dwccloudfile, namespace=None):
     ''' Translate the terms in a list to standard Darwin Core terms.
     parameters:
         termlist - list of values to translate (required)
-        dwccloudfile - the vocabulary file for the Darwin Cloud (required)
-        encoding - a string designating the input file encoding (optional; default None) 
-            (e.g., 'utf-8', 'mac_roman', 'latin_1', 'cp1252')
+        dwccloudfile - the vocabulary file for the Darwin Cloud, a Vocabulary loaded 
+            from it, or a DarwinCloudMapper made from it (required)
+        namespace - prepend the namespace to darwinized terms if it contains 'y' 
+            (optional; default None)
     returns:
         a list with all translatable terms translated
     '''
@@ -623,48 +1136,16 @@ def darwinize_list(termlist, dwccloudfile, namespace=None):
         logging.debug(s)
         return None
 
-    dialect = csv_file_dialect(dwccloudfile)
-
-    # No need to check if dwccloudfile is given and exists, vetted_vocab_dict_from_file() 
-    # does that.
-    darwinclouddict = darwin_cloud_vocab_dict_from_file(dwccloudfile)
+    # No need to check if dwccloudfile is given and exists, darwin_cloud_mapper() does
+    # that.
+    mapper = darwin_cloud_mapper(dwccloudfile)
 
-    if darwinclouddict is None:
+    if mapper is None:
         s = 'No Darwin Cloud terms in %s.' % functionname
         logging.debug(s)
         return None
 
-    thelist = []
-    for term in termlist:
-        thelist.append(ustripstr(term))
-
-    addnamespace = False
-    if namespace is not None and 'y' in namespace:
-        addnamespace = True
-
-    darwinizedlist = []
-    i = 0
-    j = 1
-    for term in thelist:
-        if term in darwinclouddict:
-            if darwinclouddict[term]['standard'] is not None and \
-                len(darwinclouddict[term]['standard'].strip()) > 0:
-                if addnamespace == True:
-                    ns = darwinclouddict[term]['namespace']
-                    newterm = ns + ':' + darwinclouddict[term]['standard']
-                else:
-                    newterm = darwinclouddict[term]['standard']
-            else:
-                newterm = termlist[i].strip()
-        else:
-            newterm = termlist[i].strip()
-            if len(newterm) == 0:
-                newterm = 'UNNAMED_COLUMN_%s' % j
-                j += 1
-        darwinizedlist.append(newterm)
-        i += 1
-
-    return darwinizedlist
+    return mapper.darwinize(termlist, namespace)
 
 def not_in_list(targetlist, checklist, function=None, *args, **kwargs):
     ''' Get the list of distinct values in a checklist that are not in a target list.
@@ -674,7 +1155,8 @@ def not_in_list(targetlist, checklist, function=None, *args, **kwargs):
        not_in_list(a,b,function=ustripstr) would return all of the stripped, uppercased
        items in b that are not in a. The items in a do not have the function applied.
     parameters:
-        targetlist - list to check to see if the value already exists there (required)
+        targetlist - list, set or dictionary keys to check to see if the value already 
+            exists there (required)
         checklist - list of values to check against the target list (required)
         function - function to call for each value to compare (default None)
         args - unnamed parameters to function as tuple (optional)
@@ -694,25 +1176,76 @@ def not_in_list(targetlist, checklist, function=None, *args, **kwargs):
         logging.debug(s)
         return sorted(checklist)
 
-    newlist = []
+    # Membership in sets and dictionaries does not depend on their size
+    if not isinstance(targetlist, (set, frozenset, dict, type({}.viewkeys()))):
+        targetlist = frozenset(targetlist)
 
     if function is None:
-        for v in checklist:
-            if v not in targetlist:
-                newlist.append(v)
+        newset = set(checklist)
     else:
-        for v in checklist:
+        newset = set(normalized_key_index(checklist, function, *args, **kwargs))
+
+    newset.difference_update(targetlist)
+    newset.discard('')
+
+    return sorted(newset)
+
+def normalized_key_index(values, function=None, *args, **kwargs):
+    ''' Get an index of distinct values by the keys made from them by a function, so that 
+        the function is called once for each distinct value and the keys can be compared 
+        as a set.
+    parameters:
+        values - list of values to index (required)
+        function - function to call for each value to make its key (default None)
+        args - unnamed parameters to function as tuple (optional)
+        kwargs - named parameters to function as dictionary (optional)
+    returns:
+        index - dictionary of keys and the sets of values that have them; values for 
+            which the function fails are their own keys
+    '''
+    index = {}
+    if values is None:
+        return index
+
+    for v in set(values):
+        if function is None:
+            newvalue = v
+        else:
             try:
                 newvalue = function(v, *args, **kwargs)
             except:
                 newvalue = v
-            if newvalue not in targetlist:
-                newlist.append(newvalue)
+        try:
+            index[newvalue].add(v)
+        except KeyError:
+            index[newvalue] = set([v])
+
+    return index
+
+def normalized_vocab_key(value, separator=None):
+    ''' Make the key for a value to look up in a vocabulary: the value stripped and upper 
+        case, or if there is a separator, each of its parts stripped and upper case.
+    parameters:
+        value - the value to make the key for (required)
+        separator - string to use as the value separator in the string 
+            (optional; default None)
+    returns:
+        the key for the value
+    '''
+    functionname = 'normalized_vocab_key()'
+
+    if separator is None:
+        return ustripstr(value)
 
-    if '' in newlist:
-        newlist.remove('')
+    try:
+        terms = value.split(separator)
+    except Exception , e:
+        s = 'Exception splitting value: %s Exception: %s ' % (value, e)
+        s += 'in %s' % functionname
+        logging.debug(s)
+        return ustripstr(value) # cop out
 
-    return sorted(newlist)
+    return separator.join([ustripstr(term) for term in terms])
 
 def distinct_vocabs_to_file(vocabfile, valuelist, key, separator=None, dialect=None):
     ''' Add distinct new verbatim values from a valuelist to a vocabulary file. Always 
@@ -749,7 +1282,7 @@ def distinct_vocabs_to_file(vocabfile, valuelist, key, separator=None, dialect=N
         dialect=dialect, encoding='utf-8')
 
     # Get the values not already in the vocab file
-    newvaluelist = not_in_list(vocablist, valuelist)
+    newvaluelist = not_in_list(frozenset(vocablist or []), valuelist)
 
     if newvaluelist is None or len(newvaluelist) == 0:
         s = 'No new values found for %s in %s' % (vocabfile, functionname)
@@ -15,17 +15,46 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "dwcareader_utils.py 2017-07-19T09:24-07:00"
+__version__ = "dwcareader_utils.py 2026-10-19T09:20-04:00"
 __kurator_content_type__ = "utility"
 __adapted_from__ = ""
 
 # This file contains common utility functions for dealing with the content of a Darwin
 # Core archive.
 
+from dwca_utils import indexed_line_count
+from dwca_utils import ColumnStoreWriter
+from dwca_utils import line_index
+from dwca_utils import tsv_dialect
+from dwca_utils import write_header
+from dwca_vocab_utils import dwc_ordered_header
+from operator import itemgetter
 import os.path
 import glob
+import codecs
+import hashlib
+import logging
+import struct
+import zipfile
+import zlib
 import xml.etree.ElementTree as ET
 
+# Replace the system csv with unicodecsv. All invocations of csv will use unicodecsv,
+# which supports reading and writing unicode streams.
+try:
+    import unicodecsv as csv
+except ImportError:
+    import warnings
+    s = "The unicodecsv package is required.\n"
+    s += "pip install unicodecsv\n"
+    s += "$JYTHON_HOME/bin/pip install unicodecsv"
+    warnings.warn(s)
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 # Requires the Python Darwin Core Archive Reader from 
 #   https://github.com/BelgianBiodiversityPlatform/python-dwca-reader
 try:
@@ -41,6 +70,17 @@ except ImportError:
     s += "$JYTHON_HOME/bin/pip install python-dwca-reader"
     warnings.warn(s)
 
+# Dictionary of fully qualified term identifiers and their term names, made from TERMS 
+# when first needed (see shortname())
+_shortnames = None
+
+# Inspections of archives already made in this process, by archive checksum (see 
+# inspect_archive())
+_inspections = {}
+
+# Full path to the directory in which archive inspections are persisted, if any.
+_inspection_cache = None
+
 def dwca_metadata(dwcareader):
     ''' Return metadata from Darwin Core Archive Reader.'''
     if dwcareader is None:
@@ -55,6 +95,11 @@ def dwca_metadata_from_file(inputfile, archivetype=None):
     if inputfile is None or len(inputfile.strip())==0:
         return None
 
+    # Read the metadata file straight from the archive if it has a meta.xml
+    inspection = inspect_archive(inputfile)
+    if inspection is not None and inspection['metadata'] is not None:
+        return ET.fromstring(inspection['metadata'])
+
     # Make an appropriate reader based on whether the archive is standard or a GBIF
     # download.
     dwcareader = None
@@ -97,6 +142,12 @@ def get_core_rowcount_from_file(inputfile, archivetype=None):
     ''' Return number of rows in the core file of a Darwin Core Archive file.'''
     if inputfile is None or len(inputfile.strip())==0:
         return None
+
+    # Count the lines of the core straight from the archive if it has a meta.xml
+    inspection = inspect_archive(inputfile)
+    if inspection is not None and inspection['corerowcount'] is not None:
+        return inspection['corerowcount']
+
     # Make an appropriate reader based on whether the archive is standard or a GBIF
     # download.
     dwcareader = None
@@ -121,6 +172,140 @@ def get_core_rowcount_from_file(inputfile, archivetype=None):
     dwcareader.close()
     return rowcount
 
+def set_inspection_cache(cachedir):
+    ''' Set the directory in which archive inspections made by inspect_archive() are 
+        persisted, so that other processes do not have to inspect the archives again.
+    parameters:
+        cachedir - full path to the directory. It will be created if it does not 
+            exist. If None, stop persisting inspections (required)
+    returns:
+        True if the inspection cache is in use, otherwise False
+    '''
+    global _inspection_cache
+    functionname = 'set_inspection_cache()'
+
+    if cachedir is None or len(cachedir) == 0:
+        _inspection_cache = None
+        return False
+
+    if os.path.isdir(cachedir) == False:
+        try:
+            os.makedirs(cachedir)
+        except Exception, e:
+            s = 'Unable to create inspection cache %s in %s: %s' % \
+                (cachedir, functionname, e)
+            logging.debug(s)
+            _inspection_cache = None
+            return False
+
+    _inspection_cache = cachedir
+    return True
+
+def clear_inspections():
+    ''' Forget the archive inspections kept in this process by inspect_archive().
+    parameters:
+        None
+    returns:
+        None
+    '''
+    _inspections.clear()
+
+def archive_checksum(inputfile):
+    ''' Get a checksum of the content of a zip file from the names, CRC-32 checksums and
+       sizes of its members in the central directory, without decompressing anything.
+    parameters:
+        inputfile - full path to the zip file (required)
+    returns:
+        checksum - a hexadecimal SHA-1 digest, or None if the file is not a zip file
+    '''
+    functionname = 'archive_checksum()'
+
+    try:
+        with zipfile.ZipFile(inputfile) as archive:
+            members = sorted([(i.filename, i.CRC, i.file_size) \
+                for i in archive.infolist()])
+    except Exception, e:
+        s = 'Unable to read archive %s in %s: %s' % (inputfile, functionname, e)
+        logging.debug(s)
+        return None
+
+    return hashlib.sha1(repr(members)).hexdigest()
+
+def inspect_archive(inputfile):
+    ''' Get the descriptions of the data files, the metadata and the number of rows in 
+       the core of a Darwin Core archive, reading only meta.xml, the metadata file and 
+       the decompressed core from the zip file. Inspections are kept by archive checksum
+       (see archive_checksum()) in this process and in the inspection cache, if any 
+       (see set_inspection_cache()), so an archive is inspected only once.
+    parameters:
+        inputfile - full path to the Darwin Core archive file (required)
+    returns:
+        inspection - a dictionary of the checksum, descriptors (see 
+            dwca_file_descriptors()), metadata (the content of the metadata file, or 
+            None if there is none) and corerowcount (see dwca_file_rowcount()), or None 
+            if the archive has no meta.xml
+    '''
+    functionname = 'inspect_archive()'
+
+    checksum = archive_checksum(inputfile)
+    if checksum is None:
+        return None
+
+    inspection = _inspections.get(checksum)
+    if inspection is not None:
+        return inspection
+
+    cachefile = None
+    if _inspection_cache is not None:
+        cachefile = '%s/%s.inspection' % (_inspection_cache, checksum)
+        inspection = _read_inspection_cache(cachefile)
+
+    if inspection is None:
+        descriptors = dwca_file_descriptors(inputfile)
+        if descriptors is None:
+            return None
+
+        corerowcount = None
+        if len(descriptors) > 0 and descriptors[0]['core'] == True and \
+            descriptors[0]['location'] is not None:
+            corerowcount = dwca_file_rowcount(inputfile, descriptors[0])
+
+        inspection = {'checksum':checksum, 'descriptors':descriptors, 
+            'metadata':_archive_metadata(inputfile), 'corerowcount':corerowcount}
+        if cachefile is not None:
+            _write_inspection_cache(cachefile, inspection)
+
+    _inspections[checksum] = inspection
+    return inspection
+
+def dwca_file_rowcount(inputfile, descriptor, blocksize=1048576):
+    ''' Count the rows of a data file in a Darwin Core archive as the line terminators in
+       the decompressed file, less the header lines, without splitting it into lines. A
+       last line without a terminator is counted.
+    parameters:
+        inputfile - full path to the Darwin Core archive file (required)
+        descriptor - a dictionary describing the data file (see dwca_file_descriptors())
+            (required)
+        blocksize - the number of bytes to read at a time (optional; default 1048576)
+    returns:
+        rowcount - the number of rows after the header lines
+    '''
+    # The last character of the terminator ends every line, even of files written with
+    # '\n' rather than the '\r\n' declared
+    terminator = str(descriptor['lineterminator'])[-1:] or '\n'
+    linecount = 0
+    last = ''
+    with zipfile.ZipFile(inputfile) as archive:
+        with archive.open(descriptor['location'], 'r') as data:
+            block = data.read(blocksize)
+            while block:
+                linecount += block.count(terminator)
+                last = block[-1]
+                block = data.read(blocksize)
+    if len(last) > 0 and last != terminator:
+        linecount += 1
+    return max(linecount - descriptor['ignoreheaderlines'], 0)
+
 def shortname(qualname):
     ''' Get a term name from a fully qualified term identifier.
     parameters:
@@ -128,12 +313,12 @@ def shortname(qualname):
             (e.g., 'http://rs.tdwg.org/dwc/terms/catalogNumber')
     returns:
         qualname.rpartition('/')[2] - the term name part of the identifier 
-            (e.g., 'catalogNumber')
+            (e.g., 'catalogNumber'), or None if the identifier is not in TERMS
     '''
-    for t in TERMS:
-        if t==qualname:
-            return t.rpartition('/')[2]
-    return None
+    global _shortnames
+    if _shortnames is None:
+        _shortnames = dict([(t, t.rpartition('/')[2]) for t in TERMS])
+    return _shortnames.get(qualname)
 
 def short_term_names(termlist):
     ''' Get a list of term names that are the short versions of the fully qualified 
@@ -146,11 +331,847 @@ def short_term_names(termlist):
             (e.g., 'catalogNumber')
     '''
     shortnamelist=[]
-    for i in range(len(termlist)):
-        longname=termlist[i]
+    for longname in termlist:
         sname=shortname(longname)
         if sname is None:
             shortnamelist.append(longname)
         else:
             shortnamelist.append(sname)
     return shortnamelist
+
+def short_term_name_map(termlist):
+    ''' Get a dictionary of fully qualified term identifiers and the names to use for 
+       them, to resolve them once instead of for every row.
+    parameters:
+        termlist - a list of fully qualified term identifiers
+            (e.g., 'http://rs.tdwg.org/dwc/terms/catalogNumber')
+    returns:
+        shortnamemap - dictionary of term identifiers and their term names without 
+            qualifications (e.g., 'catalogNumber'), or the identifiers themselves if 
+            they are not in TERMS
+    '''
+    return dict(zip(termlist, short_term_names(termlist)))
+
+def dwca_file_descriptors(inputfile):
+    ''' Get the descriptions of the data files in a Darwin Core archive from its meta.xml,
+       read directly from the zip file without extracting the archive.
+    parameters:
+        inputfile - full path to the Darwin Core archive file (required)
+    returns:
+        descriptors - a list of dictionaries, the core first, then the extensions, with
+            the rowtype, location (of the member in the zip file), encoding, delimiter, 
+            quotechar, lineterminator, ignoreheaderlines, idindex (of the id column of 
+            the core or the coreid column of an extension), core (True for the core) 
+            and fields (list of dictionaries of term, index and default), or None if 
+            the archive has no meta.xml
+    '''
+    functionname = 'dwca_file_descriptors()'
+
+    if inputfile is None or os.path.isfile(inputfile) == False:
+        s = 'Archive %s not found in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    try:
+        with zipfile.ZipFile(inputfile) as archive:
+            metaname = _archive_member(archive, 'meta.xml')
+            if metaname is None:
+                s = 'No meta.xml in archive %s in %s.' % (inputfile, functionname)
+                logging.debug(s)
+                return None
+            metaxml = archive.read(metaname)
+            members = archive.namelist()
+    except Exception, e:
+        s = 'Unable to read archive %s in %s: %s' % (inputfile, functionname, e)
+        logging.debug(s)
+        return None
+
+    return meta_descriptors(metaxml, metaname, members)
+
+def meta_descriptors(metaxml, metaname='meta.xml', members=None):
+    ''' Get the descriptions of the data files in a Darwin Core archive from the content
+       of its meta.xml.
+    parameters:
+        metaxml - the content of the meta.xml file (required)
+        metaname - the name of the meta.xml member in the zip file 
+            (optional; default 'meta.xml')
+        members - list of the names of the members of the zip file, to find the first
+            location of a data file that is in the archive (optional; default None to 
+            take the first location given)
+    returns:
+        descriptors - a list of dictionaries, as from dwca_file_descriptors()
+    '''
+    root = ET.fromstring(metaxml)
+
+    # The data files are described relative to the directory of meta.xml
+    metapath = metaname[:-len('meta.xml')]
+
+    descriptors = []
+    for section in root:
+        sectiontype = _local_tag(section)
+        if sectiontype not in ['core', 'extension']:
+            continue
+        descriptor = {}
+        descriptor['core'] = sectiontype == 'core'
+        descriptor['rowtype'] = section.get('rowType')
+        descriptor['encoding'] = section.get('encoding') or 'utf-8'
+        # Defaults are those of the python-dwca-reader, so that archives read either way
+        # give the same values
+        descriptor['delimiter'] = _xml_attribute(section, 'fieldsTerminatedBy', '\t')
+        descriptor['quotechar'] = _xml_attribute(section, 'fieldsEnclosedBy', '')
+        descriptor['lineterminator'] = _xml_attribute(section, 'linesTerminatedBy', '\n')
+        try:
+            descriptor['ignoreheaderlines'] = int(section.get('ignoreHeaderLines') or 0)
+        except ValueError:
+            descriptor['ignoreheaderlines'] = 0
+        descriptor['location'] = None
+        descriptor['idindex'] = None
+        descriptor['fields'] = []
+        for element in section:
+            tag = _local_tag(element)
+            if tag == 'files':
+                for location in element:
+                    if _local_tag(location) == 'location' and location.text:
+                        name = metapath + location.text.strip()
+                        if members is None or name in members:
+                            descriptor['location'] = name
+                            break
+            elif tag in ['id', 'coreid'] and element.get('index') is not None:
+                descriptor['idindex'] = int(element.get('index'))
+            elif tag == 'field':
+                index = element.get('index')
+                if index is not None and len(index.strip()) > 0:
+                    index = int(index)
+                else:
+                    index = None
+                descriptor['fields'].append({'term':element.get('term'), 
+                    'index':index, 'default':element.get('default')})
+        if sectiontype == 'core':
+            descriptors.insert(0, descriptor)
+        else:
+            descriptors.append(descriptor)
+
+    return descriptors
+
+def dwca_file_rows(inputfile, descriptor, data=None, errors=None, errorcounts=None):
+    ''' Get the rows of a data file in a Darwin Core archive as lists of values, streamed
+       from the zip file without extracting the archive. Rows are split as the 
+       python-dwca-reader splits them.
+    parameters:
+        inputfile - full path to the Darwin Core archive file (required)
+        descriptor - a dictionary describing the data file (see dwca_file_descriptors())
+            (required)
+        data - the data file already open for reading, such as a member of a ZipStream
+            (optional; default None to open it from the inputfile)
+        errors - what to do with a row that cannot be decoded: 'skip' it, 'replace' the 
+            bytes that cannot be decoded with U+FFFD, as the python-dwca-reader does, or
+            raise a UnicodeDecodeError with 'strict' (optional; default 'replace')
+        errorcounts - dictionary in which to count the 'skipped' and 'replaced' rows 
+            (optional; default None)
+    returns:
+        a generator of lists of unicode values, one per row after the header lines
+    '''
+    functionname = 'dwca_file_rows()'
+
+    if errors is None:
+        errors = 'replace'
+    delimiter = descriptor['delimiter']
+    quotechar = descriptor['quotechar']
+    encoding = descriptor['encoding']
+    for line in dwca_file_lines(inputfile, descriptor, data):
+        try:
+            line = line.decode(encoding)
+        except UnicodeDecodeError:
+            if errors == 'strict':
+                raise
+            if errors == 'skip':
+                if errorcounts is not None:
+                    errorcounts['skipped'] = errorcounts.get('skipped', 0) + 1
+                s = 'Skipped undecodable row in %s of %s in %s.' % \
+                    (descriptor['location'], inputfile, functionname)
+                logging.debug(s)
+                continue
+            if errorcounts is not None:
+                errorcounts['replaced'] = errorcounts.get('replaced', 0) + 1
+            line = line.decode(encoding, 'replace')
+        if len(quotechar) > 0:
+            yield [f.strip(quotechar) for f in line.split(delimiter)]
+        else:
+            yield line.split(delimiter)
+
+def dwca_file_lines(inputfile, descriptor, data=None):
+    ''' Get the lines of a data file in a Darwin Core archive as they are in the file, 
+       without line endings, streamed from the zip file without extracting the archive.
+       Header lines and empty lines are skipped.
+    parameters:
+        inputfile - full path to the Darwin Core archive file (required)
+        descriptor - a dictionary describing the data file (see dwca_file_descriptors())
+            (required)
+        data - the data file already open for reading lines with universal newlines,
+            such as a member of a ZipStream (optional; default None to open it from 
+            the inputfile)
+    returns:
+        a generator of the lines of the file after the header lines
+    '''
+    if data is None:
+        with zipfile.ZipFile(inputfile) as archive:
+            with archive.open(descriptor['location'], 'rU') as data:
+                for line in dwca_file_lines(inputfile, descriptor, data):
+                    yield line
+        return
+
+    lineending = str(descriptor['lineterminator'] + '\r\n')
+    skip = descriptor['ignoreheaderlines']
+    for line in data:
+        if skip > 0:
+            skip -= 1
+            continue
+        line = line.rstrip(lineending)
+        if len(line) > 0:
+            yield line
+
+def copy_dwca_file_data(inputfile, descriptor, outfile, blocksize=1048576, data=None,
+    lineterminator=None):
+    ''' Copy the content of a data file in a Darwin Core archive after its header lines, 
+       in blocks. As in dwca_file_lines(), carriage returns, newlines and both together 
+       end lines, and empty lines are skipped. The copy ends with a line terminator even
+       if the file does not.
+    parameters:
+        inputfile - full path to the Darwin Core archive file (required)
+        descriptor - a dictionary describing the data file (see dwca_file_descriptors())
+            (required)
+        outfile - the open file to write to (required)
+        blocksize - the number of bytes to copy at a time (optional; default 1048576)
+        data - the data file already open for reading, such as a member of a ZipStream
+            (optional; default None to open it from the inputfile)
+        lineterminator - the line terminator to write (optional; default None for the 
+            line terminator of the file)
+    returns:
+        linecount - the number of lines written
+    '''
+    if data is None:
+        with zipfile.ZipFile(inputfile) as archive:
+            with archive.open(descriptor['location'], 'r') as data:
+                return copy_dwca_file_data(inputfile, descriptor, outfile, blocksize, 
+                    data, lineterminator)
+
+    if lineterminator is None:
+        lineterminator = descriptor['lineterminator']
+    lineterminator = str(lineterminator)
+    linecount = 0
+    skip = descriptor['ignoreheaderlines']
+    # A carriage return at the end of a block may be the start of a line ending that
+    # ends in the next block
+    pending = ''
+    linestart = True
+    block = data.read(blocksize)
+    while block:
+        block = pending + block
+        pending = ''
+        more = data.read(blocksize)
+        if more and block.endswith('\r'):
+            pending = '\r'
+            block = block[:-1]
+        if '\r' in block:
+            block = block.replace('\r\n', '\n').replace('\r', '\n')
+        # Skip the header lines, which may end in a later block
+        while skip > 0 and len(block) > 0:
+            position = block.find('\n')
+            if position < 0:
+                block = ''
+            else:
+                block = block[position + 1:]
+                skip -= 1
+        while '\n\n' in block:
+            block = block.replace('\n\n', '\n')
+        if linestart:
+            block = block.lstrip('\n')
+        if len(block) > 0:
+            linecount += block.count('\n')
+            linestart = block.endswith('\n')
+            if lineterminator != '\n':
+                block = block.replace('\n', lineterminator)
+            outfile.write(block)
+        block = more
+    if linestart == False:
+        outfile.write(lineterminator)
+        linecount += 1
+    return linecount
+
+def dwca_file_columns(descriptor, idcolumn=None):
+    ''' Get the columns to write for a data file in a Darwin Core archive, with term names
+       without qualification, ordered as they are in Darwin Core.
+    parameters:
+        descriptor - a dictionary describing the data file (see dwca_file_descriptors())
+            (required)
+        idcolumn - name of a first column to hold the id (or coreid) of the rows 
+            (optional; default None for no id column)
+    returns:
+        columns - a list of dictionaries with the name of each column, and the index of 
+            the value in the data file or the default value for the column
+    '''
+    # Resolve the field names without full qualification once for the file
+    termnames = [f['term'] for f in descriptor['fields']]
+    shortnamemap = short_term_name_map(termnames)
+
+    sources = {}
+    for f in descriptor['fields']:
+        sources[shortnamemap[f['term']]] = f
+
+    columns = []
+    if idcolumn is not None and descriptor['idindex'] is not None:
+        columns.append({'name':idcolumn, 'index':descriptor['idindex'], 'default':None})
+    for name in dwc_ordered_header([shortnamemap[t] for t in termnames]):
+        columns.append({'name':name, 'index':sources[name]['index'], 
+            'default':sources[name]['default']})
+    return columns
+
+def write_dwca_file_tsv(inputfile, descriptor, outputfile, idcolumn=None, 
+    indexfile=None, data=None, errors=None, errorcounts=None, columnstore=False):
+    ''' Create a tsv file from a data file in a Darwin Core archive, streamed from the zip
+       file without extracting the archive. A file that is already tab-separated utf-8 
+       without enclosing quotes is copied without decoding its values, as a block if its 
+       columns are already in output order and no column store is to be written.
+    parameters:
+        inputfile - full path to the Darwin Core archive file (required)
+        descriptor - a dictionary describing the data file (see dwca_file_descriptors())
+            (required)
+        outputfile - full path to the tsv file to write (required)
+        idcolumn - name of a first column to hold the id (or coreid) of the rows 
+            (optional; default None for no id column)
+        indexfile - full path to a file in which to write the ids (or coreids) of the 
+            rows and the byte offsets of the rows in the output file, sorted by id 
+            (see dwca_index_offsets()) (optional; default None)
+        data - the data file already open for reading, such as a member of a ZipStream
+            (optional; default None to open it from the inputfile)
+        errors - what to do with a row that has to be decoded but cannot be (see 
+            dwca_file_rows()) (optional; default None for 'replace')
+        errorcounts - dictionary in which to count the 'skipped' and 'replaced' rows 
+            (optional; default None)
+        columnstore - True to also write a column store of the tsv file from the rows 
+            as they are written (see write_column_store()) (optional; default False)
+    returns:
+        rowcount - the number of rows written, or None if the file was not written
+    '''
+    functionname = 'write_dwca_file_tsv()'
+
+    if descriptor is None or descriptor['location'] is None:
+        s = 'No data file described for %s in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    columns = dwca_file_columns(descriptor, idcolumn)
+    dialect = tsv_dialect()
+    header = [c['name'] for c in columns]
+    success = write_header(outputfile, header, dialect)
+    if success == False:
+        return None
+
+    store = None
+    if columnstore == True:
+        store = ColumnStoreWriter(outputfile, header, dialect, 'utf-8')
+
+    # Offsets of rows by id, only if they are to be indexed
+    offsets = None
+    if indexfile is not None and descriptor['idindex'] is not None:
+        offsets = []
+
+    try:
+        if _raw_dwca_file(descriptor, dialect):
+            rowcount = _copy_dwca_file_lines(inputfile, outputfile, descriptor, columns, 
+                dialect, offsets, data, store)
+        else:
+            rowcount = 0
+            idindex = descriptor['idindex']
+            with open(outputfile, 'ab') as outfile:
+                outfile.seek(0, os.SEEK_END)
+                writer = csv.writer(outfile, dialect=dialect, encoding='utf-8')
+                for values in dwca_file_rows(inputfile, descriptor, data, errors, 
+                    errorcounts):
+                    fieldcount = len(values)
+                    rowout = []
+                    for c in columns:
+                        if c['default'] is not None:
+                            rowout.append(c['default'])
+                        elif c['index'] < fieldcount:
+                            rowout.append(values[c['index']])
+                        else:
+                            rowout.append('')
+                    if offsets is not None and idindex < fieldcount:
+                        offsets.append((values[idindex].encode('utf-8'), outfile.tell()))
+                    writer.writerow(rowout)
+                    if store is not None:
+                        store.writerow(rowout, written=True)
+                    rowcount += 1
+    except Exception:
+        if store is not None:
+            store.fail('%s not written' % outputfile)
+        raise
+
+    # The tsv file is still complete without a column store, only slower to profile
+    if store is not None:
+        store.close()
+
+    if offsets is not None:
+        offsets.sort()
+        with open(indexfile, 'wb') as index:
+            for idvalue, offset in offsets:
+                index.write('%s\t%s\n' % (idvalue, offset))
+
+    return rowcount
+
+def dwca_index_offsets(indexfile, idvalue):
+    ''' Get the byte offsets of the rows with an id (or coreid) in a tsv file written by
+       write_dwca_file_tsv(), by binary search in its index file, without reading either
+       file into memory.
+    parameters:
+        indexfile - full path to the index file (required)
+        idvalue - the id to look for (required)
+    returns:
+        offsets - a list of the byte offsets of the rows with the id, or None if the 
+            index file was not found
+    '''
+    index = line_index(indexfile)
+    if index is None:
+        return None
+    if isinstance(idvalue, unicode):
+        idvalue = idvalue.encode('utf-8')
+
+    offsets = []
+    with open(indexfile, 'rb') as data:
+        linecount = indexed_line_count(index)
+
+        def indexed_id(n):
+            data.seek(index['offsets'][n])
+            return data.readline().rstrip('\n').rpartition('\t')
+
+        # Find the first line with the id
+        low, high = 0, linecount
+        while low < high:
+            middle = (low + high) // 2
+            if indexed_id(middle)[0] < idvalue:
+                low = middle + 1
+            else:
+                high = middle
+        while low < linecount:
+            found, tab, offset = indexed_id(low)
+            if found != idvalue:
+                break
+            offsets.append(int(offset))
+            low += 1
+
+    return offsets
+
+def _raw_dwca_file(descriptor, dialect):
+    ''' Determine if the lines of a data file can be written to a file of the given 
+       dialect without decoding them.'''
+    try:
+        encoding = codecs.lookup(descriptor['encoding']).name
+    except LookupError:
+        return False
+    return encoding == 'utf-8' and descriptor['delimiter'] == dialect.delimiter and \
+        len(descriptor['quotechar']) == 0
+
+def _copy_dwca_file_lines(inputfile, outputfile, descriptor, columns, dialect, 
+    offsets=None, data=None, store=None):
+    ''' Write the lines of a data file that needs no decoding (see _raw_dwca_file()) to 
+       the output file with its columns in output order, with a block copy if they are 
+       in that order already.
+    parameters:
+        inputfile - full path to the Darwin Core archive file
+        outputfile - the path to the tsv file, with the header already written
+        descriptor - a dictionary describing the data file
+        columns - list of the columns to write (see dwca_file_columns())
+        dialect - csv.dialect object with the attributes of the output file
+        offsets - list to which to append the id and byte offset of every row written
+            (optional; default None)
+        data - the data file already open for reading (optional; default None)
+        store - ColumnStoreWriter to which to give every row written (optional; 
+            default None)
+    returns:
+        rowcount - the number of rows written
+    '''
+    delimiter = str(dialect.delimiter)
+    lineterminator = str(dialect.lineterminator)
+    indexes = [c['index'] for c in columns]
+
+    # Default values are appended to the values of every row, after the widest row 
+    # described
+    width = max([i for i in indexes if i is not None] + [descriptor['idindex'], -1]) + 1
+    defaults = []
+    for i in range(len(columns)):
+        if columns[i]['default'] is not None:
+            indexes[i] = width + len(defaults)
+            defaults.append(columns[i]['default'].encode('utf-8'))
+
+    rowcount = 0
+    with open(outputfile, 'ab') as outfile:
+        if offsets is None and store is None and len(defaults) == 0 and \
+            indexes == range(width):
+            return copy_dwca_file_data(inputfile, descriptor, outfile, data=data, 
+                lineterminator=lineterminator)
+
+        if len(indexes) == 1:
+            getter = lambda values: (values[indexes[0]],)
+        else:
+            getter = itemgetter(*indexes)
+        idindex = descriptor['idindex']
+        outfile.seek(0, os.SEEK_END)
+        offset = outfile.tell()
+        padding = [''] * width
+        for line in dwca_file_lines(inputfile, descriptor, data):
+            values = line.split(delimiter)
+            if len(values) != width:
+                values = (values + padding)[:width]
+            rowout = getter(values + defaults)
+            line = delimiter.join(rowout) + lineterminator
+            if offsets is not None:
+                offsets.append((values[idindex], offset))
+                offset += len(line)
+            outfile.write(line)
+            if store is not None and store.failure is None:
+                try:
+                    store.writerow([v.decode('utf-8') for v in rowout], written=True)
+                except UnicodeDecodeError, e:
+                    store.fail(e)
+            rowcount += 1
+
+    return rowcount
+
+class ZipStream(object):
+    ''' A reader of the members of a zip file from their local headers, as the bytes of
+        the file arrive from a stream such as an HTTP response, without waiting for the
+        central directory at the end of the file. The bytes read can be copied to a 
+        spool file as they arrive, so that the whole zip file is kept. Members are read 
+        in the order in which they are in the file (see members()).
+    '''
+    def __init__(self, source, spool=None, blocksize=1048576):
+        ''' Make a reader of a zip file.
+        parameters:
+            source - a stream with a read(size) method, from which to read the zip file
+                (required)
+            spool - a file open for writing, to which to copy the bytes read 
+                (optional; default None)
+            blocksize - the number of bytes to read from the source at a time 
+                (optional; default 1048576)
+        '''
+        self.source = source
+        self.spool = spool
+        self.blocksize = blocksize
+        self.size = 0
+        # The name, CRC-32 and size of every member read, to check against the central
+        # directory (see verify())
+        self.entries = []
+        self._hasher = hashlib.sha256()
+        self._buffer = ''
+        self._offset = 0
+
+    def members(self):
+        ''' Get the members of the zip file as they arrive. Whatever of a member is not 
+            read is skipped when the next member is requested.
+        parameters:
+            None
+        returns:
+            a generator of ZipStreamMember for each member, up to the central directory.
+            IOError is raised if a member cannot be read from its local header alone 
+            (encrypted, stored with sizes only after the data, or compressed with a 
+            method other than deflate).
+        '''
+        while self._peek(4) == 'PK\x03\x04':
+            member = ZipStreamMember(self, self._take(30))
+            yield member
+            member.skip()
+            self.entries.append((member.name, member.crc, member.file_size))
+
+    def drain(self):
+        ''' Read the rest of the source, such as the central directory, to the spool.
+        parameters:
+            None
+        returns:
+            checksum - the SHA-256 digest of all of the bytes read from the source
+        '''
+        self._offset = len(self._buffer)
+        while self._fill():
+            self._offset = len(self._buffer)
+        return self._hasher.hexdigest()
+
+    def verify(self, zipfilename, size=None):
+        ''' Check that a zip file spooled from the source was read whole, raising 
+            IOError if it was not. A source that ends early, as a dropped connection 
+            can, is otherwise indistinguishable from one that is complete.
+        parameters:
+            zipfilename - full path to the spooled zip file, after drain() (required)
+            size - the number of bytes the source was to give, such as the 
+                Content-Length of a response (optional; default None)
+        returns:
+            None
+        '''
+        if size is not None and self.size != size:
+            raise IOError('Zip stream ended after %s of %s bytes' % (self.size, size))
+        try:
+            with zipfile.ZipFile(zipfilename) as archive:
+                directory = [(i.filename, i.CRC, i.file_size) 
+                    for i in archive.infolist()]
+        except zipfile.BadZipfile, e:
+            raise IOError('Zip stream incomplete: %s' % e)
+        if directory != self.entries:
+            raise IOError('Members read do not match the central directory')
+
+    def _fill(self):
+        ''' Read the next block from the source, returning False at its end.'''
+        block = self.source.read(self.blocksize)
+        if not block:
+            return False
+        if self.spool is not None:
+            self.spool.write(block)
+        self._hasher.update(block)
+        self.size += len(block)
+        self._buffer = self._buffer[self._offset:] + block
+        self._offset = 0
+        return True
+
+    def _peek(self, size):
+        ''' Get the next bytes without consuming them, fewer at the end of the source.'''
+        while len(self._buffer) - self._offset < size and self._fill():
+            pass
+        return self._buffer[self._offset:self._offset + size]
+
+    def _take(self, size):
+        ''' Consume exactly the next number of bytes, or raise IOError.'''
+        data = self._peek(size)
+        if len(data) < size:
+            raise IOError('Zip stream ended %s bytes short' % (size - len(data)))
+        self._offset += size
+        return data
+
+    def _take_up_to(self, size):
+        ''' Consume up to the next number of bytes, fewer only at the end of the source.'''
+        if self._offset == len(self._buffer):
+            self._fill()
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+    def _unread(self, data):
+        ''' Give back bytes consumed but not used.'''
+        self._buffer = data + self._buffer[self._offset:]
+        self._offset = 0
+
+class ZipStreamMember(object):
+    ''' A file-like reader of the content of a member of a ZipStream.'''
+    def __init__(self, stream, header):
+        ''' Make a reader of the member from its local header (see ZipStream.members()).
+        '''
+        self.stream = stream
+        signature, version, flags, method, time, date, self.crc, compressedsize, \
+            self.file_size, namelength, extralength = struct.unpack('<4s5H3L2H', header)
+        self.name = stream._take(namelength)
+        if flags & 0x800:
+            self.name = self.name.decode('utf-8')
+        extra = stream._take(extralength)
+
+        # Sizes too big for the header are in the Zip64 extra field
+        self._zip64 = False
+        while len(extra) >= 4:
+            fieldid, fieldsize = struct.unpack('<2H', extra[:4])
+            if fieldid == 0x0001:
+                self._zip64 = True
+                values = list(struct.unpack('<%sQ' % (fieldsize // 8), 
+                    extra[4:4 + fieldsize - fieldsize % 8]))
+                if self.file_size == 0xFFFFFFFF and len(values) > 0:
+                    self.file_size = values.pop(0)
+                if compressedsize == 0xFFFFFFFF and len(values) > 0:
+                    compressedsize = values.pop(0)
+            extra = extra[4 + fieldsize:]
+
+        if flags & 0x1:
+            raise IOError('Encrypted member %s' % self.name)
+        if method not in [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED]:
+            raise IOError('Compression method %s of member %s' % (method, self.name))
+
+        # Sizes and checksum follow the data in a data descriptor
+        self._descriptor = flags & 0x8 != 0
+        self._remaining = compressedsize
+        if self._descriptor:
+            if method == zipfile.ZIP_STORED:
+                raise IOError('Stored member %s without sizes' % self.name)
+            self._remaining = None
+
+        self._decompressor = None
+        if method == zipfile.ZIP_DEFLATED:
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._output = ''
+        self._crc = 0
+        self._done = False
+
+    def read(self, size=-1):
+        ''' Get up to size bytes of the content, all of the rest if size is negative.'''
+        while (size < 0 or len(self._output) < size) and self._done == False:
+            self._advance()
+        if size < 0:
+            size = len(self._output)
+        data = self._output[:size]
+        self._output = self._output[size:]
+        return data
+
+    def __iter__(self):
+        ''' Get the lines of the content with universal newlines.'''
+        pending = ''
+        block = self.read(self.stream.blocksize)
+        while block:
+            pending += block
+            # A '\r' at the end of a block may be followed by '\n' in the next one
+            end = len(pending)
+            if pending.endswith('\r'):
+                end -= 1
+            lines = pending[:end].splitlines(True)
+            pending = pending[end:]
+            if len(lines) > 0 and lines[-1][-1:] not in ['\r', '\n']:
+                pending = lines.pop() + pending
+            for line in lines:
+                yield line
+            block = self.read(self.stream.blocksize)
+        if len(pending) > 0:
+            yield pending
+
+    def skip(self):
+        ''' Consume the rest of the member without keeping its content.'''
+        if self._done == False and self._remaining is not None:
+            # Known sizes need no decompression
+            while self._remaining > 0:
+                data = self.stream._take_up_to(min(self._remaining, 
+                    self.stream.blocksize))
+                if len(data) == 0:
+                    raise IOError('Zip stream ended in member %s' % self.name)
+                self._remaining -= len(data)
+            self._done = True
+            self._output = ''
+            return
+        while self._done == False:
+            self._advance()
+            self._output = ''
+
+    def _advance(self):
+        ''' Read and decompress the next block of the member.'''
+        if self._remaining is not None:
+            data = self.stream._take_up_to(min(self._remaining, self.stream.blocksize))
+            self._remaining -= len(data)
+            if len(data) == 0 and self._remaining > 0:
+                raise IOError('Zip stream ended in member %s' % self.name)
+            finished = self._remaining == 0
+        else:
+            # The end of the compressed data is known only when the decompressor finds
+            # it, leaving the bytes after it unused
+            data = self.stream._take_up_to(self.stream.blocksize)
+            if len(data) == 0:
+                raise IOError('Zip stream ended in member %s' % self.name)
+            finished = False
+
+        if self._decompressor is not None:
+            output = self._decompressor.decompress(data)
+            if self._remaining is None and len(self._decompressor.unused_data) > 0:
+                self.stream._unread(self._decompressor.unused_data)
+                finished = True
+            if finished:
+                output += self._decompressor.flush()
+        else:
+            output = data
+        self._crc = zlib.crc32(output, self._crc)
+        self._output += output
+
+        if finished:
+            self._done = True
+            self._finish()
+
+    def _finish(self):
+        ''' Check the content against the checksum, read from the data descriptor after
+            the data if there is one.'''
+        if self._descriptor:
+            if self.stream._peek(4) == 'PK\x07\x08':
+                self.stream._take(4)
+            if self._zip64:
+                self.crc, compressedsize, self.file_size = \
+                    struct.unpack('<LQQ', self.stream._take(20))
+            else:
+                self.crc, compressedsize, self.file_size = \
+                    struct.unpack('<3L', self.stream._take(12))
+        if self._crc & 0xFFFFFFFF != self.crc:
+            raise IOError('Bad CRC-32 for member %s' % self.name)
+
+def _archive_metadata(inputfile):
+    ''' Get the content of the metadata file named in meta.xml of a Darwin Core archive,
+       or of eml.xml if none is named, or None if there is no metadata file.'''
+    with zipfile.ZipFile(inputfile) as archive:
+        metaname = _archive_member(archive, 'meta.xml')
+        metadataname = None
+        if metaname is not None:
+            root = ET.fromstring(archive.read(metaname))
+            if root.get('metadata'):
+                metadataname = metaname[:-len('meta.xml')] + root.get('metadata')
+        if metadataname is None or metadataname not in archive.namelist():
+            metadataname = None
+            for member in archive.namelist():
+                if os.path.basename(member).lower() == 'eml.xml':
+                    metadataname = member
+                    break
+        if metadataname is None:
+            return None
+        return archive.read(metadataname)
+
+def _read_inspection_cache(cachefile):
+    ''' Read an archive inspection from the inspection cache, if it is there.'''
+    functionname = '_read_inspection_cache()'
+
+    if os.path.isfile(cachefile) == False:
+        return None
+
+    try:
+        with open(cachefile, 'rb') as data:
+            inspection = pickle.load(data)
+    except Exception, e:
+        s = 'Unable to read inspection cache %s in %s: %s' % \
+            (cachefile, functionname, e)
+        logging.debug(s)
+        return None
+
+    if not isinstance(inspection, dict):
+        s = 'No inspection in inspection cache %s in %s.' % (cachefile, functionname)
+        logging.debug(s)
+        return None
+    return inspection
+
+def _write_inspection_cache(cachefile, inspection):
+    ''' Persist an archive inspection in the inspection cache.'''
+    functionname = '_write_inspection_cache()'
+
+    tempfile = '%s.%s.tmp' % (cachefile, os.getpid())
+    try:
+        with open(tempfile, 'wb') as data:
+            pickle.dump(inspection, data, pickle.HIGHEST_PROTOCOL)
+        os.rename(tempfile, cachefile)
+    except Exception, e:
+        s = 'Unable to write inspection cache %s in %s: %s' % \
+            (cachefile, functionname, e)
+        logging.debug(s)
+        return False
+    return True
+
+def _archive_member(archive, name):
+    ''' Get the name of a member of an open zip file at its root or in a single top 
+       directory, or None if there is no such member.'''
+    for member in archive.namelist():
+        if member == name or (member.endswith('/' + name) and member.count('/') == 1):
+            return member
+    return None
+
+def _local_tag(element):
+    ''' Get the tag of an xml element without its namespace.'''
+    return element.tag.rpartition('}')[2]
+
+def _xml_attribute(element, name, default):
+    ''' Get the value of an attribute of an xml element with escaped characters such as
+       \\t decoded, or the default if there is no such attribute.'''
+    value = element.get(name)
+    if value is None:
+        return default
+    return value.encode('utf-8').decode('string_escape').decode('utf-8')
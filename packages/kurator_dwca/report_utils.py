@@ -15,7 +15,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "report_utils.py 2017-07-20T10:38-07:00"
+__version__ = "report_utils.py 2026-10-19T02:40-04:00"
 __kurator_content_type__ = "utility"
 __adapted_from__ = ""
 
@@ -27,12 +27,14 @@ from dwca_utils import csv_file_encoding
 from dwca_utils import csv_file_dialect
 from dwca_utils import extract_values_from_row
 from dwca_utils import get_guid
+from dwca_utils import LRUCache
 from dwca_utils import read_csv_row
 from dwca_utils import read_header
 from dwca_utils import strip_list
 from dwca_utils import tsv_dialect
 from dwca_utils import ustripstr
 from dwca_utils import write_header
+from dwca_vocab_utils import Vocabulary
 from dwca_vocab_utils import recommended_value
 from dwca_vocab_utils import vocab_dict_from_file
 from dwca_vocab_utils import vocabheader
@@ -110,7 +112,8 @@ def term_recommendation_report(
     logging.debug(s)
     return True
 
-def term_list_report(reportfile, termlist, key, separator=None, format=None):
+def term_list_report(reportfile, termlist, key, separator=None, format=None, 
+    suggestions=None):
     ''' Write a report with a list of terms.
     parameters:
         reportfile - full path to the output report file (optional)
@@ -120,6 +123,9 @@ def term_list_report(reportfile, termlist, key, separator=None, format=None):
             in the vocabulary file (required)
         separator - string to use as the value separator in the string 
             (optional; default None)
+        suggestions - dictionary of terms and lists of tuples of similar vocabulary 
+            values and their scores (see similar_vocab_dict_from_file()). If given, they
+            are reported in a 'suggestions' field, best first (optional; default None)
     returns:
         success - True if the report was written, else False
     '''
@@ -136,6 +142,8 @@ def term_list_report(reportfile, termlist, key, separator=None, format=None):
         return False
 
     fieldnames = vocabheader(key, separator)
+    if suggestions is not None:
+        fieldnames.append('suggestions')
 
     if format is None or format.lower()=='csv':
         dialect = csv_dialect()
@@ -162,6 +170,9 @@ def term_list_report(reportfile, termlist, key, separator=None, format=None):
             if len(fields) > 1:
                 for field in fields:
                     row[field] = value
+            if suggestions is not None:
+                row['suggestions'] = '; '.join(['%s (%.2f)' % (similar, score) \
+                    for similar, score in suggestions.get(value, [])])
             writer.writerow(row)
     s = 'Report written to %s in %s.' % (reportfile, functionname)
     logging.debug(s)
@@ -464,19 +475,37 @@ def uuid_term_appender(
     return True
 
 def term_standardizer_report(
-    inputfile, reportfile, vocabfile, key, separator=None, encoding=None, format=None):
+    inputfile, reportfile, vocabfile, key, separator=None, encoding=None, format=None,
+    cachesize=None, cachestats=None, standardizations=None):
     ''' Write a file with substitutions from a vocabfile for fields in a key and appended 
-        terms showing the original values.
+        terms showing the original values. The substitutions for a combination of values
+        of the fields in the key are looked up only once while the combination stays 
+        among the most recently seen. Substitutions from any number of vocabularies are 
+        made in a single pass over the input file, in the order given, each on the 
+        values left by those before it. The appended terms show the values in the input 
+        file.
     parameters:
         inputfile - full path to the input file (required)
         reportfile - full path to the output file (required)
-        vocabfile - path to the vocabulary file (required)
-        key - field or separator-separated fields to set (required)
+        vocabfile - path to the vocabulary file, or a Vocabulary loaded from it 
+            (required unless standardizations are given)
+        key - field or separator-separated fields to set (required unless 
+            standardizations are given)
         separator - string to use as the key and value separator (optional; default '|')
         encoding - string signifying the encoding of the input file. If known, it speeds
             up processing a great deal. (optional; default None) (e.g., 'utf-8')
         format - string signifying the csv.dialect of the report file ('csv' or 'txt')
             (optional; default: txt)
+        cachesize - the largest number of combinations of values of the fields in the 
+            key for which to keep the substitutions (see LRUCache) (optional; default 
+            10000)
+        cachestats - dictionary in which to put the number of 'hits' and 'misses' of 
+            combinations looked up in the caches and their 'size' (optional; default 
+            None)
+        standardizations - list of (key, vocabfile) pairs of further substitutions to 
+            make after those from vocabfile for key, if given. A pair with no field of 
+            its key in the input file, or without a usable vocabulary, is left out 
+            (optional; default None)
     returns:
         success - True if the report was written, else False
     '''
@@ -512,7 +541,14 @@ def term_standardizer_report(
         logging.debug(s)
         return False
 
-    if key is None or len(key.strip())==0:
+    # The keys and vocabularies of the substitutions to make, in order
+    pairs = []
+    if key is not None or vocabfile is not None:
+        pairs.append([key, vocabfile])
+    if standardizations is not None:
+        pairs += [list(pair) for pair in standardizations]
+
+    if len(pairs) == 0:
         s = 'No key given in %s.' % functionname
         logging.debug(s)
         return False
@@ -521,41 +557,36 @@ def term_standardizer_report(
     if separator is None or len(separator)==0:
         separator = '|'
 
-    # Make a list of the fields in the key by splitting it on the separator
-    fieldlist = key.split(separator)
-
-    # Assume none of the fields is in the file
-    headerhaskey = False
+    if cachesize is None:
+        cachesize = 10000
 
-    # Search the cleaned up header for any field from the key
+    # Clean up the header to search it for the fields in the keys
     cleanedinputheader = strip_list(inputheader)
-    for field in fieldlist:
-       if field in cleanedinputheader:
-           headerhaskey = True
-           break
-
-    if headerhaskey == False:
-        s = 'No field from %s found ' % fieldlist
-        s += 'in input file %s in %s.' % (inputfile, functionname)
-        logging.debug(s)
-        return False
-
-    if vocabfile is None or len(vocabfile) == 0:
-        logging.debug('No vocabulary file given in %s.') % functionname
-        return False
-
-    if os.path.isfile(vocabfile) == False:
-        s = 'Vocabulary file %s not found in %s.' % (vocabfile, functionname)
-        logging.debug(s)
-        return False
 
-    # Get the vocabulary dictionary, but convert all entries using ustripstr. Assume
-    # vocabulary file is encoded as utf-8.
-    vocabdict = vocab_dict_from_file(vocabfile, key, encoding='utf-8', \
-        separator=separator, function=ustripstr)
-    if len(vocabdict) == 0:
-        s = 'Vocabulary file %s ' % vocabfile
-        s += 'had zero recommendations in %s.' % functionname
+    # Make a list of the fields in the key, the vocabulary dictionary and the cache of 
+    # the standard values of each substitution
+    steps = []
+    for key, vocabfile in pairs:
+        fieldlist = _standardizer_fields(inputfile, cleanedinputheader, vocabfile, key, 
+            separator)
+        if fieldlist is None:
+            continue
+
+        # Get the vocabulary dictionary, but convert all entries using ustripstr. 
+        # Assume vocabulary file is encoded as utf-8.
+        vocabdict = vocab_dict_from_file(vocabfile, key, encoding='utf-8', \
+            separator=separator, function=ustripstr)
+        if vocabdict is None or len(vocabdict) == 0:
+            s = 'Vocabulary file %s ' % vocabfile
+            s += 'had zero recommendations in %s.' % functionname
+            logging.debug(s)
+            continue
+
+        steps.append([fieldlist, vocabdict, LRUCache(cachesize)])
+
+    if len(steps) == 0:
+        s = 'No substitutions to make in input file %s ' % inputfile
+        s += 'in %s.' % functionname
         logging.debug(s)
         return False
 
@@ -570,14 +601,18 @@ def term_standardizer_report(
         outputdialect = csv_dialect()
 
     # Create an output header that is the same as the input header with fields
-    # appended to hold the original values of the key fields
-    # Get the fields to add by splitting the key with the separator
+    # appended to hold the original values of the key fields, and fields for those 
+    # not in the input header
     outputheader = cleanedinputheader
-    for field in fieldlist:
-        if field in outputheader:
-            outputheader = outputheader + [field+'_orig']
-        else:
-            outputheader = outputheader + [field]
+    origfields = []
+    for fieldlist, vocabdict, cache in steps:
+        for field in fieldlist:
+            if field in cleanedinputheader:
+                if field not in origfields:
+                    origfields.append(field)
+                    outputheader = outputheader + [field+'_orig']
+            elif field not in outputheader:
+                outputheader = outputheader + [field]
 
     # Create the outputfile and write the new header to it
     write_header(reportfile, outputheader, outputdialect)
@@ -595,43 +630,124 @@ def term_standardizer_report(
         # Iterate through all rows in the input file
         for row in read_csv_row(inputfile, dialect=inputdialect, encoding=encoding, 
             header=True, fieldnames=cleanedinputheader):
-            # Set the _orig values for every field in the field list that exists in
+            # Set the _orig values for every field in the field lists that exists in
             # the row
-            for field in fieldlist:
-                if field in row:
-                    row[field+'_orig'] = row[field]
-
-            # Construct a composite field value for the row to match a key in the 
-            # vocabulary file
-            rowkey = extract_values_from_row(row, fieldlist, separator)
-
-            # Get dictionary for recommended value for the ustripstr(rowkey)
-            newvaluedict = recommended_value(vocabdict, ustripstr(rowkey))
-
-            # Only make changes if there is a standardized value found
-            if newvaluedict is not None:
-                # ustripstr(rowkey) was found in the vocabulary
-                # Get the standard value
-                standard = newvaluedict['standard']
-
-                # Treat standard value that is None or only whitespace as ''
-                if standard is None or len(standard.strip())==0:
-                    standard=''
-
-                # Make a list of values given in standard
-                newvalues = standard.split(separator)
-
-                # Only make changes if the number of recommendation fields is the 
-                # same as the number of fields in the key
-                if len(newvalues) == len(fieldlist):
-                    i = 0
-                    # Update or add new value to field in the fieldlist
-                    for field in fieldlist:
-                        row[field] = newvalues[i]
-                        i += 1
+            for field in origfields:
+                row[field+'_orig'] = row[field]
+
+            for fieldlist, vocabdict, cache in steps:
+                # Construct a composite field value for the row to match a key in the 
+                # vocabulary file
+                rowkey = extract_values_from_row(row, fieldlist, separator)
+
+                # Get the new values for the rowkey, looking them up in the vocabulary 
+                # only if not seen recently
+                newvalues = cache.get(rowkey)
+                if newvalues is None:
+                    newvalues = _standard_values(vocabdict, rowkey, fieldlist, 
+                        separator)
+                    cache.set(rowkey, newvalues)
+
+                # Update or add new value to field in the fieldlist
+                for field, newvalue in zip(fieldlist, newvalues):
+                    row[field] = newvalue
 
             writer.writerow(row)
 
+    if cachestats is not None:
+        stats = {'hits':0, 'misses':0, 'size':0}
+        for fieldlist, vocabdict, cache in steps:
+            for name, count in cache.stats().iteritems():
+                stats[name] += count
+        cachestats.update(stats)
+
     s = 'Report written to %s in %s.' % (reportfile, functionname)
     logging.debug(s)
-    return True    
+    return True
+
+def _standardizer_fields(inputfile, header, vocabfile, key, separator):
+    ''' Get the fields in the key of a substitution made by term_standardizer_report(),
+        if the substitution can be made in a file.
+    parameters:
+        inputfile - full path to the input file (required)
+        header - list of the cleaned fields in the header of the input file (required)
+        vocabfile - path to the vocabulary file, or a Vocabulary loaded from it 
+            (required)
+        key - field or separator-separated fields to set (required)
+        separator - string separating the fields in the key (required)
+    returns:
+        fieldlist - list of the fields in the key, or None if no field from the key is 
+            in the header, or if there is no vocabulary file
+    '''
+    functionname = '_standardizer_fields()'
+
+    if key is None or len(key.strip())==0:
+        s = 'No key given in %s.' % functionname
+        logging.debug(s)
+        return None
+
+    # Make a list of the fields in the key by splitting it on the separator
+    fieldlist = key.split(separator)
+
+    # Assume none of the fields is in the file
+    headerhaskey = False
+
+    # Search the cleaned up header for any field from the key
+    for field in fieldlist:
+       if field in header:
+           headerhaskey = True
+           break
+
+    if headerhaskey == False:
+        s = 'No field from %s found ' % fieldlist
+        s += 'in input file %s in %s.' % (inputfile, functionname)
+        logging.debug(s)
+        return None
+
+    if vocabfile is None or len(vocabfile) == 0:
+        s = 'No vocabulary file given in %s.' % functionname
+        logging.debug(s)
+        return None
+
+    if not isinstance(vocabfile, Vocabulary) and os.path.isfile(vocabfile) == False:
+        s = 'Vocabulary file %s not found in %s.' % (vocabfile, functionname)
+        logging.debug(s)
+        return None
+
+    return fieldlist
+
+def _standard_values(vocabdict, rowkey, fieldlist, separator):
+    ''' Get the standard values for the fields in a key from a vocabulary.
+    parameters:
+        vocabdict - dictionary of the vocabulary, with keys converted using ustripstr
+            (required)
+        rowkey - the values of the fields in the key, separated by separator (required)
+        fieldlist - list of the fields in the key (required)
+        separator - string separating the values in the key (required)
+    returns:
+        newvalues - tuple of the standard values of the fields, empty if there is no 
+            standard value for the rowkey or if it does not have a value for every field
+    '''
+    # Get dictionary for recommended value for the ustripstr(rowkey)
+    newvaluedict = recommended_value(vocabdict, ustripstr(rowkey))
+
+    # Only make changes if there is a standardized value found
+    if newvaluedict is None:
+        return ()
+
+    # ustripstr(rowkey) was found in the vocabulary
+    # Get the standard value
+    standard = newvaluedict['standard']
+
+    # Treat standard value that is None or only whitespace as ''
+    if standard is None or len(standard.strip())==0:
+        standard=''
+
+    # Make a list of values given in standard
+    newvalues = standard.split(separator)
+
+    # Only make changes if the number of recommendation fields is the same as the 
+    # number of fields in the key
+    if len(newvalues) != len(fieldlist):
+        return ()
+    return tuple(newvalues)
@@ -15,17 +15,20 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "term_completeness_reporter.py 2017-04-27T16:37-04:00"
+__version__ = "term_completeness_reporter.py 2026-10-19T00:40-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
+from dwca_utils import setup_actor_fingerprint_store
 from dwca_utils import write_header
 from dwca_utils import csv_dialect
 from dwca_utils import tsv_dialect
 from dwca_utils import split_path
 from dwca_utils import term_completeness_from_file
+from dwca_utils import profile_file_incremental
 from report_utils import term_completeness_report
 import logging
 import os
@@ -48,15 +51,24 @@ def term_completeness_reporter(options):
         the field is populated.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the tsvfile (optional)
         inputfile - full path to the input file (required)
         outputfile - name of the output file, without path (optional)
         format - output file format (e.g., 'csv' or 'txt') (optional; default 'csv')
         encoding - string signifying the encoding of the input file. If known, it speeds
             up processing a great deal. (optional; default None) (e.g., 'utf-8')
+        fingerprintstore - path to a directory in which to keep fingerprints of the 
+            rows of the input file and the counts, so that the counts for a later 
+            version of the file are made from only the rows that changed (see 
+            profile_file_incremental()). Without a path it is placed in the workspace 
+            (optional)
     returns a dictionary with information about the results
         workspace - actual path to the directory where the outputfile was written
         outputfile - actual full path to the output tsv file
+        changes - dictionary of the number of records inserted, updated, deleted and
+            unchanged since the version of the file in the fingerprintstore, if given
         success - True if process completed successfully, otherwise False
         message - an explanation of the reason if success=False
         artifacts - a dictionary of persistent objects created
@@ -64,16 +76,22 @@ def term_completeness_reporter(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     #logging.debug( 'Started %s' % __version__ )
     #logging.debug( 'options: %s' % options )
 
     # Make a list for the response
-    returnvars = ['workspace', 'outputfile', 'success', 'message', 'artifacts']
+    returnvars = ['workspace', 'outputfile', 'changes', 'success', 'message', 
+        'artifacts']
 
     ### Standard outputs ###
     success = False
     message = None
+
+    ### Custom outputs ###
+    changes = None
+
     # Make a dictionary for artifacts left behind
     artifacts = {}
 
@@ -97,7 +115,7 @@ def term_completeness_reporter(options):
 
     if inputfile is None or len(inputfile)==0:
         message = 'No input file given. %s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
+        returnvals = [workspace, outputfile, changes, success, message, artifacts]
         logging.debug('message:\n%s' % message)
         return response(returnvars, returnvals)
 
@@ -107,7 +125,7 @@ def term_completeness_reporter(options):
             inputfile = workspace+'/'+inputfile
         else:
             message = 'Input file %s not found. %s' % (inputfile, __version__)
-            returnvals = [workspace, outputfile, success, message, artifacts]
+            returnvals = [workspace, outputfile, changes, success, message, artifacts]
             logging.debug('message:\n%s' % message)
             return response(returnvars, returnvals)
 
@@ -137,7 +155,17 @@ def term_completeness_reporter(options):
         outputfile = '%s/%s' % (workspace.rstrip('/'), outputfile)
 
     # Get the list of values for the field given by termname along with their counts.
-    fieldcountdict = term_completeness_from_file(inputfile, encoding=encoding)
+    # Count only the changes since the last version of the file if there is a 
+    # fingerprint store.
+    fingerprintstore = setup_actor_fingerprint_store(options)
+    if fingerprintstore is not None:
+        changes = {}
+        fieldcountdict = profile_file_incremental(inputfile, [{'type':'completeness'}], 
+            fingerprintstore, encoding=encoding, changes=changes)
+        if fieldcountdict is not None:
+            fieldcountdict = fieldcountdict[0]
+    else:
+        fieldcountdict = term_completeness_from_file(inputfile, encoding=encoding)
     #print 'counts: %s' % counts
 
     #Try to create the report for the term value counts.
@@ -146,13 +174,13 @@ def term_completeness_reporter(options):
     if success==False:
         message = 'No count report created for %s from %s. ' % (termname, outputfile)
         message += '%s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
+        returnvals = [workspace, outputfile, changes, success, message, artifacts]
         logging.debug('message: %s' % message)
         return response(returnvars, returnvals)
     
     s = 'field_completeness_report_file'
     artifacts[s] = outputfile
-    returnvals = [workspace, outputfile, success, message, artifacts]
+    returnvals = [workspace, outputfile, changes, success, message, artifacts]
     logging.debug('Finishing %s' % __version__)
     return response(returnvars, returnvals)
 
@@ -175,6 +203,9 @@ def _getoptions():
     help = "encoding (optional)"
     parser.add_argument("-e", "--encoding", help=help)
 
+    help = 'directory in which to keep fingerprints for incremental counts (optional)'
+    parser.add_argument("-p", "--fingerprintstore", help=help)
+
     help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
     parser.add_argument("-l", "--loglevel", help=help)
 
@@ -200,6 +231,7 @@ def main():
     optdict['outputfile'] = options.outputfile
     optdict['format'] = options.format
     optdict['encoding'] = options.encoding
+    optdict['fingerprintstore'] = options.fingerprintstore
     optdict['loglevel'] = options.loglevel
     print 'optdict: %s' % optdict
 
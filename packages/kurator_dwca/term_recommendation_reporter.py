@@ -21,6 +21,7 @@ __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 from dwca_utils import extract_values_from_file
 from dwca_vocab_utils import matching_vocab_dict_from_file
 from dwca_vocab_utils import term_values_recommended
@@ -35,6 +36,8 @@ def term_recommendation_reporter(options):
         recommended standard values.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the tsvfile (optional)
         inputfile - path to the input file. Either full path or path within the workspace
             (required)
@@ -57,6 +60,7 @@ def term_recommendation_reporter(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     #logging.debug( 'Started %s' % __version__ )
     #logging.debug( 'options: %s' % options )
@@ -15,20 +15,17 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "term_token_reporter.py 2017-04-27T16:37-04:00"
+__version__ = "term_token_reporter.py 2026-10-17T11:40-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
-from dwca_utils import csv_file_dialect
-from dwca_utils import csv_file_encoding
-from dwca_utils import read_header
+from dwca_utils import setup_actor_profile_index
 from dwca_utils import write_header
-from dwca_utils import read_csv_row
 from dwca_utils import tsv_dialect
+from dwca_utils import profile_file
 import os
-import re
 import uuid
 import logging
 import argparse
@@ -50,6 +47,8 @@ def term_token_reporter(options):
     ''' Get a dictionary of counts of tokens for a given term in an input file.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the outputfile (optional)
         inputfile - full path to the input file (required)
         outputfile - name of the output file, without path (optional)
@@ -67,6 +66,7 @@ def term_token_reporter(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
@@ -226,71 +226,11 @@ def term_token_count_from_file(inputfile, termname, dialect=None, encoding=None)
         logging.debug(s)
         return 0
 
-    # Determine the dialect of the input file
-    if dialect is None:
-        dialect = csv_file_dialect(inputfile)
-        # csv_file_dialect() always returns a dialect if there is an input file.
-        # No need to check.
-
-    # Determine the encoding of the input file
-    if encoding is None or len(encoding.strip()) == 0:
-        encoding = csv_file_encoding(inputfile)
-        # csv_file_encoding() always returns an encoding if there is an input file.
-        # No need to check.
-
-    inputheader = read_header(inputfile, dialect=dialect, encoding=encoding)
-
-    if termname not in inputheader:
-        s = 'Term %s not found in file %s ' % (termname, inputfile)
-        s += 'in %s.' % functionname
-        logging.debug(s)
+    results = profile_file(inputfile, [{'type':'tokens', 'term':termname}], 
+        dialect=dialect, encoding=encoding)
+    if results is None:
         return None
-
-    rowcount = 0
-    tokencount = 0
-    populatedrowcount = 0
-    tokens = { 'tokenlist':{} }
-
-    for row in read_csv_row(inputfile, dialect, encoding):
-        try:
-            value = row[termname]
-        except:
-            pass
-
-        if value is not None and len(value.strip()) > 0:
-            rowdict = {}
-            wordlist = re.sub("[^\w]", " ",  value).split()
-
-            for token in wordlist:
-                if token in rowdict:
-                    rowdict[token]['totalcount']=rowdict[token]['totalcount']+1
-                else:
-                    rowdict[token]={}
-                    rowdict[token]['rowcount']=1
-                    rowdict[token]['totalcount']=1
-
-            populatedrowcount += 1
-
-            for key, value in rowdict.iteritems():
-                tokenlist = tokens['tokenlist']
-                if key in tokenlist:
-                    tokenlist[key]['rowcount'] = \
-                        tokenlist[key]['rowcount'] + value['rowcount']
-                    tokenlist[key]['totalcount'] = \
-                        tokenlist[key]['totalcount'] + value['totalcount']
-                else:
-                    tokenlist[key] = {}
-                    tokenlist[key]['rowcount'] = value['rowcount']
-                    tokenlist[key]['totalcount'] = value['totalcount']
-        rowcount += 1
-        tokencount += len(wordlist)
-
-    tokens['rowcount']=rowcount
-    tokens['tokencount']=tokencount
-    tokens['input']=inputfile
-    tokens['term']=termname
-
-    return tokens
+    return results[0]
 
 def _getoptions():
     ''' Parse command line options and return them.'''
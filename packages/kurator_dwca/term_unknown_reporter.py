@@ -15,19 +15,22 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "term_unknown_reporter.py 2017-04-27T16:37-04:00"
+__version__ = "term_unknown_reporter.py 2026-10-19T02:40-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 from dwca_utils import csv_file_dialect
 from dwca_utils import extract_values_from_file
 from dwca_utils import ustripstr
 from dwca_vocab_utils import missing_vocab_list_from_file
+from dwca_vocab_utils import similar_vocab_dict_from_file
 from report_utils import term_list_report
 from slugify import slugify
 import os.path
+import uuid
 import logging
 import argparse
 
@@ -36,6 +39,8 @@ def term_unknown_reporter(options):
         vocabulary.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the tsvfile (optional)
         inputfile - path to the input file. Either full path or path within the workspace
             (required)
@@ -48,6 +53,8 @@ def term_unknown_reporter(options):
         separator - string to use as the value separator in the string (default '|')
         encoding - string signifying the encoding of the input file. If known, it speeds
             up processing a great deal. (optional; default None) (e.g., 'utf-8')
+        suggestions - the number of most similar vetted vocabulary values to report for
+            each missing value, with their similarity scores (optional; default None)
     returns a dictionary with information about the results
         workspace - actual path to the directory where the outputfile was written
         outputfile - actual full path to the output report file
@@ -58,6 +65,7 @@ def term_unknown_reporter(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     #logging.debug( 'Started %s' % __version__ )
     #logging.debug( 'options: %s' % options )
@@ -81,6 +89,7 @@ def term_unknown_reporter(options):
     key = None
     separator = None
     encoding = None
+    suggestions = None
 
     ### Required inputs ###
     try:
@@ -155,6 +164,11 @@ def term_unknown_reporter(options):
     except:
         pass
 
+    try:
+        suggestions = int(options['suggestions'])
+    except:
+        pass
+
     try:
         outputfile = options['outputfile']
     except:
@@ -195,10 +209,17 @@ def term_unknown_reporter(options):
         logging.debug('message:\n%s' % message)
         return response(returnvars, returnvals)
 
+    # Find the most similar vetted values in the vocabulary for the missing values
+    similardict = None
+    if suggestions is not None and suggestions > 0:
+        similardict = similar_vocab_dict_from_file(missingvocablist, vocabfile, key, 
+            separator=separator, encoding='utf-8', count=suggestions)
+
     # TODO: Use Allan's DQ report framework
     # Validation, Improvement, Measure
     # Create a series of term reports
-    success = term_list_report(outputfile, missingvocablist, key, format=format)
+    success = term_list_report(outputfile, missingvocablist, key, format=format,
+        suggestions=similardict)
 
     if outputfile is not None and not os.path.isfile(outputfile):
         message = 'Failed to write results to output file %s.' % outputfile
@@ -241,6 +262,9 @@ def _getoptions():
     help = "encoding (optional)"
     parser.add_argument("-e", "--encoding", help=help)
 
+    help = 'number of similar vocabulary values to suggest (optional)'
+    parser.add_argument("-n", "--suggestions", help=help)
+
     help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
     parser.add_argument("-l", "--loglevel", help=help)
 
@@ -263,6 +287,7 @@ def main():
         s += ' -k "country"'
         s += ' -s "|"'
         s += ' -e utf-8'
+        s += ' -n 3'
         s += ' -l DEBUG'
         print '%s' % s
         return
@@ -275,6 +300,7 @@ def main():
     optdict['key'] = options.key
     optdict['separator'] = options.separator
     optdict['encoding'] = options.encoding
+    optdict['suggestions'] = options.suggestions
     optdict['loglevel'] = options.loglevel
     print 'optdict: %s' % optdict
 
@@ -15,16 +15,19 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "term_value_count_reporter.py 2017-04-27T16:37-04:00"
+__version__ = "term_value_count_reporter.py 2026-10-19T00:40-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
+from dwca_utils import setup_actor_fingerprint_store
 from dwca_utils import write_header
 from dwca_utils import csv_dialect
 from dwca_utils import tsv_dialect
 from dwca_utils import extract_value_counts_from_file
+from dwca_utils import profile_file_incremental
 import logging
 import os
 import uuid
@@ -46,6 +49,8 @@ def term_value_count_reporter(options):
         the number of times each occurs.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the tsvfile (optional)
         inputfile - full path to the input file (required)
         outputfile - name of the output file, without path (optional)
@@ -55,9 +60,16 @@ def term_value_count_reporter(options):
             (optional; default '|')
         encoding - string signifying the encoding of the input file. If known, it speeds
             up processing a great deal. (optional; default None) (e.g., 'utf-8')
+        fingerprintstore - path to a directory in which to keep fingerprints of the 
+            rows of the input file and the counts, so that the counts for a later 
+            version of the file are made from only the rows that changed (see 
+            profile_file_incremental()). Without a path it is placed in the workspace 
+            (optional)
     returns a dictionary with information about the results
         workspace - actual path to the directory where the outputfile was written
         outputfile - actual full path to the output tsv file
+        changes - dictionary of the number of records inserted, updated, deleted and
+            unchanged since the version of the file in the fingerprintstore, if given
         success - True if process completed successfully, otherwise False
         message - an explanation of the reason if success=False
         artifacts - a dictionary of persistent objects created
@@ -65,16 +77,22 @@ def term_value_count_reporter(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     #logging.debug( 'Started %s' % __version__ )
     #logging.debug( 'options: %s' % options )
 
     # Make a list for the response
-    returnvars = ['workspace', 'outputfile', 'success', 'message', 'artifacts']
+    returnvars = ['workspace', 'outputfile', 'changes', 'success', 'message', 
+        'artifacts']
 
     ### Standard outputs ###
     success = False
     message = None
+
+    ### Custom outputs ###
+    changes = None
+
     # Make a dictionary for artifacts left behind
     artifacts = {}
 
@@ -100,7 +118,7 @@ def term_value_count_reporter(options):
 
     if inputfile is None or len(inputfile)==0:
         message = 'No input file given. %s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
+        returnvals = [workspace, outputfile, changes, success, message, artifacts]
         logging.debug('message:\n%s' % message)
         return response(returnvars, returnvals)
 
@@ -110,7 +128,7 @@ def term_value_count_reporter(options):
             inputfile = workspace+'/'+inputfile
         else:
             message = 'Input file %s not found. %s' % (inputfile, __version__)
-            returnvals = [workspace, outputfile, success, message, artifacts]
+            returnvals = [workspace, outputfile, changes, success, message, artifacts]
             logging.debug('message:\n%s' % message)
             return response(returnvars, returnvals)
 
@@ -121,7 +139,7 @@ def term_value_count_reporter(options):
 
     if termlist is None or len(termlist)==0:
         message = 'No field list given. %s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
+        returnvals = [workspace, outputfile, changes, success, message, artifacts]
         logging.debug('message: %s' % message)
         return response(returnvars, returnvals)
 
@@ -165,9 +183,20 @@ def term_value_count_reporter(options):
 
     outputfile = '%s/%s' % (workspace.rstrip('/'), outputfile)
 
-    # Get the list of values for the field given by termname along with their counts.
-    counts = extract_value_counts_from_file(inputfile, termlist, separator=separator, 
-        encoding=encoding)
+    # Get the list of values for the field given by termname along with their counts,
+    # counting only the changes since the last version of the file if there is a 
+    # fingerprint store.
+    fingerprintstore = setup_actor_fingerprint_store(options)
+    if fingerprintstore is not None:
+        changes = {}
+        aggregate = {'type':'valuecounts', 'fields':termlist, 'separator':separator}
+        counts = profile_file_incremental(inputfile, [aggregate], fingerprintstore, 
+            encoding=encoding, changes=changes)
+        if counts is not None:
+            counts = counts[0]
+    else:
+        counts = extract_value_counts_from_file(inputfile, termlist, 
+            separator=separator, encoding=encoding)
     #print 'counts: %s' % counts
 
     #Try to create the report for the term value counts.
@@ -176,13 +205,13 @@ def term_value_count_reporter(options):
     if success==False:
         message = 'No count report created for %s from %s. ' % (termname, outputfile)
         message += '%s' % __version__
-        returnvals = [workspace, outputfile, success, message, artifacts]
+        returnvals = [workspace, outputfile, changes, success, message, artifacts]
         logging.debug('message: %s' % message)
         return response(returnvars, returnvals)
     
     s = '%s_count_report_file' % rootname
     artifacts[s] = outputfile
-    returnvals = [workspace, outputfile, success, message, artifacts]
+    returnvals = [workspace, outputfile, changes, success, message, artifacts]
     logging.debug('Finishing %s' % __version__)
     return response(returnvars, returnvals)
 
@@ -255,6 +284,9 @@ def _getoptions():
     help = "encoding (optional)"
     parser.add_argument("-e", "--encoding", help=help)
 
+    help = 'directory in which to keep fingerprints for incremental counts (optional)'
+    parser.add_argument("-p", "--fingerprintstore", help=help)
+
     help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
     parser.add_argument("-l", "--loglevel", help=help)
 
@@ -302,6 +334,7 @@ def main():
     optdict['termlist'] = termlist
     optdict['separator'] = options.separator
     optdict['encoding'] = options.encoding
+    optdict['fingerprintstore'] = options.fingerprintstore
     optdict['loglevel'] = options.loglevel
     print 'optdict: %s' % optdict
 
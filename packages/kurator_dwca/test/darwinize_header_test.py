@@ -14,7 +14,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2016 President and Fellows of Harvard College"
-__version__ = "darwinize_header_test.py 2017-07-19T11:03-07:00"
+__version__ = "darwinize_header_test.py 2026-10-19T04:00-04:00"
 
 # This file contains unit test for the darwinize_header function.
 #
@@ -23,6 +23,7 @@ __version__ = "darwinize_header_test.py 2017-07-19T11:03-07:00"
 # python darwinize_header_test.py
 
 from kurator_dwca.darwinize_header import darwinize_header
+from kurator_dwca.darwinize_header import darwinize_file
 from kurator_dwca.dwca_vocab_utils import terms_not_in_dwc
 from kurator_dwca.dwca_utils import read_header
 from kurator_dwca.dwca_utils import csv_file_dialect
@@ -42,16 +43,19 @@ class DarwinizeHeaderFramework():
     testfile1 = testdatapath + 'test_eight_records_utf8_lf.csv'
     testfile2 = testdatapath + 'test_three_records_utf8_unix_lf.txt'
     testfile3 = testdatapath + 'test_symbiota_download.csv'
+    testfile4 = testdatapath + 'test_thirty_records_latin_1_crlf.csv'
     dwccloudfile = vocabpath + 'darwin_cloud.txt'
 
     # output data files from tests, remove these in dispose()
     outputfile = 'test_darwinizedheader_file.csv'
+    rewrittenfile = 'test_darwinizedheader_rewritten_file.csv'
 
     def dispose(self):
         """Remove any output files created as a result of testing"""
-        outputfile = self.testdatapath + self.outputfile
-        if os.path.isfile(outputfile):
-            os.remove(outputfile)
+        for outputfile in [self.outputfile, self.rewrittenfile]:
+            removeme = self.testdatapath + outputfile
+            if os.path.isfile(removeme):
+                os.remove(removeme)
         return True
 
 class DarwinizeHeaderTestCase(unittest.TestCase):
@@ -336,6 +340,45 @@ class DarwinizeHeaderTestCase(unittest.TestCase):
         outputdialect = csv_file_dialect(testfile1)
         self.assertTrue(dialects_equal(inputdialect, outputdialect), outfilelocation + ' dialect not same as dialect of ' + testfile1)
         
+    def test_darwinize_file_blockcopy(self):
+        print 'testing darwinize_file_blockcopy'
+        testfile1 = self.framework.testfile1
+        testfile4 = self.framework.testfile4
+        dwccloudfile = self.framework.dwccloudfile
+        outputfile = self.framework.testdatapath + self.framework.outputfile
+        rewrittenfile = self.framework.testdatapath + self.framework.rewrittenfile
+
+        # Same dialect, utf-8: only the header line differs from the input file
+        header = darwinize_file(testfile1, outputfile, dwccloudfile)
+        s = 'darwinized header not written to %s' % outputfile
+        self.assertIsNotNone(header, s)
+        found = open(outputfile, 'rb').read().split('\n', 1)
+        expected = open(testfile1, 'rb').read().split('\n', 1)
+        s = 'rows of %s not copied as they are' % testfile1
+        self.assertEqual(found[1], expected[1], s)
+        self.assertEqual(found[0].split(','), header, s)
+
+        # The copied rows are the rows that would be written
+        darwinize_file(testfile1, rewrittenfile, dwccloudfile, blockcopy=False)
+        s = 'copied rows of %s differ from rewritten rows' % testfile1
+        self.assertEqual(open(outputfile, 'rb').read(), 
+            open(rewrittenfile, 'rb').read(), s)
+
+        # Not in utf-8: the rows are rewritten in utf-8
+        darwinize_file(testfile4, outputfile, dwccloudfile)
+        darwinize_file(testfile4, rewrittenfile, dwccloudfile, blockcopy=False)
+        s = 'rows of %s not rewritten' % testfile4
+        self.assertEqual(open(outputfile, 'rb').read(), 
+            open(rewrittenfile, 'rb').read(), s)
+
+        # A different dialect: the rows are rewritten in the new dialect
+        darwinize_file(testfile1, outputfile, dwccloudfile, format='txt')
+        darwinize_file(testfile1, rewrittenfile, dwccloudfile, format='txt', 
+            blockcopy=False)
+        s = 'rows of %s not rewritten as tsv' % testfile1
+        self.assertEqual(open(outputfile, 'rb').read(), 
+            open(rewrittenfile, 'rb').read(), s)
+        self.assertTrue(dialects_equal(csv_file_dialect(outputfile), tsv_dialect()), s)
 
 if __name__ == '__main__':
     print '=== darwinize_header_test.py ==='
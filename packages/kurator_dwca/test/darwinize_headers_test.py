@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "John Wieczorek"
+__copyright__ = "Copyright 2018 President and Fellows of Harvard College"
+__version__ = "darwinize_headers_test.py 2026-10-19T03:20-04:00"
+
+# This file contains unit test for the darwinize_headers function.
+#
+# Example:
+#
+# python darwinize_headers_test.py
+
+from kurator_dwca.darwinize_headers import darwinize_headers
+from kurator_dwca.darwinize_header import darwinize_header
+from kurator_dwca.dwca_utils import read_header
+import os
+import shutil
+import unittest
+
+class DarwinizeHeadersFramework():
+    """Test framework for Darwinize Headers."""
+    # location for the test inputs and outputs
+    testdatapath = '../data/tests/'
+    vocabpath = '../data/vocabularies/'
+
+    # input data files to tests, don't remove these
+    testfile1 = testdatapath + 'test_eight_records_utf8_lf.csv'
+    testfile2 = testdatapath + 'test_symbiota_download.csv'
+    dwccloudfile = vocabpath + 'darwin_cloud.txt'
+
+    # output data files from tests, remove these in dispose()
+    batchpath = testdatapath + 'test_darwinize_headers/'
+    outputfile = 'test_darwinizedheader_file.csv'
+
+    def dispose(self):
+        """Remove any output files created as a result of testing"""
+        if os.path.isdir(self.batchpath):
+            shutil.rmtree(self.batchpath)
+        return True
+
+class DarwinizeHeadersTestCase(unittest.TestCase):
+    """Unit tests."""
+    def setUp(self):
+        self.framework = DarwinizeHeadersFramework()
+
+    def tearDown(self):
+        self.framework.dispose()
+        self.framework = None
+
+    def test_source_files_exist(self):
+        print 'testing source_files_exist'
+        for testfile in [self.framework.testfile1, self.framework.testfile2, 
+            self.framework.dwccloudfile]:
+            self.assertTrue(os.path.isfile(testfile), testfile + ' does not exist')
+
+    def test_missing_parameters(self):
+        print 'testing missing_parameters'
+        batchpath = self.framework.batchpath
+
+        # Test with no inputs
+        inputs = {}
+        response=darwinize_headers(inputs)
+        s = 'success without any required inputs'
+        self.assertFalse(response['success'], s)
+
+        # Test with no files in the input path
+        inputs['inputpath'] = batchpath + '*.csv'
+        inputs['dwccloudfile'] = self.framework.dwccloudfile
+        response=darwinize_headers(inputs)
+        s = 'success without input files'
+        self.assertFalse(response['success'], s)
+
+        # Test with missing Darwin Cloud Vocab file
+        os.makedirs(batchpath)
+        shutil.copy(self.framework.testfile1, batchpath)
+        inputs['dwccloudfile'] = None
+        response=darwinize_headers(inputs)
+        s = 'success without Darwin Cloud vocabulary file'
+        self.assertFalse(response['success'], s)
+
+    def test_darwinize_headers(self):
+        print 'testing darwinize_headers'
+        batchpath = self.framework.batchpath
+        testfiles = [self.framework.testfile1, self.framework.testfile2]
+        dwccloudfile = self.framework.dwccloudfile
+
+        os.makedirs(batchpath)
+        for testfile in testfiles:
+            shutil.copy(testfile, batchpath)
+
+        inputs = {}
+        inputs['inputpath'] = batchpath + '*.csv'
+        inputs['dwccloudfile'] = dwccloudfile
+        inputs['workspace'] = batchpath
+        inputs['format'] = 'txt'
+        response=darwinize_headers(inputs)
+        #print 'response:\n%s' % response
+        s = 'darwinize_headers failed: %s' % response['message']
+        self.assertTrue(response['success'], s)
+
+        names = [os.path.basename(f) for f in response['outputfiles']]
+        expected = ['darwinized_test_eight_records_utf8_lf.txt', 
+            'darwinized_test_symbiota_download.txt']
+        s = 'output files %s not as expected %s' % (names, expected)
+        self.assertEqual(names, expected, s)
+
+        # Each file is darwinized as it would be on its own
+        for testfile, outputfile in zip(testfiles, response['outputfiles']):
+            inputs = {}
+            inputs['inputfile'] = testfile
+            inputs['dwccloudfile'] = dwccloudfile
+            inputs['workspace'] = batchpath
+            inputs['outputfile'] = self.framework.outputfile
+            inputs['format'] = 'txt'
+            single = darwinize_header(inputs)
+            s = 'darwinize_header failed for %s' % testfile
+            self.assertTrue(single['success'], s)
+
+            found = open(outputfile, 'rb').read()
+            expected = open(single['outputfile'], 'rb').read()
+            s = 'batch output %s differs from single output' % outputfile
+            self.assertEqual(found, expected, s)
+
+        header = read_header(response['outputfiles'][0])
+        s = 'darwinized header %s not as expected' % header
+        self.assertEqual(header[0], 'catalogNumber', s)
+        self.assertEqual(header[-4:], ['institutionCode', 'collectionCode', 
+            'datasetName', 'Id'], s)
+
+if __name__ == '__main__':
+    print '=== darwinize_headers_test.py ==='
+    unittest.main()
@@ -14,7 +14,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2016 President and Fellows of Harvard College"
-__version__ = "downloader_test.py 2016-10-21T12:26+02:00"
+__version__ = "downloader_test.py 2026-10-19T07:20-04:00"
 
 # This file contains unit test for the downloader function.
 #
@@ -23,9 +23,78 @@ __version__ = "downloader_test.py 2016-10-21T12:26+02:00"
 # python downloader_test.py
 
 from kurator_dwca.downloader import downloader
+from kurator_dwca.downloader import fetch_url
+from kurator_dwca.downloader import download_filename
 import os
+import glob
 import json
+import shutil
+import hashlib
+import threading
 import unittest
+import BaseHTTPServer
+import SocketServer
+
+class RangeRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Stand-in for a web server serving one file, with or without ranges."""
+    payload = ''.join([chr(i % 251) for i in range(3 * 1048576 + 17)])
+    etag = '"v1"'
+    ranges = True
+    # The number of responses to cut off half way through
+    drops = 0
+    # The method and range of every request
+    requests = []
+    # The number of responses being sent, and the most sent at once
+    active = 0
+    mostactive = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def do_GET(self):
+        handler = RangeRequestHandler
+        with handler.lock:
+            handler.active += 1
+            handler.mostactive = max(handler.active, handler.mostactive)
+        try:
+            self._respond(True)
+        finally:
+            with handler.lock:
+                handler.active -= 1
+
+    def _respond(self, body):
+        handler = RangeRequestHandler
+        rangeheader = self.headers.get('Range')
+        handler.requests.append((self.command, rangeheader))
+        start, end, status = 0, len(handler.payload), 200
+        if handler.ranges and rangeheader is not None and \
+            self.headers.get('If-Range', handler.etag) == handler.etag:
+            first, last = rangeheader.split('=')[1].split('-')
+            start, status = int(first), 206
+            if len(last) > 0:
+                end = int(last) + 1
+        self.send_response(status)
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('ETag', handler.etag)
+        if handler.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', 'bytes %s-%s/%s' % \
+                (start, end - 1, len(handler.payload)))
+        self.end_headers()
+        if body:
+            data = handler.payload[start:end]
+            if handler.drops > 0:
+                handler.drops -= 1
+                data = data[:len(data) // 2]
+            self.wfile.write(data)
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
 
 class DownloaderFramework():
     """Test framework for the downloader."""
@@ -36,14 +105,45 @@ class DownloaderFramework():
     # input data files to tests, don't remove these
     #testfile1 = testdatapath + 'test_eight_specimen_records.csv'
 
+    # location for the outputs of tests against the local server
+    testdatapath = '../data/tests/'
+
     # output data files from tests, remove these in dispose()
     outputfile = 'test_ccber_mammals_download.zip'
+    localfile = testdatapath + 'test_local_download.zip'
+    urlfile = testdatapath + 'test_download_urls.txt'
+    manifest = 'test_download_manifest.json'
+    cachedir = testdatapath + 'test_download_cache'
+
+    def __init__(self):
+        RangeRequestHandler.etag = '"v1"'
+        RangeRequestHandler.ranges = True
+        RangeRequestHandler.drops = 0
+        RangeRequestHandler.requests = []
+        RangeRequestHandler.mostactive = 0
+        self.server = None
+
+    def serve(self):
+        """Start a local web server and return the URL of its file"""
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return 'http://127.0.0.1:%s/archive.zip' % self.server.server_address[1]
 
     def dispose(self):
         """Remove any output files created as a result of testing"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
         outputfile = self.workspace + self.outputfile
-        if os.path.isfile(outputfile):
-            os.remove(outputfile)
+        for removeme in [outputfile, self.localfile, self.localfile + '.part', 
+            self.localfile + '.part.json', self.urlfile, self.testdatapath + self.manifest] + \
+            glob.glob(self.testdatapath + '127-0-0-1-*.zip'):
+            if os.path.isfile(removeme):
+                os.remove(removeme)
+        if os.path.isdir(self.cachedir):
+            shutil.rmtree(self.cachedir)
         return True
 
 class DownloaderTestCase(unittest.TestCase):
@@ -107,6 +207,199 @@ class DownloaderTestCase(unittest.TestCase):
         s = 'file not downloaded from %s' % testurl 
         self.assertTrue(success, s)
 
+    def test_fetch_resume(self):
+        print 'testing fetch_resume'
+        url = self.framework.serve()
+        localfile = self.framework.localfile
+        payload = RangeRequestHandler.payload
+
+        # The first response is cut off, the second resumes where it stopped
+        RangeRequestHandler.drops = 1
+        result = fetch_url(url, localfile, retries=2, backoff=0)
+        s = 'download from %s not successful: %s' % (url, result['message'])
+        self.assertTrue(result['success'], s)
+
+        s = 'file downloaded not as served'
+        self.assertEqual(open(localfile, 'rb').read(), payload, s)
+        self.assertEqual(result['bytes'], len(payload), s)
+        self.assertEqual(result['checksum'], hashlib.sha256(payload).hexdigest(), s)
+
+        gets = [r for r in RangeRequestHandler.requests if r[0] == 'GET']
+        expected = [('GET', None), ('GET', 'bytes=%s-' % (len(payload) // 2))]
+        s = 'requests %s not as expected %s' % (gets, expected)
+        self.assertEqual(gets, expected, s)
+
+        # A part left by an earlier run resumes only if it came from the same file
+        partfile = localfile + '.part'
+        record = {'url':url, 'size':len(payload), 'etag':'"v0"', 'lastmodified':None}
+        for etag, expected in [['"v0"', None], ['"v1"', 'bytes=1000-']]:
+            with open(partfile, 'wb') as data:
+                data.write('x' * 1000)
+            record['etag'] = etag
+            with open(partfile + '.json', 'w') as data:
+                json.dump(record, data)
+            RangeRequestHandler.requests = []
+            result = fetch_url(url, localfile, retries=0)
+            s = 'download over a part from %s not as served' % etag
+            self.assertTrue(result['success'], s)
+            if expected is None:
+                self.assertEqual(open(localfile, 'rb').read(), payload, s)
+            gets = [r for r in RangeRequestHandler.requests if r[0] == 'GET']
+            s = 'requests %s over a part from %s not as expected' % (gets, etag)
+            self.assertEqual(gets, [('GET', expected)], s)
+            s = 'part record %s left after download' % (partfile + '.json')
+            self.assertFalse(os.path.isfile(partfile + '.json'), s)
+
+        # Without ranges, the retry starts over
+        RangeRequestHandler.ranges = False
+        RangeRequestHandler.drops = 1
+        RangeRequestHandler.requests = []
+        result = fetch_url(url, localfile, retries=2, backoff=0)
+        s = 'download without ranges from %s not successful' % url
+        self.assertTrue(result['success'], s)
+        self.assertEqual(result['checksum'], hashlib.sha256(payload).hexdigest(), s)
+
+        # Too few retries
+        RangeRequestHandler.drops = 2
+        result = fetch_url(url, localfile, retries=1, backoff=0)
+        s = 'download successful in spite of failed retries'
+        self.assertFalse(result['success'], s)
+
+    def test_fetch_segments(self):
+        print 'testing fetch_segments'
+        url = self.framework.serve()
+        localfile = self.framework.localfile
+        payload = RangeRequestHandler.payload
+
+        result = fetch_url(url, localfile, segments=3)
+        s = 'segmented download from %s not successful: %s' % (url, result['message'])
+        self.assertTrue(result['success'], s)
+
+        s = 'file downloaded in segments not as served'
+        self.assertEqual(open(localfile, 'rb').read(), payload, s)
+        self.assertEqual(result['checksum'], hashlib.sha256(payload).hexdigest(), s)
+
+        ranges = sorted([r[1] for r in RangeRequestHandler.requests if r[0] == 'GET'])
+        s = 'ranges requested %s not three segments' % ranges
+        self.assertEqual(len(ranges), 3, s)
+        self.assertEqual(ranges[0], 'bytes=0-%s' % (len(payload) // 3 - 1), s)
+
+        s = 'download successful with the wrong checksum'
+        result = fetch_url(url, localfile, checksum='0' * 64)
+        self.assertFalse(result['success'], s)
+        self.assertFalse(os.path.isfile(localfile + '.part'), s)
+
+    def test_fetch_cache(self):
+        print 'testing fetch_cache'
+        url = self.framework.serve()
+        localfile = self.framework.localfile
+        cachedir = self.framework.cachedir
+        payload = RangeRequestHandler.payload
+
+        result = fetch_url(url, localfile, cachedir=cachedir)
+        s = 'first download from %s cached' % url
+        self.assertTrue(result['success'], s)
+        self.assertFalse(result['cached'], s)
+
+        # Unchanged on the server, copied from the cache
+        RangeRequestHandler.requests = []
+        os.remove(localfile)
+        result = fetch_url(url, localfile, cachedir=cachedir)
+        s = 'unchanged download from %s not from cache' % url
+        self.assertTrue(result['cached'], s)
+        self.assertEqual(RangeRequestHandler.requests, [('HEAD', None)], s)
+        self.assertEqual(open(localfile, 'rb').read(), payload, s)
+        self.assertEqual(result['checksum'], hashlib.sha256(payload).hexdigest(), s)
+
+        # Changed on the server, downloaded again
+        RangeRequestHandler.etag = '"v2"'
+        result = fetch_url(url, localfile, cachedir=cachedir)
+        s = 'changed download from %s from cache' % url
+        self.assertTrue(result['success'], s)
+        self.assertFalse(result['cached'], s)
+
+    def test_downloader_local(self):
+        print 'testing downloader_local'
+        url = self.framework.serve()
+        workspace = self.framework.testdatapath
+        payload = RangeRequestHandler.payload
+
+        inputs = {}
+        inputs['url'] = url
+        inputs['workspace'] = workspace
+        inputs['outputfile'] = os.path.basename(self.framework.localfile)
+        inputs['segments'] = '2'
+        inputs['checksum'] = hashlib.sha256(payload).hexdigest()
+        response=downloader(inputs)
+        #print 'response:\n%s' % response
+        s = 'file not downloaded from %s: %s' % (url, response['message'])
+        self.assertTrue(response['success'], s)
+        self.assertEqual(response['checksum'], inputs['checksum'], s)
+
+    def test_download_filename(self):
+        print 'testing download_filename'
+        url = 'http://ipt.example.org/archive.do?r=ccber_mammals'
+        urls = [url, url.replace('_', '-'), url.replace('http:', 'https:'),
+            url + '&x=' + 'a' * 300, url + '&x=' + 'a' * 301]
+        names = [download_filename(u) for u in urls]
+        s = 'download file names %s not distinct' % names
+        self.assertEqual(len(set(names)), len(urls), s)
+
+        s = 'download file name %s not as expected' % names[0]
+        self.assertTrue(names[0].startswith('ipt-example-org-archive-do-r-ccber-mammals-'),
+            s)
+        self.assertEqual(names[0], download_filename(url), s)
+        self.assertTrue(max([len(n) for n in names]) <= 195, s)
+
+    def test_downloader_batch(self):
+        print 'testing downloader_batch'
+        url = self.framework.serve()
+        workspace = self.framework.testdatapath
+        urlfile = self.framework.urlfile
+        payload = RangeRequestHandler.payload
+
+        urls = ['%s?r=%s' % (url, i) for i in range(5)]
+        # A URL to which nothing listens
+        refused = 'http://127.0.0.1:1/archive.zip'
+        with open(urlfile, 'w') as data:
+            data.write('# IPT resources\n\n%s\n%s\n' % ('\n'.join(urls[2:]), refused))
+
+        inputs = {}
+        inputs['urls'] = ' '.join(urls[:2] + urls[:1])
+        inputs['urlfile'] = urlfile
+        inputs['workspace'] = workspace
+        inputs['workers'] = '4'
+        inputs['perhost'] = '2'
+        inputs['retries'] = '0'
+        inputs['manifest'] = self.framework.manifest
+        response=downloader(inputs)
+        #print 'response:\n%s' % response
+        s = 'batch with an unreachable URL successful'
+        self.assertFalse(response['success'], s)
+        self.assertTrue(refused in response['message'], s)
+
+        results = response['results']
+        s = 'results %s not one per distinct URL in order' % results
+        self.assertEqual([r['url'] for r in results], urls + [refused], s)
+
+        checksum = hashlib.sha256(payload).hexdigest()
+        for result in results[:-1]:
+            s = 'download of %s not as expected: %s' % (result['url'], result)
+            self.assertTrue(result['success'], s)
+            self.assertEqual(result['bytes'], len(payload), s)
+            self.assertEqual(result['checksum'], checksum, s)
+            self.assertEqual(result['status'], 200, s)
+            self.assertTrue(os.path.isfile(result['outputfile']), s)
+        self.assertFalse(results[-1]['success'], s)
+
+        s = 'more than two downloads at once from one host'
+        self.assertTrue(RangeRequestHandler.mostactive <= 2, s)
+
+        with open(response['manifest']) as manifestfile:
+            manifest = json.load(manifestfile)
+        s = 'manifest %s not as results' % response['manifest']
+        self.assertEqual(manifest, json.loads(json.dumps(results)), s)
+
 if __name__ == '__main__':
     print '=== downloader_test.py ==='
     unittest.main()
@@ -14,7 +14,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2016 President and Fellows of Harvard College"
-__version__ = "dwca_core_to_tsv_test.py 2016-10-21T12:27+02:00"
+__version__ = "dwca_core_to_tsv_test.py 2026-10-19T09:20-04:00"
 
 # This file contains unit test for the dwca_core_to_tsv function.
 #
@@ -24,9 +24,15 @@ __version__ = "dwca_core_to_tsv_test.py 2016-10-21T12:27+02:00"
 
 from kurator_dwca.dwca_core_to_tsv import dwca_core_to_tsv
 from kurator_dwca.dwca_utils import read_header
+from kurator_dwca.dwca_utils import read_csv_row
 from kurator_dwca.dwca_utils import write_header
 from kurator_dwca.dwca_utils import tsv_dialect
+from kurator_dwca.dwca_utils import column_store
+from kurator_dwca.dwca_utils import read_column_store_rows
+from kurator_dwca.dwca_utils import read_csv_tuple_row
 import os
+import shutil
+import zipfile
 import unittest
 
 class DwcaCoreToTsvFramework():
@@ -40,13 +46,18 @@ class DwcaCoreToTsvFramework():
 
     # output data files from tests, remove these in dispose()
     outputfile = 'test_tsv_from_dwca.txt'
+    streamedfile = 'test_tsv_streamed_from_dwca.txt'
+    testdwca = 'test_streamed_dwca.zip'
 
     def dispose(self):
         """Remove any output files created as a result of testing"""
-        removeme = self.testdatapath + self.outputfile
-        #print 'removeme: %s' % removeme
-        if os.path.isfile(removeme):
-            os.remove(removeme)
+        for outputfile in [self.outputfile, self.streamedfile, self.testdwca]:
+            removeme = self.testdatapath + outputfile
+            #print 'removeme: %s' % removeme
+            if os.path.isfile(removeme):
+                os.remove(removeme)
+            if os.path.isdir(removeme + '.columns'):
+                shutil.rmtree(removeme + '.columns')
         return True
 
 class DwcaCoreToTsvTestCase(unittest.TestCase):
@@ -128,6 +139,8 @@ class DwcaCoreToTsvTestCase(unittest.TestCase):
         inputs['outputfile'] = outputfile
         inputs['workspace'] = workspace
         inputs['archivetype'] = archivetype
+        # The reader puts terms outside of Darwin Core in an order of its own
+        inputs['extractmode'] = 'reader'
 
         response=dwca_core_to_tsv(inputs)
         #print 'response:\n%s' % response
@@ -225,6 +238,177 @@ class DwcaCoreToTsvTestCase(unittest.TestCase):
         s = 'Header:\n%s\nnot equal to the model header:\n%s' % (header, modelheader)
         self.assertEqual(header, modelheader, s)
 
+    def test_convert_streamed(self):
+        print 'testing convert_streamed'
+        dwca = self.framework.dwca
+        workspace = self.framework.testdatapath
+        outputfile = self.framework.outputfile
+        streamedfile = self.framework.streamedfile
+
+        inputs = {}
+        inputs['inputfile'] = dwca
+        inputs['outputfile'] = outputfile
+        inputs['workspace'] = workspace
+        inputs['extractmode'] = 'reader'
+        response=dwca_core_to_tsv(inputs)
+        expected = response['outputfile']
+
+        inputs['outputfile'] = streamedfile
+        inputs['extractmode'] = 'stream'
+        response=dwca_core_to_tsv(inputs)
+        #print 'response:\n%s' % response
+        self.assertTrue(response['success'], 'streamed conversion not successful')
+        self.assertEqual(response['rowcount'], 8, 'incorrect number of rows in output')
+        found = response['outputfile']
+
+        # Terms outside of Darwin Core may be in a different order
+        expectedheader = read_header(expected, tsv_dialect())
+        foundheader = read_header(found, tsv_dialect())
+        s = 'Header:\n%s\nnot equal to the header read with the reader:\n%s' % \
+            (foundheader, expectedheader)
+        self.assertEqual(sorted(foundheader), sorted(expectedheader), s)
+
+        expectedrows = list(read_csv_row(expected, tsv_dialect(), 'utf-8'))
+        foundrows = list(read_csv_row(found, tsv_dialect(), 'utf-8'))
+        s = 'Rows streamed from the archive not equal to the rows read with the reader'
+        self.assertEqual(foundrows, expectedrows, s)
+
+    def test_convert_streamed_formats(self):
+        print 'testing convert_streamed_formats'
+        workspace = self.framework.testdatapath
+        testdwca = workspace + self.framework.testdwca
+        streamedfile = self.framework.streamedfile
+
+        meta = '<archive xmlns="http://rs.tdwg.org/dwc/text/">'
+        meta += '<core encoding="%s" fieldsTerminatedBy="%s" linesTerminatedBy="%s" '
+        meta += 'fieldsEnclosedBy="%s" ignoreHeaderLines="1" '
+        meta += 'rowType="http://rs.tdwg.org/dwc/terms/Occurrence">'
+        meta += '<files><location>occurrence.txt</location></files><id index="0"/>'
+        meta += '<field index="0" term="http://rs.tdwg.org/dwc/terms/institutionCode"/>'
+        meta += '<field index="1" term="http://rs.tdwg.org/dwc/terms/collectionCode"/>'
+        meta += '<field index="2" term="http://rs.tdwg.org/dwc/terms/catalogNumber"/>'
+        meta += '%s</core></archive>'
+        country = '<field term="http://rs.tdwg.org/dwc/terms/country" default="Per\xc3\xba"/>'
+        expected = [
+            {'institutionCode':'MVZ', 'collectionCode':u'Mammal; Bird', 
+             'catalogNumber':'1', 'country':u'Per\xfa'},
+            {'institutionCode':'MVZ', 'collectionCode':u'Reptil\xe9', 
+             'catalogNumber':'2', 'country':u'Per\xfa'}]
+
+        # Quoted, comma-separated latin-1 values are decoded, the default value added
+        # and columns reordered.
+        core = 'catalogNumber,collectionCode,institutionCode\n'
+        core += '"MVZ","Mammal; Bird","1"\n"MVZ","Reptil\xe9","2"\n'
+        # Tab-separated utf-8 values are copied, the default value added
+        raw = 'institutionCode\tcollectionCode\tcatalogNumber\r\n'
+        raw += 'MVZ\tMammal; Bird\t1\r\nMVZ\tReptil\xc3\xa9\t2\r\n'
+        # Tab-separated utf-8 values in output order are copied as a block
+        block = 'institutionCode\tcollectionCode\tcatalogNumber\r'
+        block += 'MVZ\tMammal; Bird\t1\rMVZ\tReptil\xc3\xa9\t2'
+        # Tab-separated utf-8 values in output order are copied as a block, whatever
+        # their line terminator
+        newlines = block.replace('\r', '\n')
+        formats = [
+            (core, meta % ('ISO-8859-1', ',', '\\n', '&quot;', country)),
+            (raw, meta % ('UTF-8', '\\t', '\\r\\n', '', country)),
+            (block, meta % ('UTF-8', '\\t', '\\r', '', '')),
+            (newlines, meta % ('UTF-8', '\\t', '\\n', '', ''))]
+
+        for data, metaxml in formats:
+            with zipfile.ZipFile(testdwca, 'w') as archive:
+                archive.writestr('meta.xml', metaxml)
+                archive.writestr('occurrence.txt', data)
+
+            inputs = {}
+            inputs['inputfile'] = testdwca
+            inputs['outputfile'] = streamedfile
+            inputs['workspace'] = workspace
+            response=dwca_core_to_tsv(inputs)
+            #print 'response:\n%s' % response
+            s = 'streamed conversion not successful for\n%s' % metaxml
+            self.assertTrue(response['success'], s)
+            self.assertEqual(response['rowcount'], 2, s)
+
+            rows = list(read_csv_row(response['outputfile'], tsv_dialect(), 'utf-8'))
+            if 'default' not in metaxml:
+                for row in expected:
+                    row.pop('country', None)
+            s = 'rows %s not as expected %s for\n%s' % (rows, expected, metaxml)
+            self.assertEqual(rows, expected, s)
+
+    def test_convert_column_store(self):
+        print 'testing convert_column_store'
+        dwca = self.framework.dwca
+        workspace = self.framework.testdatapath
+
+        for outputfile, extractmode in [(self.framework.outputfile, 'reader'),
+            (self.framework.streamedfile, 'stream')]:
+            inputs = {}
+            inputs['inputfile'] = dwca
+            inputs['outputfile'] = outputfile
+            inputs['workspace'] = workspace
+            inputs['extractmode'] = extractmode
+            inputs['columnstore'] = 'true'
+            response=dwca_core_to_tsv(inputs)
+            #print 'response:\n%s' % response
+            s = 'conversion with column store not successful in %s mode' % extractmode
+            self.assertTrue(response['success'], s)
+
+            found = response['outputfile']
+            s = 'column store of %s not in artifacts %s' % (found, response['artifacts'])
+            self.assertEqual(response['artifacts']['dwca_core_to_tsv_columnstore'],
+                found + '.columns', s)
+
+            store = column_store(found, tsv_dialect(), 'utf-8')
+            s = 'column store of %s not usable' % found
+            self.assertIsNotNone(store, s)
+            self.assertEqual(store['rowcount'], 8, s)
+
+            columns = range(len(store['header']))
+            expected = list(read_csv_tuple_row(found, tsv_dialect(), 'utf-8', columns))
+            rows = list(read_column_store_rows(store))
+            s = 'rows from the column store not equal to the rows in %s' % found
+            self.assertEqual(rows, expected, s)
+
+        # A core that would be copied as a block gets its store from the rows as they 
+        # are written. A core with a row that cannot be decoded is written without one.
+        testdwca = workspace + self.framework.testdwca
+        meta = '<archive xmlns="http://rs.tdwg.org/dwc/text/">'
+        meta += '<core encoding="UTF-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" '
+        meta += 'fieldsEnclosedBy="" ignoreHeaderLines="1" '
+        meta += 'rowType="http://rs.tdwg.org/dwc/terms/Occurrence">'
+        meta += '<files><location>occurrence.txt</location></files><id index="0"/>'
+        meta += '<field index="0" term="http://rs.tdwg.org/dwc/terms/institutionCode"/>'
+        meta += '<field index="1" term="http://rs.tdwg.org/dwc/terms/locality"/>'
+        meta += '</core></archive>'
+        core = 'institutionCode\tlocality\nMVZ\t  Lima\nMVZ\tCusco\n'
+        for data, stored in [(core, True), (core + 'MVZ\tPer\xfa\n', False)]:
+            with zipfile.ZipFile(testdwca, 'w') as archive:
+                archive.writestr('meta.xml', meta)
+                archive.writestr('occurrence.txt', data)
+
+            inputs = {}
+            inputs['inputfile'] = testdwca
+            inputs['outputfile'] = self.framework.streamedfile
+            inputs['workspace'] = workspace
+            inputs['columnstore'] = 'true'
+            response=dwca_core_to_tsv(inputs)
+            s = 'streamed conversion with column store not successful'
+            self.assertTrue(response['success'], s)
+
+            found = response['outputfile']
+            store = column_store(found, tsv_dialect(), 'utf-8')
+            s = 'column store of %s in artifacts %s' % (found, response['artifacts'])
+            self.assertEqual('dwca_core_to_tsv_columnstore' in response['artifacts'],
+                stored, s)
+            self.assertEqual(store is not None, stored, s)
+            if stored == True:
+                expected = list(read_csv_tuple_row(found, tsv_dialect(), 'utf-8'))
+                rows = list(read_column_store_rows(store))
+                s = 'rows %s from the column store not as in %s' % (rows, expected)
+                self.assertEqual(rows, expected, s)
+                self.assertEqual(rows[0], (u'MVZ', u'Lima'), s)
+
 if __name__ == '__main__':
     print '=== dwca_core_to_tsv_test.py ==='
     unittest.main()
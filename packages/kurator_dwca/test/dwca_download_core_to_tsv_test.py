@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "John Wieczorek"
+__copyright__ = "Copyright 2018 President and Fellows of Harvard College"
+__version__ = "dwca_download_core_to_tsv_test.py 2026-10-19T08:00-04:00"
+
+# This file contains unit test for the dwca_download_core_to_tsv function.
+#
+# Example:
+#
+# python dwca_download_core_to_tsv_test.py
+
+from kurator_dwca.dwca_download_core_to_tsv import dwca_download_core_to_tsv
+from kurator_dwca.dwcareader_utils import ZipStream
+from kurator_dwca.dwcareader_utils import dwca_file_descriptors
+from kurator_dwca.dwcareader_utils import write_dwca_file_tsv
+import os
+import zlib
+import struct
+import hashlib
+import threading
+import unittest
+import BaseHTTPServer
+from cStringIO import StringIO
+
+class ArchiveRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Stand-in for a web server serving one archive, accepting ranges."""
+    payload = ''
+    etag = '"v1"'
+    # The number of bytes to leave out of the next response, closing the connection
+    # early
+    drop = 0
+    # The method and range of every request
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def _respond(self, body):
+        handler = ArchiveRequestHandler
+        rangeheader = self.headers.get('Range')
+        handler.requests.append((self.command, rangeheader))
+        start, status = 0, 200
+        if rangeheader is not None and \
+            self.headers.get('If-Range', handler.etag) == handler.etag:
+            start, status = int(rangeheader.split('=')[1].split('-')[0]), 206
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(handler.payload) - start))
+        self.send_header('ETag', handler.etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', 'bytes %s-%s/%s' % \
+                (start, len(handler.payload) - 1, len(handler.payload)))
+        self.end_headers()
+        if body:
+            data = handler.payload[start:]
+            if handler.drop > 0:
+                data = data[:-handler.drop]
+                handler.drop = 0
+            self.wfile.write(data)
+
+class DwcaDownloadCoreToTsvFramework():
+    """Test framework for the Darwin Core archive download to TSV converter."""
+    # location for the test inputs and outputs
+    testdatapath = '../data/tests/'
+
+    # input data files to test, don't remove these
+    dwca = testdatapath + 'dwca-uwymv_herp.zip'
+    gbifdwca = '../data/GBIFLemurs.zip'
+
+    # output data files from tests, remove these in dispose()
+    archivefile = 'test_downloaded_dwca.zip'
+    outputfile = 'test_tsv_from_downloaded_dwca.txt'
+    expectedfile = 'test_tsv_from_dwca_on_disk.txt'
+
+    def __init__(self):
+        ArchiveRequestHandler.drop = 0
+        ArchiveRequestHandler.requests = []
+        self.server = None
+
+    def serve(self, archive):
+        """Start a local web server for an archive and return its URL"""
+        ArchiveRequestHandler.payload = open(archive, 'rb').read()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+            ArchiveRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return 'http://127.0.0.1:%s/archive.do' % self.server.server_address[1]
+
+    def dispose(self):
+        """Remove any output files created as a result of testing"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for outputfile in [self.archivefile, self.archivefile + '.part',
+            self.archivefile + '.part.json', self.outputfile, self.expectedfile]:
+            removeme = self.testdatapath + outputfile
+            if os.path.isfile(removeme):
+                os.remove(removeme)
+        return True
+
+class DwcaDownloadCoreToTsvTestCase(unittest.TestCase):
+    """Unit tests."""
+    def setUp(self):
+        self.framework = DwcaDownloadCoreToTsvFramework()
+
+    def tearDown(self):
+        self.framework.dispose()
+        self.framework = None
+
+    def test_source_files_exist(self):
+        print 'testing source_files_exist'
+        for dwca in [self.framework.dwca, self.framework.gbifdwca]:
+            self.assertTrue(os.path.isfile(dwca), dwca + ' does not exist')
+
+    def test_missing_parameters(self):
+        print 'testing missing_parameters'
+        response=dwca_download_core_to_tsv({})
+        s = 'success without any required inputs'
+        self.assertFalse(response['success'], s)
+
+    def _download(self, dwca):
+        """Download an archive from the local server and check the core written"""
+        workspace = self.framework.testdatapath
+        url = self.framework.serve(dwca)
+
+        inputs = {}
+        inputs['url'] = url
+        inputs['workspace'] = workspace
+        inputs['archivefile'] = self.framework.archivefile
+        inputs['outputfile'] = self.framework.outputfile
+        response=dwca_download_core_to_tsv(inputs)
+        #print 'response:\n%s' % response
+        s = 'core not written from %s: %s' % (dwca, response['message'])
+        self.assertTrue(response['success'], s)
+
+        payload = ArchiveRequestHandler.payload
+        s = 'archive downloaded from %s not as served' % url
+        self.assertEqual(open(response['archivefile'], 'rb').read(), payload, s)
+        self.assertEqual(response['checksum'], hashlib.sha256(payload).hexdigest(), s)
+
+        expectedfile = workspace + self.framework.expectedfile
+        rowcount = write_dwca_file_tsv(dwca, dwca_file_descriptors(dwca)[0],
+            expectedfile)
+        s = 'core from download of %s not as from the archive on disk' % dwca
+        self.assertEqual(response['rowcount'], rowcount, s)
+        self.assertEqual(open(response['outputfile'], 'rb').read(),
+            open(expectedfile, 'rb').read(), s)
+        return response
+
+    def test_download_streamed(self):
+        print 'testing download_streamed'
+        # meta.xml comes before the core, which is written as it arrives
+        response = self._download(self.framework.dwca)
+        s = 'core of archive with meta.xml first not streamed'
+        self.assertTrue(response['streamed'], s)
+        self.assertEqual(response['rowcount'], 8, s)
+
+    def test_download_core_first(self):
+        print 'testing download_core_first'
+        # The core comes before meta.xml, and is written from the downloaded archive
+        response = self._download(self.framework.gbifdwca)
+        s = 'core of archive with core before meta.xml streamed'
+        self.assertFalse(response['streamed'], s)
+        self.assertEqual(response['rowcount'], 4787, s)
+
+    def test_download_dropped(self):
+        print 'testing download_dropped'
+        payload = open(self.framework.dwca, 'rb').read()
+        # Connections dropped in the central directory and in the core are resumed
+        # from the spooled part of the archive
+        for drop in [200, len(payload) // 2]:
+            ArchiveRequestHandler.drop = drop
+            ArchiveRequestHandler.requests = []
+            response = self._download(self.framework.dwca)
+            s = 'core of archive dropped %s bytes short not as expected' % drop
+            self.assertFalse(response['streamed'], s)
+            self.assertEqual(response['rowcount'], 8, s)
+            gets = [r for r in ArchiveRequestHandler.requests if r[0] == 'GET']
+            expected = [('GET', None), ('GET', 'bytes=%s-' % (len(payload) - drop))]
+            s = 'requests %s for archive dropped %s bytes short not as expected %s' % \
+                (gets, drop, expected)
+            self.assertEqual(gets, expected, s)
+            s = 'record of spooled part left after download'
+            self.assertFalse(os.path.isfile(self.framework.testdatapath + 
+                self.framework.archivefile + '.part.json'), s)
+            self.tearDown()
+            self.setUp()
+
+    def test_zip_stream_data_descriptor(self):
+        print 'testing zip_stream_data_descriptor'
+        # Members written to a stream have their sizes and checksum after the data
+        content = 'id\tcountry\r\n' + ''.join(['%s\tPer\xc3\xba\r\n' % i
+            for i in range(2000)])
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        compressed = compressor.compress(content) + compressor.flush()
+        crc = zlib.crc32(content) & 0xFFFFFFFF
+        archive = ''
+        for name in ['occurrence.txt', 'eml.xml']:
+            archive += struct.pack('<4s5H3L2H', 'PK\x03\x04', 20, 0x8, 8, 0, 0, 0, 0,
+                0, len(name), 0) + name + compressed
+            archive += struct.pack('<4s3L', 'PK\x07\x08', crc, len(compressed),
+                len(content))
+        archive += 'PK\x01\x02 central directory'
+
+        spool = StringIO()
+        stream = ZipStream(StringIO(archive), spool, blocksize=1000)
+        members = []
+        for member in stream.members():
+            if member.name == 'occurrence.txt':
+                lines = list(member)
+                s = 'lines of streamed member not as expected'
+                self.assertEqual(len(lines), 2001, s)
+                self.assertEqual(lines[1], '0\tPer\xc3\xba\r\n', s)
+            members.append(member.name)
+        checksum = stream.drain()
+
+        s = 'members %s not as expected' % members
+        self.assertEqual(members, ['occurrence.txt', 'eml.xml'], s)
+        s = 'stream not spooled as read'
+        self.assertEqual(spool.getvalue(), archive, s)
+        self.assertEqual(checksum, hashlib.sha256(archive).hexdigest(), s)
+
+        # A corrupted member fails its checksum
+        corrupted = archive.replace(struct.pack('<L', crc), struct.pack('<L', crc ^ 1))
+        stream = ZipStream(StringIO(corrupted))
+        with self.assertRaises(IOError):
+            for member in stream.members():
+                member.read()
+
+if __name__ == '__main__':
+    print '=== dwca_download_core_to_tsv_test.py ==='
+    unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "John Wieczorek"
+__copyright__ = "Copyright 2018 President and Fellows of Harvard College"
+__version__ = "dwca_extract_all_test.py 2026-10-18T16:30-04:00"
+
+# This file contains unit test for the dwca_extract_all function.
+#
+# Example:
+#
+# python dwca_extract_all_test.py
+
+from kurator_dwca.dwca_extract_all import dwca_extract_all
+from kurator_dwca.dwcareader_utils import dwca_index_offsets
+from kurator_dwca.dwca_utils import read_header
+from kurator_dwca.dwca_utils import tsv_dialect
+import os
+import json
+import zipfile
+import unittest
+
+class DwcaExtractAllFramework():
+    """Test framework for the Darwin Core archive extractor."""
+    # location for the test inputs and outputs
+    testdatapath = '../data/tests/'
+
+    # input data files to test, don't remove these
+    dwca = testdatapath + 'dwca-uwymv_herp.zip'
+
+    # output data files from tests, remove these in dispose()
+    testdwca = 'test_extract_all_dwca.zip'
+    outputfiles = ['test_extract_all_dwca_manifest.json',
+        'test_extract_all_dwca_occurrence.txt',
+        'test_extract_all_dwca_occurrence_ids.txt',
+        'test_extract_all_dwca_multimedia.txt',
+        'test_extract_all_dwca_multimedia_ids.txt',
+        'dwca-uwymv_herp_manifest.json',
+        'dwca-uwymv_herp_occurrence.txt',
+        'dwca-uwymv_herp_multimedia.txt']
+
+    def dispose(self):
+        """Remove any output files created as a result of testing"""
+        for outputfile in [self.testdwca] + self.outputfiles:
+            removeme = self.testdatapath + outputfile
+            #print 'removeme: %s' % removeme
+            if os.path.isfile(removeme):
+                os.remove(removeme)
+        return True
+
+class DwcaExtractAllTestCase(unittest.TestCase):
+    """Unit tests."""
+    def setUp(self):
+        self.framework = DwcaExtractAllFramework()
+
+    def tearDown(self):
+        self.framework.dispose()
+        self.framework = None
+
+    def test_source_files_exist(self):
+        print 'testing source_files_exist'
+        dwca = self.framework.dwca
+        self.assertTrue(os.path.isfile(dwca), dwca + ' does not exist')
+
+    def test_missing_parameters(self):
+        print 'testing missing_parameters'
+        workspace = self.framework.testdatapath
+
+        # Test with no inputs
+        inputs = {}
+        response=dwca_extract_all(inputs)
+        #print 'response:\n%s' % response
+        s = 'success without any required inputs'
+        self.assertFalse(response['success'], s)
+
+        # Test with an input file that does not exist
+        inputs['inputfile'] = 'nonexistentfile.zip'
+        inputs['workspace'] = workspace
+        response=dwca_extract_all(inputs)
+        s = 'success with non-existent input file'
+        self.assertFalse(response['success'], s)
+
+    def test_extract_all(self):
+        print 'testing extract_all'
+        dwca = self.framework.dwca
+        workspace = self.framework.testdatapath
+
+        inputs = {}
+        inputs['inputfile'] = dwca
+        inputs['workspace'] = workspace
+        response=dwca_extract_all(inputs)
+        #print 'response:\n%s' % response
+        s = 'extraction of %s not successful: %s' % (dwca, response['message'])
+        self.assertTrue(response['success'], s)
+
+        s = 'rowcount %s not as expected' % response['rowcount']
+        self.assertEqual(response['rowcount'], 8, s)
+
+        files = response['files']
+        s = 'core not first of files %s' % files
+        self.assertEqual(len(files), 2, s)
+        self.assertTrue(files[0]['core'], s)
+        self.assertEqual(files[0]['location'], 'occurrence.txt', s)
+
+        s = 'extension file %s not as expected' % files[1]
+        self.assertEqual(files[1]['location'], 'multimedia.txt', s)
+        self.assertEqual(files[1]['rowcount'], 0, s)
+        self.assertIsNone(files[1]['indexfile'], s)
+
+        header = read_header(files[1]['outputfile'], tsv_dialect())
+        s = 'extension header %s not as expected' % header
+        self.assertEqual(header, files[1]['columns'], s)
+        self.assertEqual(header[0], 'coreid', s)
+
+        with open(response['manifest']) as manifestfile:
+            manifest = json.load(manifestfile)
+        s = 'manifest %s not as expected' % manifest
+        self.assertEqual(manifest['files'], files, s)
+
+    def test_extract_all_indexed(self):
+        print 'testing extract_all_indexed'
+        workspace = self.framework.testdatapath
+        testdwca = workspace + self.framework.testdwca
+
+        meta = '<archive xmlns="http://rs.tdwg.org/text/">'
+        meta += '<core encoding="ISO-8859-1" fieldsTerminatedBy="," '
+        meta += 'linesTerminatedBy="\\n" fieldsEnclosedBy="&quot;" '
+        meta += 'ignoreHeaderLines="1" rowType="http://rs.tdwg.org/dwc/terms/Occurrence">'
+        meta += '<files><location>occurrence.txt</location></files><id index="0"/>'
+        meta += '<field index="0" term="http://rs.tdwg.org/dwc/terms/occurrenceID"/>'
+        meta += '<field index="1" term="http://rs.tdwg.org/dwc/terms/locality"/>'
+        meta += '</core>'
+        meta += '<extension encoding="UTF-8" fieldsTerminatedBy="\\t" '
+        meta += 'linesTerminatedBy="\\n" fieldsEnclosedBy="" ignoreHeaderLines="1" '
+        meta += 'rowType="http://rs.gbif.org/terms/1.0/Multimedia">'
+        meta += '<files><location>multimedia.txt</location></files><coreid index="0"/>'
+        meta += '<field index="1" term="http://purl.org/dc/terms/type"/>'
+        meta += '</extension></archive>'
+
+        core = 'occurrenceID,locality\n"b","Z\xfcrich, Switzerland"\n"a","Per\xfa"\n'
+        core += '"c","Lima"\n'
+        multimedia = 'coreid\ttype\nc\tStillImage\na\tSound\na\tStillImage\n'
+        with zipfile.ZipFile(testdwca, 'w') as archive:
+            archive.writestr('meta.xml', meta)
+            archive.writestr('occurrence.txt', core)
+            archive.writestr('multimedia.txt', multimedia)
+
+        inputs = {}
+        inputs['inputfile'] = testdwca
+        inputs['workspace'] = workspace
+        inputs['idindex'] = 'true'
+        inputs['workers'] = '2'
+        response=dwca_extract_all(inputs)
+        #print 'response:\n%s' % response
+        s = 'extraction of %s not successful: %s' % (testdwca, response['message'])
+        self.assertTrue(response['success'], s)
+
+        files = response['files']
+        s = 'rowcounts of files %s not as expected' % files
+        self.assertEqual(response['rowcount'], 6, s)
+        self.assertEqual([f['rowcount'] for f in files], [3, 3], s)
+
+        # Join every extension row to its core row through the index files
+        core, extension = files
+        with open(core['outputfile'], 'rb') as corefile:
+            with open(extension['outputfile'], 'rb') as extensionfile:
+                joined = []
+                for offset in dwca_index_offsets(extension['indexfile'], 'a'):
+                    extensionfile.seek(offset)
+                    row = extensionfile.readline().split('\r')[0].split('\t')
+                    for coreoffset in dwca_index_offsets(core['indexfile'], row[0]):
+                        corefile.seek(coreoffset)
+                        joined.append([row[1],
+                            corefile.readline().split('\r')[0].split('\t')[1]])
+
+        expected = [['Sound', 'Per\xc3\xba'], ['StillImage', 'Per\xc3\xba']]
+        s = 'joined rows %s not as expected %s' % (joined, expected)
+        self.assertEqual(joined, expected, s)
+
+        offsets = dwca_index_offsets(core['indexfile'], 'd')
+        s = 'offsets %s found for id not in core' % offsets
+        self.assertEqual(offsets, [], s)
+
+if __name__ == '__main__':
+    print '=== dwca_extract_all_test.py ==='
+    unittest.main()
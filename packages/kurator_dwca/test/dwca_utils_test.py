@@ -14,7 +14,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2018 President and Fellows of Harvard College"
-__version__ = "dwca_utils_test.py 2018-02-06T11:19-03:00"
+__version__ = "dwca_utils_test.py 2026-10-19T09:20-04:00"
 
 # This file contains unit test for the functions in dwca_utils.
 #
@@ -23,7 +23,13 @@ __version__ = "dwca_utils_test.py 2018-02-06T11:19-03:00"
 # python dwca_utils_test.py
 
 from kurator_dwca.dwca_utils import represents_int
+from kurator_dwca.dwca_utils import ascii_transparent_encoding
+from kurator_dwca.dwca_utils import CategoricalDictionary
+from kurator_dwca.dwca_utils import categorical_terms
 from kurator_dwca.dwca_utils import clean_header
+from kurator_dwca.dwca_utils import clear_file_profiles
+from kurator_dwca.dwca_utils import column_store
+from kurator_dwca.dwca_utils import ColumnStoreWriter
 from kurator_dwca.dwca_utils import composite_header
 from kurator_dwca.dwca_utils import convert_csv
 #from kurator_dwca.dwca_utils import convert_csv_pandas
@@ -32,26 +38,49 @@ from kurator_dwca.dwca_utils import csv_dialect
 from kurator_dwca.dwca_utils import csv_field_checker
 from kurator_dwca.dwca_utils import csv_file_dialect
 from kurator_dwca.dwca_utils import csv_file_encoding
+from kurator_dwca.dwca_utils import csv_file_encoding_detection
 from kurator_dwca.dwca_utils import csv_file_dialect
 from kurator_dwca.dwca_utils import dialects_equal
 from kurator_dwca.dwca_utils import extract_fields_from_row
 from kurator_dwca.dwca_utils import extract_value_counts_from_file
 from kurator_dwca.dwca_utils import extract_values_from_row
 from kurator_dwca.dwca_utils import extract_values_from_file
+from kurator_dwca.dwca_utils import file_chunks
+from kurator_dwca.dwca_utils import file_samples
+from kurator_dwca.dwca_utils import file_profile
 from kurator_dwca.dwca_utils import get_guid
 from kurator_dwca.dwca_utils import header_map
+from kurator_dwca.dwca_utils import header_index_map
+from kurator_dwca.dwca_utils import indexed_line_count
+from kurator_dwca.dwca_utils import line_index
+from kurator_dwca.dwca_utils import load_profile_index
+from kurator_dwca.dwca_utils import LRUCache
 from kurator_dwca.dwca_utils import merge_headers
+from kurator_dwca.dwca_utils import profile_file
+from kurator_dwca.dwca_utils import profile_file_incremental
 from kurator_dwca.dwca_utils import purge_non_printing_from_file
+from kurator_dwca.dwca_utils import read_csv_row
+from kurator_dwca.dwca_utils import read_column_store_rows
+from kurator_dwca.dwca_utils import read_csv_tuple_row
 from kurator_dwca.dwca_utils import read_header
+from kurator_dwca.dwca_utils import read_indexed_lines
+from kurator_dwca.dwca_utils import read_rows
+from kurator_dwca.dwca_utils import samples_are_utf8
+from kurator_dwca.dwca_utils import set_file_profile_value
+from kurator_dwca.dwca_utils import save_profile_index
 from kurator_dwca.dwca_utils import split_path
 from kurator_dwca.dwca_utils import strip_list
+from kurator_dwca.dwca_utils import term_completeness_from_file
 from kurator_dwca.dwca_utils import term_rowcount_from_file
 from kurator_dwca.dwca_utils import tsv_dialect
 from kurator_dwca.dwca_utils import ustripstr
 from kurator_dwca.dwca_utils import utf8_data_encoder
+from kurator_dwca.dwca_utils import csv_lines
 from kurator_dwca.dwca_utils import utf8_file_encoder
+from kurator_dwca.dwca_utils import write_column_store
 from kurator_dwca.dwca_utils import write_header
 import os
+import shutil
 import unittest
 
 # Replace the system csv with unicodecsv. All invocations of csv will use unicodecsv,
@@ -108,6 +137,12 @@ class DWCAUtilsFramework():
     testencoding = testdatapath + 'test_encoding.txt'
     testnonprinting = testdatapath + 'test_nonprinting_out.txt'
     newlinecondenser = testdatapath + 'test_newlinecondenser_out.txt'
+    testprofileindex = testdatapath + 'test_profile_index.json'
+    testdecodeerrors = testdatapath + 'test_decode_errors.csv'
+    testchunks = testdatapath + 'test_chunks.csv'
+    testcolumnstore = testdatapath + 'test_column_store.txt'
+    testincremental = testdatapath + 'test_incremental.txt'
+    testfingerprintstore = testdatapath + 'test_fingerprints'
 
     def dispose(self):
         csvwriteheaderfile = self.csvwriteheaderfile
@@ -118,6 +153,9 @@ class DWCAUtilsFramework():
         testencoding = self.testencoding
         testnonprinting = self.testnonprinting
         newlinecondenser = self.newlinecondenser
+        testprofileindex = self.testprofileindex
+        testdecodeerrors = self.testdecodeerrors
+        testchunks = self.testchunks
         if os.path.isfile(csvwriteheaderfile):
             os.remove(csvwriteheaderfile)
         if os.path.isfile(tsvfromcsvfile1):
@@ -134,6 +172,22 @@ class DWCAUtilsFramework():
             os.remove(testnonprinting)
         if os.path.isfile(newlinecondenser):
             os.remove(newlinecondenser)
+        if os.path.isfile(testprofileindex):
+            os.remove(testprofileindex)
+        if os.path.isfile(testdecodeerrors):
+            os.remove(testdecodeerrors)
+        if os.path.isfile(testchunks):
+            os.remove(testchunks)
+        if os.path.isfile(testchunks + '.lineindex'):
+            os.remove(testchunks + '.lineindex')
+        if os.path.isfile(self.testincremental):
+            os.remove(self.testincremental)
+        if os.path.isdir(self.testfingerprintstore):
+            shutil.rmtree(self.testfingerprintstore)
+        if os.path.isfile(self.testcolumnstore):
+            os.remove(self.testcolumnstore)
+        if os.path.isdir(self.testcolumnstore + '.columns'):
+            shutil.rmtree(self.testcolumnstore + '.columns')
         return True
 
 class DWCAUtilsTestCase(unittest.TestCase):
@@ -277,6 +331,66 @@ class DWCAUtilsTestCase(unittest.TestCase):
         s = 'Number of rows (%s) in %s not as expected (%s)' % (count, file, expected)
         self.assertEqual(count, expected, s)
 
+        # Counts of line endings without a line index agree with the line index
+        testfile = self.framework.testchunks
+        for content in ['', 'a\r\nb\r\n', 'a\nb', 'a\rb\rcd\r', 'a\n\rb\r']:
+            with open(testfile, 'wb') as outfile:
+                outfile.write(content)
+            clear_file_profiles()
+            count = count_rows(testfile)
+            expected = len(line_index(testfile)['offsets'])
+            s = 'Number of rows (%s) in %r not as expected (%s)' % \
+                (count, content, expected)
+            self.assertEqual(count, expected, s)
+        clear_file_profiles()
+
+    def test_file_profile(self):
+        print 'testing file_profile'
+        testfile = self.framework.tsvreadheaderfile
+        testprofileindex = self.framework.testprofileindex
+
+        clear_file_profiles()
+        profile = file_profile(testfile)
+        s = 'Profile of unread file %s not empty: %s' % (testfile, profile)
+        self.assertTrue('encoding' not in profile, s)
+
+        encoding = csv_file_encoding(testfile)
+        dialect = csv_file_dialect(testfile)
+        header = read_header(testfile)
+        count = count_rows(testfile)
+        profile = file_profile(testfile)
+        for attribute in ['encoding', 'dialect', 'header', 'rowcount']:
+            s = 'Attribute %s not found in profile of %s' % (attribute, testfile)
+            self.assertTrue(attribute in profile, s)
+
+        # Detection on an unchanged file should give the same results from the profile
+        s = 'Cached encoding for %s does not match original' % testfile
+        self.assertEqual(csv_file_encoding(testfile), encoding, s)
+        s = 'Cached dialect for %s does not match original' % testfile
+        self.assertTrue(dialects_equal(csv_file_dialect(testfile), dialect), s)
+        s = 'Cached header for %s does not match original' % testfile
+        self.assertEqual(read_header(testfile), header, s)
+        s = 'Cached row count for %s does not match original' % testfile
+        self.assertEqual(count_rows(testfile), count, s)
+
+        # A profile index should persist the profiles between processes
+        success = save_profile_index(testprofileindex)
+        s = 'Profile index %s not written' % testprofileindex
+        self.assertTrue(success, s)
+        self.assertTrue(os.path.isfile(testprofileindex), s)
+
+        clear_file_profiles()
+        load_profile_index(testprofileindex)
+        profile = file_profile(testfile)
+        s = 'Profile of %s not restored from %s' % (testfile, testprofileindex)
+        self.assertEqual(profile['encoding'], encoding, s)
+        self.assertEqual(read_header(testfile), header, s)
+        self.assertTrue(dialects_equal(csv_file_dialect(testfile), dialect), s)
+
+        # Stop persisting to the test index
+        load_profile_index(None)
+        clear_file_profiles()
+
     def test_tsv_dialect(self):
         print 'testing tsv_dialect'
         dialect = tsv_dialect()
@@ -626,6 +740,69 @@ class DWCAUtilsTestCase(unittest.TestCase):
         s = 'header map: %s not as \nexpected: %s' % (result, expected)
         self.assertEqual(result, expected, s)
 
+    def test_header_index_map(self):
+        print 'testing header_index_map'
+        header = ['b', 'a', 'c', 'a']
+        result = header_index_map(header)
+        expected = {'b':0, 'a':3, 'c':2}
+        s = 'header index map: %s not as \nexpected: %s' % (result, expected)
+        self.assertEqual(result, expected, s)
+
+        result = header_index_map([])
+        self.assertIsNone(result, 'header index map given for empty header')
+
+    def test_ascii_transparent_encoding(self):
+        print 'testing ascii_transparent_encoding'
+        for encoding in ['utf-8', 'UTF-8-SIG', 'ascii', 'ISO-8859-1', 'cp1252', 
+            'mac_roman']:
+            s = 'encoding %s not ascii transparent' % encoding
+            self.assertTrue(ascii_transparent_encoding(encoding), s)
+
+        for encoding in ['utf-16', 'utf-32', 'shift_jis', 'gbk', 'notanencoding', None]:
+            s = 'encoding %s ascii transparent' % encoding
+            self.assertFalse(ascii_transparent_encoding(encoding), s)
+
+    def test_read_csv_tuple_row(self):
+        print 'testing read_csv_tuple_row'
+        extractvaluesfile1 = self.framework.extractvaluesfile1
+        encodedfile_latin_1 = self.framework.encodedfile_latin_1
+        tsvtest1 = self.framework.tsvtest1
+
+        for inputfile, encoding in [[extractvaluesfile1, 'utf-8'], 
+            [encodedfile_latin_1, 'ISO-8859-1'], [tsvtest1, 'utf-8']]:
+            dialect = csv_file_dialect(inputfile)
+            header = read_header(inputfile, dialect, encoding)
+            rows = list(read_csv_tuple_row(inputfile, dialect, encoding))
+            dictrows = list(read_csv_row(inputfile, dialect, encoding))
+            s = 'row count %s not the same as for read_csv_row() %s in %s' % \
+                (len(rows), len(dictrows), inputfile)
+            self.assertEqual(len(rows), len(dictrows), s)
+            if encoding == 'utf-8':
+                for row, dictrow in zip(rows, dictrows):
+                    s = 'row %s does not match %s in %s' % (row, dictrow, inputfile)
+                    self.assertEqual(dict(zip(header, row)), dictrow, s)
+
+        # Only the requested columns are returned, in the order requested
+        dialect = csv_file_dialect(extractvaluesfile1)
+        header = read_header(extractvaluesfile1, dialect, 'utf-8')
+        indexmap = header_index_map(header)
+        columns = [indexmap['stateProvince'], None, indexmap['country']]
+        rows = list(read_csv_tuple_row(extractvaluesfile1, dialect, 'utf-8', 
+            columns=columns))
+        expected = (u'Washington', None, u'United States')
+        s = 'first row %s not as expected %s' % (rows[0], expected)
+        self.assertEqual(rows[0], expected, s)
+
+        # Values in single-byte encodings are decoded once
+        dialect = csv_file_dialect(encodedfile_latin_1)
+        header = read_header(encodedfile_latin_1, dialect, 'ISO-8859-1')
+        column = header_index_map(header)['locality']
+        rows = list(read_csv_tuple_row(encodedfile_latin_1, dialect, 'ISO-8859-1', 
+            columns=[column]))
+        expected = u'laguna miraflores, camino estel\xcc_- miraflores.'
+        s = 'second locality %s not as expected %s' % (rows[1][0], expected)
+        self.assertEqual(rows[1][0], expected, s)
+
     def test_clean_header(self):
         print 'testing clean_header'
         header = ['b ', ' a', 'c	']
@@ -752,6 +929,464 @@ class DWCAUtilsTestCase(unittest.TestCase):
             % (rowcount, term, expected, termrowcountfile)
         self.assertEqual(rowcount, expected, s)
 
+    def test_profile_file(self):
+        print 'testing profile_file'
+        extractvaluesfile1 = self.framework.extractvaluesfile1
+
+        aggregates = [
+            {'type':'rowcount'},
+            {'type':'rowcount', 'term':'country'},
+            {'type':'completeness'},
+            {'type':'valuecounts', 'fields':['country', 'stateProvince'], 
+                'separator':'|'},
+            {'type':'tokens', 'term':'locality'},
+            {'type':'rowcount', 'term':'notaterm'},
+            {'type':'notanaggregate'} ]
+        results = profile_file(extractvaluesfile1, aggregates)
+        s = 'results count (%s) does not match aggregate count (%s)' % \
+            (len(results), len(aggregates))
+        self.assertEqual(len(results), len(aggregates), s)
+
+        s = 'rowcount (%s) not as expected' % results[0]
+        self.assertEqual(results[0], 8, s)
+
+        s = 'rowcount for country (%s) not as expected' % results[1]
+        self.assertEqual(results[1], 8, s)
+
+        # The results in one pass should match those from the single aggregate calls
+        completeness = results[2]
+        s = 'completeness %s not as expected' % completeness
+        self.assertEqual(completeness['rows'], 8, s)
+        self.assertEqual(completeness['country'], 8, s)
+
+        expected = extract_value_counts_from_file(extractvaluesfile1, 
+            ['country', 'stateProvince'], '|')
+        s = 'value counts %s not as expected %s' % (results[3], expected)
+        self.assertEqual(sorted(results[3]), sorted(expected), s)
+
+        tokens = results[4]
+        s = 'tokens %s not as expected' % tokens
+        self.assertEqual(tokens['rowcount'], 8, s)
+        self.assertEqual(tokens['term'], 'locality', s)
+        self.assertTrue(tokens['tokencount'] >= len(tokens['tokenlist']), s)
+
+        s = 'result for missing term (%s) not None' % results[5]
+        self.assertIsNone(results[5], s)
+
+        s = 'result for unknown aggregate (%s) not None' % results[6]
+        self.assertIsNone(results[6], s)
+
+        results = profile_file(extractvaluesfile1, None)
+        s = 'results (%s) given for no aggregates' % results
+        self.assertIsNone(results, s)
+
+    def test_file_chunks(self):
+        print 'testing file_chunks'
+        testfile = self.framework.testchunks
+
+        # Line endings in quoted values are not record boundaries
+        with open(testfile, 'wb') as outfile:
+            outfile.write('id,notes\r\n')
+            for i in range(50):
+                outfile.write('%s,"a \\" quote, a ""quote"" and a\r\nnew line"\r\n' % i)
+
+        dialect = csv_dialect()
+        chunks = file_chunks(testfile, dialect, 4)
+        s = 'chunks %s not as expected' % chunks
+        self.assertEqual(len(chunks), 4, s)
+        self.assertEqual(chunks[0][0], len('id,notes\r\n'), s)
+        self.assertEqual(chunks[-1][1], os.path.getsize(testfile), s)
+
+        rowcount = 0
+        for chunk in chunks:
+            rows = list(read_csv_tuple_row(testfile, dialect, 'utf-8', byterange=chunk))
+            for row in rows:
+                expected = u'a " quote, a "quote" and a\nnew line'
+                s = 'value %s in chunk %s not as expected %s' % (row[1], chunk, expected)
+                self.assertEqual(row[1], expected, s)
+            rowcount += len(rows)
+        s = 'row count %s over chunks %s not as expected' % (rowcount, chunks)
+        self.assertEqual(rowcount, 50, s)
+
+        chunks = file_chunks(self.framework.tsvtest1, tsv_dialect(), 1)
+        s = 'chunks %s not one chunk' % chunks
+        self.assertEqual(len(chunks), 1, s)
+
+    def test_line_index(self):
+        print 'testing line_index'
+        testfile = self.framework.testchunks
+
+        with open(testfile, 'wb') as outfile:
+            outfile.write('id\tname\r\n')
+            for i in range(20):
+                outfile.write('%s\tname %s\r\n' % (i, i))
+
+        index = line_index(testfile, persist=True)
+        s = 'line index file for %s not written' % testfile
+        self.assertTrue(os.path.isfile(testfile + '.lineindex'), s)
+
+        found = indexed_line_count(index)
+        s = 'line count %s not as expected 21' % found
+        self.assertEqual(found, 21, s)
+
+        found = read_indexed_lines(testfile, 5)
+        expected = '4\tname 4\r\n'
+        s = 'line 5 (%s) not as expected (%s)' % (found, expected)
+        self.assertEqual(found, expected, s)
+
+        found = read_indexed_lines(testfile, 20, 25)
+        expected = '19\tname 19\r\n'
+        s = 'lines from 20 (%s) not as expected (%s)' % (found, expected)
+        self.assertEqual(found, expected, s)
+
+        # Chunks of files without quotes come from the line index
+        chunks = file_chunks(testfile, tsv_dialect(), 3)
+        s = 'chunks %s not as expected' % chunks
+        self.assertEqual(len(chunks), 3, s)
+        self.assertEqual(chunks[0][0], index['offsets'][1], s)
+        self.assertEqual(chunks[-1][1], os.path.getsize(testfile), s)
+        for chunk in chunks:
+            self.assertTrue(chunk[0] in index['offsets'], s)
+
+        # A changed file is indexed again
+        with open(testfile, 'ab') as outfile:
+            outfile.write('20\tname 20')
+        os.utime(testfile, None)
+        index = line_index(testfile, persist=True)
+        found = indexed_line_count(index)
+        s = 'line count %s after change not as expected 22' % found
+        self.assertEqual(found, 22, s)
+
+        found = read_indexed_lines(testfile, 21)
+        expected = '20\tname 20'
+        s = 'last line (%s) not as expected (%s)' % (found, expected)
+        self.assertEqual(found, expected, s)
+
+    def test_column_store(self):
+        print 'testing column_store'
+        testfile = self.framework.testcolumnstore
+
+        # 150 columns, of which a few are populated from small vocabularies, the rest
+        # with values that are all different
+        header = ['id'] + ['term%s' % c for c in range(1, 150)]
+        countries = [u'Per\xfa', 'Chile', 'Bolivia']
+        with open(testfile, 'wb') as outfile:
+            outfile.write('\t'.join(header) + '\n')
+            for i in range(200):
+                row = [str(i), countries[i % 3].encode('utf-8'), '', ' ']
+                row += ['value %s %s' % (c, i) for c in range(4, 150)]
+                if i % 50 == 7:
+                    # A row missing its last values
+                    row = row[:2]
+                outfile.write('\t'.join(row) + '\n')
+
+        store = write_column_store(testfile, tsv_dialect(), 'utf-8', rowgroupsize=64)
+        s = 'column store for %s not written' % testfile
+        self.assertIsNotNone(store, s)
+        self.assertEqual(store['rowcount'], 200, s)
+        self.assertEqual(len(store['rowgroups']), 4, s)
+
+        found = column_store(testfile, tsv_dialect(), 'utf-8')
+        s = 'column store for %s not found' % testfile
+        self.assertIsNotNone(found, s)
+        found = column_store(testfile, tsv_dialect(), 'latin-1')
+        s = 'column store for %s found for another encoding' % testfile
+        self.assertIsNone(found, s)
+
+        stats = store['rowgroups'][0]['columns']
+        s = 'statistics of first row group %s not as expected' % stats[1]
+        self.assertEqual(stats[1]['kind'], 'dictionary', s)
+        self.assertEqual(stats[1]['distinct'], 3, s)
+        self.assertEqual(stats[1]['min'], 'Bolivia', s)
+        self.assertEqual(stats[1]['max'], u'Per\xfa', s)
+        s = 'statistics of first row group %s not as expected' % stats[3]
+        self.assertEqual(stats[3]['nonempty'], 0, s)
+        self.assertIsNone(stats[3]['min'], s)
+        s = 'statistics of first row group %s not as expected' % stats[10]
+        self.assertEqual(stats[10]['kind'], 'plain', s)
+        self.assertEqual(stats[10]['nonempty'], 62, s)
+
+        # The rows are those in the file, with None for the missing values
+        columns = [1, 0, 149, None, 3]
+        expected = list(read_csv_tuple_row(testfile, tsv_dialect(), 'utf-8', columns))
+        found = list(read_column_store_rows(store, columns))
+        s = 'rows from column store not as in the file'
+        self.assertEqual(found, expected, s)
+        self.assertEqual(found[7], (u'Chile', u'7', None, None, None), s)
+
+        found = list(read_column_store_rows(store, [0, 2], where={1:'Chile'}))
+        expected = [(unicode(i), None if i % 50 == 7 else u'') 
+            for i in range(1, 200, 3)]
+        s = 'filtered rows from column store not as expected'
+        self.assertEqual(found, expected, s)
+        found = list(read_column_store_rows(store, where={1:'Argentina'}))
+        s = 'rows found for value outside of the row group statistics'
+        self.assertEqual(found, [], s)
+
+        # The columns of a geography assessment are a small part of the store
+        geography = range(1, 10)
+        needed = 0
+        total = 0
+        for group in store['rowgroups']:
+            for c, column in enumerate(group['columns']):
+                total += column['length']
+                if c in geography:
+                    needed += column['length']
+        s = 'bytes for %s of %s columns (%s) not a small part of %s' % \
+            (len(geography), len(header), needed, total)
+        self.assertTrue(needed * 10 < total, s)
+
+        # Profiles from the store are those from the file
+        aggregates = [
+            {'type':'rowcount'},
+            {'type':'completeness'},
+            {'type':'valuecounts', 'fields':['term1', 'term3'], 'separator':'|'}]
+        fromstore = profile_file(testfile, aggregates)
+        fromvalues = extract_values_from_file(testfile, ['term1'])
+        shutil.rmtree(testfile + '.columns')
+        fromfile = profile_file(testfile, aggregates)
+        s = 'profile from column store %s not as from file %s' % (fromstore, fromfile)
+        self.assertEqual(fromstore, fromfile, s)
+        expected = extract_values_from_file(testfile, ['term1'])
+        s = 'values from column store %s not as from file %s' % (fromvalues, expected)
+        self.assertEqual(fromvalues, expected, s)
+
+        # A store for a file that has changed since is not used
+        write_column_store(testfile)
+        with open(testfile, 'ab') as outfile:
+            outfile.write('200\tChile\n')
+        os.utime(testfile, None)
+        found = column_store(testfile)
+        s = 'column store found for changed file %s' % testfile
+        self.assertIsNone(found, s)
+
+    def test_column_store_writer(self):
+        print 'testing column_store_writer'
+        testfile = self.framework.testcolumnstore
+        header = ['id', 'country', 'locality']
+        rows = [[u'1', u'Per\xfa', u'  Lima'], [u'2', u'', u''], [u'3', u'Chile', u' ']]
+        dialect = tsv_dialect()
+
+        # The store of a file written row by row has the rows as read from the file
+        store = ColumnStoreWriter(testfile, header, dialect, 'utf-8', rowgroupsize=2)
+        write_header(testfile, header, dialect)
+        with open(testfile, 'ab') as outfile:
+            writer = csv.writer(outfile, dialect=dialect, encoding='utf-8')
+            for row in rows:
+                writer.writerow(row)
+                store.writerow(row, written=True)
+        written = store.close()
+        s = 'column store for %s not written' % testfile
+        self.assertIsNotNone(written, s)
+        self.assertEqual(written['rowcount'], 3, s)
+        self.assertEqual(len(written['rowgroups']), 2, s)
+        found = column_store(testfile, dialect, 'utf-8')
+        s = 'column store for %s not found' % testfile
+        self.assertIsNotNone(found, s)
+
+        expected = list(read_csv_tuple_row(testfile, dialect, 'utf-8'))
+        rows = list(read_column_store_rows(found))
+        s = 'rows %s from column store not as in the file %s' % (rows, expected)
+        self.assertEqual(rows, expected, s)
+        self.assertEqual(rows[0], (u'1', u'Per\xfa', u'Lima'), s)
+
+        # A value with a line break is read from the file as two rows
+        os.utime(testfile, (0, 0))
+        store = ColumnStoreWriter(testfile, header, dialect, 'utf-8')
+        store.writerow([u'4', u'Chile', u'Lima\nCallao'], written=True)
+        s = 'column store kept for a row not read as written'
+        self.assertIsNone(store.close(), s)
+        self.assertIsNone(column_store(testfile, dialect, 'utf-8'), s)
+
+    def test_categorical_dictionary(self):
+        print 'testing categorical_dictionary'
+        extractvaluesfile1 = self.framework.extractvaluesfile1
+        dialect = csv_file_dialect(extractvaluesfile1)
+        encoding = csv_file_encoding(extractvaluesfile1)
+
+        terms = categorical_terms()
+        s = 'categorical terms %s not as expected' % terms
+        self.assertTrue('basisOfRecord' in terms, s)
+        self.assertTrue('countryCode' in terms, s)
+
+        dictionary = CategoricalDictionary()
+        code = dictionary.encode('Per\xc3\xba')
+        s = 'code %s for value not as expected' % code
+        self.assertEqual(code, 1, s)
+        self.assertEqual(dictionary.encode_value(u'Per\xfa'), code, s)
+        self.assertEqual(dictionary.encode(None), 0, s)
+        s = 'value %s for code not as expected' % dictionary.values[code]
+        self.assertEqual(dictionary.values[code], u'Per\xfa', s)
+
+        # Values are given as codes in the positions with a dictionary
+        header = read_header(extractvaluesfile1, dialect, encoding)
+        columns = [header.index('country'), header.index('recordedBy')]
+        dictionary = CategoricalDictionary()
+        expected = list(read_csv_tuple_row(extractvaluesfile1, dialect, encoding, 
+            columns))
+        found = list(read_csv_tuple_row(extractvaluesfile1, dialect, encoding, columns,
+            categoricals={0:dictionary}))
+        found = [(dictionary.values[code], v) for code, v in found]
+        s = 'decoded rows %s not as expected %s' % (found, expected)
+        self.assertEqual(found, expected, s)
+
+        # Rows kept in memory share the values of categorical terms
+        rows = read_rows(extractvaluesfile1, None, dialect, encoding, 
+            categoricals=['country'])
+        s = 'values of country not shared among rows'
+        self.assertEqual(rows[0]['country'], rows[1]['country'], s)
+        self.assertTrue(rows[0]['country'] is rows[1]['country'], s)
+
+        # Value counts from codes are those from the values
+        aggregates = [
+            {'type':'valuecounts', 'fields':['country', 'stateProvince'], 
+                'separator':'|'},
+            {'type':'valuecounts', 'fields':['country', 'notaterm']},
+            {'type':'completeness'},
+            {'type':'valuecounts', 'fields':['country']}]
+        fromvalues = profile_file(extractvaluesfile1, aggregates, categoricals=[])
+        fromcodes = profile_file(extractvaluesfile1, aggregates, 
+            categoricals=['country', 'stateProvince', 'notaterm'])
+        s = 'value counts from codes %s not as from values %s' % (fromcodes, fromvalues)
+        self.assertEqual(fromcodes, fromvalues, s)
+        self.assertEqual(fromcodes[3], [(u'United States', 8)], s)
+
+        # Codes from the dictionaries of different processes are not mixed up
+        fromcodes = profile_file(extractvaluesfile1, aggregates, workers=3,
+            categoricals=['country', 'stateProvince', 'notaterm'])
+        s = 'value counts from codes with workers %s not as from values %s' % \
+            (fromcodes, fromvalues)
+        self.assertEqual(fromcodes, fromvalues, s)
+
+    def test_lru_cache(self):
+        print 'testing lru_cache'
+        cache = LRUCache(4)
+        for key in ['a', 'b', 'c']:
+            cache.set(key, key.upper())
+        s = 'values in cache not as expected'
+        self.assertEqual(cache.get('a'), 'A', s)
+        self.assertEqual(cache.get('b'), 'B', s)
+        self.assertIsNone(cache.get('z'), s)
+        self.assertEqual(cache.get('z', ()), (), s)
+
+        # The entries used least recently are forgotten first, and at least the half 
+        # of the maximum used most recently are kept
+        cache.set('d', 'D')
+        cache.set('e', 'E')
+        s = 'cache of %s entries larger than its maximum' % len(cache)
+        self.assertTrue(len(cache) <= 4, s)
+        s = 'recently used entries not kept'
+        self.assertTrue('d' in cache and 'e' in cache, s)
+        s = 'least recently used entry kept'
+        self.assertFalse('c' in cache, s)
+
+        stats = cache.stats()
+        expected = {'hits':2, 'misses':2, 'size':len(cache)}
+        s = 'cache stats %s not as expected %s' % (stats, expected)
+        self.assertEqual(stats, expected, s)
+
+    def test_profile_file_incremental(self):
+        print 'testing profile_file_incremental'
+        testincremental = self.framework.testincremental
+        storedir = self.framework.testfingerprintstore
+
+        header = 'occurrenceID\tcountry\tstateProvince\tyear\tlocality\n'
+        rows = ['%s\tUnited States\tCalifornia\t19%s\tNear Bishop %s\n' % 
+            (i, i % 10, i % 3) for i in range(100)]
+        rows[7] = '7\tPer\xc3\xba\tLima\t1999\tLima\n'
+        aggregates = [
+            {'type':'rowcount'},
+            {'type':'completeness'},
+            {'type':'valuecounts', 'fields':['country', 'stateProvince'], 
+                'separator':'|'},
+            {'type':'valuecounts', 'fields':['country'], 'function':ustripstr},
+            {'type':'tokens', 'term':'locality'}]
+
+        def compare(changes):
+            found = profile_file_incremental(testincremental, aggregates, storedir,
+                changes=changes)
+            expected = profile_file(testincremental, aggregates, categoricals=[])
+            # Values with the same count may be listed in any order
+            for i in range(len(aggregates)):
+                if aggregates[i]['type'] != 'valuecounts':
+                    continue
+                found[i] = dict(found[i])
+                expected[i] = dict(expected[i])
+            s = 'incremental results %s not as expected %s' % (found, expected)
+            self.assertEqual(found, expected, s)
+
+        with open(testincremental, 'w') as outfile:
+            outfile.write(header + ''.join(rows))
+        changes = {}
+        compare(changes)
+        expected = {'inserted':100, 'updated':0, 'deleted':0, 'unchanged':0, 
+            'scanned':100}
+        s = 'changes %s in first version not as expected %s' % (changes, expected)
+        self.assertEqual(changes, expected, s)
+
+        # Update two records, delete one and insert two, one of them a duplicate of 
+        # another row, and count only the rows that changed
+        rows[7] = '7\tUnited States\tCalifornia\t1999\tLima\n'
+        rows[20] = '20\tUnited States\tNevada\t1920\tNear Reno\n'
+        del rows[50]
+        rows.append('100\tPer\xc3\xba\tCusco\t2001\tCusco\n')
+        rows.append('101' + rows[0][1:])
+        with open(testincremental, 'w') as outfile:
+            outfile.write(header + ''.join(rows))
+        changes = {}
+        compare(changes)
+        expected = {'inserted':2, 'updated':2, 'deleted':1, 'unchanged':97, 
+            'scanned':7}
+        s = 'changes %s in second version not as expected %s' % (changes, expected)
+        self.assertEqual(changes, expected, s)
+
+        # A change in the header counts all of the rows again
+        with open(testincremental, 'w') as outfile:
+            outfile.write(header.replace('year', 'eventDate') + ''.join(rows))
+        changes = {}
+        compare(changes)
+        s = 'rows not all counted again after change in header: %s' % changes
+        self.assertEqual(changes['scanned'], 101, s)
+        self.assertEqual(changes['inserted'], 101, s)
+
+        # Completeness keeps only which columns are blank, so changes to values that 
+        # stay filled in count no rows, but filling in a blank value does
+        aggregates = [{'type':'rowcount', 'term':'stateProvince'}, 
+            {'type':'completeness'}]
+        rows[3] = '3\tUnited States\t\t1903\t\xc2\xa0\n'
+        with open(testincremental, 'w') as outfile:
+            outfile.write(header + ''.join(rows))
+        compare({})
+        rows[5] = '5\tUnited States\tCalifornia\t1905\tNear Lone Pine\n'
+        rows[6] = '6\tUnited States\tCalifornia\t1906\t\n'
+        with open(testincremental, 'w') as outfile:
+            outfile.write(header + ''.join(rows))
+        changes = {}
+        compare(changes)
+        s = 'changes %s to completeness not as expected' % changes
+        self.assertEqual(changes['updated'], 2, s)
+        self.assertEqual(changes['scanned'], 2, s)
+
+    def test_profile_file_workers(self):
+        print 'testing profile_file with workers'
+        extractvaluesfile1 = self.framework.extractvaluesfile1
+        termrowcountfile2 = self.framework.termrowcountfile2
+
+        for inputfile in [extractvaluesfile1, termrowcountfile2]:
+            expected = term_completeness_from_file(inputfile)
+            found = term_completeness_from_file(inputfile, workers=3)
+            s = 'completeness %s with workers not as expected %s in %s' % \
+                (found, expected, inputfile)
+            self.assertEqual(found, expected, s)
+
+            expected = extract_value_counts_from_file(inputfile, ['country'], 
+                function=ustripstr)
+            found = extract_value_counts_from_file(inputfile, ['country'], 
+                function=ustripstr, workers=3)
+            s = 'value counts %s with workers not as expected %s in %s' % \
+                (found, expected, inputfile)
+            self.assertEqual(sorted(found), sorted(expected), s)
+
     def test_represents_int(self):
         print 'testing represents_int'
 
@@ -818,8 +1453,8 @@ class DWCAUtilsTestCase(unittest.TestCase):
 
         encoding = csv_file_encoding(encodedfile_utf8)
         # UTF8 file containing only ascii and latin2 characters encoded as utf-8 is 
-        # indistinguishable from latin1.
-        expected = 'ISO-8859-1'
+        # indistinguishable from latin1 to the detector, but it is valid utf-8.
+        expected = 'utf-8'
         s = 'file encoding (%s) does not match expectation (%s)' % (encoding, expected)
         self.assertEqual(encoding, expected, s)
         
@@ -868,6 +1503,85 @@ class DWCAUtilsTestCase(unittest.TestCase):
         s = 'maxlines = 1000 file encoding (%s) does not match expectation (%s)' % (encoding, expected)
         self.assertEqual(encoding, expected, s)
 
+    def test_csv_file_encoding_detection(self):
+        print 'testing csv_file_encoding_detection'
+        encodedfile_utf8 = self.framework.encodedfile_utf8
+        encodedfile_latin_1 = self.framework.encodedfile_latin_1
+
+        # Make sure detection is not bypassed by the profiles of files seen before
+        clear_file_profiles()
+
+        detected = csv_file_encoding_detection(encodedfile_utf8)
+        s = 'utf-8 file %s not detected by utf-8 validation: %s' % \
+            (encodedfile_utf8, detected)
+        self.assertEqual(detected['encoding'], 'utf-8', s)
+        self.assertEqual(detected['method'], 'utf-8', s)
+
+        detected = csv_file_encoding_detection(encodedfile_latin_1, maxlines=1000)
+        s = 'latin-1 file %s not detected from lines: %s' % \
+            (encodedfile_latin_1, detected)
+        self.assertEqual(detected['encoding'], 'ISO-8859-1', s)
+        self.assertEqual(detected['method'], 'lines', s)
+        self.assertTrue(detected['confidence'] > 0 and detected['confidence'] <= 1, s)
+
+        # Samples smaller than the file should give the same result without reading
+        # all of it
+        detected = csv_file_encoding_detection(encodedfile_latin_1, samplesize=2048, 
+            samplecount=4)
+        s = 'latin-1 file %s not detected from samples: %s' % \
+            (encodedfile_latin_1, detected)
+        self.assertEqual(detected['method'], 'sampled', s)
+        self.assertEqual(detected['encoding'], 'ISO-8859-1', s)
+
+        # The second time the result should come from the file profile
+        detected = csv_file_encoding_detection(encodedfile_latin_1)
+        s = 'latin-1 file %s not detected from profile: %s' % \
+            (encodedfile_latin_1, detected)
+        self.assertEqual(detected['method'], 'profile', s)
+        self.assertEqual(detected['encoding'], 'ISO-8859-1', s)
+
+        # Profiles written without a confidence still give the encoding
+        clear_file_profiles()
+        set_file_profile_value(encodedfile_utf8, 'encoding', 'utf-8')
+        detected = csv_file_encoding_detection(encodedfile_utf8)
+        s = 'utf-8 file %s not detected from profile without confidence: %s' % \
+            (encodedfile_utf8, detected)
+        self.assertEqual(detected['method'], 'profile', s)
+        self.assertEqual(detected['encoding'], 'utf-8', s)
+        self.assertEqual(detected['confidence'], None, s)
+        clear_file_profiles()
+
+    def test_file_samples(self):
+        print 'testing file_samples'
+        testfile = self.framework.encodedfile_latin_1
+        filesize = os.path.getsize(testfile)
+
+        samples, complete = file_samples(testfile)
+        s = 'Small file %s not read whole' % testfile
+        self.assertTrue(complete, s)
+        self.assertEqual(len(samples), 1, s)
+        self.assertEqual(len(samples[0]), filesize, s)
+
+        samples, complete = file_samples(testfile, samplesize=100, samplecount=5)
+        s = 'Samples of %s not bounded as expected' % testfile
+        self.assertFalse(complete, s)
+        self.assertEqual(len(samples), 5, s)
+        for sample in samples:
+            self.assertEqual(len(sample), 100, s)
+        with open(testfile, 'rb') as f:
+            data = f.read()
+        s = 'Samples of %s do not include head and tail' % testfile
+        self.assertEqual(samples[0], data[:100], s)
+        self.assertEqual(samples[-1], data[-100:], s)
+
+        s = 'Split multi-byte characters at sample edges not ignored'
+        self.assertTrue(samples_are_utf8(['abc\xc3', '\xa9def']), s)
+        s = 'Truncated multi-byte character at the end of the file not detected'
+        self.assertFalse(samples_are_utf8(['abc\xc3\xa9d\xc3']), s)
+        self.assertFalse(samples_are_utf8(['abc\xc3', '\xa9de\xe2\x82']), s)
+        s = 'Invalid utf-8 sample not detected'
+        self.assertFalse(samples_are_utf8(['abc', 'd\xe9fghi']), s)
+
     def test_utf8_file_encoder(self):
         # TODO: Add more tests for files in other common encodings
         print 'testing utf8_file_encoder'
@@ -900,6 +1614,100 @@ class DWCAUtilsTestCase(unittest.TestCase):
         s = 'Encoding (%s) of %s to %s not utf-8' % (encoding, testfile, tempfile)
         self.assertEqual(encoding, expected, s)
 
+    def test_utf8_data_encoder(self):
+        print 'testing utf8_data_encoder'
+        testfile = self.framework.testdecodeerrors
+        encodedfile_latin_1 = self.framework.encodedfile_latin_1
+
+        # A utf-8 file with an invalid byte on the third line
+        with open(testfile, 'w') as outfile:
+            outfile.write('a,b\nx,caf\xc3\xa9\ny,\xe9t\xe9\nz,ok\n')
+
+        for errors, expectedlines, expectedcounts in [
+            [None, 3, {'skipped':1}], ['skip', 3, {'skipped':1}], 
+            ['replace', 4, {'replaced':1}] ]:
+            errorcounts = {}
+            with open(testfile, 'rU') as data:
+                lines = list(utf8_data_encoder(data, 'utf-8', errors=errors, 
+                    errorcounts=errorcounts, blocksize=5))
+            s = 'line count (%s) with errors=%s not as expected (%s)' % \
+                (len(lines), errors, expectedlines)
+            self.assertEqual(len(lines), expectedlines, s)
+            s = 'error counts %s with errors=%s not as expected %s' % \
+                (errorcounts, errors, expectedcounts)
+            self.assertEqual(errorcounts, expectedcounts, s)
+            s = 'line %s not as expected' % lines[1]
+            self.assertEqual(lines[1], 'x,caf\xc3\xa9\n', s)
+
+        with open(testfile, 'rU') as data:
+            with self.assertRaises(UnicodeDecodeError):
+                list(utf8_data_encoder(data, 'utf-8', errors='strict'))
+
+        # The same policies apply to the rows of the csv readers
+        dialect = csv_dialect()
+        errorcounts = {}
+        rows = list(read_csv_row(testfile, dialect, 'utf-8', errorcounts=errorcounts))
+        s = 'rows %s, counts %s not as expected' % (rows, errorcounts)
+        self.assertEqual(len(rows), 2, s)
+        self.assertEqual(errorcounts, {'skipped':1}, s)
+
+        errorcounts = {}
+        rows = list(read_csv_row(testfile, dialect, 'utf-8', errors='replace', 
+            errorcounts=errorcounts))
+        s = 'rows %s, counts %s not as expected' % (rows, errorcounts)
+        self.assertEqual(len(rows), 3, s)
+        self.assertEqual(rows[1]['b'], u'\ufffdt\ufffd', s)
+        self.assertEqual(errorcounts, {'replaced':1}, s)
+
+        errorcounts = {}
+        rows = list(read_csv_tuple_row(testfile, dialect, 'utf-8', 
+            errorcounts=errorcounts))
+        s = 'rows %s, counts %s not as expected' % (rows, errorcounts)
+        self.assertEqual(rows, [(u'x', u'caf\xe9'), (u'z', u'ok')], s)
+        self.assertEqual(errorcounts, {'skipped':1}, s)
+
+        # Only bytes that cannot be decoded count, not an encoded U+FFFD
+        with open(testfile, 'w') as outfile:
+            outfile.write('a,b\nw,\xef\xbf\xbd\nx,caf\xc3\nyy,long\xff\nz,ok')
+        for blocksize in [1, 3, 5, 65536]:
+            errorcounts = {}
+            with open(testfile, 'rU') as data:
+                lines = list(utf8_data_encoder(data, 'utf-8', errorcounts=errorcounts, 
+                    blocksize=blocksize))
+            expected = ['a,b\n', 'w,\xef\xbf\xbd\n', 'z,ok']
+            s = 'lines %s with blocksize %s not as expected %s' % \
+                (lines, blocksize, expected)
+            self.assertEqual(lines, expected, s)
+            s = 'error counts %s with blocksize %s not as expected' % \
+                (errorcounts, blocksize)
+            self.assertEqual(errorcounts, {'skipped':2}, s)
+
+        # Files in encodings that leave ASCII as it is go to the csv reader as they are
+        with open(testfile, 'w') as outfile:
+            outfile.write('a,b\nx,caf\xe9\ny,\x81t\xe9\nz,ok\n')
+        with open(testfile, 'rU') as data:
+            lines, lineencoding = csv_lines(data, 'cp1252')
+            s = 'lines of cp1252 file converted for the csv reader'
+            self.assertTrue(lines is data, s)
+            self.assertEqual(lineencoding, 'cp1252', s)
+        with open(testfile, 'rU') as data:
+            lines, lineencoding = csv_lines(data, 'utf-16')
+            s = 'lines of utf-16 file not converted for the csv reader'
+            self.assertFalse(lines is data, s)
+            self.assertEqual(lineencoding, 'utf-8', s)
+        errorcounts = {}
+        rows = list(read_csv_row(testfile, dialect, 'cp1252', errorcounts=errorcounts))
+        s = 'cp1252 rows %s, counts %s not as expected' % (rows, errorcounts)
+        self.assertEqual([r['b'] for r in rows], [u'caf\xe9', u'ok'], s)
+        self.assertEqual(errorcounts, {'skipped':1}, s)
+
+        # Values of files not in utf-8 are decoded from their own encoding
+        dialect = csv_file_dialect(encodedfile_latin_1)
+        rows = list(read_csv_row(encodedfile_latin_1, dialect, 'ISO-8859-1'))
+        expected = u'laguna miraflores, camino estel\xcc_- miraflores.'
+        s = 'second locality %s not as expected %s' % (rows[1]['locality'], expected)
+        self.assertEqual(rows[1]['locality'], expected, s)
+
     def test_purge_non_printing_from_file(self):
         print 'testing purge_non_printing_from_file'
         testfile = self.framework.non_printing_file
@@ -1224,6 +2032,18 @@ class DWCAUtilsTestCase(unittest.TestCase):
         s += ' from %s' % extractvaluesfile1
         self.assertEqual(sortedlist, expected, s)
 
+        # Positional parameters after function are passed on to function
+        def suffixed(value, suffix):
+            return '%s%s' % (value, suffix)
+        fields = ['country']
+        found = extract_value_counts_from_file(extractvaluesfile1, fields, None, None,
+            None, suffixed, '!')
+        expected = [('United States!', 8)]
+        s = 'Extracted values:\n%s' % found
+        s += ' not as expected:\n%s' % expected
+        s += ' from %s with positional function parameter' % extractvaluesfile1
+        self.assertEqual(found, expected, s)
+
     def test_strip_list(self):
         print 'testing strip_list'
         inputlist = [' a ', 'b', ' c', 'd ', None]
@@ -15,7 +15,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2016 President and Fellows of Harvard College"
-__version__ = "dwca_vocab_utils_test.py 2016-10-21T14:40+02:00"
+__version__ = "dwca_vocab_utils_test.py 2026-10-19T03:20-04:00"
 
 # This file contains unit tests for the functions in dwca_vocab_utils.
 #
@@ -40,7 +40,18 @@ from kurator_dwca.dwca_vocab_utils import distinct_vocabs_to_file
 from kurator_dwca.dwca_vocab_utils import dwc_ordered_header
 from kurator_dwca.dwca_vocab_utils import matching_vocab_dict_from_file
 from kurator_dwca.dwca_vocab_utils import missing_vocab_list_from_file
+from kurator_dwca.dwca_vocab_utils import similar_vocab_dict_from_file
+from kurator_dwca.dwca_vocab_utils import TrigramIndex
+from kurator_dwca.dwca_vocab_utils import Vocabulary
+from kurator_dwca.dwca_vocab_utils import clear_vocabularies
+from kurator_dwca.dwca_vocab_utils import darwin_cloud_vocab_dict_from_file
+from kurator_dwca.dwca_vocab_utils import darwin_cloud_vocabulary
+from kurator_dwca.dwca_vocab_utils import darwin_cloud_mapper
+from kurator_dwca.dwca_vocab_utils import load_vocabulary
+from kurator_dwca.dwca_vocab_utils import normalized_key_index
+from kurator_dwca.dwca_vocab_utils import normalized_vocab_key
 from kurator_dwca.dwca_vocab_utils import not_in_list
+from kurator_dwca.dwca_vocab_utils import set_vocabulary_cache
 from kurator_dwca.dwca_vocab_utils import term_values_recommended
 from kurator_dwca.dwca_vocab_utils import terms_not_in_darwin_cloud
 from kurator_dwca.dwca_vocab_utils import terms_not_in_dwc
@@ -50,6 +61,7 @@ from kurator_dwca.dwca_vocab_utils import vocab_dict_from_file
 from kurator_dwca.dwca_vocab_utils import vocabheader
 from kurator_dwca.dwca_vocab_utils import writevocabheader
 import os
+import shutil
 import unittest
 
 # Replace the system csv with unicodecsv. All invocations of csv will use unicodecsv,
@@ -72,6 +84,7 @@ class DWCAVocabUtilsFramework():
     # following are files used as input during the tests, don't remove these
     compositetestfile = testdatapath + 'test_eight_specimen_records.csv'
     monthvocabfile = vocabpath + 'month.txt'
+    countryvocabfile = vocabpath + 'country.txt'
     testmonthvocabfile = testdatapath + 'test_month.txt'
     geogvocabfile = vocabpath + 'dwc_geography.txt'
     darwincloudfile = vocabpath + 'darwin_cloud.txt'
@@ -86,6 +99,7 @@ class DWCAVocabUtilsFramework():
     recommendedreporttestfile = testdatapath + 'test_term_recommended_report.txt'
     termcountreporttestfile = testdatapath + 'test_term_count_report.txt'
     counttestfile = testdatapath + 'test_three_specimen_records.txt'
+    vocabcachedir = testdatapath + 'test_vocabulary_cache'
 
     def dispose(self):
         tsvfromcsvfile1 = self.tsvfromcsvfile1
@@ -103,6 +117,9 @@ class DWCAVocabUtilsFramework():
             os.remove(termcountreporttestfile)
         if os.path.isfile(testvocabfile):
             os.remove(testvocabfile)
+        set_vocabulary_cache(None)
+        if os.path.isdir(self.vocabcachedir):
+            shutil.rmtree(self.vocabcachedir)
         return True
 
 class DWCAVocabUtilsTestCase(unittest.TestCase):
@@ -302,6 +319,69 @@ class DWCAVocabUtilsTestCase(unittest.TestCase):
         s = "missinglist empty for %s" % v
         self.assertEqual(len(missinglist), 1, s)
 
+    def test_similar_vocab_dict_from_file(self):
+        print 'testing similar_vocab_dict_from_file'
+        countryvocabfile = self.framework.countryvocabfile
+        geogcountfileutf8 = self.framework.geogcountfileutf8
+
+        checklist = ['Venezuala', 'Untied Sttes', 'Venezuala', 'XQXQXQ']
+        similardict = similar_vocab_dict_from_file(checklist, countryvocabfile, 
+            'country', count=2)
+        s = 'similardict %s does not have one entry per distinct value' % similardict
+        self.assertEqual(sorted(similardict.keys()), sorted(set(checklist)), s)
+
+        found = similardict['Untied Sttes']
+        s = 'similar values for Untied Sttes %s not as expected' % found
+        self.assertEqual(len(found), 1, s)
+        self.assertEqual(found[0][0], 'UNTIED STATES', s)
+        self.assertTrue(found[0][1] > 0.8 and found[0][1] < 1, s)
+
+        found = similardict['Venezuala']
+        s = 'similar values for Venezuala %s not as expected' % found
+        self.assertEqual([v for v, score in found], ['VENEZUALA', 'VENEZUELA'], s)
+        self.assertEqual(found[0][1], 1.0, s)
+        self.assertTrue(found[0][1] > found[1][1], s)
+
+        found = similardict['XQXQXQ']
+        s = 'similar values found for XQXQXQ: %s' % found
+        self.assertEqual(found, [], s)
+
+        # Only vetted values are proposed, and the geography counts are not vetted
+        v = 'North America|Canada||Alberta|||Brule Lake||'
+        key = 'continent|country|countrycode|stateprovince|county|municipality|'
+        key += 'waterbody|islandgroup|island'
+        vocab = load_vocabulary(geogcountfileutf8, key, '|', csv_dialect(), 'utf-8')
+        similardict = similar_vocab_dict_from_file([v], vocab, key, '|')
+        s = 'unvetted values proposed for %s: %s' % (v, similardict)
+        self.assertEqual(similardict[v], [], s)
+
+        found = vocab.similar(v, vetted=False)
+        s = 'similar values for %s %s not as expected' % (v, found)
+        self.assertEqual(len(found), 1, s)
+        self.assertEqual(found[0][0], u'NORTH AMERICA|CANADA||ALBERTA|||BR\xdbL\xc9 LAKE||', s)
+
+    def test_trigram_index(self):
+        print 'testing trigram_index'
+        index = TrigramIndex(['Peru', 'PERU ', 'Per\xc3\xba', 'Perak', 'Paraguay'])
+        s = 'values with the same keys not indexed once'
+        self.assertEqual(len(index), 4, s)
+
+        found = index.similar(u'PER\xda', count=10, minscore=0.3)
+        s = 'similar values %s not as expected' % found
+        self.assertEqual(found[0], ('Per\xc3\xba', 1.0), s)
+        self.assertEqual([v for v, score in found[1:]], ['Peru', 'Perak'], s)
+
+        found = index.similar('peru', count=1)
+        s = 'most similar value %s not as expected' % found
+        self.assertEqual(found, [('Peru', 1.0)], s)
+
+        found = index.similar('PER', count=10, minscore=0.9)
+        s = 'values less similar than minscore found: %s' % found
+        self.assertEqual(found, [], s)
+
+        s = 'similar values found for an empty value'
+        self.assertEqual(index.similar(''), [], s)
+
     def test_matching_vocab_dict_from_file(self):
         print 'testing matching_vocab_dict_from_file'
         monthvocabfile = self.framework.monthvocabfile
@@ -442,6 +522,40 @@ class DWCAVocabUtilsTestCase(unittest.TestCase):
         s = 'Found:\n%s\nNot as expected:\n%s' % (notdwc, expectedlist)
         self.assertEqual(notdwc, expectedlist, s)
 
+    def test_darwin_cloud_mapper(self):
+        print 'testing darwin_cloud_mapper'
+        darwincloudfile = self.framework.darwincloudfile
+
+        mapper = darwin_cloud_mapper(darwincloudfile)
+        s = 'Darwin Cloud mapper not made from %s' % darwincloudfile
+        self.assertIsNotNone(mapper, s)
+
+        s = 'Darwin Cloud mapper made again from %s' % darwincloudfile
+        self.assertTrue(darwin_cloud_mapper(darwincloudfile) is mapper, s)
+        self.assertTrue(darwin_cloud_mapper(mapper.vocabulary) is mapper, s)
+        self.assertTrue(darwin_cloud_mapper(mapper) is mapper, s)
+
+        checklist = ['Year', '  ', 'dwc:day', 'Id']
+        expectedlist = ['dwc:year', 'UNNAMED_COLUMN_1', 'dwc:day', 'Id']
+        found = mapper.darwinize(checklist, namespace='y')
+        s = 'Found:\n%s\nNot as expected:\n%s' % (found, expectedlist)
+        self.assertEqual(found, expectedlist, s)
+
+        # The same header is darwinized once, and the result can not be changed
+        found.append('extra')
+        found = darwinize_list(checklist, mapper, namespace='y')
+        s = 'Found:\n%s\nNot as expected:\n%s' % (found, expectedlist)
+        self.assertEqual(found, expectedlist, s)
+        stats = mapper._headers.stats()
+        s = 'header cache stats %s not as expected' % stats
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1), s)
+
+        s = 'darwinized header without namespace taken from the cache'
+        self.assertEqual(mapper.darwinize(checklist)[0], 'year', s)
+
+        s = 'Darwin Cloud mapper made from nonexistent file'
+        self.assertIsNone(darwin_cloud_mapper('nonexistentfile.txt'), s)
+
     def test_not_in_list(self):
         print 'testing not_in_list'
         targetlist = ['b', 'a', 'c']
@@ -453,6 +567,84 @@ class DWCAVocabUtilsTestCase(unittest.TestCase):
         self.assertEqual(newlist, ['a', 'c', 'd', 'e'],
             'new values acde for targetlist do not meet expectation')
 
+        # Repeated values are returned once, and sets can be the target
+        checklist = ['c', 'd', 'a', 'e', 'd', '']
+        newlist = not_in_list(set(targetlist), checklist)
+        self.assertEqual(newlist, ['d', 'e'],
+            'distinct new values de for target set do not meet expectation')
+
+        checklist = [' c', 'd ', 'A', 'e', 'D']
+        newlist = not_in_list(['B', 'A', 'C'], checklist, function=ustripstr)
+        self.assertEqual(newlist, ['D', 'E'],
+            'new keys DE for target list do not meet expectation')
+
+    def test_load_vocabulary(self):
+        print 'testing load_vocabulary'
+        monthvocabfile = self.framework.monthvocabfile
+        darwincloudfile = self.framework.darwincloudfile
+        vocabcachedir = self.framework.vocabcachedir
+
+        vocab = load_vocabulary(monthvocabfile, 'month')
+        s = 'month vocabulary not loaded from %s' % monthvocabfile
+        self.assertTrue(isinstance(vocab, Vocabulary), s)
+
+        found = load_vocabulary(monthvocabfile, 'month')
+        s = 'month vocabulary read again from %s' % monthvocabfile
+        self.assertTrue(found is vocab, s)
+
+        found = load_vocabulary(vocab, 'month')
+        s = 'Vocabulary not returned as given'
+        self.assertTrue(found is vocab, s)
+
+        expected = vocab_dict_from_file(monthvocabfile, 'month')
+        found = vocab_dict_from_file(vocab, 'month')
+        s = 'vocab dict from Vocabulary does not match the one from the file'
+        self.assertEqual(found, expected, s)
+
+        found = vocab.entry('JUL')['standard']
+        s = 'standard for JUL (%s) not as expected (7)' % found
+        self.assertEqual(found, '7', s)
+
+        found = vocab.lookup(' jul ')
+        s = 'normalized lookup of jul (%s) not as expected' % found
+        self.assertEqual(found, vocab.entry('JUL'), s)
+
+        s = 'lookup of a value not in the vocabulary not None'
+        self.assertIsNone(vocab.lookup('not a month'), s)
+
+        # A vocabulary persisted by one process is read from the cache by another
+        s = 'vocabulary cache %s not set' % vocabcachedir
+        self.assertTrue(set_vocabulary_cache(vocabcachedir), s)
+        clear_vocabularies()
+        vocab = darwin_cloud_vocabulary(darwincloudfile)
+        s = 'no vocabulary persisted in %s' % vocabcachedir
+        self.assertEqual(len(os.listdir(vocabcachedir)), 1, s)
+
+        clear_vocabularies()
+        cached = darwin_cloud_vocabulary(darwincloudfile)
+        s = 'cached vocabulary not read again from the cache'
+        self.assertFalse(cached is vocab, s)
+        found = darwin_cloud_vocab_dict_from_file(cached)
+        expected = vocab.vocab_dict()
+        s = 'cached Darwin Cloud vocabulary does not match the one from the file'
+        self.assertEqual(found, expected, s)
+
+    def test_normalized_key_index(self):
+        print 'testing normalized_key_index'
+        index = normalized_key_index([' a', 'A', 'b ', 'a'], ustripstr)
+        expected = {'A':set([' a', 'A', 'a']), 'B':set(['b '])}
+        s = 'index %s does not match expectation %s' % (index, expected)
+        self.assertEqual(index, expected, s)
+
+        index = normalized_key_index(None)
+        s = 'index %s for no values not empty' % index
+        self.assertEqual(index, {}, s)
+
+        found = normalized_vocab_key(' North America| canada ', '|')
+        expected = 'NORTH AMERICA|CANADA'
+        s = 'key %s does not match expectation %s' % (found, expected)
+        self.assertEqual(found, expected, s)
+
     def test_distinct_vocabs_to_file(self):
         print 'testing distinct_vocabs_to_file'
         testvocabfile = self.framework.testvocabfile
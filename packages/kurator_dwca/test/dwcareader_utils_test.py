@@ -15,7 +15,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2016 President and Fellows of Harvard College"
-__version__ = "dwcareader_utils_test.py 2016-10-21T14:29+02:00"
+__version__ = "dwcareader_utils_test.py 2026-10-19T09:00-04:00"
 
 # This file contains unit tests for the functions in dwcareader_utils.
 #
@@ -25,9 +25,22 @@ __version__ = "dwcareader_utils_test.py 2016-10-21T14:29+02:00"
 
 from kurator_dwca.dwcareader_utils import get_core_rowcount_from_file
 from kurator_dwca.dwcareader_utils import dwca_metadata_from_file
+from kurator_dwca.dwcareader_utils import dwca_file_descriptors
+from kurator_dwca.dwcareader_utils import dwca_file_rows
+from kurator_dwca.dwcareader_utils import dwca_file_lines
+from kurator_dwca.dwcareader_utils import copy_dwca_file_data
+from kurator_dwca.dwcareader_utils import short_term_name_map
+from kurator_dwca.dwcareader_utils import shortname
+from kurator_dwca.dwcareader_utils import archive_checksum
+from kurator_dwca.dwcareader_utils import inspect_archive
+from kurator_dwca.dwcareader_utils import set_inspection_cache
+from kurator_dwca.dwcareader_utils import clear_inspections
 import os
 import glob
+import shutil
 import unittest
+import zipfile
+import StringIO
 import xml.etree.ElementTree as ET
 
 # Requires the Python Darwin Core Archive Reader from 
@@ -57,8 +70,16 @@ class DWCAUtilsReaderFramework():
 
     # following are files output during the tests, remove these in dispose()
     #csvwriteheaderfile = testdatapath + 'test_write_header_file.csv'
+    inspectioncachedir = testdatapath + 'test_inspection_cache'
+    testblankarchive = testdatapath + 'test_blank_lines_dwca.zip'
 
     def dispose(self):
+        if os.path.isfile(self.testblankarchive):
+            os.remove(self.testblankarchive)
+        set_inspection_cache(None)
+        clear_inspections()
+        if os.path.isdir(self.inspectioncachedir):
+            shutil.rmtree(self.inspectioncachedir)
         files = glob.glob(self.archiveextractionpath + '*')
         for file in files:
             if os.path.isfile(file):
@@ -113,6 +134,174 @@ class DWCAUtilsReaderTestCase(unittest.TestCase):
         north = metadata.find("./dataset/coverage/geographicCoverage/boundingCoordinates/northBoundingCoordinate").text
         #print north
         self.assertEqual(north, '90', 'north geographic coverage incorrect from archive metadata')
+
+    def test_dwca_file_descriptors(self):
+        print 'testing dwca_file_descriptors'
+        dwca = self.framework.dwca
+        descriptors = dwca_file_descriptors(dwca)
+        s = 'descriptors for core and one extension not found in %s' % dwca
+        self.assertEqual(len(descriptors), 2, s)
+
+        core = descriptors[0]
+        s = 'core descriptor %s not as expected' % core
+        self.assertTrue(core['core'], s)
+        self.assertEqual(core['location'], 'occurrence.txt', s)
+        self.assertEqual(core['delimiter'], '\t', s)
+        self.assertEqual(core['ignoreheaderlines'], 1, s)
+        self.assertEqual(core['idindex'], 0, s)
+        self.assertEqual(len(core['fields']), 85, s)
+        self.assertEqual(core['fields'][0]['term'], 'http://purl.org/dc/terms/type', s)
+        self.assertEqual(core['fields'][0]['index'], 1, s)
+
+        extension = descriptors[1]
+        s = 'extension descriptor %s not as expected' % extension
+        self.assertFalse(extension['core'], s)
+        self.assertEqual(extension['location'], 'multimedia.txt', s)
+
+        rows = list(dwca_file_rows(dwca, core))
+        s = 'rows streamed from core not as expected'
+        self.assertEqual(len(rows), 8, s)
+        self.assertEqual(rows[0][13], '326', s)
+
+        s = 'descriptors found for a file that is not an archive'
+        self.assertIsNone(dwca_file_descriptors(self.framework.testdatapath + 
+            'test_eight_specimen_records.csv'), s)
+
+    def test_copy_dwca_file_data(self):
+        print 'testing copy_dwca_file_data'
+        testfile = self.framework.testblankarchive
+        content = 'id\tname\r\r1\ta\r\r\r2\tb\r\n3\tc\n\n4\td'
+        with zipfile.ZipFile(testfile, 'w') as archive:
+            archive.writestr('occurrence.txt', content)
+        descriptor = {'location':'occurrence.txt', 'lineterminator':'\r', 
+            'ignoreheaderlines':1}
+
+        # The block copy has the same lines as the line by line copy
+        lines = list(dwca_file_lines(testfile, descriptor))
+        expected = ''.join([line + '\r' for line in lines])
+        for blocksize in [1, 2, 3, 1048576]:
+            outfile = StringIO.StringIO()
+            linecount = copy_dwca_file_data(testfile, descriptor, outfile, blocksize)
+            found = outfile.getvalue()
+            s = 'copy %r with blocksize %s not as expected %r' % \
+                (found, blocksize, expected)
+            self.assertEqual(found, expected, s)
+            s = 'line count %s with blocksize %s not as expected %s' % \
+                (linecount, blocksize, len(lines))
+            self.assertEqual(linecount, len(lines), s)
+        s = 'lines %s not as expected' % lines
+        self.assertEqual(len(lines), 4, s)
+
+        # Lines are written with the line terminator asked for, whatever the line 
+        # terminator declared in meta.xml
+        content = 'id\tname\r\n1\ta\n2\tb\r\n'
+        with zipfile.ZipFile(testfile, 'w') as archive:
+            archive.writestr('occurrence.txt', content)
+        descriptor['lineterminator'] = '\n'
+        expected = '1\ta\r2\tb\r'
+        for blocksize in [1, 2, 3, 1048576]:
+            outfile = StringIO.StringIO()
+            linecount = copy_dwca_file_data(testfile, descriptor, outfile, blocksize,
+                lineterminator='\r')
+            found = outfile.getvalue()
+            s = 'copy %r with blocksize %s not as expected %r' % \
+                (found, blocksize, expected)
+            self.assertEqual(found, expected, s)
+            self.assertEqual(linecount, 2, s)
+
+    def test_dwca_file_rows_undecodable(self):
+        print 'testing dwca_file_rows_undecodable'
+        testfile = self.framework.testblankarchive
+        content = 'id,name\n1,Per\xc3\xba\n2,Per\xfa\n3,a\n'
+        with zipfile.ZipFile(testfile, 'w') as archive:
+            archive.writestr('occurrence.txt', content)
+        descriptor = {'location':'occurrence.txt', 'lineterminator':'\n', 
+            'ignoreheaderlines':1, 'encoding':'utf-8', 'delimiter':',', 'quotechar':''}
+
+        # Bytes that cannot be decoded are replaced, as the python-dwca-reader does
+        errorcounts = {}
+        rows = list(dwca_file_rows(testfile, descriptor, errorcounts=errorcounts))
+        expected = [[u'1', u'Per\xfa'], [u'2', u'Per\ufffd'], [u'3', u'a']]
+        s = 'rows %s not as expected %s' % (rows, expected)
+        self.assertEqual(rows, expected, s)
+        s = 'error counts %s not as expected' % errorcounts
+        self.assertEqual(errorcounts, {'replaced':1}, s)
+
+        errorcounts = {}
+        rows = list(dwca_file_rows(testfile, descriptor, errors='skip', 
+            errorcounts=errorcounts))
+        s = 'rows %s with undecodable row skipped not as expected' % rows
+        self.assertEqual(rows, [expected[0], expected[2]], s)
+        self.assertEqual(errorcounts, {'skipped':1}, s)
+
+        with self.assertRaises(UnicodeDecodeError):
+            list(dwca_file_rows(testfile, descriptor, errors='strict'))
+
+    def test_shortname(self):
+        print 'testing shortname'
+        found = shortname('http://rs.tdwg.org/dwc/terms/catalogNumber')
+        s = 'shortname %s not catalogNumber' % found
+        self.assertEqual(found, 'catalogNumber', s)
+
+        found = shortname('http://example.org/terms/notATerm')
+        s = 'shortname %s for term not in TERMS not None' % found
+        self.assertIsNone(found, s)
+
+        termlist = ['http://rs.tdwg.org/dwc/terms/catalogNumber', 
+            'http://example.org/terms/notATerm']
+        found = short_term_name_map(termlist)
+        expected = {'http://rs.tdwg.org/dwc/terms/catalogNumber':'catalogNumber',
+            'http://example.org/terms/notATerm':'http://example.org/terms/notATerm'}
+        s = 'short term name map %s not as expected %s' % (found, expected)
+        self.assertEqual(found, expected, s)
+
+    def test_inspect_archive(self):
+        print 'testing inspect_archive'
+        dwca = self.framework.dwca
+        cachedir = self.framework.inspectioncachedir
+
+        s = 'inspection cache %s not set' % cachedir
+        self.assertTrue(set_inspection_cache(cachedir), s)
+
+        inspection = inspect_archive(dwca)
+        s = 'core row count %s not as expected' % inspection['corerowcount']
+        self.assertEqual(inspection['corerowcount'], 8, s)
+
+        s = 'descriptors of core and extension not found in inspection'
+        self.assertEqual(inspection['descriptors'], dwca_file_descriptors(dwca), s)
+
+        title = ET.fromstring(inspection['metadata']).find('./dataset/title').text
+        s = 'title %s from inspection metadata not as expected' % title
+        self.assertEqual(title, 'UWYMV Herpetology Collection (Arctos)', s)
+
+        checksum = archive_checksum(dwca)
+        s = 'inspection not persisted in %s' % cachedir
+        self.assertEqual(inspection['checksum'], checksum, s)
+        self.assertTrue(os.path.isfile(cachedir + '/' + checksum + '.inspection'), s)
+
+        # Another process would read the inspection from the cache
+        clear_inspections()
+        cached = inspect_archive(dwca)
+        s = 'inspection from cache not as expected'
+        self.assertIsNot(cached, inspection, s)
+        self.assertEqual(cached, inspection, s)
+
+        # A corrupt cache file is inspected again, and replaced
+        cachefile = cachedir + '/' + checksum + '.inspection'
+        with open(cachefile, 'wb') as f:
+            f.write('not a pickled inspection')
+        clear_inspections()
+        rowcount = get_core_rowcount_from_file(dwca)
+        s = 'core row count %s from archive with corrupt cache not as expected' % \
+            rowcount
+        self.assertEqual(rowcount, 8, s)
+        clear_inspections()
+        s = 'corrupt inspection cache not replaced'
+        self.assertEqual(inspect_archive(dwca), inspection, s)
+
+        s = 'inspection found for a file that is not an archive'
+        self.assertIsNone(inspect_archive(self.framework.testdatapath + 
+            'test_eight_specimen_records.csv'), s)
     
 if __name__ == '__main__':
     print '=== dwcareader_utils_test.py ==='
@@ -15,7 +15,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2016 President and Fellows of Harvard College"
-__version__ = "report_utils_test.py 2016-10-21T14:34+02:00"
+__version__ = "report_utils_test.py 2026-10-19T02:00-04:00"
 
 # This file contains unit tests for the functions in dwca_vocab_utils.
 #
@@ -58,6 +58,10 @@ class ReportUtilsFramework():
     testtokenreportfile = testdatapath + 'test_token_report_file.txt'
     testcorrectionreportfile = testdatapath + 'test_correction_report_file.txt'
     testsetterreportfile = testdatapath + 'test_setter_report_file.txt'
+    testrepeatedinputfile = testdatapath + 'test_repeated_months.txt'
+    testrepeatedreportfile = testdatapath + 'test_repeated_months_report_file.txt'
+    testmonthnamevocabfile = testdatapath + 'test_month_names.txt'
+    testcountryvocabfile = testdatapath + 'test_country_codes.txt'
 
     def dispose(self):
         testtokenreportfile = self.testtokenreportfile
@@ -69,6 +73,10 @@ class ReportUtilsFramework():
             os.remove(testcorrectionreportfile)
         if os.path.isfile(testsetterreportfile):
             os.remove(testsetterreportfile)
+        for outputfile in [self.testrepeatedinputfile, self.testrepeatedreportfile,
+            self.testmonthnamevocabfile, self.testcountryvocabfile]:
+            if os.path.isfile(outputfile):
+                os.remove(outputfile)
         return True
 
 class ReportUtilsTestCase(unittest.TestCase):
@@ -219,6 +227,105 @@ class ReportUtilsTestCase(unittest.TestCase):
         s = 'Field %s value %s not as expected (%s)' % (field, value, expected)
         self.assertEqual(value, expected, s)
 
+    def test_term_standardizer_report_cache(self):
+        print 'testing term_standardizer_report_cache'
+        testrepeatedinputfile = self.framework.testrepeatedinputfile
+        testrepeatedreportfile = self.framework.testrepeatedreportfile
+        testmonthvocabfile = self.framework.testmonthvocabfile
+
+        months = ['vi', 'VII', 'x', 'vi', 'viii', 'vi', 'VII', 'x', '8', 'vi']
+        with open(testrepeatedinputfile, 'w') as outfile:
+            outfile.write('ID\tmonth\n')
+            for i, month in enumerate(months):
+                outfile.write('%s\t%s\n' % (i, month))
+
+        # Each distinct value is looked up in the vocabulary only once
+        cachestats = {}
+        result = term_standardizer_report(testrepeatedinputfile, 
+            testrepeatedreportfile, testmonthvocabfile, 'month', cachestats=cachestats)
+        s = 'term_standardizer_report() result not True with cache'
+        self.assertTrue(result, s)
+        expected = {'hits':5, 'misses':5, 'size':5}
+        s = 'cache stats %s not as expected %s' % (cachestats, expected)
+        self.assertEqual(cachestats, expected, s)
+
+        dialect = csv_file_dialect(testrepeatedreportfile)
+        encoding = csv_file_encoding(testrepeatedreportfile)
+        rows = read_rows(testrepeatedreportfile, None, dialect=dialect, 
+            encoding=encoding, header=True)
+        found = [row['month'] for row in rows]
+        expected = ['6', '7', 'x', '6', '8', '6', '7', 'x', '8', '6']
+        s = 'standardized months %s not as expected %s' % (found, expected)
+        self.assertEqual(found, expected, s)
+        found = [row['month_orig'] for row in rows]
+        s = 'original months %s not as expected %s' % (found, months)
+        self.assertEqual(found, months, s)
+
+        # A cache too small to hold the distinct values gives the same results
+        cachestats = {}
+        result = term_standardizer_report(testrepeatedinputfile, 
+            testrepeatedreportfile, testmonthvocabfile, 'month', cachesize=2, 
+            cachestats=cachestats)
+        s = 'term_standardizer_report() result not True with small cache'
+        self.assertTrue(result, s)
+        s = 'cache stats %s not as expected with small cache' % cachestats
+        self.assertTrue(cachestats['size'] <= 2, s)
+        self.assertEqual(cachestats['hits'] + cachestats['misses'], len(months), s)
+        rows = read_rows(testrepeatedreportfile, None, dialect=dialect, 
+            encoding=encoding, header=True)
+        found = [row['month'] for row in rows]
+        s = 'months %s with small cache not as expected %s' % (found, expected)
+        self.assertEqual(found, expected, s)
+
+    def test_term_standardizer_report_multiple(self):
+        print 'testing term_standardizer_report_multiple'
+        testcorrectioninputfile = self.framework.testcorrectioninputfile
+        testcorrectionreportfile = self.framework.testcorrectionreportfile
+        testmonthvocabfile = self.framework.testmonthvocabfile
+        testmonthnamevocabfile = self.framework.testmonthnamevocabfile
+        testcountryvocabfile = self.framework.testcountryvocabfile
+
+        with open(testmonthnamevocabfile, 'w') as outfile:
+            outfile.write('month\tstandard\tvetted\n6\tJune\t1\nvi\tVI\t1\n')
+        with open(testcountryvocabfile, 'w') as outfile:
+            outfile.write('country\tstandard\tvetted\nar\tArgentina\t1\n')
+
+        # Standardizations are made in the order given, each on the values left by 
+        # those before it, with the original values kept once. A standardization for 
+        # fields not in the file is left out.
+        standardizations = [['country', testcountryvocabfile], 
+            ['month', testmonthnamevocabfile], ['island', testcountryvocabfile]]
+        result = term_standardizer_report(testcorrectioninputfile, 
+            testcorrectionreportfile, testmonthvocabfile, 'month', 
+            standardizations=standardizations)
+        s = 'term_standardizer_report() result not True with standardizations'
+        self.assertTrue(result, s)
+
+        outputheader = read_header(testcorrectionreportfile)
+        expected = ['ID', 'month', 'country', 'month_orig', 'country_orig']
+        s = 'outputheader: %s not as expected: %s' % (outputheader, expected)
+        self.assertEqual(outputheader, expected, s)
+
+        dialect = csv_file_dialect(testcorrectionreportfile)
+        encoding = csv_file_encoding(testcorrectionreportfile)
+        rows = read_rows(testcorrectionreportfile, 1, dialect=dialect, encoding=encoding, 
+            header=True, fieldnames=outputheader)
+        found = [rows[0][field] for field in outputheader]
+        expected = ['1', 'June', 'Argentina', 'vi', 'AR']
+        s = 'standardized row %s not as expected %s' % (found, expected)
+        self.assertEqual(found, expected, s)
+
+        # Standardizations alone, without a key and vocabfile
+        result = term_standardizer_report(testcorrectioninputfile, 
+            testcorrectionreportfile, None, None, standardizations=standardizations)
+        s = 'term_standardizer_report() result not True with only standardizations'
+        self.assertTrue(result, s)
+        rows = read_rows(testcorrectionreportfile, 1, dialect=dialect, encoding=encoding, 
+            header=True)
+        s = 'row %s standardized without key not as expected' % rows[0]
+        self.assertEqual(rows[0]['month'], 'VI', s)
+        self.assertEqual(rows[0]['country'], 'Argentina', s)
+
 if __name__ == '__main__':
     print '=== report_utils_test.py ==='
     unittest.main()
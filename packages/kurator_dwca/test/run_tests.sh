@@ -48,6 +48,10 @@ date
 #date
 #jython: 3s
 
+python darwinize_headers_test.py
+date
+#python: 0s
+
 python downloader_test.py
 date
 #python: 3
@@ -62,6 +66,14 @@ date
 #date
 #jython: 3s
 
+python dwca_download_core_to_tsv_test.py
+date
+#python: 1s
+
+python dwca_extract_all_test.py
+date
+#python: 0s
+
 python dwca_utils_test.py
 date
 #python: 59s
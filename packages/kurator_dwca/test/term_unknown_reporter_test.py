@@ -14,7 +14,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2016 President and Fellows of Harvard College"
-__version__ = "term_unknown_reporter_test.py 2016-10-21T12:36+02:00"
+__version__ = "term_unknown_reporter_test.py 2026-10-19T02:40-04:00"
 
 # This file contains unit tests for the term_unknown_reporter function.
 #
@@ -34,15 +34,17 @@ class TermUnknownReporterFramework():
     # input data files to tests, don't remove these
     testfile1 = testdatapath + 'test_month_report.txt'
     monthvocabfile = testdatapath + 'test_vocab_month.txt'
+    countryvocabfile = '../data/vocabularies/country.txt'
 
     # output data files from tests, remove these in dispose()
     testreportfile = testdatapath + 'test_term_recommendation_file.csv'
+    testcountryfile = testdatapath + 'test_misspelled_countries.txt'
 
     def dispose(self):
         """Remove any output files created as a result of testing"""
-        testreportfile = self.testreportfile
-        if os.path.isfile(testreportfile):
-            os.remove(testreportfile)
+        for removeme in [self.testreportfile, self.testcountryfile]:
+            if os.path.isfile(removeme):
+                os.remove(removeme)
         return True
 
 class TermUnknownReporterTestCase(unittest.TestCase):
@@ -120,6 +122,36 @@ class TermUnknownReporterTestCase(unittest.TestCase):
         s = 'term recommendation failed: %s' % response['message']
         self.assertTrue(success, s)
 
+    def test_term_unknown_reporter_suggestions(self):
+        print 'testing term_unknown_reporter_suggestions'
+        testreportfile = self.framework.testreportfile
+        testcountryfile = self.framework.testcountryfile
+        countryvocabfile = self.framework.countryvocabfile
+
+        with open(testcountryfile, 'w') as f:
+            f.write('catalogNumber\tcountry\n1\tUntied Sttes\n2\tXQXQXQ\n3\tPeru\n')
+
+        inputs = {}
+        inputs['inputfile'] = testcountryfile
+        inputs['key'] = 'country'
+        inputs['outputfile'] = testreportfile
+        inputs['vocabfile'] = countryvocabfile
+        inputs['format'] = 'txt'
+        inputs['suggestions'] = '2'
+
+        response=term_unknown_reporter(inputs)
+        #print 'response:\n%s' % response
+        s = 'term unknown report with suggestions failed: %s' % response['message']
+        self.assertTrue(response['success'], s)
+
+        with open(testreportfile) as f:
+            lines = f.read().splitlines()
+        expected = ['country\tstandard\tvetted\tsuggestions',
+            'UNTIED STTES\t\t0\tUNTIED STATES (0.81)',
+            'XQXQXQ\t\t0\t']
+        s = 'report lines %s not as expected %s' % (lines, expected)
+        self.assertEqual(lines, expected, s)
+
 if __name__ == '__main__':
     print '=== term_unknown_reporter_test.py ==='
     unittest.main()
@@ -14,7 +14,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2016 President and Fellows of Harvard College"
-__version__ = "text_file_filter_test.py 2016-10-21T13:08+02:00"
+__version__ = "text_file_filter_test.py 2026-10-19T05:00-04:00"
 
 # This file contains unit tests for the text_file_filter function.
 #
@@ -28,7 +28,9 @@ from kurator_dwca.dwca_utils import csv_file_dialect
 from kurator_dwca.dwca_utils import csv_file_encoding
 from kurator_dwca.dwca_utils import read_csv_row
 from kurator_dwca.dwca_utils import count_rows
+from kurator_dwca.dwca_utils import write_column_store
 import os
+import shutil
 import unittest
 
 # Replace the system csv with unicodecsv. All invocations of csv will use unicodecsv,
@@ -52,12 +54,18 @@ class TextFileFilterFramework():
 
     # output data files from tests, remove these in dispose()
     testreportfile = 'test_tefile_filter_file.csv'
+    teststorefile = 'test_tefile_filter_column_store.csv'
+    teststorereportfile = 'test_tefile_filter_column_store_file.csv'
 
     def dispose(self):
         """Remove any output files created as a result of testing"""
-        testreportfile = self.testdatapath+self.testreportfile
-        if os.path.isfile(testreportfile):
-            os.remove(testreportfile)
+        for outputfile in [self.testreportfile, self.teststorefile, 
+            self.teststorereportfile]:
+            removeme = self.testdatapath + outputfile
+            if os.path.isfile(removeme):
+                os.remove(removeme)
+            if os.path.isdir(removeme + '.columns'):
+                shutil.rmtree(removeme + '.columns')
         return True
 
 class TextFileFilterTestCase(unittest.TestCase):
@@ -181,6 +189,70 @@ class TextFileFilterTestCase(unittest.TestCase):
         s += 'was %s, not as expected (%s) ' % (matches, expected)
         self.assertEqual(matches, expected, s)
         
+    def test_text_file_filter_column_store(self):
+        print 'testing text_file_filter_column_store'
+        workspace = self.framework.testdatapath
+        teststorefile = workspace + self.framework.teststorefile
+        shutil.copyfile(self.framework.testinputfile, teststorefile)
+
+        inputs = {}
+        inputs['inputfile'] = teststorefile
+        inputs['termname'] = 'year'
+        inputs['matchingvalue'] = '1990'
+        inputs['workspace'] = workspace
+        inputs['outputfile'] = self.framework.testreportfile
+        response=text_file_filter(inputs)
+        expected = open(response['outputfile'], 'rb').read()
+
+        # Rows filtered from the column store of the file are those from the file
+        store = write_column_store(teststorefile)
+        s = 'column store for %s not written' % teststorefile
+        self.assertIsNotNone(store, s)
+
+        inputs['outputfile'] = self.framework.teststorereportfile
+        response=text_file_filter(inputs)
+        s = 'text file filter with column store failed: %s' % response['message']
+        self.assertTrue(response['success'], s)
+        found = open(response['outputfile'], 'rb').read()
+        s = 'Output filtered from column store:\n%s\nnot as expected:\n%s' % \
+            (found, expected)
+        self.assertEqual(found, expected, s)
+
+    def test_text_file_filter_non_ascii(self):
+        print 'testing text_file_filter_non_ascii'
+        workspace = self.framework.testdatapath
+        teststorefile = workspace + self.framework.teststorefile
+        with open(teststorefile, 'wb') as f:
+            f.write('catalogNumber,country\n1,Per\xc3\xba\n2,Chile\n3,Per\xc3\xba\n')
+
+        inputs = {}
+        inputs['inputfile'] = teststorefile
+        inputs['termname'] = 'country'
+        inputs['matchingvalue'] = 'Per\xc3\xba'
+        inputs['encoding'] = 'utf-8'
+        inputs['workspace'] = workspace
+        inputs['outputfile'] = self.framework.testreportfile
+        response=text_file_filter(inputs)
+        s = 'text file filter for non-ASCII value failed: %s' % response['message']
+        self.assertTrue(response['success'], s)
+        expected = open(response['outputfile'], 'rb').read()
+        s = 'rows matching non-ASCII value not found:\n%s' % expected
+        self.assertEqual(expected.count('Per\xc3\xba'), 2, s)
+
+        # The same rows are filtered from the column store of the file
+        store = write_column_store(teststorefile)
+        s = 'column store for %s not written' % teststorefile
+        self.assertIsNotNone(store, s)
+
+        inputs['outputfile'] = self.framework.teststorereportfile
+        response=text_file_filter(inputs)
+        s = 'text file filter with column store failed: %s' % response['message']
+        self.assertTrue(response['success'], s)
+        found = open(response['outputfile'], 'rb').read()
+        s = 'Output filtered from column store:\n%s\nnot as expected:\n%s' % \
+            (found, expected)
+        self.assertEqual(found, expected, s)
+
 if __name__ == '__main__':
     print '=== text_file_filter_test.py ==='
     unittest.main()
@@ -14,7 +14,7 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2016 President and Fellows of Harvard College"
-__version__ = "vocab_extractor_test.py 2016-10-21T13:05+02:00"
+__version__ = "vocab_extractor_test.py 2026-10-19T00:40-04:00"
 
 # This file contains unit test for the vocab_extractor function.
 #
@@ -25,6 +25,7 @@ __version__ = "vocab_extractor_test.py 2016-10-21T13:05+02:00"
 from kurator_dwca.vocab_extractor import vocab_extractor
 from kurator_dwca.dwca_utils import read_header
 import os
+import shutil
 import unittest
 
 class VocabExtractorFramework():
@@ -39,12 +40,18 @@ class VocabExtractorFramework():
 
     # output data files from tests, remove these in dispose()
     testvocabfile = testdatapath + 'test_vocab_file.csv'
+    testversionfile = testdatapath + 'test_vocab_version.txt'
+    fingerprintstore = 'test_vocab_fingerprints'
 
     def dispose(self):
         """Remove any output files created as a result of testing"""
         testvocabfile = self.testvocabfile
         if os.path.isfile(testvocabfile):
             os.remove(testvocabfile)
+        if os.path.isfile(self.testversionfile):
+            os.remove(self.testversionfile)
+        if os.path.isdir(self.testdatapath + self.fingerprintstore):
+            shutil.rmtree(self.testdatapath + self.fingerprintstore)
         return True
 
 class VocabExtractorTestCase(unittest.TestCase):
@@ -224,6 +231,43 @@ class VocabExtractorTestCase(unittest.TestCase):
         s += 'do not match expectation: %s' % expected
         self.assertEqual(values, expected, s)
 
+    def test_vocab_extractor_incremental(self):
+        print 'testing vocab_extractor_incremental'
+        testfile = self.framework.testversionfile
+        workspace = self.framework.testdatapath
+
+        header = 'occurrenceID\tcountry\n'
+        with open(testfile, 'w') as outfile:
+            outfile.write(header + '1\tPeru\n2\tChile\n3\tperu \n')
+
+        inputs = {}
+        inputs['workspace'] = workspace
+        inputs['inputfile'] = testfile
+        inputs['termlist'] = 'country'
+        inputs['fingerprintstore'] = self.framework.fingerprintstore
+        response=vocab_extractor(inputs)
+        #print 'response:\n%s' % response
+        values = response['extractedvalues']
+        expected = ['CHILE', 'PERU']
+        s = 'values %s not as expected %s' % (values, expected)
+        self.assertEqual(values, expected, s)
+        s = 'fingerprint store not created in workspace'
+        self.assertTrue(os.path.isdir(workspace + self.framework.fingerprintstore), s)
+
+        # The only row with Chile is deleted, one is changed and one inserted
+        with open(testfile, 'w') as outfile:
+            outfile.write(header + '1\tPeru\n3\tBolivia\n4\tEcuador\n')
+        response=vocab_extractor(inputs)
+        values = response['extractedvalues']
+        expected = ['BOLIVIA', 'ECUADOR', 'PERU']
+        s = 'values %s from second version not as expected %s' % (values, expected)
+        self.assertEqual(values, expected, s)
+
+        changes = response['changes']
+        expected = {'inserted':1, 'updated':1, 'deleted':1, 'unchanged':1, 'scanned':4}
+        s = 'changes %s not as expected %s' % (changes, expected)
+        self.assertEqual(changes, expected, s)
+
 if __name__ == '__main__':
     print '=== vocab_extractor_test.py ==='
     unittest.main()
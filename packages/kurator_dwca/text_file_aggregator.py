@@ -15,19 +15,20 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "text_file_aggregator.py 2017-07-19T09:33-07:00"
+__version__ = "text_file_aggregator.py 2026-10-19T08:20-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import composite_header
 from dwca_utils import csv_file_dialect
 from dwca_utils import csv_file_encoding
-from dwca_utils import utf8_data_encoder
+from dwca_utils import csv_lines
 from dwca_utils import csv_dialect
 from dwca_utils import tsv_dialect
 from dwca_utils import dialect_attributes
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 import os
 import glob
 import uuid
@@ -50,6 +51,8 @@ def text_file_aggregator(options):
         to be the same. Write a file containing the joined files with one header line.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the outputfile (optional)
         inputpath - full path to the input file set. The file extension of the outputfile
             will be the substring following the last '.' in the inputpath.
@@ -68,6 +71,7 @@ def text_file_aggregator(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
@@ -149,8 +153,8 @@ def text_file_aggregator(options):
             dialect = csv_file_dialect(file)
             encoding = csv_file_encoding(file)
             with open(file, 'rU') as inputfile:
-                reader = csv.DictReader(utf8_data_encoder(inputfile, encoding), 
-                    dialect=dialect, encoding=encoding)
+                lines, lineencoding = csv_lines(inputfile, encoding)
+                reader = csv.DictReader(lines, dialect=dialect, encoding=lineencoding)
                 for line in reader:
                     try:
                         writer.writerow(line)
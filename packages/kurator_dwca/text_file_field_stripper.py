@@ -21,6 +21,7 @@ __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 from dwca_utils import read_header
 from dwca_utils import write_header
 from dwca_utils import clean_header
@@ -50,6 +51,8 @@ def text_file_field_stripper(options):
     ''' Filter a text file into a new file based on matching a list of fields to keep.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - the directory in which the output will be written (optional)
         inputfile - full path to the input file (required)
         outputfile - name of the output file, without path (required)
@@ -69,6 +72,7 @@ def text_file_field_stripper(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
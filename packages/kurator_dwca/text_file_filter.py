@@ -15,17 +15,21 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2018 President and Fellows of Harvard College"
-__version__ = "text_file_filter.py 2018-02-05T19:41-03:00"
+__version__ = "text_file_filter.py 2026-10-19T05:00-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 from dwca_utils import read_header
 from dwca_utils import write_header
 from dwca_utils import csv_file_dialect
 from dwca_utils import csv_file_encoding
-from dwca_utils import read_csv_row
+from dwca_utils import read_csv_tuple_row
+from dwca_utils import column_store
+from dwca_utils import read_column_store_rows
+from dwca_utils import header_index_map
 from dwca_utils import csv_dialect
 from dwca_utils import tsv_dialect
 import os
@@ -48,6 +52,8 @@ def text_file_filter(options):
     ''' Filter a text file into a new file based on matching values in a term.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - the directory in which the output will be written (optional)
         inputfile - full path to the input file (required)
         encoding - string signifying the encoding of the input file. If known, it speeds
@@ -66,6 +72,7 @@ def text_file_filter(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
@@ -134,6 +141,16 @@ def text_file_filter(options):
         logging.debug('message: %s' % message)
         return response(returnvars, returnvals)
 
+    # Values are read from the file as unicode, so compare them with a unicode value
+    if isinstance(matchingvalue, str):
+        try:
+            matchingvalue = matchingvalue.decode('utf-8')
+        except UnicodeDecodeError:
+            message = 'Matching value for %s not in utf-8. %s' % (termname, __version__)
+            returnvals = [workspace, outputfile, success, message, artifacts]
+            logging.debug('message: %s' % message)
+            return response(returnvars, returnvals)
+
     try:
         encoding = options['encoding']
     except:
@@ -187,17 +204,28 @@ def text_file_filter(options):
         returnvals = [workspace, outputfile, success, message, artifacts]
         return response(returnvars, returnvals)
 
+    # Find the column of the term. Rows are written with the fields of the header, 
+    # filling missing values with empty strings.
+    termcolumn = header_index_map(header)[termname]
+    fieldcount = len(header)
+
     # Open the outputfile to start writing matching rows
     with open(outputfile, 'a') as outfile:
-        writer = csv.DictWriter(outfile, dialect=outputdialect, encoding='utf-8', 
-            fieldnames=header)
-
-        # Iterate through all rows in the input file
-        for row in read_csv_row(inputfile, dialect=inputdialect, encoding=encoding, 
-            header=True, fieldnames=header):
+        writer = csv.writer(outfile, dialect=outputdialect, encoding='utf-8')
+
+        # Iterate through all rows in the input file. From a column store, read the 
+        # other columns only for the rows in which the term has the matching value.
+        store = column_store(inputfile, inputdialect, encoding)
+        if store is not None:
+            rows = read_column_store_rows(store, range(fieldcount), 
+                where={termcolumn:matchingvalue})
+        else:
+            rows = read_csv_tuple_row(inputfile, dialect=inputdialect, 
+                encoding=encoding, header=True)
+        for row in rows:
             # Write rows where the term value matches the criterion
-            if row[termname] == matchingvalue:
-                writer.writerow(row)
+            if termcolumn < len(row) and row[termcolumn] == matchingvalue:
+                writer.writerow(row[:fieldcount] + ('',) * (fieldcount - len(row)))
 
     success = True
     s = '%s_filtered_file' % termname
@@ -15,13 +15,16 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "text_file_splitter.py 2017-04-27T16:37-04:00"
+__version__ = "text_file_splitter.py 2026-10-18T09:20-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import split_path
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import line_index
+from dwca_utils import indexed_line_count
+from dwca_utils import copy_indexed_lines
 import os
 import uuid
 import logging
@@ -99,40 +102,24 @@ def text_file_splitter(options):
     fileext = None
     path, fileext, filepattern = split_path(inputfile)
 
-    # Open the file in universal mode
-    input = open(inputfile, 'rU')
+    # Get the offsets of the lines in the file, kept for later use on the same file
+    index = line_index(inputfile)
 
-    # Get the first line of the file as the header
-    header=input.next()
-
-    # dest will be used for the chunk files
-    dest = None
-    rowcount = 0
+    # The rows after the header line
+    rowcount = indexed_line_count(index) - 1
+    if rowcount < 0:
+        rowcount = 0
     chunks = 0
 
-    # Iterate though the entire input file
-    for line in input:
-        # For the first line and every multiple of subsequent max_chunk_length lines
-        if rowcount % chunksize == 0:
-            # Close the old chunk file, if there is one
-            if dest:
-                dest.close()
-            # Open a new chunk file to write the next lines into, with a header
+    # Copy the header and each range of chunksize rows into a chunk file, with the 
+    # line endings as they are in the input file
+    with open(inputfile, 'rb') as input:
+        for first in range(1, rowcount + 1, chunksize):
             destfile=workspace+'/'+filepattern+'-'+str(chunks)+'.'+fileext
-            dest = open(destfile, 'w')
-            dest.write(header)
+            with open(destfile, 'wb') as dest:
+                copy_indexed_lines(input, dest, index, 0)
+                copy_indexed_lines(input, dest, index, first, first + chunksize)
             chunks += 1
-        # Write a line to the current chunk and keep going
-        dest.write(line)
-        rowcount += 1
-
-    # Close the last chunk file
-    if dest:
-        dest.close()
-
-    # Close the last input file
-    if input:
-        input.close()
 
     outputpattern = None
     if filepattern is not None and fileext is not None:
@@ -22,6 +22,7 @@ __adapted_from__ = "actor_template.py"
 from dwca_utils import utf8_file_encoder
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 import os
 import logging
 import argparse
@@ -30,6 +31,8 @@ def utf8_encoder(options):
     ''' Translate input file from its current encoding to utf8.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the outputfile (optional)
         inputfile - full path to the input file (required)
         outputfile - name of the output file, without path (required)
@@ -42,6 +45,7 @@ def utf8_encoder(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
@@ -22,6 +22,7 @@ __adapted_from__ = "actor_template.py"
 from dwca_utils import read_header
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 from dwca_utils import csv_file_dialect
 from dwca_utils import tsv_dialect
 from dwca_vocab_utils import vocabheader
@@ -48,6 +49,8 @@ def vocab_appender(options):
         given vocabulary file as new entries.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory to work in (optional)
         vocabfile - full path to the file containing the vocabulary (required)
         checkvaluelist - a list of candidate key values to append (optional)
@@ -63,6 +66,7 @@ def vocab_appender(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
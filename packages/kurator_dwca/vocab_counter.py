@@ -21,6 +21,7 @@ __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
 from dwca_utils import extract_value_counts_from_file
 import os.path
 import logging
@@ -31,6 +32,8 @@ def vocab_counter(options):
         with the number of times each occurs.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory for the output artifacts (optional)
         inputfile - full path to the input file (required)
         termname - the name of the term for which to find distinct values (required)
@@ -46,6 +49,7 @@ def vocab_counter(options):
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
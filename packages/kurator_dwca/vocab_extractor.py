@@ -15,13 +15,16 @@
 
 __author__ = "John Wieczorek"
 __copyright__ = "Copyright 2017 President and Fellows of Harvard College"
-__version__ = "vocab_extractor.py 2017-04-27T16:37-04:00"
+__version__ = "vocab_extractor.py 2026-10-19T00:40-04:00"
 __kurator_content_type__ = "actor"
 __adapted_from__ = "actor_template.py"
 
 from dwca_utils import response
 from dwca_utils import setup_actor_logging
+from dwca_utils import setup_actor_profile_index
+from dwca_utils import setup_actor_fingerprint_store
 from dwca_utils import extract_values_from_file
+from dwca_utils import profile_file_incremental
 from dwca_utils import ustripstr
 import os
 import logging
@@ -31,6 +34,8 @@ def vocab_extractor(options):
     ''' Extract a list of the distinct values of a set of terms in a text file.
     options - a dictionary of parameters
         loglevel - level at which to log (e.g., DEBUG) (optional)
+        profileindex - full path to a file in which to keep the detected dialect,
+            encoding and header of files for reuse by other actors (optional)
         workspace - path to a directory to work in (optional)
         inputfile - full path to the input file (required)
         termlist - list of fields to extract from the input file (required)
@@ -38,21 +43,29 @@ def vocab_extractor(options):
             (optional; default None)
         encoding - string signifying the encoding of the input file. If known, it speeds
             up processing a great deal. (optional; default None) (e.g., 'utf-8')
+        fingerprintstore - path to a directory in which to keep fingerprints of the 
+            rows of the input file and the values, so that the values for a later 
+            version of the file are extracted from only the rows that changed (see 
+            profile_file_incremental()). Without a path it is placed in the workspace 
+            (optional)
     returns a dictionary with information about the results
         workspace - path to a directory worked in
         extractedvalues - a list of distinct values of the term in the inputfile
+        changes - dictionary of the number of records inserted, updated, deleted and
+            unchanged since the version of the file in the fingerprintstore, if given
         success - True if process completed successfully, otherwise False
         message - an explanation of the reason if success=False
     '''
     #print '%s options: %s' % (__version__, options)
 
     setup_actor_logging(options)
+    setup_actor_profile_index(options)
 
     logging.debug( 'Started %s' % __version__ )
     logging.debug( 'options: %s' % options )
 
     # Make a list of keys in the response dictionary
-    returnvars = ['workspace', 'extractedvalues', 'success', 'message']
+    returnvars = ['workspace', 'extractedvalues', 'changes', 'success', 'message']
 
     ### Standard outputs ###
     success = False
@@ -60,6 +73,7 @@ def vocab_extractor(options):
 
     ### Custom outputs ###
     extractedvalues = None
+    changes = None
 
     # Make a dictionary for artifacts left behind
     artifacts = {}
@@ -84,13 +98,13 @@ def vocab_extractor(options):
 
     if inputfile is None or len(inputfile)==0:
         message = 'No input file given. %s' % __version__
-        returnvals = [workspace, extractedvalues, success, message]
+        returnvals = [workspace, extractedvalues, changes, success, message]
         logging.debug('message: %s' % message)
         return response(returnvars, returnvals)
         
     if not os.path.isfile(inputfile):
         message = 'Input file %s not found. %s' % (inputfile, __version__)
-        returnvals = [workspace, extractedvalues, success, message]
+        returnvals = [workspace, extractedvalues, changes, success, message]
         logging.debug('message: %s' % message)
         return response(returnvars, returnvals)
 
@@ -101,7 +115,7 @@ def vocab_extractor(options):
 
     if termlist is None or len(termlist)==0:
         message = 'No termlist given. %s' % __version__
-        returnvals = [workspace, extractedvalues, success, message]
+        returnvals = [workspace, extractedvalues, changes, success, message]
         logging.debug('message: %s' % message)
         return response(returnvars, returnvals)
 
@@ -123,11 +137,23 @@ def vocab_extractor(options):
     # Extract the distinct values from the inputfile, applying the function to strip
     # white space and make lower case.
     # Let extract_values_from_file figure out the dialect and encoding of inputfile.
-    extractedvalues = extract_values_from_file(inputfile, theterms, separator=separator,
-        encoding=encoding, function=ustripstr)
+    # With a fingerprint store, keep counts of the values, so that values no longer in
+    # any row of a later version of the file can be dropped.
+    fingerprintstore = setup_actor_fingerprint_store(options)
+    if fingerprintstore is not None:
+        changes = {}
+        aggregate = {'type':'valuecounts', 'fields':theterms, 'separator':separator,
+            'function':ustripstr}
+        counts = profile_file_incremental(inputfile, [aggregate], fingerprintstore, 
+            encoding=encoding, changes=changes)
+        if counts is not None and counts[0] is not None:
+            extractedvalues = sorted([value for value, count in counts[0]])
+    else:
+        extractedvalues = extract_values_from_file(inputfile, theterms, 
+            separator=separator, encoding=encoding, function=ustripstr)
 
     success = True
-    returnvals = [workspace, extractedvalues, success, message]
+    returnvals = [workspace, extractedvalues, changes, success, message]
     logging.debug('Finishing %s' % __version__)
     return response(returnvars, returnvals)
 
@@ -150,6 +176,10 @@ def _getoptions():
     help = "encoding (optional)"
     parser.add_argument("-e", "--encoding", help=help)
 
+    help = 'directory in which to keep fingerprints for incremental extraction '
+    help += '(optional)'
+    parser.add_argument("-p", "--fingerprintstore", help=help)
+
     help = 'log level (e.g., DEBUG, WARNING, INFO) (optional)'
     parser.add_argument("-l", "--loglevel", help=help)
 
@@ -186,6 +216,7 @@ def main():
     optdict['termlist'] = options.termlist
     optdict['separator'] = options.separator
     optdict['encoding'] = options.encoding
+    optdict['fingerprintstore'] = options.fingerprintstore
     optdict['loglevel'] = options.loglevel
     print 'optdict: %s' % optdict
 